@@ -18,6 +18,22 @@ class Settings(BaseSettings):
     # IMPORTANT: Set MELIPAYAMAK_API_KEY via environment in production (do NOT hardcode).
     MELIPAYAMAK_API_KEY: str = ""
     SMS_FORCE_TEST_MODE: bool = False
+    # REST host of the Melipayamak console API (override to point at a local stub) and bulk sender line
+    MELIPAYAMAK_API_BASE_URL: str = "https://console.melipayamak.com"
+    # Host of the legacy SOAP API used as a fallback when the REST send fails
+    MELIPAYAMAK_SOAP_BASE_URL: str = "https://api.payamak-panel.com"
+    MELIPAYAMAK_SENDER: str = "50004001"
+
+    # Login codes and send-rate limits live off the primary DB (see app/services/otp_store.py).
+    # memory:// (single worker only), sqlite:///path (shared local file) or redis://host:port/db
+    OTP_STORE_URL: str = "sqlite:///./otp_store.db"
+    OTP_TTL_SECONDS: int = 900
+    OTP_MAX_ATTEMPTS: int = 5
+    # Token buckets for /auth/send-verification: burst size and seconds to regain one send
+    OTP_PHONE_BURST: int = 3
+    OTP_PHONE_REFILL_SECONDS: int = 120
+    OTP_IP_BURST: int = 10
+    OTP_IP_REFILL_SECONDS: int = 60
 
     # Payment Gateway Configuration (ZarinPal)
     # IMPORTANT: Set ZARINPAL_MERCHANT_ID via environment in production (do NOT hardcode).
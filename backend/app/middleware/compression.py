@@ -0,0 +1,34 @@
+"""
+Gzip middleware that leaves Server-Sent Events streams alone.
+
+Starlette's GZipMiddleware buffers small writes until it has enough to
+compress, so an event stream behind it only ever delivers the gzip header
+and the browser never sees an event. Requests for a stream (an
+``Accept: text/event-stream`` header or a ``.../events`` path) are passed
+straight through; everything else is compressed as before.
+"""
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+EVENT_STREAM_SUFFIX = "/events"
+
+
+def is_event_stream(scope: Scope) -> bool:
+    if scope["type"] != "http":
+        return False
+    if scope["path"].rstrip("/").endswith(EVENT_STREAM_SUFFIX):
+        return True
+    return "text/event-stream" in Headers(scope=scope).get("accept", "")
+
+
+class StreamAwareGZipMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 500, compresslevel: int = 9) -> None:
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=compresslevel)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if is_event_stream(scope):
+            await self.app(scope, receive, send)
+            return
+        await self.gzip(scope, receive, send)
@@ -1,10 +1,19 @@
 """
 Request tracking middleware to monitor slow requests and prevent 524 timeouts
+
+Also performs per-worker admission control: requests are classified into
+priority lanes (payment callbacks first, then user APIs, then admin and
+polling traffic) and lower lanes are queued briefly or shed with
+503 + Retry-After before they can starve payment verification.
 """
+import os
 import time
+import heapq
 import asyncio
+import itertools
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
+from starlette.responses import JSONResponse
 from app.utils.logging import get_logger
 
 logger = get_logger(__name__)
@@ -13,6 +22,144 @@ logger = get_logger(__name__)
 active_requests = 0
 slow_request_count = 0
 
+# Priority lanes, highest first
+CRITICAL = "critical"
+USER = "user"
+BACKGROUND = "background"
+PRIORITY = {CRITICAL: 0, USER: 1, BACKGROUND: 2}
+
+# Payment gateway round-trips: never shed, may use every slot
+CRITICAL_PATHS = ("/payment/callback", "/payment/verify", "/payment/verify-public")
+# Admin panel and client polling endpoints
+BACKGROUND_PREFIXES = ("/admin", "/time")
+BACKGROUND_GET_PREFIXES = ("/groups/", "/group-orders/", "/group-buys/")
+
+# Per-worker concurrency limit and the share of it each lane may occupy
+MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "16"))
+LANE_SHARE = {CRITICAL: 1.0, USER: 0.85, BACKGROUND: 0.5}
+# How long a request may wait for a slot before being shed (seconds)
+LANE_MAX_WAIT = {CRITICAL: 30.0, USER: 2.0, BACKGROUND: 0.25}
+# Waiting requests per lane beyond which new arrivals are shed immediately
+LANE_MAX_QUEUE = {CRITICAL: 1000, USER: 64, BACKGROUND: 8}
+RETRY_AFTER_SECONDS = {CRITICAL: 1, USER: 2, BACKGROUND: 5}
+
+
+def classify_request(method: str, path: str) -> str:
+    """Map a request to its priority lane. Works with or without the /api prefix."""
+    if path.startswith("/api/"):
+        path = path[4:]
+    if path.rstrip("/") in CRITICAL_PATHS or (method == "PUT" and path.rstrip("/") == "/payment"):
+        return CRITICAL
+    if path.startswith(BACKGROUND_PREFIXES):
+        return BACKGROUND
+    if method == "GET" and path.startswith(BACKGROUND_GET_PREFIXES):
+        return BACKGROUND
+    return USER
+
+
+class AdmissionController:
+    """Priority-aware counting semaphore with per-lane caps, queues and metrics."""
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.in_flight = {lane: 0 for lane in PRIORITY}
+        self._waiters = []  # heap of (priority, seq, lane, future)
+        self._seq = itertools.count()
+        self.metrics = {
+            lane: {"admitted": 0, "queued": 0, "shed": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+            for lane in PRIORITY
+        }
+
+    def _lane_limit(self, lane: str) -> int:
+        return max(1, int(self.max_concurrency * LANE_SHARE[lane]))
+
+    def _can_run(self, lane: str) -> bool:
+        total = sum(self.in_flight.values())
+        return total < self.max_concurrency and total < self._lane_limit(lane)
+
+    def _queued(self, lane: str) -> int:
+        return sum(1 for w in self._waiters if w[2] == lane and not w[3].done())
+
+    def _record_admit(self, lane: str, waited_ms: float) -> None:
+        self.in_flight[lane] += 1
+        m = self.metrics[lane]
+        m["admitted"] += 1
+        m["wait_ms_total"] += waited_ms
+        m["wait_ms_max"] = max(m["wait_ms_max"], waited_ms)
+
+    async def acquire(self, lane: str) -> bool:
+        """Wait for a slot. Returns False if the request should be shed."""
+        # Higher-priority waiters go first; only skip the queue when nobody is ahead
+        ahead = any(w[0] <= PRIORITY[lane] and not w[3].done() for w in self._waiters)
+        if not ahead and self._can_run(lane):
+            self._record_admit(lane, 0.0)
+            return True
+        if self._queued(lane) >= LANE_MAX_QUEUE[lane]:
+            self.metrics[lane]["shed"] += 1
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (PRIORITY[lane], next(self._seq), lane, future))
+        self.metrics[lane]["queued"] += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=LANE_MAX_WAIT[lane])
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self.metrics[lane]["shed"] += 1
+                return False
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was handed to us as we were cancelled; pass it on
+                self.release(lane)
+            else:
+                future.cancel()
+            raise
+        # The slot was reserved for us by release()/_wake()
+        waited_ms = (time.perf_counter() - started) * 1000
+        m = self.metrics[lane]
+        m["admitted"] += 1
+        m["wait_ms_total"] += waited_ms
+        m["wait_ms_max"] = max(m["wait_ms_max"], waited_ms)
+        return True
+
+    def release(self, lane: str) -> None:
+        self.in_flight[lane] -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters:
+            priority, seq, lane, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._can_run(lane):
+                # Strict priority: do not let lower lanes overtake the head waiter
+                return
+            heapq.heappop(self._waiters)
+            self.in_flight[lane] += 1
+            future.set_result(True)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "lanes": {
+                lane: {
+                    "in_flight": self.in_flight[lane],
+                    "waiting": self._queued(lane),
+                    "limit": self._lane_limit(lane),
+                    **self.metrics[lane],
+                    "wait_ms_avg": round(self.metrics[lane]["wait_ms_total"] / self.metrics[lane]["admitted"], 2)
+                    if self.metrics[lane]["admitted"] else 0.0,
+                }
+                for lane in PRIORITY
+            },
+        }
+
+
+admission = AdmissionController()
+
 class RequestTrackingMiddleware(BaseHTTPMiddleware):
     """
     Middleware to track request duration and warn about slow requests
@@ -21,7 +168,21 @@ class RequestTrackingMiddleware(BaseHTTPMiddleware):
     
     async def dispatch(self, request: Request, call_next):
         global active_requests, slow_request_count
-        
+
+        # The middleware is installed on both the root app and the /api sub-app;
+        # admit each request only once (mounts share the same scope dict).
+        lane = None
+        if not request.scope.get("admission_lane"):
+            lane = classify_request(request.method, request.url.path)
+            if not await admission.acquire(lane):
+                logger.info(f"⛔ SHED ({lane}): {request.method} {request.url.path}")
+                return JSONResponse(
+                    status_code=503,
+                    content={"detail": "Server is busy. Please retry shortly.", "shed": True},
+                    headers={"Retry-After": str(RETRY_AFTER_SECONDS[lane])},
+                )
+            request.scope["admission_lane"] = lane
+
         active_requests += 1
         start_time = time.time()
         path = request.url.path
@@ -65,7 +226,6 @@ class RequestTrackingMiddleware(BaseHTTPMiddleware):
                 f"- Aborted to prevent Cloudflare 524 error"
             )
             # Return 504 Gateway Timeout
-            from fastapi.responses import JSONResponse
             return JSONResponse(
                 status_code=504,
                 content={
@@ -79,12 +239,15 @@ class RequestTrackingMiddleware(BaseHTTPMiddleware):
             raise
         finally:
             active_requests -= 1
+            if lane:
+                admission.release(lane)
 
 
 def get_request_stats():
     """Return current request statistics"""
     return {
         "active_requests": active_requests,
-        "slow_request_count": slow_request_count
+        "slow_request_count": slow_request_count,
+        "admission": admission.stats(),
     }
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean, DateTime, Date, Text, Enum
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean, DateTime, Date, Text, Enum, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime, timezone, timedelta
@@ -127,6 +127,7 @@ class Product(Base):
     __tablename__ = "products"
 
     id = Column(Integer, primary_key=True, index=True)
+    sku = Column(String(64), nullable=True, unique=True, index=True)  # Supplier SKU; bulk import upsert key
     name = Column(String(120), nullable=False)
     description = Column(Text)
     base_price = Column(Float, nullable=False)
@@ -152,6 +153,10 @@ class Product(Base):
     rating_baseline_sum = Column(Float, default=0)
     rating_baseline_count = Column(Integer, default=0)
     rating_seed_set_at = Column(DateTime, nullable=True)
+    # Materialized display_sales / display_rating used as keyset sort keys;
+    # refreshed by services/product_browse.refresh_product_scores
+    sales_score = Column(Integer, default=0, nullable=False)
+    rating_score = Column(Float, default=0, nullable=False)
     
     # Manual positioning for curated layouts
     # Lower numbers appear first; NULL means not curated
@@ -227,7 +232,14 @@ class Order(Base):
     # Delivery information
     shipping_address = Column(Text, nullable=True)  # Full shipping address
     delivery_slot = Column(String(100), nullable=True)  # Selected delivery time slot
-    
+    delivery_slot_id = Column(Integer, ForeignKey("delivery_slots.id", ondelete="SET NULL"), nullable=True, index=True)
+
+    # Checkout metadata (formerly JSON in delivery_slot / marker in shipping_address)
+    mode = Column(String(20), nullable=True, index=True)  # 'group', 'solo', 'alone', ...
+    expected_friends = Column(Integer, nullable=True)  # Friends tier chosen at checkout
+    allow_consolidation = Column(Boolean, nullable=True)  # Leader's consolidation toggle
+    pending_invite_token = Column(String(50), nullable=True, index=True)  # Invite awaiting link on verification
+
     # Relationships
     user = relationship("User", back_populates="orders")
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
@@ -275,7 +287,13 @@ class GroupOrder(Base):
     # Shipping consolidation settings
     allow_consolidation = Column(Boolean, default=False)  # Leader's choice
     leader_address_id = Column(Integer, ForeignKey("user_addresses.id"), nullable=True)
-    
+
+    # Denormalized summary maintained on join/payment (see services/group_summary.py)
+    kind = Column(String(20), nullable=True, index=True)  # 'primary' or 'secondary'; NULL = not yet backfilled
+    participants_count = Column(Integer, default=0)  # Non-settlement orders in the group
+    paid_members = Column(Integer, default=0)  # Paid non-leader orders
+    product_name = Column(String(120), nullable=True)  # First product of the source order
+
     # Relationships
     leader = relationship("User", foreign_keys=[leader_id])
     leader_address = relationship("UserAddress", foreign_keys=[leader_address_id])
@@ -326,6 +344,7 @@ class DailyReward(Base):
 
 class Favorite(Base):
     __tablename__ = "favorites"
+    __table_args__ = (UniqueConstraint("user_id", "product_id", name="uq_favorites_user_product"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -377,6 +396,26 @@ class SupportMessage(Base):
     message = Column(Text, nullable=False)
     timestamp = Column(DateTime, default=lambda: datetime.now(TEHRAN_TZ))
 
+class SupportConversation(Base):
+    """Summary of one user's support thread (see services/support_chat.py).
+
+    Read receipts are high-water marks: a message is seen once its id is at
+    or below the other side's *_seen_id. Timestamps are naive UTC.
+    """
+    __tablename__ = "support_conversations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True)
+    last_message_id = Column(Integer, nullable=True)
+    last_message = Column(Text, nullable=True)
+    last_sender = Column(String(10), nullable=True)  # user | admin
+    last_message_at = Column(DateTime, nullable=True, index=True)
+    unread_by_admin = Column(Integer, nullable=False, default=0)
+    unread_by_user = Column(Integer, nullable=False, default=0)
+    admin_seen_id = Column(Integer, nullable=False, default=0)  # highest user message the admin has seen
+    user_seen_id = Column(Integer, nullable=False, default=0)  # highest admin message the user has seen
+    updated_at = Column(DateTime, nullable=True, index=True)
+
 class UserAddress(Base):
     __tablename__ = "user_addresses"
 
@@ -422,4 +461,118 @@ class PopularSearch(Base):
     sort_order = Column(Integer, default=0)  # Lower numbers appear first
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=lambda: datetime.now(TEHRAN_TZ))
-    updated_at = Column(DateTime, default=lambda: datetime.now(TEHRAN_TZ), onupdate=lambda: datetime.now(TEHRAN_TZ))
\ No newline at end of file
+    updated_at = Column(DateTime, default=lambda: datetime.now(TEHRAN_TZ), onupdate=lambda: datetime.now(TEHRAN_TZ))
+
+
+class BackgroundJob(Base):
+    """Cluster-wide lease + run stats for a periodic job (see services/job_scheduler.py).
+
+    Timestamps are naive UTC. A worker may run the job only while it holds
+    an unexpired lease (owner/lease_expires_at) and next_run_at has passed.
+    """
+    __tablename__ = "background_jobs"
+
+    name = Column(String(64), primary_key=True)
+    owner = Column(String(120), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    next_run_at = Column(DateTime, nullable=True)
+    last_started_at = Column(DateTime, nullable=True)
+    last_finished_at = Column(DateTime, nullable=True)
+    last_duration_ms = Column(Integer, nullable=True)
+    last_lag_ms = Column(Integer, nullable=True)  # How late the last run started vs. its due time
+    last_error = Column(Text, nullable=True)
+    run_count = Column(Integer, default=0)
+
+class ProductNeighbor(Base):
+    """Precomputed top-K co-purchase neighbours of a product (see services/recommendations.py).
+
+    Rebuilt by the recommendation_build job a chunk of products at a time; rank 0 is the most similar.
+    """
+    __tablename__ = "product_neighbors"
+
+    product_id = Column(Integer, primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    neighbor_id = Column(Integer, nullable=False)
+    score = Column(Float, nullable=False)
+
+class SearchTermStat(Base):
+    """Daily search counts per normalized term, flushed from the in-process
+    counter in services/search_analytics.py."""
+    __tablename__ = "search_term_stats"
+    __table_args__ = (UniqueConstraint("term", "day", name="uq_search_term_stats_term_day"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    term = Column(String(120), nullable=False)
+    day = Column(Date, nullable=False, index=True)
+    search_count = Column(Integer, nullable=False, default=0)
+    zero_result_count = Column(Integer, nullable=False, default=0)
+    last_result_count = Column(Integer, nullable=True)
+    last_seen_at = Column(DateTime, nullable=True)
+
+
+class Broadcast(Base):
+    """Telegram message to a user segment (see services/broadcasts.py).
+
+    Recipients are sent in users.id order by the broadcast_dispatch job;
+    cursor_user_id is the last id of the last finished chunk, so a paused or
+    interrupted broadcast resumes there. Timestamps are naive UTC.
+    """
+    __tablename__ = "broadcasts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(120), nullable=False)
+    segment = Column(String(50), nullable=False)
+    message = Column(Text, nullable=False)
+    parse_mode = Column(String(16), nullable=True, default="HTML")
+    status = Column(String(20), nullable=False, default="draft", index=True)  # draft, running, paused, completed, cancelled
+    cursor_user_id = Column(Integer, nullable=False, default=0)
+    total_recipients = Column(Integer, nullable=True)
+    sent_count = Column(Integer, nullable=False, default=0)
+    blocked_count = Column(Integer, nullable=False, default=0)  # user blocked the bot / never started it
+    failed_count = Column(Integer, nullable=False, default=0)
+    rate_limited_count = Column(Integer, nullable=False, default=0)  # 429 responses retried
+    active_seconds = Column(Float, nullable=False, default=0)  # time spent dispatching, for throughput
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class NotificationOutbox(Base):
+    """Pending user notification written in the same transaction as the change
+    it announces (see services/notification_outbox.py).
+
+    The notification_outbox job sends pending rows through NotificationService
+    and marks them sent/skipped/failed. Timestamps are naive UTC.
+    """
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    event = Column(String(40), nullable=False)  # order_status, delivery_slot, ...
+    title = Column(String(200), nullable=False)
+    message = Column(Text, nullable=False)
+    payload = Column(Text, nullable=True)  # JSON, e.g. {"order_ids": [...]}
+    status = Column(String(20), nullable=False, default="pending", index=True)  # pending, sent, skipped, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+
+def _archive_table(source, name: str, *indexed: str):
+    """Copy of ``source`` for cold rows (see services/order_archive.py).
+
+    Same columns and types, no foreign keys or unique constraints (the rows
+    they point at may be archived or gone), plus archived_at (naive UTC).
+    """
+    from sqlalchemy import Table
+    columns = [
+        Column(col.name, col.type.copy(), primary_key=col.primary_key, nullable=col.nullable, index=col.name in indexed)
+        for col in source.columns
+    ]
+    return Table(name, Base.metadata, *columns, Column("archived_at", DateTime, nullable=True))
+
+
+group_orders_archive = _archive_table(GroupOrder.__table__, "group_orders_archive", "leader_id", "created_at")
+orders_archive = _archive_table(Order.__table__, "orders_archive", "user_id", "group_order_id", "created_at")
+order_items_archive = _archive_table(OrderItem.__table__, "order_items_archive", "order_id")
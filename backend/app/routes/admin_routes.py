@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, Query, HTTPException, Form, Request, Response
 from fastapi import UploadFile
+from fastapi.responses import StreamingResponse
 from pathlib import Path
 import os
 from sqlalchemy.orm import Session
@@ -10,9 +11,29 @@ import json
 from pydantic import BaseModel
 
 from app.database import get_db
-from app.models import Product, Category, SubCategory, Order, User, UserType, Store, ProductImage, OrderItem, GroupOrder, Favorite, OrderState, Banner, Review, GroupOrderStatus, DeliverySlot
+from app.models import Product, Category, SubCategory, Order, User, UserType, Store, ProductImage, OrderItem, GroupOrder, Favorite, OrderState, Banner, Review, GroupOrderStatus, DeliverySlot, Broadcast
 from app.services.group_settlement_service import GroupSettlementService
 from app.services import notification_service
+from app.services.order_metadata import resolve_delivery_slot_id
+from app.services.pricing import admin_settlement_unit_price
+from app.services.job_scheduler import job_scheduler
+from app.services.product_browse import refresh_product_scores
+from app.services.product_reviews import reviews_changed
+from app.services.search_analytics import trending_terms, zero_result_terms
+from app.services.suggest_index import suggest_index
+from app.services.broadcasts import SEGMENTS, change_status, count_recipients, serialize_broadcast
+from app.services.sms import sms_service
+from app.services.ai_chatbot import ai_reply_worker
+from app.services.app_settings import settings_store
+from app.services.catalog_import import detect_format as detect_import_format, import_catalog
+from app.services.exports import FORMATS as EXPORT_FORMATS, build_query as build_export_query, export_stream
+from app.services.order_bulk import bulk_update_delivery_slot, bulk_update_status
+from app.services.notification_outbox import outbox_stats
+from app.services.backups import list_backups
+from app.services.order_archive import archive_orders, archive_stats, get_archived_order, search_archived_orders
+from app.services.product_positions import RAILS, Move, place_product, rail_items, rail_ordinals, reorder_rail
+from app.routes.home_routes import invalidate_home_cache
+from app.utils.admin import get_admin_user
 from app.utils.logging import get_logger
 
 admin_router = APIRouter(prefix="/admin", tags=["admin"])
@@ -52,7 +73,13 @@ def get_user_display_info(user) -> tuple[str, str]:
         return (display_name, phone)
 
 # Ensure new nullable columns exist in SQLite without requiring manual migration
+_POSITION_COLUMNS_CHECKED = False
+
 def _ensure_product_position_columns(db: Session):
+    global _POSITION_COLUMNS_CHECKED
+    # Columns only ever get added, so one successful check per process is enough
+    if _POSITION_COLUMNS_CHECKED:
+        return
     try:
         cols = [row[1] for row in db.execute(text("PRAGMA table_info(products)"))]
         missing = []
@@ -66,6 +93,7 @@ def _ensure_product_position_columns(db: Session):
             if 'landing_position' in missing:
                 db.execute(text("ALTER TABLE products ADD COLUMN landing_position INTEGER"))
             db.commit()
+        _POSITION_COLUMNS_CHECKED = True
     except Exception as _e:
         try:
             db.rollback()
@@ -74,6 +102,21 @@ def _ensure_product_position_columns(db: Session):
         # Fail open; routes will still work if columns already exist
         logger.warning(f"ensure columns error: {_e}")
 
+def _apply_rail_positions(db: Session, product_id: int, data: dict) -> bool:
+    """Place the product at the 1-based home/landing positions in ``data``; "" takes it off the rail."""
+    changed = False
+    for rail, field in RAILS.items():
+        if field not in data:
+            continue
+        raw = str(data.get(field)).strip()
+        try:
+            ordinal = int(raw) if raw != "" else None
+        except ValueError:
+            continue
+        place_product(db, rail, product_id, ordinal)
+        changed = True
+    return changed
+
 # -----------------------------------------------------------------------------
 # Product images helpers (dedupe / upsert by URL)
 # -----------------------------------------------------------------------------
@@ -287,7 +330,8 @@ def _split_address_details(address: Optional[str]) -> tuple[Optional[str], Optio
     except Exception:
         return address, None
 
-# Normalize delivery slot: extract from JSON wrapper if present
+# Normalize delivery slot: extract from JSON wrapper if present.
+# New orders store the plain slot text; JSON only remains on rows not yet backfilled.
 def _normalize_delivery_slot(raw_slot: Optional[str]) -> Optional[str]:
     if not raw_slot:
         return raw_slot
@@ -298,8 +342,8 @@ def _normalize_delivery_slot(raw_slot: Optional[str]) -> Optional[str]:
             return s
         obj = json.loads(s)
         if isinstance(obj, dict):
-            # Prefer common keys used for time slot
-            for key in ("delivery_slot", "slot", "time_slot", "time"):
+            # Prefer common keys used for time slot ("ds" is the compact checkout key)
+            for key in ("delivery_slot", "ds", "slot", "time_slot", "time"):
                 val = obj.get(key)
                 if val:
                     return str(val)
@@ -444,6 +488,145 @@ async def delete_slot(
     return {"ok": True}
 
 # Dashboard endpoint
+@admin_router.get("/jobs")
+async def get_background_jobs(db: Session = Depends(get_db)):
+    """Periodic job registry: lease holder, next run, last duration and lag."""
+    return {"jobs": job_scheduler.status(db)}
+
+
+@admin_router.get("/search-terms/trending")
+async def get_trending_search_terms(
+    days: int = Query(1, ge=1, le=30),
+    baseline_days: int = Query(7, ge=1, le=90),
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    """Terms searched more in the last `days` than their baseline daily rate."""
+    return {"terms": trending_terms(db, days=days, baseline_days=baseline_days, limit=limit)}
+
+
+@admin_router.get("/search-terms/zero-results")
+async def get_zero_result_search_terms(
+    days: int = Query(7, ge=1, le=90),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """Most frequent searches that returned no products."""
+    return {"terms": zero_result_terms(db, days=days, limit=limit)}
+
+
+class BroadcastCreateBody(BaseModel):
+    name: str
+    segment: str
+    message: str
+    parse_mode: Optional[str] = "HTML"
+    start: bool = False
+
+
+@admin_router.get("/broadcasts/segments")
+async def get_broadcast_segments(db: Session = Depends(get_db)):
+    """Available Telegram broadcast segments with their current recipient counts."""
+    return {
+        "segments": [
+            {"name": name, "description": description, "recipients": count_recipients(db, name)}
+            for name, (description, _) in SEGMENTS.items()
+        ]
+    }
+
+
+@admin_router.get("/broadcasts")
+async def list_broadcasts(
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    rows = db.query(Broadcast).order_by(Broadcast.id.desc()).limit(limit).all()
+    return {"broadcasts": [serialize_broadcast(b) for b in rows]}
+
+
+@admin_router.post("/broadcasts")
+async def create_broadcast(
+    body: BroadcastCreateBody,
+    db: Session = Depends(get_db),
+    admin: User = Depends(get_admin_user),
+):
+    """Create a broadcast (draft, or running right away with start=true); the broadcast_dispatch job sends it."""
+    if body.segment not in SEGMENTS:
+        raise HTTPException(status_code=400, detail=f"Unknown segment: {body.segment}")
+    if not body.message.strip():
+        raise HTTPException(status_code=400, detail="message is required")
+    broadcast = Broadcast(
+        name=body.name,
+        segment=body.segment,
+        message=body.message,
+        parse_mode=body.parse_mode or None,
+        status="draft",
+        cursor_user_id=0,
+        total_recipients=count_recipients(db, body.segment),
+    )
+    if body.start:
+        change_status(db, broadcast, "start")
+    db.add(broadcast)
+    db.commit()
+    db.refresh(broadcast)
+    return serialize_broadcast(broadcast)
+
+
+@admin_router.get("/broadcasts/{broadcast_id}")
+async def get_broadcast(broadcast_id: int, db: Session = Depends(get_db)):
+    """Progress and throughput of one broadcast."""
+    broadcast = db.get(Broadcast, broadcast_id)
+    if not broadcast:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    return serialize_broadcast(broadcast)
+
+
+@admin_router.post("/broadcasts/{broadcast_id}/{action}")
+async def update_broadcast_status(
+    broadcast_id: int,
+    action: str,
+    db: Session = Depends(get_db),
+    admin: User = Depends(get_admin_user),
+):
+    """start / pause / cancel. A paused broadcast resumes from its last finished chunk."""
+    broadcast = db.get(Broadcast, broadcast_id)
+    if not broadcast:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    try:
+        change_status(db, broadcast, action)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
+    return serialize_broadcast(broadcast)
+
+
+class BulkSMSBody(BaseModel):
+    phone_numbers: List[str]
+    message: str
+
+
+@admin_router.post("/sms/bulk")
+async def send_bulk_sms(body: BulkSMSBody, admin: User = Depends(get_admin_user)):
+    """Send one message to many numbers through the provider's multi-recipient endpoint."""
+    if not body.message.strip():
+        raise HTTPException(status_code=400, detail="message is required")
+    if not body.phone_numbers:
+        raise HTTPException(status_code=400, detail="phone_numbers is required")
+    result = await sms_service.send_bulk((phone, body.message) for phone in body.phone_numbers)
+    return result.as_dict()
+
+
+@admin_router.get("/sms/metrics")
+async def get_sms_metrics():
+    """Bulk SMS counters for this worker since startup."""
+    return sms_service.metrics.snapshot()
+
+
+@admin_router.get("/ai-chatbot/metrics")
+async def get_ai_chatbot_metrics():
+    """AI reply worker counters for this worker since startup."""
+    return ai_reply_worker.snapshot()
+
+
 @admin_router.get("/dashboard")
 async def get_dashboard_stats(
     db: Session = Depends(get_db)
@@ -503,6 +686,9 @@ async def get_all_products(
         query = query.order_by(Product.id.desc())
 
     products = query.offset(skip).limit(limit).all()
+    # Rails are shown to admins as 1-based places, not stored ranks
+    home_places = rail_ordinals(db, "home")
+    landing_places = rail_ordinals(db, "landing")
     
     # Optimize: Bulk fetch sales and ratings data to avoid N+1 queries
     product_ids = [p.id for p in products]
@@ -542,8 +728,8 @@ async def get_all_products(
             "friend_1_price": product.friend_1_price,
             "friend_2_price": product.friend_2_price,  
             "friend_3_price": product.friend_3_price,
-                "home_position": getattr(product, 'home_position', None),
-                "landing_position": getattr(product, 'landing_position', None),
+                "home_position": home_places.get(product.id),
+                "landing_position": landing_places.get(product.id),
             "category_id": product.category_id,
             "category": product.category.name if product.category else "نامشخص",
             "store": product.store.name if product.store else "نامشخص",
@@ -644,18 +830,6 @@ async def create_product(
             "friend_2_price": float(data.get("friend_2_price", 0)),
             "friend_3_price": float(data.get("friend_3_price", 0))
         }
-        # Optional curated positions
-        if "home_position" in data:
-            try:
-                product_data["home_position"] = int(str(data.get("home_position")).strip()) if str(data.get("home_position")).strip() != "" else None
-            except Exception:
-                pass
-        if "landing_position" in data:
-            try:
-                product_data["landing_position"] = int(str(data.get("landing_position")).strip()) if str(data.get("landing_position")).strip() != "" else None
-            except Exception:
-                pass
-        
         # Handle optional fields
         if data.get("weight_grams"):
             try:
@@ -678,19 +852,7 @@ async def create_product(
             except Exception:
                 pass
 
-        # Optional curated positions from request
-        if "home_position" in data:
-            try:
-                product_data["home_position"] = int(str(data.get("home_position")).strip()) if str(data.get("home_position")).strip() != "" else None
-            except Exception:
-                pass
-        if "landing_position" in data:
-            try:
-                product_data["landing_position"] = int(str(data.get("landing_position")).strip()) if str(data.get("landing_position")).strip() != "" else None
-            except Exception:
-                pass
-
-        # Defaults: assign next positions if not provided
+        # Defaults: bottom of both rails; places given in the request are applied after insert
         try:
             if product_data.get("home_position") is None:
                 max_home = db.query(func.max(Product.home_position)).scalar() or 0
@@ -707,8 +869,14 @@ async def create_product(
         
         product = Product(**product_data)
         db.add(product)
+        db.flush()
+        _apply_rail_positions(db, product.id, {
+            field: data[field] for field in RAILS.values() if field in data and str(data[field]).strip() != ""
+        })
+        refresh_product_scores(db, [product.id])
         db.commit()
         db.refresh(product)
+        suggest_index.refresh_product(db, product.id)
 
         # Handle image uploads if present in form
         try:
@@ -917,19 +1085,9 @@ async def update_product(
             product.friend_2_price = float(data["friend_2_price"])
         if "friend_3_price" in data:
             product.friend_3_price = float(data["friend_3_price"])
-        # Curated positions
-        if "home_position" in data:
-            try:
-                raw = str(data.get("home_position")).strip()
-                product.home_position = int(raw) if raw != "" else None
-            except Exception:
-                pass
-        if "landing_position" in data:
-            try:
-                raw = str(data.get("landing_position")).strip()
-                product.landing_position = int(raw) if raw != "" else None
-            except Exception:
-                pass
+        # Curated positions (1-based places on the rail)
+        if _apply_rail_positions(db, product.id, data):
+            invalidate_home_cache(db)
             
         # Save images if included in form
         has_main_image = False
@@ -1044,7 +1202,11 @@ async def update_product(
             except Exception:
                 pass
 
+        # Seeds feed the materialized sort scores of GET /products
+        db.flush()
+        refresh_product_scores(db, [product.id])
         db.commit()
+        suggest_index.refresh_product(db, product.id)
         return {"message": "Product updated successfully"}
     except Exception as e:
         db.rollback()
@@ -1237,7 +1399,7 @@ async def update_product_position(
     request: Request,
     db: Session = Depends(get_db)
 ):
-    """Lightweight endpoint to update only home/landing positions via JSON or form-data."""
+    """Lightweight endpoint to update only home/landing positions (1-based places) via JSON or form-data."""
     _ensure_product_position_columns(db)
     product = db.query(Product).filter(Product.id == product_id).first()
     if not product:
@@ -1249,32 +1411,15 @@ async def update_product_position(
             form = await request.form()
             data = dict(form)
 
-        changed = False
-        if "home_position" in data:
-            try:
-                raw = str(data.get("home_position")).strip()
-                product.home_position = int(raw) if raw != "" else None
-                changed = True
-            except Exception:
-                pass
-        if "landing_position" in data:
-            try:
-                raw = str(data.get("landing_position")).strip()
-                product.landing_position = int(raw) if raw != "" else None
-                changed = True
-            except Exception:
-                pass
-
-        if changed:
-            db.add(product)
+        if _apply_rail_positions(db, product.id, data):
+            invalidate_home_cache(db)
             db.commit()
-            db.refresh(product)
 
         return {
             "ok": True,
             "id": product.id,
-            "home_position": getattr(product, 'home_position', None),
-            "landing_position": getattr(product, 'landing_position', None),
+            "home_position": rail_ordinals(db, "home").get(product.id),
+            "landing_position": rail_ordinals(db, "landing").get(product.id),
         }
     except HTTPException:
         raise
@@ -1282,6 +1427,78 @@ async def update_product_position(
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
+class PositionMoveRequest(BaseModel):
+    id: int
+    after_id: Optional[int] = None
+    before_id: Optional[int] = None
+    to: Optional[str] = None
+    remove: bool = False
+
+class ReorderRequest(BaseModel):
+    rail: str
+    order: List[int] = []
+    moves: List[PositionMoveRequest] = []
+
+@admin_router.post("/products/positions")
+def reorder_products(body: ReorderRequest, db: Session = Depends(get_db)):
+    """
+    Reorder the home or landing rail in one transaction.
+
+    ``order`` lists product ids to put first (the rest keep their order
+    behind them); ``moves`` place single products ``after_id``/``before_id``
+    another one, ``to`` "top"/"bottom", or ``remove`` them from the rail.
+    Returns the rail's new ordering.
+    """
+    if body.rail not in RAILS:
+        raise HTTPException(status_code=400, detail=f"rail must be one of: {', '.join(RAILS)}")
+    if not body.order and not body.moves:
+        raise HTTPException(status_code=400, detail="Provide order or moves")
+    for move in body.moves:
+        if move.to is not None and move.to not in ("top", "bottom"):
+            raise HTTPException(status_code=400, detail="to must be 'top' or 'bottom'")
+    _ensure_product_position_columns(db)
+    try:
+        updated = reorder_rail(
+            db,
+            body.rail,
+            order=body.order,
+            moves=[Move(**move.model_dump()) for move in body.moves],
+        )
+    except LookupError as e:
+        db.rollback()
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    invalidate_home_cache(db)
+    db.commit()
+    return {"rail": body.rail, "updated": updated, "items": rail_items(db, body.rail)}
+
+@admin_router.post("/products/import")
+def import_products(
+    file: UploadFile,
+    format: Optional[str] = Query(None, description="csv or jsonl; detected from the file name if omitted"),
+    create_categories: bool = Query(False, description="Create categories for unknown slugs"),
+    dry_run: bool = Query(False),
+    db: Session = Depends(get_db),
+):
+    """Upsert products (by sku) with options, images and categories from a CSV/JSONL upload."""
+    import io
+    fmt = format or detect_import_format(file.filename)
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        result = import_catalog(db, stream, fmt, create_categories=create_categories, dry_run=dry_run)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        stream.detach()
+    if result.product_ids and not dry_run:
+        invalidate_home_cache(db)
+        db.commit()
+    return result.as_dict()
+
 @admin_router.delete("/products/{product_id}")
 async def delete_product(
     product_id: int,
@@ -1300,6 +1517,7 @@ async def delete_product(
             product.is_active = False
             db.add(product)
             db.commit()
+            suggest_index.remove("product", product_id)
             return {"message": "Product archived (soft-deleted) because it is referenced by orders"}
         
         # Check if product has any favorites
@@ -1311,6 +1529,7 @@ async def delete_product(
         # Now delete the product (no references)
         db.delete(product)
         db.commit()
+        suggest_index.remove("product", product_id)
         return {"message": "Product deleted successfully"}
     except HTTPException:
         db.rollback()
@@ -1379,6 +1598,7 @@ async def create_category(
                 category.image_url = f"{static_base}/{dest.relative_to(backend_dir / 'uploads').as_posix()}"
                 db.add(category)
                 db.commit()
+            suggest_index.refresh_category(db, category.id)
             return {"message": "Category created successfully", "category_id": category.id, "image_url": category.image_url}
 
         # JSON path (or form without file)
@@ -1394,6 +1614,7 @@ async def create_category(
         db.add(category)
         db.commit()
         db.refresh(category)
+        suggest_index.refresh_category(db, category.id)
         return {"message": "Category created successfully", "category_id": category.id}
     except Exception as e:
         db.rollback()
@@ -1441,6 +1662,7 @@ async def update_category(
 
         db.add(category)
         db.commit()
+        suggest_index.refresh_category(db, category_id)
         return {"message": "Category updated successfully"}
     except Exception as e:
         db.rollback()
@@ -1478,6 +1700,7 @@ async def delete_category(
         # Now delete the category
         db.delete(category)
         db.commit()
+        suggest_index.remove("category", category_id)
         return {"message": "Category deleted successfully"}
     except Exception as e:
         db.rollback()
@@ -1827,9 +2050,37 @@ async def get_all_orders(
 
     return results
 
+def _archived_order_details(archived: dict, db: Session) -> dict:
+    order = archived["order"]
+    user = db.query(User).filter(User.id == order.user_id).first() if order.user_id else None
+    user_name = (f"{user.first_name or ''} {user.last_name or ''}".strip() if user else "مهمان")
+    user_phone = (user.phone_number if user else "")
+    main, details = _split_address_details(_resolve_shipping_address(order, db))
+    group = archived["group"]
+    return {
+        "id": order.id,
+        "user_id": order.user_id,
+        "user_name": user_name or user_phone or "مهمان",
+        "user_phone": user_phone,
+        "total_amount": order.total_amount,
+        "status": order.status,
+        "order_type": order.order_type.value if hasattr(order.order_type, 'value') else str(order.order_type),
+        "group_order_id": order.group_order_id,
+        "group_status": group.status.value if group is not None and group.status else None,
+        "created_at": _format_datetime_with_tz(order.created_at),
+        "paid_at": _format_datetime_with_tz(order.paid_at),
+        "shipping_address": main,
+        "shipping_details": details,
+        "delivery_slot": _normalize_delivery_slot(order.delivery_slot),
+        "items": archived["items"],
+        "archived": True,
+        "archived_at": order.archived_at.isoformat() if order.archived_at else None,
+    }
+
 @admin_router.get("/orders/{order_id}")
 async def get_order_details(
     order_id: int,
+    include_archived: bool = Query(False, description="Fall back to the order archive"),
     db: Session = Depends(get_db)
 ):
     """Get detailed information about a specific order.
@@ -1837,9 +2088,15 @@ async def get_order_details(
     If the order belongs to a consolidated group (leader enabled consolidation and
     follower(s) opted for ship_to_leader_address), return a consolidated structure
     that includes per-participant items so the admin can see products separately.
+    Archived orders are only looked up with include_archived and are always
+    returned as a single order.
     """
     try:
         order = db.query(Order).filter(Order.id == order_id).first()
+        if not order and include_archived:
+            archived = get_archived_order(db, order_id)
+            if archived:
+                return _archived_order_details(archived, db)
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
 
@@ -2074,16 +2331,12 @@ async def update_order_delivery_slot(
         raise HTTPException(status_code=400, detail="delivery_slot is required")
 
     try:
-        # Store delivery slot as JSON to maintain consistency with existing format
-        delivery_slot_json = json.dumps({
-            "date": request.get("date"),
-            "from": request.get("from"),
-            "to": request.get("to"),
-            "delivery_slot": delivery_slot
-        })
+        # Store the plain slot text plus the matching DeliverySlot id
+        slot_id = resolve_delivery_slot_id(db, delivery_slot)
         
         # Update the current order
-        order.delivery_slot = delivery_slot_json
+        order.delivery_slot = delivery_slot
+        order.delivery_slot_id = slot_id
         
         # If this order is part of a group, update all orders in the same group
         if order.group_order_id:
@@ -2095,7 +2348,8 @@ async def update_order_delivery_slot(
             
             # Update delivery_slot for all orders in the group
             for group_order in group_orders:
-                group_order.delivery_slot = delivery_slot_json
+                group_order.delivery_slot = delivery_slot
+                group_order.delivery_slot_id = slot_id
         
         db.commit()
         return {"message": "Delivery slot updated successfully"}
@@ -2103,6 +2357,112 @@ async def update_order_delivery_slot(
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
+class BulkOrderStatusRequest(BaseModel):
+    status: str
+    order_ids: List[int] = []
+    group_id: Optional[int] = None
+    notify: bool = True
+
+class BulkDeliverySlotRequest(BaseModel):
+    delivery_slot: str
+    order_ids: List[int] = []
+    group_id: Optional[int] = None
+    notify: bool = True
+
+@admin_router.post("/orders/bulk-status")
+def bulk_order_status(body: BulkOrderStatusRequest, db: Session = Depends(get_db)):
+    """Set the status of many orders (and their consolidated shipments) at once."""
+    try:
+        result = bulk_update_status(db, body.status, body.order_ids, body.group_id, body.notify)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return result.as_dict()
+
+@admin_router.post("/orders/bulk-delivery-slot")
+def bulk_order_delivery_slot(body: BulkDeliverySlotRequest, db: Session = Depends(get_db)):
+    """Set the delivery slot of many orders (and the rest of their groups) at once."""
+    try:
+        result = bulk_update_delivery_slot(db, body.delivery_slot, body.order_ids, body.group_id, body.notify)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return result.as_dict()
+
+@admin_router.get("/notifications/outbox")
+def notification_outbox_stats(db: Session = Depends(get_db)):
+    """Outbox row counts per status (pending, sent, skipped, failed)."""
+    return outbox_stats(db)
+
+class ArchiveRunRequest(BaseModel):
+    older_than_days: Optional[int] = None
+    dry_run: bool = True
+
+@admin_router.get("/archive/orders")
+def lookup_archived_orders(
+    user_id: Optional[int] = None,
+    phone: Optional[str] = None,
+    group_order_id: Optional[int] = None,
+    before_id: Optional[int] = Query(None, ge=1, description="Page: ids below this one"),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    """Archived orders of a user (by id or phone) or group, newest first."""
+    try:
+        orders = search_archived_orders(db, user_id, phone, group_order_id, limit, before_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    for order in orders:
+        for key in ("created_at", "paid_at"):
+            order[key] = _format_datetime_with_tz(order[key])
+        order["archived_at"] = order["archived_at"].isoformat() if order["archived_at"] else None
+    return orders
+
+@admin_router.get("/archive/stats")
+def order_archive_stats(db: Session = Depends(get_db)):
+    """Row counts of the hot order tables and their archives."""
+    return archive_stats(db)
+
+@admin_router.post("/archive/run")
+def run_order_archive_now(body: ArchiveRunRequest, db: Session = Depends(get_db)):
+    """Archive eligible groups and orders now (dry run by default)."""
+    try:
+        result = archive_orders(db, body.older_than_days, dry_run=body.dry_run)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return result.as_dict()
+
+@admin_router.get("/backups")
+def database_backups():
+    """Database backups newest first (see scripts/db_backup.py to verify or restore)."""
+    return list_backups()
+
+@admin_router.get("/export/{dataset}")
+def export_dataset(
+    dataset: str,
+    format: str = Query("csv"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    status: Optional[str] = Query(None, description="Comma-separated; user_type for users"),
+    after_id: Optional[int] = Query(None, ge=0, description="Resume after this id"),
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """Stream orders, groups or users as CSV/XLSX in id order."""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    try:
+        spec, stmt = build_export_query(dataset, date_from, date_to, status, after_id, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filename = f"{dataset}-{datetime.now(TEHRAN_TZ):%Y%m%d-%H%M}.{format}"
+    return StreamingResponse(
+        export_stream(dataset, format, stmt, spec),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 # Users management
 @admin_router.get("/users")
 async def get_all_users(
@@ -2340,31 +2700,12 @@ async def delete_banner(banner_id: int, db: Session = Depends(get_db)):
     return {"message": "Banner deleted"}
 
 @admin_router.get("/settings")
-async def get_admin_settings(db: Session = Depends(get_db)):
+async def get_admin_settings():
     """Return admin-manageable settings used by the storefront.
     
     Includes dynamic category images (category_<id>_image keys).
     """
-    try:
-        # Get all settings from app_settings table
-        rows = db.execute(text("SELECT key, value FROM app_settings"))
-        data = {row[0]: row[1] for row in rows}
-        
-        # Build response with all settings
-        result = {
-            "all_category_image": data.get("all_category_image"),
-            "all_category_label": data.get("all_category_label", "همه"),
-            "ai_chatbot_enabled": data.get("ai_chatbot_enabled", "false"),
-        }
-        
-        # Include all category_<id>_image settings dynamically
-        for key, value in data.items():
-            if key.startswith("category_") and key.endswith("_image"):
-                result[key] = value
-        
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return settings_store.admin_payload()
 
 @admin_router.put("/settings")
 async def update_admin_settings(request: Request, db: Session = Depends(get_db)):
@@ -2453,31 +2794,9 @@ async def update_admin_settings(request: Request, db: Session = Depends(get_db))
                             f.write(content)
                         updates[f"category_{cat_id}_image"] = f"{static_base}/{dest.relative_to(backend_dir / 'uploads').as_posix()}"
 
-        # Persist updates
-        for k, v in updates.items():
-            if v == "":
-                # Delete the setting if value is empty
-                db.execute(text("DELETE FROM app_settings WHERE key = :k"), {"k": k})
-            else:
-                db.execute(text("INSERT INTO app_settings(key, value) VALUES (:k, :v) ON CONFLICT(key) DO UPDATE SET value = excluded.value"), {"k": k, "v": v})
-        db.commit()
-
-        # Return merged view (all settings)
-        rows = db.execute(text("SELECT key, value FROM app_settings"))
-        data = {row[0]: row[1] for row in rows}
-        
-        result = {
-            "all_category_image": data.get("all_category_image"),
-            "all_category_label": data.get("all_category_label", "همه"),
-            "ai_chatbot_enabled": data.get("ai_chatbot_enabled", "false"),
-        }
-        
-        # Include all category_<id>_image settings
-        for key, value in data.items():
-            if key.startswith("category_") and key.endswith("_image"):
-                result[key] = value
-        
-        return result
+        # Persist updates (bumps the settings version so every worker reloads)
+        settings_store.update(db, updates)
+        return settings_store.admin_payload()
     except HTTPException:
         db.rollback()
         raise
@@ -3424,17 +3743,8 @@ async def finalize_group_buy(
             else:
                 raise HTTPException(status_code=400, detail="برای تکمیل گروه، حداقل یک عضو غیر از لیدر باید به گروه بپیوندد")
         # Before marking success, enforce leader settlement if promised friends > actual
-        # Extract target friends from delivery_slot JSON of leader order if available
-        promised_friends = None
-        try:
-            if getattr(leader_order, 'delivery_slot', None):
-                import json as _json
-                info = _json.loads(leader_order.delivery_slot)
-                if isinstance(info, dict):
-                    promised_friends = info.get('friends')
-                    max_friends = info.get('max_friends')
-        except Exception:
-            promised_friends = None
+        # Target friends the leader chose at checkout
+        promised_friends = getattr(leader_order, 'expected_friends', None)
 
         # Compute actual non-leader paid participants
         actual_paid_followers = 0
@@ -3462,20 +3772,8 @@ async def finalize_group_buy(
             difference_total = 0.0
             for it in leader_items:
                 product = getattr(it, 'product', None)
-                solo_price = getattr(product, 'market_price', None) or getattr(product, 'base_price', 0)
-                price_at_actual = None
-                price_at_promised = None
-                # Map tiers: 0 -> solo, 1 -> friend_1_price, 2 -> friend_2_price, >=3 -> 0
-                def tier_price(paid_friends: int) -> float:
-                    if paid_friends >= 3:
-                        return 0.0
-                    if paid_friends == 2:
-                        return getattr(product, 'friend_2_price', None) or solo_price * 0.25
-                    if paid_friends == 1:
-                        return getattr(product, 'friend_1_price', None) or solo_price * 0.5
-                    return solo_price
-                price_at_actual = tier_price(actual_paid_followers)
-                price_at_promised = tier_price(promised_friends)
+                price_at_actual = admin_settlement_unit_price(product, actual_paid_followers, charge_full_group=False)
+                price_at_promised = admin_settlement_unit_price(product, promised_friends, charge_full_group=False)
                 # The leader paid based on promised; if promised < actual (not our branch) would refund; here promised > actual -> extra to pay
                 diff_per_unit = max(0.0, price_at_actual - price_at_promised)
                 difference_total += diff_per_unit * getattr(it, 'quantity', 1)
@@ -3642,24 +3940,13 @@ async def get_settlements_required(db: Session = Depends(get_db)):
                 if it.product_id not in product_cache:
                     product_cache[it.product_id] = db.query(Product).filter(Product.id == it.product_id).first()
 
-            def tier_price(product: Product, friends_count: int) -> float:
-                solo_price = float(product.market_price or product.base_price or 0)
-                if friends_count >= 3:
-                    return float(product.friend_3_price or 0.0)
-                elif friends_count == 2:
-                    return float(product.friend_2_price or (solo_price * 0.25))
-                elif friends_count == 1:
-                    return float(product.friend_1_price or (solo_price * 0.5))
-                else:
-                    return solo_price
-
             for it in order_items:
                 prod = product_cache.get(it.product_id)
                 if not prod:
                     continue
                 qty = float(getattr(it, 'quantity', 1) or 1)
-                expected_total += tier_price(prod, expected_friends) * qty
-                actual_total += tier_price(prod, actual_friends) * qty
+                expected_total += admin_settlement_unit_price(prod, expected_friends) * qty
+                actual_total += admin_settlement_unit_price(prod, actual_friends) * qty
 
         difference = actual_total - expected_total
         
@@ -3719,24 +4006,13 @@ async def get_settlements_required(db: Session = Depends(get_db)):
                     if it.product_id not in product_cache:
                         product_cache[it.product_id] = db.query(Product).filter(Product.id == it.product_id).first()
 
-                def tier_price(product: Product, friends_count: int) -> float:
-                    solo_price = float(product.market_price or product.base_price or 0)
-                    if friends_count >= 3:
-                        return float(product.friend_3_price or 0.0)
-                    elif friends_count == 2:
-                        return float(product.friend_2_price or (solo_price * 0.25))
-                    elif friends_count == 1:
-                        return float(product.friend_1_price or (solo_price * 0.5))
-                    else:
-                        return solo_price
-
                 for it in order_items:
                     prod = product_cache.get(it.product_id)
                     if not prod:
                         continue
                     qty = float(getattr(it, 'quantity', 1) or 1)
-                    expected_total += tier_price(prod, expected_friends) * qty
-                    actual_total += tier_price(prod, actual_friends) * qty
+                    expected_total += admin_settlement_unit_price(prod, expected_friends) * qty
+                    actual_total += admin_settlement_unit_price(prod, actual_friends) * qty
 
                 difference = actual_total - expected_total
                 
@@ -3929,6 +4205,7 @@ async def create_review(
         )
         
         db.add(review)
+        reviews_changed(db, review.product_id)
         db.commit()
         db.refresh(review)
         
@@ -3969,6 +4246,7 @@ async def update_review(
         if "approved" in data:
             review.approved = data["approved"]
         
+        reviews_changed(db, review.product_id)
         db.commit()
         db.refresh(review)
         
@@ -3999,6 +4277,7 @@ async def approve_review(
             raise HTTPException(status_code=404, detail="Review not found")
         
         review.approved = True
+        reviews_changed(db, review.product_id)
         db.commit()
         db.refresh(review)
         
@@ -4024,6 +4303,7 @@ async def reject_review(
             raise HTTPException(status_code=404, detail="Review not found")
         
         review.approved = False
+        reviews_changed(db, review.product_id)
         db.commit()
         db.refresh(review)
         
@@ -4048,7 +4328,9 @@ async def delete_review(
         if not review:
             raise HTTPException(status_code=404, detail="Review not found")
         
+        product_id = review.product_id
         db.delete(review)
+        reviews_changed(db, product_id)
         db.commit()
         
         return {"message": "Review deleted successfully"}
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Form
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from datetime import timedelta
@@ -28,14 +28,26 @@ logger = get_logger("auth.routes")
 router = APIRouter(prefix="/auth", tags=["authentication"])
 settings = get_settings()
 
+_TRUSTED_PROXIES = {"127.0.0.1", "::1"}
+
+def _client_ip(http_request: Request) -> Optional[str]:
+    """Caller IP; X-Real-IP / X-Forwarded-For are only trusted from the local nginx proxy"""
+    peer = http_request.client.host if http_request.client else None
+    if peer in _TRUSTED_PROXIES:
+        forwarded = http_request.headers.get("x-real-ip") or http_request.headers.get("x-forwarded-for", "").split(",")[0]
+        if forwarded.strip():
+            return forwarded.strip()
+    return peer
+
 @router.post("/send-verification", response_model=PhoneVerificationResponse)
 async def request_verification(
     request: PhoneVerificationRequest,
+    http_request: Request,
     db: Session = Depends(get_db)
 ):
     """Send verification code to phone number"""
     logger.info(f"Received verification request for phone: {request.phone_number}")
-    result = await send_verification_code(db, request.phone_number, request.user_type)
+    result = await send_verification_code(db, request.phone_number, request.user_type, _client_ip(http_request))
     logger.info(f"Verification code sent for phone: {request.phone_number}")
     return result
 
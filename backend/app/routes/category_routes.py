@@ -6,6 +6,7 @@ import re
 from app.database import get_db
 from app.models import Category, SubCategory, Product
 from app.schemas import Category as CategorySchema, SubCategory as SubCategorySchema, SubCategoryCreate, SubCategoryUpdate, CategoryCreate, CategoryUpdate
+from app.services.suggest_index import suggest_index
 
 category_router = APIRouter(prefix="/categories", tags=["categories"])
 
@@ -52,6 +53,7 @@ def create_category(category: CategoryCreate, db: Session = Depends(get_db)):
     db.add(new_category)
     db.commit()
     db.refresh(new_category)
+    suggest_index.refresh_category(db, new_category.id)
     return new_category
 
 # GET a specific category by slug
@@ -86,6 +88,7 @@ def update_category(slug: str, category: CategoryUpdate, db: Session = Depends(g
     
     db.commit()
     db.refresh(db_category)
+    suggest_index.refresh_category(db, db_category.id)
     return db_category
 
 # DELETE a category
@@ -111,8 +114,10 @@ def delete_category(slug: str, db: Session = Depends(get_db)):
             db.refresh(default_cat)
         products_in_cat.update({Product.category_id: default_cat.id, Product.subcategory_id: None})
 
+    category_id = category.id
     db.delete(category)
     db.commit()
+    suggest_index.remove("category", category_id)
     
     return {"message": f"Category with slug '{slug}' deleted successfully"}
 
@@ -159,6 +164,7 @@ def create_subcategory(
     db.add(new_subcategory)
     db.commit()
     db.refresh(new_subcategory)
+    suggest_index.refresh_subcategory(db, new_subcategory.id)
     return new_subcategory
 
 # GET a specific subcategory by slug
@@ -193,6 +199,7 @@ def update_subcategory(slug: str, subcategory: SubCategoryUpdate, db: Session =
     
     db.commit()
     db.refresh(db_subcategory)
+    suggest_index.refresh_subcategory(db, db_subcategory.id)
     return db_subcategory
 
 # DELETE a subcategory
@@ -202,7 +209,9 @@ def delete_subcategory(slug: str, db: Session = Depends(get_db)):
     if not subcategory:
         raise HTTPException(status_code=404, detail=f"Subcategory with slug '{slug}' not found")
     
+    subcategory_id = subcategory.id
     db.delete(subcategory)
     db.commit()
+    suggest_index.remove("subcategory", subcategory_id)
     
     return {"message": f"Subcategory with slug '{slug}' deleted successfully"} 
\ No newline at end of file
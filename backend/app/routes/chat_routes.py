@@ -1,20 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+from typing import List, Optional
 
-from app.database import get_db
-from app.models import ChatMessage, Product, SupportMessage, User
+from app.database import SessionLocal, get_db
+from app.models import ChatMessage, Product, User
 from app.schemas import ChatMessageSend, ChatMessage as ChatMessageSchema, SupportMessage as SupportMessageSchema
-from app.utils.security import get_current_user
-from app.utils.admin import ADMIN_PHONE_NUMBER
+from app.utils.security import get_current_user, oauth2_scheme_optional
 from app.services.ai_chatbot import maybe_reply_to_user
+from app.services.support_chat import (
+    add_message,
+    event_stream,
+    get_admin_user,
+    list_conversations,
+    mark_seen_by_admin as mark_support_seen_by_admin,
+    mark_seen_by_user as mark_support_seen_by_user,
+    thread_page,
+)
 
 chat_router = APIRouter(prefix="/chat", tags=["chat"])
 
-# In-memory receipt store: { message_id: { delivered: bool, seen_by_user: bool, seen_by_admin: bool } }
-_receipts: dict[int, dict[str, bool]] = {}
-
 @chat_router.get("/messages/{product_id}", response_model=List[ChatMessageSchema])
 def get_chat_messages(product_id: int, db: Session = Depends(get_db)):
     user_id = 1  # legacy endpoint kept for compatibility
@@ -31,28 +36,59 @@ def get_chat_messages(product_id: int, db: Session = Depends(get_db)):
 
 # Admin support chat (user <-> admin by phone)
 def _get_admin_user(db: Session) -> User | None:
-    phone = ADMIN_PHONE_NUMBER
-    if phone and phone.startswith("+"):
-        phone = phone
-    return db.query(User).filter(User.phone_number == phone).first()
+    return get_admin_user(db)
+
+def _sse_response(stream) -> StreamingResponse:
+    return StreamingResponse(stream, media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache, no-transform",  # proxies must not compress/buffer
+        "X-Accel-Buffering": "no",  # nginx: don't buffer the stream
+    })
+
+def _last_event_id(request: Request, after_id: Optional[int]) -> Optional[int]:
+    raw = request.headers.get("last-event-id")
+    return int(raw) if raw and raw.isdigit() else after_id
 
 @chat_router.get('/admin/messages', response_model=List[SupportMessageSchema])
-def get_support_messages(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_support_messages(limit: Optional[int] = Query(None, ge=1), current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     admin = _get_admin_user(db)
     if not admin:
         # Return empty list instead of error to avoid breaking the UI
         return []
-    rows = db.query(SupportMessage).filter(
-        ((SupportMessage.sender_id == current_user.id) & (SupportMessage.receiver_id == admin.id)) |
-        ((SupportMessage.sender_id == admin.id) & (SupportMessage.receiver_id == current_user.id))
-    ).order_by(SupportMessage.timestamp.asc()).all()
-    def to_schema(r: SupportMessage) -> SupportMessageSchema:
-        sender = 'user' if r.sender_id == current_user.id else 'admin'
-        rec = _receipts.get(r.id, {})
-        seen = rec.get('seen_by_admin', False) if sender == 'user' else rec.get('seen_by_user', False)
-        delivered = rec.get('delivered', True)
-        return SupportMessageSchema(id=r.id, sender=sender, message=r.message, timestamp=r.timestamp, delivered=delivered, seen=seen)
-    return [to_schema(r) for r in rows]
+    items, _ = thread_page(db, admin.id, current_user.id, limit=limit)
+    return items
+
+# Keyset page of the current user's thread, newest page first; pass ``next_cursor`` back as before_id
+@chat_router.get('/admin/messages/page')
+def get_support_messages_page(
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    admin = _get_admin_user(db)
+    if not admin:
+        return {"items": [], "next_cursor": None}
+    items, next_cursor = thread_page(db, admin.id, current_user.id, before_id=before_id, limit=limit)
+    return {"items": [SupportMessageSchema(**i) for i in items], "next_cursor": next_cursor}
+
+# Push channel for the current user's thread (EventSource can't send headers, so ?token= is accepted)
+@chat_router.get('/admin/messages/events')
+async def stream_support_messages(
+    request: Request,
+    token: Optional[str] = None,
+    after_id: Optional[int] = None,
+    header_token: Optional[str] = Depends(oauth2_scheme_optional),
+):
+    db = SessionLocal()
+    try:
+        current_user = await get_current_user(token=header_token or token or "", db=db)
+        admin = _get_admin_user(db)
+        if not admin:
+            raise HTTPException(status_code=503, detail='Admin user not configured')
+        admin_id, user_id = admin.id, current_user.id
+    finally:
+        db.close()
+    return _sse_response(event_stream(request, admin_id, user_id=user_id, after_id=_last_event_id(request, after_id)))
 
 @chat_router.post('/admin/send', response_model=SupportMessageSchema)
 def send_support_message(payload: dict, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
@@ -62,58 +98,58 @@ def send_support_message(payload: dict, background_tasks: BackgroundTasks, curre
     admin = _get_admin_user(db)
     if not admin:
         raise HTTPException(status_code=500, detail='Admin user not configured')
-    row = SupportMessage(sender_id=current_user.id, receiver_id=admin.id, message=msg, timestamp=datetime.utcnow())
-    db.add(row)
     try:
-        db.commit()
-        _receipts[row.id] = { 'delivered': True, 'seen_by_user': True, 'seen_by_admin': False }
-        # Schedule AI auto-reply in background
-        background_tasks.add_task(maybe_reply_to_user, current_user.id, msg)
-        return SupportMessageSchema(id=row.id, sender='user', message=row.message, timestamp=row.timestamp, delivered=True, seen=False)
+        row = add_message(db, admin.id, current_user.id, 'user', msg)
     except Exception:
         db.rollback()
         raise HTTPException(status_code=500, detail='Failed to send')
+    # Schedule AI auto-reply in background
+    background_tasks.add_task(maybe_reply_to_user, current_user.id, msg)
+    return SupportMessageSchema(id=row.id, sender='user', message=row.message, timestamp=row.timestamp, delivered=True, seen=False)
 
 @chat_router.get('/admin/conversations')
-def list_conversations(db: Session = Depends(get_db)):
+def get_conversations(
+    limit: Optional[int] = Query(None, ge=1),
+    unread_only: bool = False,
+    db: Session = Depends(get_db)
+):
+    return list_conversations(db, limit=limit, unread_only=unread_only)
+
+# Push channel for the admin inbox: every conversation's messages and receipt changes
+@chat_router.get('/admin/conversations/events')
+async def stream_conversations(request: Request, after_id: Optional[int] = None):
+    db = SessionLocal()
+    try:
+        admin = _get_admin_user(db)
+        if not admin:
+            raise HTTPException(status_code=503, detail='Admin user not configured')
+        admin_id = admin.id
+    finally:
+        db.close()
+    return _sse_response(event_stream(request, admin_id, after_id=_last_event_id(request, after_id)))
+
+@chat_router.get('/admin/conversations/{user_id}', response_model=List[SupportMessageSchema])
+def get_conversation(user_id: int, limit: Optional[int] = Query(None, ge=1), db: Session = Depends(get_db)):
     admin = _get_admin_user(db)
     if not admin:
         # Return empty list instead of error to avoid breaking the UI
         return []
-    rows = db.query(SupportMessage).filter(
-        (SupportMessage.sender_id == admin.id) | (SupportMessage.receiver_id == admin.id)
-    ).order_by(SupportMessage.timestamp.desc()).all()
-    conversations: dict[int, dict] = {}
-    for r in rows:
-        other_id = r.receiver_id if r.sender_id == admin.id else r.sender_id
-        if other_id not in conversations:
-            user = db.query(User).filter(User.id == other_id).first()
-            conversations[other_id] = {
-                'user_id': other_id,
-                'name': f"{getattr(user, 'first_name', '') or ''} {getattr(user, 'last_name', '') or ''}".strip() if user else 'کاربر',
-                'phone': getattr(user, 'phone_number', None) if user else None,
-                'last_message': r.message,
-                'last_timestamp': r.timestamp,
-            }
-    return list(conversations.values())
+    items, _ = thread_page(db, admin.id, user_id, limit=limit)
+    return items
 
-@chat_router.get('/admin/conversations/{user_id}', response_model=List[SupportMessageSchema])
-def get_conversation(user_id: int, db: Session = Depends(get_db)):
+# Keyset page of one thread, newest page first; pass ``next_cursor`` back as before_id
+@chat_router.get('/admin/conversations/{user_id}/page')
+def get_conversation_page(
+    user_id: int,
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
     admin = _get_admin_user(db)
     if not admin:
-        # Return empty list instead of error to avoid breaking the UI
-        return []
-    rows = db.query(SupportMessage).filter(
-        ((SupportMessage.sender_id == user_id) & (SupportMessage.receiver_id == admin.id)) |
-        ((SupportMessage.sender_id == admin.id) & (SupportMessage.receiver_id == user_id))
-    ).order_by(SupportMessage.timestamp.asc()).all()
-    def to_schema(r: SupportMessage) -> SupportMessageSchema:
-        sender = 'admin' if r.sender_id == admin.id else 'user'
-        rec = _receipts.get(r.id, {})
-        seen = rec.get('seen_by_user', False) if sender == 'admin' else rec.get('seen_by_admin', False)
-        delivered = rec.get('delivered', True)
-        return SupportMessageSchema(id=r.id, sender=sender, message=r.message, timestamp=r.timestamp, delivered=delivered, seen=seen)
-    return [to_schema(r) for r in rows]
+        return {"items": [], "next_cursor": None}
+    items, next_cursor = thread_page(db, admin.id, user_id, before_id=before_id, limit=limit)
+    return {"items": [SupportMessageSchema(**i) for i in items], "next_cursor": next_cursor}
 
 @chat_router.post('/admin/conversations/{user_id}/send', response_model=SupportMessageSchema)
 def send_conversation_message(user_id: int, payload: dict, db: Session = Depends(get_db)):
@@ -127,22 +163,19 @@ def send_conversation_message(user_id: int, payload: dict, db: Session = Depends
     admin = _get_admin_user(db)
     if not admin:
         raise HTTPException(status_code=500, detail='Admin user not configured')
-    row = SupportMessage(sender_id=admin.id, receiver_id=user_id, message=msg, timestamp=datetime.utcnow())
-    db.add(row)
     try:
-        db.commit()
-        _receipts[row.id] = { 'delivered': True, 'seen_by_user': False, 'seen_by_admin': True }
-        return SupportMessageSchema(id=row.id, sender='admin', message=row.message, timestamp=row.timestamp, delivered=True, seen=False)
+        row = add_message(db, admin.id, user_id, 'admin', msg)
     except Exception:
         db.rollback()
         raise HTTPException(status_code=500, detail='Failed to send')
+    return SupportMessageSchema(id=row.id, sender='admin', message=row.message, timestamp=row.timestamp, delivered=True, seen=False)
 
-# Mark messages seen by user (frontend chat open)
+# Mark messages seen by user (frontend chat open); moves the thread's read mark to the highest id
 @chat_router.post('/admin/messages/seen')
-def mark_seen_by_user(ids: List[int]):
-    for mid in ids:
-        entry = _receipts.setdefault(mid, { 'delivered': True, 'seen_by_user': False, 'seen_by_admin': False })
-        entry['seen_by_user'] = True
+def mark_seen_by_user(ids: List[int], db: Session = Depends(get_db)):
+    admin = _get_admin_user(db)
+    if admin:
+        mark_support_seen_by_user(db, admin.id, ids)
     return { 'ok': True }
 
 # Mark messages seen by admin (admin-full conversation open)
@@ -152,12 +185,7 @@ def mark_seen_by_admin(user_id: int, db: Session = Depends(get_db)):
     if not admin:
         # Return success even if admin not configured
         return { 'ok': True }
-    rows = db.query(SupportMessage).filter(
-        (SupportMessage.sender_id == user_id) & (SupportMessage.receiver_id == admin.id)
-    ).all()
-    for r in rows:
-        entry = _receipts.setdefault(r.id, { 'delivered': True, 'seen_by_user': False, 'seen_by_admin': False })
-        entry['seen_by_admin'] = True
+    mark_support_seen_by_admin(db, admin.id, user_id)
     return { 'ok': True }
 
 # Test endpoint for AI chatbot (no auth required)
@@ -2,7 +2,7 @@
 Group Order Routes - API endpoints for group buying functionality
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Form, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Form, Body, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, func, case
 from datetime import datetime, timedelta, timezone
@@ -15,6 +15,7 @@ except Exception:
     ZoneInfo = None  # Will fallback to naive timestamps
 import secrets
 import string
+import time
 from typing import Optional, List
 
 from app.database import get_db
@@ -25,6 +26,8 @@ from app.models import (
 from app.utils.security import get_current_user, get_current_user_optional
 from app.services.group_settlement_service import GroupSettlementService
 from app.services.payment_service import PaymentService
+from app.services.group_summary import refresh_group_summary
+from app.services.order_archive import archived_orders_for_user
 from app.services import notification_service
 import logging
 
@@ -75,56 +78,83 @@ def _is_secondary_group(group: GroupOrder) -> bool:
 
 
 
+# Short-lived per-page cache for the public list; summaries change only on join/payment
+_PUBLIC_LIST_CACHE: dict[tuple, tuple[float, dict]] = {}
+_PUBLIC_LIST_TTL_SECONDS = 15
+
+
 @router.get("/public-list")
-async def public_list(db: Session = Depends(get_db)):
-    """Public list of group orders with minimal info (no auth)."""
-    groups = db.query(GroupOrder).order_by(GroupOrder.created_at.desc()).all()
-    result = []
-    for g in groups:
-        # Parse kind from basket_snapshot if present
-        kind = "primary"
-        product_name = None
-        try:
-            import json as _json
-            meta = _json.loads(g.basket_snapshot) if getattr(g, 'basket_snapshot', None) else {}
-            if isinstance(meta, dict):
-                kind = (meta.get("kind") or "primary").lower()
-                src_oid = meta.get("source_order_id")
-                if src_oid:
-                    src_order = db.query(Order).filter(Order.id == int(src_oid)).first()
-                    if src_order and getattr(src_order, 'items', None):
-                        first_item = src_order.items[0] if len(src_order.items) > 0 else None
-                        if first_item and getattr(first_item, 'product', None):
-                            product_name = getattr(first_item.product, 'name', None)
-        except Exception:
-            pass
+async def public_list(
+    response: Response,
+    cursor: Optional[int] = Query(default=None, description="Return groups with id below this value"),
+    limit: int = Query(default=50, ge=1, le=200),
+    status_filter: Optional[str] = Query(default=None, alias="status"),
+    kind: Optional[str] = Query(default=None),
+    db: Session = Depends(get_db),
+):
+    """Public list of group orders with minimal info (no auth).
 
-        # Count paid members excluding leader and settlement payments
-        orders = db.query(Order).filter(
-            Order.group_order_id == g.id,
-            Order.is_settlement_payment == False,
-        ).all()
-        paid_members = [
-            o for o in orders
-            if o.user_id != g.leader_id and (
-                o.payment_ref_id is not None or o.paid_at is not None or str(getattr(o, 'status', '')).lower() in ["paid","completed","تکمیل شده"]
-            )
-        ]
+    Keyset-paginated by id (newest first) and served from the summary columns
+    maintained by ``services.group_summary``, so cost is bounded by ``limit``.
+    """
+    cache_key = (cursor, limit, status_filter, kind)
+    response.headers["Cache-Control"] = f"public, max-age={_PUBLIC_LIST_TTL_SECONDS}"
+    now = time.time()
+    cached = _PUBLIC_LIST_CACHE.get(cache_key)
+    if cached and now - cached[0] < _PUBLIC_LIST_TTL_SECONDS:
+        return cached[1]
+
+    query = (
+        db.query(
+            GroupOrder.id,
+            GroupOrder.kind,
+            GroupOrder.status,
+            GroupOrder.participants_count,
+            GroupOrder.paid_members,
+            GroupOrder.created_at,
+            GroupOrder.expires_at,
+            GroupOrder.invite_token,
+            GroupOrder.product_name,
+            User.phone_number,
+        )
+        .outerjoin(User, User.id == GroupOrder.leader_id)
+    )
+    if status_filter:
+        try:
+            query = query.filter(GroupOrder.status == GroupOrderStatus(status_filter.upper()))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid status: {status_filter}")
+    if kind:
+        query = query.filter(GroupOrder.kind == kind.lower())
+    if cursor is not None:
+        query = query.filter(GroupOrder.id < cursor)
+
+    rows = query.order_by(GroupOrder.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
 
-        status = g.status.value if hasattr(g.status, 'value') else str(g.status)
-        leader = db.query(User).filter(User.id == g.leader_id).first() if g.leader_id else None
-        result.append({
-            "id": g.id,
-            "kind": kind,
-            "status": status,
-            "participants_count": len(orders),
-            "paid_members": len(paid_members),
-            "created_at": g.created_at.isoformat() if g.created_at else None,
-            "expires_at": g.expires_at.isoformat() if g.expires_at else None,
-            "invite_token": g.invite_token,
-            "leader_username": (leader.phone_number if leader else None),
-            "product_name": product_name,
+    items = []
+    for row in rows:
+        items.append({
+            "id": row.id,
+            "kind": row.kind or "primary",
+            "status": row.status.value if hasattr(row.status, "value") else str(row.status),
+            "participants_count": row.participants_count or 0,
+            "paid_members": row.paid_members or 0,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+            "expires_at": row.expires_at.isoformat() if row.expires_at else None,
+            "invite_token": row.invite_token,
+            "leader_username": row.phone_number,
+            "product_name": row.product_name,
         })
+
+    result = {
+        "items": items,
+        "next_cursor": rows[-1].id if has_more and rows else None,
+    }
+    if len(_PUBLIC_LIST_CACHE) > 500:
+        _PUBLIC_LIST_CACHE.clear()
+    _PUBLIC_LIST_CACHE[cache_key] = (now, result)
     return result
 
  
@@ -261,6 +291,8 @@ async def create_secondary_group(
     )
     
     db.add(new_group)
+    db.flush()
+    refresh_group_summary(db, new_group.id)
     db.commit()
     db.refresh(new_group)
     
@@ -462,9 +494,11 @@ async def finalize_group_order(
             ).first()
             
             delivery_slot = None
+            delivery_slot_id = None
             shipping_address = None
             if sample_invited_order:
                 delivery_slot = sample_invited_order.delivery_slot
+                delivery_slot_id = sample_invited_order.delivery_slot_id
                 shipping_address = sample_invited_order.shipping_address
                 # Clean up any PENDING markers from shipping address
                 if shipping_address and 'PENDING_' in shipping_address:
@@ -483,6 +517,7 @@ async def finalize_group_order(
                 payment_ref_id=f"GROUP_FINALIZED_{group_order_id}",
                 is_settlement_payment=False,
                 delivery_slot=delivery_slot,
+                delivery_slot_id=delivery_slot_id,
                 shipping_address=shipping_address
             )
             
@@ -693,12 +728,14 @@ async def get_my_group_orders(
 
 @router.get("/my-groups-and-orders")
 async def get_user_groups_and_orders(
+    include_archived: bool = Query(False, description="Append archived orders (marked archived=true)"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     یک API یکپارچه که همه اطلاعات گروه‌ها و سفارش‌های کاربر را برمی‌گرداند
     OPTIMIZED VERSION - Uses aggregated queries instead of N+1
+    Archived orders (services/order_archive.py) are only included on request.
     """
     try:
         from sqlalchemy.orm import joinedload
@@ -925,6 +962,9 @@ async def get_user_groups_and_orders(
                         "allow_consolidation": group.allow_consolidation if group else False
                     }
                     orders_data.append(order_data)
+
+        if include_archived:
+            orders_data.extend(archived_orders_for_user(db, current_user.id))
         
         return {
             "success": True,
@@ -13,6 +13,8 @@ import json
 from app.database import get_db
 from app.models import GroupOrder, Order, User, GroupOrderStatus
 from app.utils.security import get_current_user
+from app.services.group_summary import refresh_group_summary
+from app.services.pricing import basket_from_order_items, basket_from_snapshot, group_totals, load_products
 
 logger = logging.getLogger(__name__)
 
@@ -155,117 +157,22 @@ def _serialize_group(g: GroupOrder, db: Session) -> Dict[str, Any]:
         expires_at_ms = int(expires_at.timestamp() * 1000)
         server_now_ms = int(current_time.timestamp() * 1000)
     
-    # Build basket items from snapshot or orders
-    basket_items = []
-    original_total = 0
-    
-    # Helper to get price from product with all pricing tiers
-    def get_product_pricing(product, order_item=None):
-        if product:
-            solo = float(getattr(product, "solo_price", 0) or getattr(product, "market_price", 0) or 0)
-            f1 = float(getattr(product, "friend_1_price", 0) or 0)
-            f2 = float(getattr(product, "friend_2_price", 0) or 0)
-            f3 = float(getattr(product, "friend_3_price", 0) or 0)
-            return {
-                "solo_price": solo if solo > 0 else (float(getattr(order_item, "base_price", 0) or 0) if order_item else 0),
-                "friend_1_price": f1,
-                "friend_2_price": f2,
-                "friend_3_price": f3,
-            }
-        elif order_item:
-            base = float(getattr(order_item, "base_price", 0) or 0)
-            return {"solo_price": base, "friend_1_price": 0, "friend_2_price": 0, "friend_3_price": 0}
-        return {"solo_price": 0, "friend_1_price": 0, "friend_2_price": 0, "friend_3_price": 0}
-    
-    # Try to get items from meta (basket_snapshot)
+    # Build basket items from snapshot or, failing that, the first order with items
     if meta.get("items"):
-        from app.models import Product
-        for item in meta.get("items", []):
-            unit_price = float(item.get("unit_price", 0) or 0)
-            qty = int(item.get("quantity", 1) or 1)
-            product_id = item.get("product_id")
-            
-            # Try to get product pricing
-            product = db.query(Product).filter(Product.id == product_id).first() if product_id else None
-            pricing = get_product_pricing(product)
-            
-            # Use solo_price if unit_price is 0
-            if unit_price == 0 and pricing["solo_price"] > 0:
-                unit_price = pricing["solo_price"]
-            
-            basket_items.append({
-                "productId": str(product_id or ""),
-                "name": item.get("product_name") or (getattr(product, "name", None) if product else None) or f"محصول {product_id}",
-                "qty": qty,
-                "unitPrice": unit_price,
-                "discountedUnitPrice": unit_price,
-                "image": item.get("image"),
-                # Include pricing tiers for frontend calculation
-                "solo_price": pricing["solo_price"] if pricing["solo_price"] > 0 else unit_price,
-                "friend_1_price": pricing["friend_1_price"],
-                "friend_2_price": pricing["friend_2_price"],
-                "friend_3_price": pricing["friend_3_price"],
-            })
-            original_total += (pricing["solo_price"] if pricing["solo_price"] > 0 else unit_price) * qty
-    
-    # If no items in snapshot, try to get from orders
-    if not basket_items and orders:
+        snapshot_items = meta.get("items", [])
+        products = load_products(db, (it.get("product_id") for it in snapshot_items))
+        basket_items = basket_from_snapshot(snapshot_items, products)
+    else:
+        basket_items = []
         for o in orders:
             if hasattr(o, 'items') and o.items:
-                for item in o.items:
-                    product = getattr(item, "product", None)
-                    pricing = get_product_pricing(product, item)
-                    unit_price = pricing["solo_price"] if pricing["solo_price"] > 0 else float(getattr(item, "base_price", 0) or 0)
-                    qty = int(getattr(item, "quantity", 1) or 1)
-                    basket_items.append({
-                        "productId": str(item.product_id),
-                        "name": getattr(product, "name", f"محصول {item.product_id}") if product else f"محصول {item.product_id}",
-                        "qty": qty,
-                        "unitPrice": unit_price,
-                        "discountedUnitPrice": unit_price,
-                        "image": getattr(product, "image_url", None) if product else None,
-                        # Include pricing tiers for frontend calculation
-                        "solo_price": pricing["solo_price"] if pricing["solo_price"] > 0 else unit_price,
-                        "friend_1_price": pricing["friend_1_price"],
-                        "friend_2_price": pricing["friend_2_price"],
-                        "friend_3_price": pricing["friend_3_price"],
-                    })
-                    original_total += unit_price * qty
-                break  # Only get items from first order (leader's order)
-    
-    # Calculate pricing based on group type and number of paid members
+                products = load_products(db, (it.product_id for it in o.items))
+                basket_items = basket_from_order_items(o.items, products)
+                break
+
     non_leader_paid = sum(1 for p in participants if not p.get("isLeader") and p.get("paid", False))
-    current_total = original_total
-    
-    if is_secondary and original_total > 0:
-        # Secondary group: Each friend reduces payment by 1/4
-        capped_friends = min(non_leader_paid, 3)
-        quarter = original_total / 4
-        current_total = max(0, original_total - capped_friends * quarter)
-        if non_leader_paid >= 4:
-            current_total = 0
-    elif not is_secondary and basket_items:
-        # Regular group: Calculate based on pricing tiers
-        def get_item_price_for_friends(item, friends):
-            if friends == 0:
-                return item.get("solo_price", item.get("unitPrice", 0))
-            elif friends == 1:
-                f1 = item.get("friend_1_price", 0)
-                return f1 if f1 > 0 else item.get("solo_price", item.get("unitPrice", 0)) / 2
-            elif friends == 2:
-                f2 = item.get("friend_2_price", 0)
-                return f2 if f2 > 0 else item.get("solo_price", item.get("unitPrice", 0)) / 3
-            else:  # 3 or more friends = free
-                return item.get("friend_3_price", 0)
-        
-        if non_leader_paid >= 3:
-            current_total = 0
-        else:
-            current_total = sum(
-                get_item_price_for_friends(item, non_leader_paid) * item.get("qty", 1)
-                for item in basket_items
-            )
-    
+    pricing = group_totals(basket_items, non_leader_paid, is_secondary)
+
     # Calculate consolidation reward (aggregation bonus)
     # Count paid members who opted to ship to leader address
     paid_followers_to_leader = db.query(Order).filter(
@@ -317,11 +224,7 @@ def _serialize_group(g: GroupOrder, db: Session) -> Dict[str, Any]:
         "shareUrl": share_url,
         # Additional fields for secondary_invite page
         "basket": basket_items,
-        "pricing": {
-            "originalTotal": original_total,
-            "currentTotal": current_total,
-            "expectedTotal": 0 if is_secondary else original_total,
-        },
+        "pricing": pricing,
         "invite": {
             "shareUrl": share_url,
         },
@@ -492,6 +395,8 @@ async def create_group(
         basket_snapshot=json.dumps(meta),
     )
     db.add(group)
+    db.flush()
+    refresh_group_summary(db, group.id)
     db.commit()
     db.refresh(group)
 
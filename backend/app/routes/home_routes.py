@@ -1,55 +1,54 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile
 from sqlalchemy.orm import Session, joinedload
-from typing import List
+from typing import List, Optional
 
 from app.database import get_db
-from app.models import Product, Banner
-from sqlalchemy import text
+from app.models import Product, Banner, User
 from app.schemas import RecommendationResponse, ProductResponse
+from app.services.product_cards import card_select, fetch_cards
+from app.services.favorites import mark_favorites
+from app.services.recommendations import recommend_product_ids
+from app.services.app_settings import VersionRow, public_settings_response
+from app.utils.security import get_current_user_optional
 
 home_router = APIRouter(tags=["home"])
 
 _HOME_CACHE: dict[str, tuple[float, list]] = {}
 _BANNERS_CACHE: dict[str, tuple[float, list]] = {}
+_HOME_VERSION = VersionRow("_home_version")
+
+
+def invalidate_home_cache(db: Session) -> None:
+    """Drop the cached home rail in every worker (after curated positions change). Does not commit."""
+    _HOME_VERSION.bump(db)
+    _HOME_CACHE.clear()
 
 @home_router.get("/home", response_model=List[ProductResponse])
-def home(db: Session = Depends(get_db)):
-    # 60s lightweight cache to avoid repeated heavy joins
+def home(
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_current_user_optional),
+):
+    # 60s lightweight cache to avoid repeated heavy joins; favorites are merged per request
     import time
     now = time.time()
+    if _HOME_VERSION.changed(db):
+        _HOME_CACHE.clear()
     cached = _HOME_CACHE.get("home")
     if cached and now - cached[0] < 60:
-        return cached[1]
+        return mark_favorites(db, current_user, cached[1])
 
     try:
         # Prefer curated order by home_position, then newest
-        products = (
-            db.query(Product)
-            .options(joinedload(Product.store), joinedload(Product.category), joinedload(Product.images))
-            .order_by(Product.home_position.asc().nulls_last(), Product.id.desc())
-            .limit(30)
-            .all()
+        products = fetch_cards(
+            db, card_select(db).order_by(Product.home_position.asc().nulls_last(), Product.id.desc()).limit(30)
         )
     except Exception:
-        products = (
-            db.query(Product)
-            .options(joinedload(Product.store), joinedload(Product.category), joinedload(Product.images))
-            .order_by(Product.home_position.asc(), Product.id.desc())
-            .limit(30)
-            .all()
+        products = fetch_cards(
+            db, card_select(db).order_by(Product.home_position.asc(), Product.id.desc()).limit(30)
         )
     
-    # Set computed fields for each product
-    for product in products:
-        product.store_name = product.store.name if product.store else None
-        product.category_name = product.category.name if product.category else None
-        main_image = next((image for image in product.images if image.is_main), None)
-        product.main_image = main_image.image_url if main_image else None
-        if not product.main_image and product.images:
-            product.main_image = product.images[0].image_url
-    
     _HOME_CACHE["home"] = (now, products)
-    return products
+    return mark_favorites(db, current_user, products)
 
 @home_router.get("/banners")
 def get_banners(db: Session = Depends(get_db)):
@@ -81,28 +80,30 @@ def get_banners(db: Session = Depends(get_db)):
     return result
 
 @home_router.get("/settings")
-def get_public_settings(db: Session = Depends(get_db)):
-    # Read optional "all" category image from a tiny settings table; tolerate absence
-    try:
-        rows = db.execute(text("SELECT key, value FROM app_settings WHERE key IN ('all_category_image', 'all_category_label')"))
-        data = {row[0]: row[1] for row in rows}
-        all_image = data.get('all_category_image')
-        all_label = data.get('all_category_label', 'همه')
-    except Exception:
-        all_image = None
-        all_label = 'همه'
-    return {"all_category_image": all_image, "all_category_label": all_label}
+def get_public_settings(request: Request):
+    # Served from the in-memory settings snapshot; revalidate with If-None-Match
+    return public_settings_response(request.headers.get("if-none-match"))
 
 @home_router.get("/recommendations", response_model=List[RecommendationResponse])
-def get_recommendations(db: Session = Depends(get_db)):
-    # TODO: Implement actual recommendation logic
-    products = db.query(Product).limit(5).all()
-    
-    # Set computed fields for each product
-    for product in products:
-        main_image = next((image for image in product.images if image.is_main), None)
-        product.main_image = main_image.image_url if main_image else None
-        if not product.main_image and product.images:
-            product.main_image = product.images[0].image_url
-    
-    return products 
\ No newline at end of file
+def get_recommendations(
+    product_id: Optional[int] = None,
+    limit: int = Query(5, ge=1, le=30),
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_current_user_optional),
+):
+    # Co-purchase neighbours of the viewed product and the user's recent
+    # purchases/favorites, from the precomputed product_neighbors table
+    ids = recommend_product_ids(db, user=current_user, product_id=product_id, limit=limit)
+    if not ids:
+        return []
+    cards = {card["id"]: card for card in fetch_cards(db, card_select(db).where(Product.id.in_(ids)))}
+    return [
+        {
+            "id": cards[pid]["id"],
+            "name": cards[pid]["name"],
+            "base_price": cards[pid]["base_price"],
+            "image_url": cards[pid]["image"],
+        }
+        for pid in ids
+        if pid in cards
+    ]
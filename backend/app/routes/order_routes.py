@@ -14,6 +14,7 @@ from app.models import (
     OrderType, GroupOrderStatus
 )
 from app.utils.security import get_current_user
+from app.services.order_metadata import resolve_delivery_slot_id
 
 order_router = APIRouter(prefix="/orders", tags=["orders"])
 
@@ -287,17 +288,12 @@ async def update_order_delivery_slot(
         raise HTTPException(status_code=400, detail="delivery_slot is required")
 
     try:
-        import json
-        # Store delivery slot as JSON to maintain consistency with existing format
-        delivery_slot_json = json.dumps({
-            "date": request.get("date"),
-            "from": request.get("from"),
-            "to": request.get("to"),
-            "delivery_slot": delivery_slot
-        })
+        # Store the plain slot text plus the matching DeliverySlot id
+        slot_id = resolve_delivery_slot_id(db, delivery_slot)
         
         # Update the current order
-        order.delivery_slot = delivery_slot_json
+        order.delivery_slot = delivery_slot
+        order.delivery_slot_id = slot_id
         
         # If this order is part of a group, update all orders in the same group
         if order.group_order_id:
@@ -309,7 +305,8 @@ async def update_order_delivery_slot(
             
             # Update delivery_slot for all orders in the group
             for group_order in group_orders:
-                group_order.delivery_slot = delivery_slot_json
+                group_order.delivery_slot = delivery_slot
+                group_order.delivery_slot_id = slot_id
         
         db.commit()
         return {"message": "Delivery slot updated successfully"}
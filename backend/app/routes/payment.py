@@ -9,6 +9,7 @@ from app.models import User, Order, OrderType, GroupOrder, GroupOrderStatus
 from sqlalchemy import or_, func
 from app.config import get_settings
 from app.services.payment_service import PaymentService
+from app.services.group_summary import refresh_group_summary
 from sqlalchemy import text
 from pydantic import BaseModel
 from typing import List, Optional
@@ -225,7 +226,7 @@ async def create_payment_order_public(
         logger.info(f"📦 Prepared items: {len(items)} items for service")
 
         # Simplified invited flow: do NOT resolve group at creation time.
-        # If an invite_code exists, we will mark the order as invited using PENDING_INVITE
+        # If an invite_code exists, we record it as pending_invite_token on the order
         # and link it during payment verification.
         group_order_id = None
 
@@ -266,6 +267,7 @@ async def create_payment_order_public(
                 max_friends=getattr(order_data, 'max_friends', None),
                 expected_friends=getattr(order_data, 'expected_friends', None),
                 is_invited_checkout=bool(getattr(order_data, 'invite_code', None)),
+                invite_code=getattr(order_data, 'invite_code', None),
             )
             logger.info(f"✅ PaymentService.create_payment_order returned: success={result.get('success')}")
         except Exception as service_error:
@@ -276,22 +278,9 @@ async def create_payment_order_public(
             raise
         
         if result["success"]:
-            # Post-create linking for group orders
+            # Invited orders carry pending_invite_token (set at creation) and are linked
+            # after verification; leader groups are likewise created only after payment.
             authority = result["authority"]
-            order = db.query(Order).filter(Order.payment_authority == authority).first()
-            if order:
-                if getattr(order_data, 'invite_code', None):
-                    # Always mark invited orders using PENDING_INVITE; linking is done after verification
-                    original_address = order.shipping_address or ""
-                    order.shipping_address = f"PENDING_INVITE:{order_data.invite_code}|{original_address}"
-                    db.commit()
-                else:
-                    # Leader initiating a new group buy
-                    # ✅ FIX: Do NOT create GroupOrder here - wait for payment verification
-                    # Store mode and group info in delivery_slot (already done in payment_service.create_payment_order)
-                    # Group will be created in verify_and_complete_payment AFTER successful payment
-                    logger.info(f"⏳ Leader order {order.id} created - GroupOrder will be created after payment verification")
-                    # No action needed here - group creation happens in verify_and_complete_payment
 
             return PaymentResponse(
                 success=True,
@@ -643,13 +632,10 @@ async def payment_callback(
         
         logger.info(f"✅ Order after verification: id={order.id}, group_order_id={order.group_order_id}, user_id={order.user_id}, order_type={order.order_type}, shipping_address={order.shipping_address[:50] if order.shipping_address else None}")
         
-        # ✅ Track invited checkout via persisted flag (primary) + legacy PENDING marker (fallback)
+        # ✅ Track invited checkout via persisted flag (primary) + unlinked invite token (fallback)
         was_invited_checkout = bool(getattr(order, "is_invited_checkout", False))
-        if not was_invited_checkout and order.shipping_address and (
-            order.shipping_address.startswith("PENDING_INVITE:") or
-            "PENDING_INVITE:" in order.shipping_address
-        ):
-            logger.warning(f"⚠️ Order {order.id} still has PENDING_INVITE marker - group linking may have failed")
+        if not was_invited_checkout and order.pending_invite_token:
+            logger.warning(f"⚠️ Order {order.id} still has a pending invite token - group linking may have failed")
             was_invited_checkout = True
 
         # IMPORTANT: Check order type AFTER verification (which may have updated it from ALONE to GROUP)
@@ -1258,6 +1244,8 @@ async def get_group_invite_by_code(
                             basket_snapshot=snap_json,
                         )
                         db.add(new_group)
+                        db.flush()
+                        refresh_group_summary(db, new_group.id)
                         db.commit()
                         db.refresh(new_group)
                         group_order = new_group
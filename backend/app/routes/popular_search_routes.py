@@ -1,28 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Union
 from datetime import datetime
 
 from app.database import get_db
 from app.models import PopularSearch, TEHRAN_TZ
-from app.schemas import PopularSearchCreate, PopularSearchUpdate, PopularSearchResponse
+from app.schemas import PopularSearchCreate, PopularSearchUpdate, PopularSearchResponse, TrendingSearchResponse
+from app.services.search_analytics import cached_trending_terms, normalize_term
+from app.services.suggest_index import suggest_index
 from app.utils.security import get_current_user
 
 popular_search_router = APIRouter(prefix="/popular-searches", tags=["popular-searches"])
 
-@popular_search_router.get("", response_model=List[PopularSearchResponse])
+@popular_search_router.get("", response_model=List[Union[PopularSearchResponse, TrendingSearchResponse]])
 def get_popular_searches(
     include_inactive: bool = False,
+    include_trending: bool = False,
+    trending_limit: int = Query(5, ge=1, le=20),
     db: Session = Depends(get_db)
 ):
-    """Get all popular searches (public endpoint)"""
+    """Get all popular searches (public endpoint).
+
+    With include_trending, live trending terms not already curated are
+    appended after the curated list.
+    """
     query = db.query(PopularSearch)
     
     if not include_inactive:
         query = query.filter(PopularSearch.is_active == True)
     
     searches = query.order_by(PopularSearch.sort_order.asc()).all()
-    return searches
+    if not include_trending:
+        return searches
+
+    curated = {normalize_term(s.search_term) for s in searches}
+    trending = [
+        TrendingSearchResponse(search_term=t["term"], recent_count=t["recent_count"])
+        for t in cached_trending_terms(db, trending_limit + len(curated))
+        if t["term"] not in curated
+    ]
+    return [PopularSearchResponse.model_validate(s) for s in searches] + trending[:trending_limit]
 
 @popular_search_router.get("/{search_id}", response_model=PopularSearchResponse)
 def get_popular_search(
@@ -50,6 +67,7 @@ def create_popular_search(
     db.add(new_search)
     db.commit()
     db.refresh(new_search)
+    suggest_index.refresh_terms(db)
     return new_search
 
 @popular_search_router.put("/{search_id}", response_model=PopularSearchResponse)
@@ -74,6 +92,7 @@ def update_popular_search(
     search.updated_at = datetime.now(TEHRAN_TZ)
     db.commit()
     db.refresh(search)
+    suggest_index.refresh_terms(db)
     return search
 
 @popular_search_router.delete("/{search_id}")
@@ -89,6 +108,7 @@ def delete_popular_search(
     
     db.delete(search)
     db.commit()
+    suggest_index.refresh_terms(db)
     return {"message": "Popular search deleted successfully"}
 
 @popular_search_router.post("/reorder")
@@ -105,5 +125,6 @@ def reorder_popular_searches(
             search.updated_at = datetime.now(TEHRAN_TZ)
     
     db.commit()
+    suggest_index.refresh_terms(db)
     return {"message": "Popular searches reordered successfully"}
 
@@ -4,6 +4,7 @@ from typing import Optional, Dict, Any
 
 from app.database import get_db
 from app.models import Order
+from app.services.pricing import price_groups, secondary_tier_prices
 
 router = APIRouter(prefix="/pricing", tags=["pricing"])
 
@@ -20,16 +21,26 @@ async def get_secondary_pricing_tiers(
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     base = float(order.total_amount or 0)
-    leaderPrices = {
-        "with1Friend": base,
-        "with2Friends": round(base * 0.667, 2),
-        "with3Friends": round(base * 0.334, 2),
-        "with4Friends": 0.0,
-    }
     return {
         "basePrice": base,
-        "leaderPrices": leaderPrices,
+        "leaderPrices": secondary_tier_prices(base),
         "inviteePrice": base,
     }
 
 
+@router.get("/groups")
+async def get_groups_pricing(
+    ids: str = Query(..., description="Comma-separated group ids"),
+    db: Session = Depends(get_db),
+):
+    """Track-page pricing (originalTotal/currentTotal/expectedTotal) for many groups at once."""
+    try:
+        group_ids = [int(x) for x in ids.split(",") if x.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if len(group_ids) > 200:
+        raise HTTPException(status_code=400, detail="At most 200 groups per request")
+    priced = price_groups(db, group_ids)
+    return {"items": {str(gid): pricing for gid, pricing in priced.items()}}
+
+
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query
 from sqlalchemy.orm import Session
 from typing import Optional, List
 import re
@@ -6,6 +6,11 @@ import re
 from app.database import get_db
 from app.models import Product, ProductOption, ProductImage, Review, User
 from app.schemas import ProductDetailResponse, ProductOptionsResponse, ProductCreate, ProductUpdate, ReviewResponse, ReviewCreate, ReviewBase
+from app.services.product_browse import InvalidCursor
+from app.services.product_cards import fetch_card
+from app.services.product_reviews import review_page, review_summary, reviews_changed
+from app.services.favorites import favorite_ids
+from app.utils.security import get_current_user_optional
 
 product_router = APIRouter(prefix="/product", tags=["product"])
 
@@ -23,53 +28,50 @@ def slugify(text):
     
     return text
 
+def _detail_from_card(card: dict) -> dict:
+    detail = {k: card[k] for k in (
+        "id", "name", "description", "base_price", "discount_price", "discount", "shipping_cost",
+        "category", "category_slug", "subcategory", "subcategory_slug", "in_stock",
+        "store_id", "store_name", "image", "images",
+    )}
+    # Add group buy options
+    detail["group_buy_options"] = {
+        "twoPersonPrice": card["market_price"],
+        "fourPersonPrice": round(card["market_price"] * 0.9, 2)  # 10% additional discount for 4 people
+    }
+    return detail
+
 # Get product details by ID
 @product_router.get("/{product_id}", response_model=ProductDetailResponse)
 def product_detail(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if not product:
+    card = fetch_card(db, product_id)
+    if not card:
         raise HTTPException(status_code=404, detail="Product not found")
-    
-    # Create response object with computed fields
-    product_dict = {
-        "id": product.id,
-        "name": product.name,
-        "description": product.description,
-        "base_price": product.base_price,
-        "discount_price": product.market_price if product.market_price < product.base_price else None,
-        "shipping_cost": product.shipping_cost,
-        "category": product.category.name if product.category else "Unknown",
-        "category_slug": product.category.slug if product.category else None,
-        "subcategory": product.subcategory.name if product.subcategory else None,
-        "subcategory_slug": product.subcategory.slug if product.subcategory else None,
-        "in_stock": any(option.stock > 0 for option in product.options) if product.options else True,
-        "store": product.store,
-        "store_id": product.store_id,
-        "store_name": product.store.name if product.store else None
-    }
-    
-    # Set main image and all images
-    if product.images:
-        main_image = next((img for img in product.images if img.is_main), None)
-        product_dict["image"] = main_image.image_url if main_image else (product.images[0].image_url if product.images else None)
-        product_dict["images"] = [img.image_url for img in product.images]
-    else:
-        product_dict["image"] = None
-        product_dict["images"] = []
-    
-    # Calculate discount percentage if discount_price exists
-    if product_dict["discount_price"] and product.base_price > 0:
-        product_dict["discount"] = round((product.base_price - product_dict["discount_price"]) / product.base_price * 100)
-    else:
-        product_dict["discount"] = None
-    
-    # Add group buy options
-    product_dict["group_buy_options"] = {
-        "twoPersonPrice": product.market_price,
-        "fourPersonPrice": round(product.market_price * 0.9, 2)  # 10% additional discount for 4 people
+    return ProductDetailResponse(**_detail_from_card(card))
+
+# Everything the product page needs in one round trip: detail, first page of
+# reviews and the rating summary (three statements, or two on a summary cache hit;
+# signed-in users add the token's user lookup and, on a cache miss, their favorite ids)
+@product_router.get("/{product_id}/page")
+def product_page(
+    product_id: int,
+    user_id: Optional[int] = None,
+    reviews_limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_current_user_optional),
+):
+    card = fetch_card(db, product_id)
+    if not card:
+        raise HTTPException(status_code=404, detail="Product not found")
+    detail = _detail_from_card(card)
+    if current_user is not None:
+        detail["is_favorite"] = product_id in favorite_ids(db, current_user.id)
+    reviews, next_cursor = review_page(db, product_id, limit=reviews_limit, viewer_user_id=user_id or (current_user.id if current_user else None))
+    return {
+        "product": ProductDetailResponse(**detail),
+        "reviews": {"items": [ReviewResponse(**r) for r in reviews], "next_cursor": next_cursor},
+        "review_summary": review_summary(db, product_id),
     }
-    
-    return ProductDetailResponse(**product_dict)
 
 # Get product options
 @product_router.get("/{product_id}/options", response_model=ProductOptionsResponse)
@@ -163,15 +165,16 @@ def get_product_reviews(
     db: Session = Depends(get_db)
 ):
     # Check if product exists
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if not product:
+    if not db.query(Product.id).filter(Product.id == product_id).first():
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # Build query for reviews
-    query = db.query(Review).filter(Review.product_id == product_id)
-    
     # If user_id is provided, include that user's reviews (even if not approved)
     # Otherwise, only show approved reviews
+    query = (
+        db.query(Review, User.first_name, User.last_name)
+        .outerjoin(User, User.id == Review.user_id)
+        .filter(Review.product_id == product_id)
+    )
     if user_id:
         query = query.filter(
             (Review.approved == True) | (Review.user_id == user_id)
@@ -179,27 +182,38 @@ def get_product_reviews(
     else:
         query = query.filter(Review.approved == True)
     
-    reviews = query.order_by(Review.created_at.desc(), Review.id.desc()).all()
+    rows = query.order_by(Review.created_at.desc(), Review.id.desc()).all()
 
-    # Prepare response with first_name and last_name
-    response_reviews = []
-    for review in reviews:
-        user = db.query(User).filter(User.id == review.user_id).first()
-        review_dict = {
-            "id": review.id,
-            "rating": review.rating,
-            "comment": review.comment,
-            "display_name": review.display_name,
-            "product_id": review.product_id,
-            "user_id": review.user_id,
-            "created_at": review.created_at,
-            "approved": review.approved,
-            "first_name": user.first_name if user else None,
-            "last_name": user.last_name if user else None
-        }
-        response_reviews.append(ReviewResponse(**review_dict))
+    return [
+        ReviewResponse(
+            id=review.id,
+            rating=review.rating,
+            comment=review.comment,
+            display_name=review.display_name,
+            product_id=review.product_id,
+            user_id=review.user_id,
+            created_at=review.created_at,
+            approved=review.approved,
+            first_name=first_name,
+            last_name=last_name,
+        )
+        for review, first_name, last_name in rows
+    ]
 
-    return response_reviews
+# Keyset page of reviews; pass back ``next_cursor`` for the following page
+@product_router.get("/{product_id}/reviews/page")
+def get_product_reviews_page(
+    product_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=50),
+    user_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    try:
+        reviews, next_cursor = review_page(db, product_id, cursor=cursor, limit=limit, viewer_user_id=user_id)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": [ReviewResponse(**r) for r in reviews], "next_cursor": next_cursor}
 
 # Create a review for a product
 @product_router.post("/{product_id}/reviews", response_model=ReviewResponse)
@@ -252,6 +266,7 @@ def create_product_review(
             pass
 
     db.add(review)
+    reviews_changed(db, product_id)
     db.commit()
     db.refresh(review)
 
@@ -296,6 +311,7 @@ def delete_product_review(
 
     # Delete the review
     db.delete(review)
+    reviews_changed(db, product_id)
     db.commit()
 
     return {"message": "Review deleted successfully"}
@@ -343,6 +359,7 @@ def update_product_review(
         if comment_changed:
             review.approved = False
 
+    reviews_changed(db, product_id)
     db.commit()
     db.refresh(review)
 
@@ -1,9 +1,9 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import text
 
 from app.database import get_db
 from app.models import Banner
+from app.services.app_settings import public_settings_response
 
 public_router = APIRouter(tags=["public"])
 
@@ -24,27 +24,6 @@ async def get_public_banners(db: Session = Depends(get_db)):
     ]
 
 @public_router.get("/settings")
-async def get_public_settings(db: Session = Depends(get_db)):
+async def get_public_settings(request: Request):
     """Get public settings for the storefront (no auth required)"""
-    try:
-        rows = db.execute(text("SELECT key, value FROM app_settings WHERE key IN ('all_category_image', 'all_category_label', 'fruit_category_image', 'fruit_category_label', 'veggie_category_image', 'veggie_category_label')"))
-        data = {row[0]: row[1] for row in rows}
-        return {
-            "all_category_image": data.get("all_category_image"),
-            "all_category_label": data.get("all_category_label", "همه"),
-            "fruit_category_image": data.get("fruit_category_image"),
-            "fruit_category_label": data.get("fruit_category_label", "میوه ها"),
-            "veggie_category_image": data.get("veggie_category_image"),
-            "veggie_category_label": data.get("veggie_category_label", "صیفی جات"),
-        }
-    except Exception as e:
-        # Return defaults if database error
-        return {
-            "all_category_image": None,
-            "all_category_label": "همه",
-            "fruit_category_image": None,
-            "fruit_category_label": "میوه ها",
-            "veggie_category_image": None,
-            "veggie_category_label": "صیفی جات",
-        }
-
+    return public_settings_response(request.headers.get("if-none-match"))
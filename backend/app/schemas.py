@@ -187,8 +187,9 @@ class ProductResponse(BaseModel):
     category_slug: Optional[str] = None
     subcategory: Optional[str] = None
     subcategory_slug: Optional[str] = None
-    image: str
+    image: Optional[str] = None
     in_stock: Optional[bool] = True
+    is_favorite: Optional[bool] = None
 
     @validator('image', pre=True, always=True)
     def set_image(cls, v, values):
@@ -244,12 +245,13 @@ class ProductDetailResponse(BaseModel):
     category_slug: Optional[str] = None
     subcategory: Optional[str] = None
     subcategory_slug: Optional[str] = None
-    image: str
+    image: Optional[str] = None
     images: List[str] = []
     in_stock: Optional[bool] = True
     group_buy_options: Optional[dict] = None
     store_id: Optional[int] = None
     store_name: Optional[str] = None
+    is_favorite: Optional[bool] = None
 
     @validator('image', pre=True, always=True)
     def set_image(cls, v, values):
@@ -637,10 +639,16 @@ class PopularSearchResponse(PopularSearchBase):
     id: int
     created_at: datetime
     updated_at: datetime
+    source: str = "curated"
 
     class Config:
         from_attributes = True
 
+class TrendingSearchResponse(BaseModel):
+    search_term: str
+    source: str = "trending"
+    recent_count: int
+
 # Telegram authentication schemas
 class TelegramLoginRequest(BaseModel):
     init_data: str
@@ -1,27 +1,72 @@
+"""
+AI support replies.
+
+Incoming support messages are handed to ``ai_reply_worker``, which runs on
+the app's event loop: a bounded queue, a fixed number of concurrent reply
+tasks, and per-user coalescing. Messages a user sends while their reply is
+queued or being written are folded into one reply. The LLM is called with
+an async HTTP call to the Chat Completions API (OPENAI_BASE_URL may point
+at any compatible server). A bare greeting gets the canned welcome and short
+FAQ-style questions are answered from the question alone, never the user's
+history, so the answer can be cached and shared without leaking one
+customer's context to another; the keyword replies are only a fallback when
+the model fails.
+"""
 from __future__ import annotations
 
-from typing import List, Optional
-from datetime import datetime
+import asyncio
+import logging
 import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 
+import httpx
 from sqlalchemy.orm import Session
 
 from app.database import SessionLocal
 from app.models import SupportMessage, User
 from app.utils.admin import ADMIN_PHONE_NUMBER
+from app.services.app_settings import settings_store
+from app.services.support_chat import add_message
+
+logger = logging.getLogger(__name__)
+
+AI_REPLY_QUEUE_SIZE = int(os.getenv("AI_REPLY_QUEUE_SIZE", "200"))
+AI_REPLY_CONCURRENCY = int(os.getenv("AI_REPLY_CONCURRENCY", "4"))
+# Wait this long after a user's first message so a quick follow-up joins the same reply
+AI_REPLY_COALESCE_SECONDS = float(os.getenv("AI_REPLY_COALESCE_SECONDS", "2"))
+_ANSWER_CACHE_SIZE = 500
+_ANSWER_CACHE_TTL_SECONDS = 6 * 3600
+# Questions up to this many words without digits (order numbers, amounts) count as FAQ-style
+_FAQ_MAX_WORDS = 8
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1"
+
+# One async HTTP client per event loop (its connection pool is bound to the loop);
+# the loop is kept alongside so its id can't be reused while the entry exists
+_http_clients: Dict[int, Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
 
 
-def _load_openai_client():
-    """Lazy import OpenAI client only if API key is present to avoid hard dependency."""
+def _openai_api_key() -> Optional[str]:
     # Load API key from environment variables only
-    api_key = os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_API_TOKEN")
-    if not api_key:
-        return None, None
-    try:
-        from openai import OpenAI  # type: ignore
-    except Exception:
-        return None, None
-    return OpenAI(api_key=api_key), api_key
+    return os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_API_TOKEN")
+
+
+def _http_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    entry = _http_clients.get(id(loop))
+    if entry is None:
+        entry = _http_clients[id(loop)] = (loop, httpx.AsyncClient(timeout=20))
+    return entry[1]
+
+
+async def close_http_client() -> None:
+    """Close this loop's client; call before a short-lived loop (``asyncio.run``) ends."""
+    entry = _http_clients.pop(id(asyncio.get_running_loop()), None)
+    if entry is not None:
+        await entry[1].aclose()
 
 
 SYSTEM_PROMPT = (
@@ -31,77 +76,95 @@ SYSTEM_PROMPT = (
 )
 
 def is_ai_enabled() -> bool:
-    """Check database setting and env flag to enable/disable AI replies globally."""
-    # Check database setting first
-    try:
-        from sqlalchemy import text
-        db = SessionLocal()
-        try:
-            result = db.execute(text("SELECT value FROM app_settings WHERE key = 'ai_chatbot_enabled'"))
-            row = result.fetchone()
-            if row:
-                db_flag = (row[0] or "").strip().lower()
-                enabled = db_flag in ("1", "true", "yes", "on")
-                print(f"[AI Chatbot] Database setting found: {row[0]} -> enabled: {enabled}")
-                return enabled
-            else:
-                print(f"[AI Chatbot] No database setting found for ai_chatbot_enabled")
-        finally:
-            db.close()
-    except Exception as e:
-        print(f"[AI Chatbot] Database check failed: {e}")
-        pass
-    
-    # Fallback to environment variable
+    """Admin toggle (app_settings snapshot), falling back to the AI_SUPPORT_ENABLED env flag."""
+    enabled = settings_store.get("ai_chatbot_enabled")
+    if enabled is not None:
+        return enabled
     flag = (os.getenv("AI_SUPPORT_ENABLED") or "").strip().lower()
-    enabled = flag in ("1", "true", "yes", "on")
-    print(f"[AI Chatbot] Environment variable fallback: {flag} -> enabled: {enabled}")
-    return enabled
+    return flag in ("1", "true", "yes", "on")
 
 
-def _build_messages_context(history: List[dict[str, str]], user_text: str) -> List[dict[str, str]]:
+def _build_messages_context(history: List[dict[str, str]]) -> List[dict[str, str]]:
+    """System prompt plus the recent thread, which already ends with the user's new message(s)."""
     messages: List[dict[str, str]] = [{"role": "system", "content": SYSTEM_PROMPT}]
     # Keep last ~8 turns for brevity
-    for h in history[-16:]:
-        messages.append(h)
-    messages.append({"role": "user", "content": user_text})
+    messages.extend(history[-16:])
     return messages
 
 
-def _generate_reply_with_openai(user_text: str, history: List[dict[str, str]]) -> Optional[str]:
-    client, api_key = _load_openai_client()
-    if not client or not api_key:
+async def _generate_reply_with_openai(history: List[dict[str, str]]) -> Optional[str]:
+    """Chat Completions call over plain HTTP (any OpenAI-compatible server via OPENAI_BASE_URL)."""
+    api_key = _openai_api_key()
+    if not api_key:
         return None
     model = os.getenv("AI_MODEL", "gpt-4o-mini")
     try:
-        resp = client.chat.completions.create(
-            model=model,
-            messages=_build_messages_context(history, user_text),
-            temperature=0.4,
-            max_tokens=300,
+        response = await _http_client().post(
+            f"{OPENAI_BASE_URL.rstrip('/')}/chat/completions",
+            headers={"Authorization": f"Bearer {api_key}"},
+            json={
+                "model": model,
+                "messages": _build_messages_context(history),
+                "temperature": 0.4,
+                "max_tokens": 300,
+            },
         )
-        return (resp.choices[0].message.content or "").strip()
-    except Exception:
+        response.raise_for_status()
+        return (response.json()["choices"][0]["message"]["content"] or "").strip()
+    except Exception as e:
+        logger.warning(f"AI reply generation failed: {e}")
         return None
 
 
-def _fallback_rule_based_reply(user_text: str) -> str:
+_GREETING_REPLY = "سلام و درود! من دستیار هوش مصنوعی بهام هستم. چطور می‌تونم کمکتون کنم؟"
+# (keywords, canned reply), checked in order
+_FAQ_REPLIES = [
+    (["پرداخت", "payment", "authority", "ref id", "رسید"],
+     "سلام! برای بررسی وضعیت پرداخت، لطفاً شماره سفارش یا کد پیگیری پرداخت را بفرمایید."),
+    (["ارسال", "delivery", "تحویل", "پیک"],
+     "سلام! زمان تحویل بسته به آدرس شما متفاوت است. لطفاً شهر/منطقه خود را بفرمایید تا دقیق‌تر راهنمایی کنم."),
+    (["سفارش", "order", "پیگیری"],
+     "سلام! برای پیگیری سفارش، لطفاً شماره سفارش را ارسال کنید تا وضعیت را بررسی کنم."),
+    (["بازگشت", "refund", "مرجوع", "استرداد"],
+     "سلام! درخواست بازگشت وجه/مرجوعی را می‌توانید ثبت کنید. لطفاً شماره سفارش و شرح کوتاه مشکل را بفرمایید."),
+    (["سلام", "hello", "hi", "درود"], _GREETING_REPLY),
+]
+_GENERIC_REPLY = (
+    "سلام! سوال شما را دریافت کردم. من دستیار هوش مصنوعی بهام هستم و آماده کمک به شما در مورد سفارشات، "
+    "پرداخت‌ها و خدمات ما هستم. لطفاً کمی بیشتر توضیح دهید تا بهتر بتونم راهنمایی‌تون کنم."
+)
+# Whole-message greetings answered without the model
+_GREETINGS = {"سلام", "درود", "hello", "hi", "hey", "salam"}
+_DIGITS = re.compile(r"[0-9۰-۹٠-٩]")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def _faq_key(user_text: str) -> Optional[str]:
+    """Normalized text if the message is a short question with nothing user-specific in it."""
+    text = _PUNCTUATION.sub(" ", (user_text or "").lower())
+    words = text.split()
+    if not words or len(words) > _FAQ_MAX_WORDS or _DIGITS.search(text):
+        return None
+    return " ".join(words)
+
+
+def _greeting_reply(key: str) -> Optional[str]:
+    """Canned welcome when every word of the normalized message is a greeting."""
+    if all(word in _GREETINGS for word in key.split()):
+        return _GREETING_REPLY
+    return None
+
+
+def _canned_reply(user_text: str) -> Optional[str]:
     text = (user_text or "").lower()
-    print(f"[AI Chatbot] Generating fallback response for: {text}")
-    
-    # Extremely simple heuristics (fa and en keywords)
-    if any(k in text for k in ["پرداخت", "payment", "authority", "ref id", "رسید"]):
-        return "سلام! برای بررسی وضعیت پرداخت، لطفاً شماره سفارش یا کد پیگیری پرداخت را بفرمایید."
-    if any(k in text for k in ["ارسال", "delivery", "تحویل", "پیک"]):
-        return "سلام! زمان تحویل بسته به آدرس شما متفاوت است. لطفاً شهر/منطقه خود را بفرمایید تا دقیق‌تر راهنمایی کنم."
-    if any(k in text for k in ["سفارش", "order", "پیگیری"]):
-        return "سلام! برای پیگیری سفارش، لطفاً شماره سفارش را ارسال کنید تا وضعیت را بررسی کنم."
-    if any(k in text for k in ["بازگشت", "refund", "مرجوع", "استرداد"]):
-        return "سلام! درخواست بازگشت وجه/مرجوعی را می‌توانید ثبت کنید. لطفاً شماره سفارش و شرح کوتاه مشکل را بفرمایید."
-    if any(k in text for k in ["سلام", "hello", "hi", "درود"]):
-        return "سلام و درود! من دستیار هوش مصنوعی بهام هستم. چطور می‌تونم کمکتون کنم؟"
-    
-    return "سلام! سوال شما را دریافت کردم. من دستیار هوش مصنوعی بهام هستم و آماده کمک به شما در مورد سفارشات، پرداخت‌ها و خدمات ما هستم. لطفاً کمی بیشتر توضیح دهید تا بهتر بتونم راهنمایی‌تون کنم."
+    for keywords, reply in _FAQ_REPLIES:
+        if any(k in text for k in keywords):
+            return reply
+    return None
+
+
+def _fallback_rule_based_reply(user_text: str) -> str:
+    return _canned_reply(user_text) or _GENERIC_REPLY
 
 
 def _fetch_conversation_history(db: Session, admin_id: int, user_id: int, limit: int = 20) -> List[dict[str, str]]:
@@ -111,79 +174,233 @@ def _fetch_conversation_history(db: Session, admin_id: int, user_id: int, limit:
             ((SupportMessage.sender_id == user_id) & (SupportMessage.receiver_id == admin_id))
             | ((SupportMessage.sender_id == admin_id) & (SupportMessage.receiver_id == user_id))
         )
-        .order_by(SupportMessage.timestamp.asc())
+        .order_by(SupportMessage.id.desc())
+        .limit(limit)
         .all()
     )
     history: List[dict[str, str]] = []
-    for r in rows[-limit:]:
+    for r in reversed(rows):
         role = "assistant" if r.sender_id == admin_id else "user"
         history.append({"role": role, "content": r.message})
     return history
 
 
-def maybe_reply_to_user(user_id: int, user_text: str) -> None:
-    """Background task: generate an AI reply and save it as an admin message.
+def _load_context(user_id: int) -> Tuple[Optional[int], List[dict[str, str]]]:
+    db = SessionLocal()
+    try:
+        admin: Optional[User] = db.query(User).filter(User.phone_number == ADMIN_PHONE_NUMBER).first()
+        if not admin:
+            return None, []
+        return admin.id, _fetch_conversation_history(db, admin.id, user_id)
+    finally:
+        db.close()
 
-    Safe to no-op if admin user or AI provider not configured.
-    """
-    print(f"[AI Chatbot] Checking if AI is enabled...")
-    if not is_ai_enabled():
-        print(f"[AI Chatbot] AI is disabled, skipping response")
-        return
-    
-    print(f"[AI Chatbot] AI is enabled, processing message from user {user_id}: {user_text}")
-    
-    # Create independent session for background task
-    db: Session = SessionLocal()
+
+def _save_reply(admin_id: int, user_id: int, reply: str) -> None:
+    db = SessionLocal()
     try:
-        # Lookup admin by configured phone number
-        phone = ADMIN_PHONE_NUMBER
-        if not phone:
-            print(f"[AI Chatbot] No admin phone number configured")
+        add_message(db, admin_id, user_id, "admin", reply)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class AIReplyWorker:
+    """Bounded queue of users awaiting a reply, drained by ``concurrency`` tasks.
+
+    ``_pending`` holds the texts not yet answered per user; a user is in the
+    queue at most once and is never handled by two tasks at a time, so a
+    burst of messages gets one reply. A user only enters the queue once their
+    coalescing window has passed (a loop timer), so waiting for follow-ups
+    never occupies one of the reply tasks.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = AI_REPLY_QUEUE_SIZE,
+        concurrency: int = AI_REPLY_CONCURRENCY,
+        coalesce_seconds: float = AI_REPLY_COALESCE_SECONDS,
+    ):
+        self.queue_size = queue_size
+        self.concurrency = concurrency
+        self.coalesce_seconds = coalesce_seconds
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Dict[int, Tuple[float, List[str]]] = {}  # user_id -> (first message at, texts)
+        self._inflight: set[int] = set()
+        self._answers: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.stats = {
+            "submitted": 0, "coalesced": 0, "dropped": 0, "replied": 0, "failed": 0,
+            "llm_calls": 0, "canned": 0, "cache_hits": 0, "busy_seconds": 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def submit(self, user_id: int, user_text: str) -> bool:
+        """Queue a reply to the user's message; safe to call from request threads.
+
+        Returns False if the worker isn't running (the caller may reply inline).
+        """
+        loop = self._loop
+        if not self._tasks or loop is None or loop.is_closed():
+            return False
+        loop.call_soon_threadsafe(self._enqueue, user_id, user_text)
+        return True
+
+    def _enqueue(self, user_id: int, user_text: str) -> None:
+        self.stats["submitted"] += 1
+        pending = self._pending.get(user_id)
+        if pending is not None:
+            pending[1].append(user_text)
+            self.stats["coalesced"] += 1
             return
-        admin: Optional[User] = db.query(User).filter(User.phone_number == phone).first()
-        if not admin:
-            print(f"[AI Chatbot] Admin user not found with phone: {phone}")
+        if user_id not in self._inflight and len(self._pending) >= self.queue_size:
+            self.stats["dropped"] += 1
+            logger.warning(f"AI reply queue full, not answering user {user_id}")
             return
+        self._pending[user_id] = (time.monotonic(), [user_text])
+        # A user whose reply is being written is re-queued when that finishes
+        if user_id not in self._inflight:
+            self._schedule(user_id)
 
-        print(f"[AI Chatbot] Admin found: {admin.id}")
-        
-        history = _fetch_conversation_history(db, admin.id, user_id)
-        print(f"[AI Chatbot] Conversation history loaded: {len(history)} messages")
-        
-        # Try OpenAI first, then fallback
-        ai_text = _generate_reply_with_openai(user_text, history)
-        if not ai_text:
-            print(f"[AI Chatbot] OpenAI failed, using fallback")
-            ai_text = _fallback_rule_based_reply(user_text)
-        else:
-            print(f"[AI Chatbot] OpenAI response generated")
-        
-        # Force fallback for now since OpenAI has billing issues
-        if not ai_text or "billing" in str(ai_text).lower():
-            print(f"[AI Chatbot] Forcing fallback response")
-            ai_text = _fallback_rule_based_reply(user_text)
-
-        if ai_text and ai_text.strip():
-            print(f"[AI Chatbot] Saving AI response: {ai_text}")
-            row = SupportMessage(
-                sender_id=admin.id,
-                receiver_id=user_id,
-                message=ai_text.strip(),
-                timestamp=datetime.utcnow(),
-            )
-            db.add(row)
-            db.commit()
-            print(f"[AI Chatbot] AI response saved successfully")
-        else:
-            print(f"[AI Chatbot] No AI response generated")
-    except Exception as e:
-        print(f"[AI Chatbot] Error: {e}")
+    def _schedule(self, user_id: int) -> None:
+        """Queue the user when their coalescing window ends."""
+        first_at, _ = self._pending[user_id]
+        wait = max(0.0, first_at + self.coalesce_seconds - time.monotonic())
+        self._loop.call_later(wait, self._release, user_id)
+
+    def _release(self, user_id: int) -> None:
+        if user_id not in self._pending or not self._tasks:
+            return
         try:
-            db.rollback()
-        except Exception:
-            pass
-    finally:
-        db.close()
+            self._queue.put_nowait(user_id)
+        except asyncio.QueueFull:
+            self._pending.pop(user_id, None)
+            self.stats["dropped"] += 1
+
+    async def _work(self) -> None:
+        while True:
+            user_id = await self._queue.get()
+            try:
+                _, texts = self._pending.pop(user_id, (0, []))
+                if not texts:
+                    continue
+                self._inflight.add(user_id)
+                started = time.monotonic()
+                try:
+                    await self.reply(user_id, texts)
+                    self.stats["replied"] += 1
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    logger.error(f"AI reply to user {user_id} failed: {e}")
+                finally:
+                    self.stats["busy_seconds"] += time.monotonic() - started
+                    self._inflight.discard(user_id)
+                    if user_id in self._pending:
+                        self._schedule(user_id)
+            finally:
+                self._queue.task_done()
 
+    def _cached_answer(self, key: str) -> Optional[str]:
+        entry = self._answers.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > _ANSWER_CACHE_TTL_SECONDS:
+            del self._answers[key]
+            return None
+        self._answers.move_to_end(key)
+        return entry[1]
 
+    def _remember_answer(self, key: str, answer: str) -> None:
+        self._answers[key] = (time.monotonic(), answer)
+        self._answers.move_to_end(key)
+        while len(self._answers) > _ANSWER_CACHE_SIZE:
+            self._answers.popitem(last=False)
+
+    async def generate(self, user_text: str, history: List[dict[str, str]]) -> str:
+        """Canned greeting or cached answer for FAQ-style questions, otherwise the LLM, otherwise rules.
+
+        FAQ-style questions go to the model without ``history``: their answer is
+        cached under the question and served to every user who asks it.
+        """
+        key = _faq_key(user_text)
+        if key:
+            canned = _greeting_reply(key)
+            if canned:
+                self.stats["canned"] += 1
+                return canned
+            cached = self._cached_answer(key)
+            if cached:
+                self.stats["cache_hits"] += 1
+                return cached
+        self.stats["llm_calls"] += 1
+        question = [{"role": "user", "content": user_text}]
+        ai_text = await _generate_reply_with_openai(question if key else (history or question))
+        # OpenAI billing errors come back as text; don't forward them
+        if not ai_text or "billing" in ai_text.lower():
+            return _fallback_rule_based_reply(user_text)
+        if key:
+            self._remember_answer(key, ai_text)
+        return ai_text
+
+    async def reply(self, user_id: int, texts: List[str]) -> None:
+        if not await asyncio.to_thread(is_ai_enabled):
+            return
+        admin_id, history = await asyncio.to_thread(_load_context, user_id)
+        if admin_id is None:
+            logger.warning(f"Admin user not found with phone: {ADMIN_PHONE_NUMBER}")
+            return
+        reply = await self.generate("\n".join(dict.fromkeys(texts)), history)
+        if reply and reply.strip():
+            await asyncio.to_thread(_save_reply, admin_id, user_id, reply.strip())
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "busy_seconds": round(self.stats["busy_seconds"], 2),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "pending": len(self._pending),
+            "in_flight": len(self._inflight),
+            "cached_answers": len(self._answers),
+            "concurrency": self.concurrency,
+            "running": self.running,
+        }
+
+
+ai_reply_worker = AIReplyWorker()
+
+
+def maybe_reply_to_user(user_id: int, user_text: str) -> None:
+    """Queue an AI reply to the user's message.
+
+    Without a running worker (scripts, tests without lifespan) the reply is
+    generated inline in the calling thread.
+    """
+    if ai_reply_worker.submit(user_id, user_text):
+        return
+
+    async def reply_inline() -> None:
+        try:
+            await ai_reply_worker.reply(user_id, [user_text])
+        finally:
+            await close_http_client()
+
+    try:
+        asyncio.run(reply_inline())
+    except Exception as e:
+        logger.error(f"AI reply to user {user_id} failed: {e}")
@@ -0,0 +1,264 @@
+"""
+App Settings Service
+Typed, cached view of the ``app_settings`` key/value table.
+
+Every known key is declared in SETTINGS with its type, default and whether
+the storefront may see it. Each worker keeps one immutable snapshot of the
+whole table; hot paths read it with ``settings_store.get()`` without
+touching the database.
+
+Writes go through ``settings_store.update()``, which bumps the
+``_settings_version`` row in the same transaction. Other workers compare
+that row with their snapshot at most once per VERSION_CHECK_SECONDS and
+reload when it moved; a full reload every RELOAD_SECONDS also picks up
+rows written behind the service's back (scripts, manual SQL).
+
+``VersionRow`` is that mechanism on its own, for other per-process caches
+(favorites, review summaries) that need the same cross-worker invalidation.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "_settings_version"
+VERSION_CHECK_SECONDS = 1.0
+RELOAD_SECONDS = 60.0
+
+
+@dataclass(frozen=True)
+class SettingSpec:
+    type: type = str
+    default: Any = None
+    public: bool = False
+
+
+SETTINGS: Dict[str, SettingSpec] = {
+    "all_category_image": SettingSpec(public=True),
+    "all_category_label": SettingSpec(default="همه", public=True),
+    "fruit_category_image": SettingSpec(public=True),
+    "fruit_category_label": SettingSpec(default="میوه ها", public=True),
+    "veggie_category_image": SettingSpec(public=True),
+    "veggie_category_label": SettingSpec(default="صیفی جات", public=True),
+    "ai_chatbot_enabled": SettingSpec(type=bool, default=None),
+}
+# Keys matching these share one spec (per-category icons set in the admin panel)
+PATTERN_SETTINGS = [
+    (re.compile(r"^category_\d+_image$"), SettingSpec()),
+]
+
+_TRUE = ("1", "true", "yes", "on")
+
+
+def spec_for(key: str) -> Optional[SettingSpec]:
+    spec = SETTINGS.get(key)
+    if spec is not None:
+        return spec
+    for pattern, pattern_spec in PATTERN_SETTINGS:
+        if pattern.match(key):
+            return pattern_spec
+    return None
+
+
+def _coerce(spec: SettingSpec, raw: Optional[str]) -> Any:
+    if raw is None:
+        return spec.default
+    if spec.type is bool:
+        return raw.strip().lower() in _TRUE
+    if spec.type is int:
+        try:
+            return int(raw)
+        except ValueError:
+            return spec.default
+    return raw
+
+
+def _etag(payload: Mapping[str, Any]) -> str:
+    digest = hashlib.sha1(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+    return f'W/"{digest[:16]}"'
+
+
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    version: int
+    raw: Dict[str, str]
+    public: Dict[str, Any] = field(default_factory=dict)
+    public_etag: str = ""
+    loaded_at: float = 0.0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        spec = spec_for(key)
+        raw = self.raw.get(key)
+        if spec is None:
+            return raw if raw is not None else default
+        value = _coerce(spec, raw)
+        return default if value is None else value
+
+
+class VersionRow:
+    """A counter row in ``app_settings`` that writers bump inside their own transaction.
+
+    A per-process cache calls ``changed()`` before serving; it reads the row
+    at most once per VERSION_CHECK_SECONDS and returns True when the row moved
+    since the last read (or on the first call), meaning the cache must be dropped.
+    """
+
+    _table_checked = False
+
+    def __init__(self, key: str):
+        if not key.startswith("_"):
+            raise ValueError("Version keys must start with '_' so settings ignore them")
+        self.key = key
+        self._lock = threading.Lock()
+        self._seen: Optional[int] = None
+        self._checked_at = 0.0
+
+    @classmethod
+    def _ensure_table(cls, db: Session) -> None:
+        # main.py creates it at startup; scripts on a fresh database may not have run that
+        if not cls._table_checked:
+            db.execute(text("CREATE TABLE IF NOT EXISTS app_settings (key TEXT PRIMARY KEY, value TEXT)"))
+            cls._table_checked = True
+
+    def read(self, db: Session) -> int:
+        self._ensure_table(db)
+        row = db.execute(text("SELECT value FROM app_settings WHERE key = :k"), {"k": self.key}).fetchone()
+        try:
+            return int(row[0]) if row else 0
+        except (TypeError, ValueError):
+            return 0
+
+    def bump(self, db: Session) -> None:
+        """Increment the row. Does not commit."""
+        self._ensure_table(db)
+        db.execute(
+            text("INSERT INTO app_settings(key, value) VALUES (:k, '1') "
+                 "ON CONFLICT(key) DO UPDATE SET value = CAST(CAST(app_settings.value AS INTEGER) + 1 AS TEXT)"),
+            {"k": self.key},
+        )
+
+    def changed(self, db: Session) -> bool:
+        if self._seen is not None and time.monotonic() - self._checked_at < VERSION_CHECK_SECONDS:
+            return False
+        with self._lock:
+            if self._seen is not None and time.monotonic() - self._checked_at < VERSION_CHECK_SECONDS:
+                return False
+            version = self.read(db)
+            moved = version != self._seen
+            self._seen = version
+            self._checked_at = time.monotonic()
+            return moved
+
+
+class SettingsStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[SettingsSnapshot] = None
+        self._checked_at = 0.0
+        self._version = VersionRow(VERSION_KEY)
+
+    def _session(self) -> Session:
+        from app.database import SessionLocal
+        return SessionLocal()
+
+    def _load(self, db: Session) -> SettingsSnapshot:
+        rows = db.execute(text("SELECT key, value FROM app_settings")).fetchall()
+        raw = {k: v for k, v in rows if not k.startswith("_") and v is not None}
+        try:
+            version = int(next((v for k, v in rows if k == VERSION_KEY), 0) or 0)
+        except ValueError:
+            version = 0
+        public = {key: _coerce(spec, raw.get(key)) for key, spec in SETTINGS.items() if spec.public}
+        return SettingsSnapshot(version=version, raw=raw, public=public, public_etag=_etag(public),
+                                loaded_at=time.monotonic())
+
+    def snapshot(self) -> SettingsSnapshot:
+        """Current snapshot; at most one cheap version check per VERSION_CHECK_SECONDS."""
+        snap = self._snapshot
+        now = time.monotonic()
+        if snap is not None and now - self._checked_at < VERSION_CHECK_SECONDS:
+            return snap
+        with self._lock:
+            snap = self._snapshot
+            if snap is not None and time.monotonic() - self._checked_at < VERSION_CHECK_SECONDS:
+                return snap
+            db = self._session()
+            try:
+                if snap is None or now - snap.loaded_at > RELOAD_SECONDS or self._version.read(db) != snap.version:
+                    snap = self._snapshot = self._load(db)
+            except Exception as e:
+                # Table missing or DB unavailable: serve defaults (or the last good snapshot)
+                logger.warning(f"Failed to load app settings: {e}")
+                if snap is None:
+                    defaults = {key: spec.default for key, spec in SETTINGS.items() if spec.public}
+                    snap = self._snapshot = SettingsSnapshot(
+                        version=-1, raw={}, public=defaults, public_etag=_etag(defaults), loaded_at=time.monotonic()
+                    )
+            finally:
+                db.close()
+            self._checked_at = time.monotonic()
+            return snap
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Typed value of ``key`` (spec default when unset)."""
+        return self.snapshot().get(key, default)
+
+    def public_payload(self) -> Tuple[Dict[str, Any], str]:
+        """Storefront settings and their ETag."""
+        snap = self.snapshot()
+        return snap.public, snap.public_etag
+
+    def admin_payload(self) -> Dict[str, Any]:
+        """Everything the admin panel edits: declared keys plus per-category images."""
+        snap = self.snapshot()
+        result = {key: snap.get(key) for key in SETTINGS}
+        # The admin form has always shown the toggle as a string
+        result["ai_chatbot_enabled"] = snap.raw.get("ai_chatbot_enabled", "false")
+        for key, value in snap.raw.items():
+            if key not in SETTINGS and spec_for(key) is not None:
+                result[key] = value
+        return result
+
+    def update(self, db: Session, updates: Mapping[str, Optional[str]]) -> SettingsSnapshot:
+        """Write ``updates`` (None or "" deletes the key) and bump the version. Commits."""
+        for key, value in updates.items():
+            if key.startswith("_"):
+                raise ValueError(f"Reserved setting key: {key}")
+            if value is None or value == "":
+                db.execute(text("DELETE FROM app_settings WHERE key = :k"), {"k": key})
+            else:
+                db.execute(
+                    text("INSERT INTO app_settings(key, value) VALUES (:k, :v) "
+                         "ON CONFLICT(key) DO UPDATE SET value = excluded.value"),
+                    {"k": key, "v": str(value)},
+                )
+        self._version.bump(db)
+        db.commit()
+        with self._lock:
+            self._snapshot = self._load(db)
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+
+settings_store = SettingsStore()
+
+
+def public_settings_response(if_none_match: Optional[str]):
+    """GET /settings body with its ETag; 304 when the client already has this version."""
+    from fastapi import Response
+    from fastapi.responses import JSONResponse
+
+    payload, etag = settings_store.public_payload()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload, headers=headers)
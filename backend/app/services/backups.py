@@ -0,0 +1,385 @@
+"""
+Database Backups
+Consistent online snapshots with incremental storage, checksums, verify and restore.
+
+SQLite: the live database is copied with SQLite's online backup API,
+PAGES_PER_STEP pages at a time, inside one read transaction on the source.
+The copy is a consistent snapshot that does not restart when the app
+writes, and in WAL mode writers keep committing while it runs. The snapshot is
+then packed by a separate process into the chunk store
+(utils/backup_store.py), which only writes chunks no earlier backup has,
+so repeated backups of a slowly changing database stay small. A JSON
+manifest records the chunk list and the SHA-256 of the whole file.
+
+PostgreSQL: ``pg_dump --format=custom`` (compressed by pg_dump itself) and
+the SHA-256 of the dump; restore goes through ``pg_restore``.
+
+Layout under BACKUP_DIR:
+    manifests/<id>.json
+    chunks/<aa>/<sha256>        (SQLite)
+    dumps/<id>.dump             (PostgreSQL)
+"""
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.engine.url import URL, make_url
+
+from app.utils.backup_store import COMPRESS_LEVEL, DEFAULT_CHUNK_SIZE, file_sha256, pack_file, unpack_chunks
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+STEP_PAUSE_SECONDS = float(os.getenv("BACKUP_STEP_PAUSE_MS", "5")) / 1000
+CHUNK_SIZE = int(os.getenv("BACKUP_CHUNK_KB", str(DEFAULT_CHUNK_SIZE // 1024))) * 1024
+COMPRESS = int(os.getenv("BACKUP_COMPRESS_LEVEL", str(COMPRESS_LEVEL)))
+KEEP_BACKUPS = int(os.getenv("BACKUP_KEEP", "14"))
+ID_FORMAT = "%Y%m%dT%H%M%S%fZ"
+
+
+def backup_dir() -> Path:
+    return Path(os.getenv("BACKUP_DIR") or BACKEND_DIR / "backups")
+
+
+def _database_url(database_url: Optional[str]) -> str:
+    if database_url:
+        return database_url
+    from app.database import DATABASE_URL
+    return DATABASE_URL
+
+
+def _engine_kind(database_url: str) -> str:
+    backend = make_url(database_url).get_backend_name()
+    if backend not in ("sqlite", "postgresql"):
+        raise ValueError(f"Backups are not supported for {backend}")
+    return backend
+
+
+def _new_id(root: Path) -> str:
+    """Fixed-width UTC timestamp with microseconds, after every existing id.
+
+    Listing, pruning and parent selection sort ids as strings, so a new id
+    must sort after all earlier ones even within one second or if the clock
+    stepped back.
+    """
+    backup_id = datetime.utcnow().strftime(ID_FORMAT)
+    newest = max((path.stem for path in (root / "manifests").glob("*.json")), default="")
+    if backup_id <= newest:
+        try:
+            backup_id = (datetime.strptime(newest, ID_FORMAT) + timedelta(microseconds=1)).strftime(ID_FORMAT)
+        except ValueError:
+            # Newest is in the old second-precision format
+            backup_id = newest + "-1"
+    return backup_id
+
+
+def _write_manifest(root: Path, manifest: Dict[str, Any]) -> None:
+    path = root / "manifests" / f"{manifest['id']}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1))
+    os.replace(tmp, path)
+
+
+def load_manifest(backup_id: str, directory: Optional[Path] = None) -> Dict[str, Any]:
+    root = directory or backup_dir()
+    if not backup_id or "/" in backup_id or "\\" in backup_id or backup_id.startswith("."):
+        raise ValueError(f"Invalid backup id: {backup_id}")
+    path = root / "manifests" / f"{backup_id}.json"
+    if not path.exists():
+        raise LookupError(f"Backup {backup_id} not found")
+    return json.loads(path.read_text())
+
+
+def list_backups(directory: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """Manifests newest first, without their chunk lists."""
+    root = directory or backup_dir()
+    manifests = []
+    for path in sorted((root / "manifests").glob("*.json"), reverse=True):
+        manifest = json.loads(path.read_text())
+        manifest.pop("chunks", None)
+        manifests.append(manifest)
+    return manifests
+
+
+# ---- SQLite ----------------------------------------------------------------------
+
+def _sqlite_snapshot(source: str, target: Path, pages_per_step: int, step_pause: float) -> Dict[str, Any]:
+    """Online backup of ``source`` into ``target`` in page steps; returns timing stats."""
+    src = sqlite3.connect(source, isolation_level=None, timeout=30)
+    dst = sqlite3.connect(str(target))
+    steps = 0
+    max_step = 0.0
+    last = time.perf_counter()
+
+    def progress(status, remaining, total):
+        nonlocal steps, max_step, last
+        now = time.perf_counter()
+        steps += 1
+        max_step = max(max_step, now - last)
+        if step_pause and remaining:
+            time.sleep(step_pause)
+        last = time.perf_counter()
+
+    started = time.perf_counter()
+    try:
+        # One read transaction: a fixed snapshot the copy never has to restart on
+        src.execute("BEGIN")
+        src.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        src.backup(dst, pages=pages_per_step, progress=progress)
+        src.execute("COMMIT")
+        page_size = dst.execute("PRAGMA page_size").fetchone()[0]
+        page_count = dst.execute("PRAGMA page_count").fetchone()[0]
+        # The copy keeps the source's journal mode; store it as a plain rollback-journal file
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dst.close()
+        src.close()
+    return {
+        "page_size": page_size,
+        "pages": page_count,
+        "steps": steps,
+        "snapshot_seconds": round(time.perf_counter() - started, 3),
+        "max_step_ms": round(max_step * 1000, 2),
+    }
+
+
+def _pack_in_subprocess(snapshot: Path, store: Path, chunk_size: int) -> Dict[str, Any]:
+    # spawn, not fork: the caller may be a multi-threaded web worker
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(pack_file, str(snapshot), str(store), chunk_size, COMPRESS).result()
+
+
+def _backup_sqlite(
+    database_url: str, root: Path, backup_id: str, pages_per_step: int, step_pause: float, chunk_size: int
+) -> Dict[str, Any]:
+    source = make_url(database_url).database
+    if not source or source == ":memory:" or not os.path.exists(source):
+        raise ValueError(f"SQLite database not found: {source}")
+    staging = root / "tmp"
+    staging.mkdir(parents=True, exist_ok=True)
+    snapshot = staging / f"{backup_id}.db"
+    try:
+        stats = _sqlite_snapshot(source, snapshot, pages_per_step, step_pause)
+        packed = _pack_in_subprocess(snapshot, root / "chunks", chunk_size)
+    finally:
+        snapshot.unlink(missing_ok=True)
+    stats.update(packed)
+    stats["source"] = source
+    return stats
+
+
+def _restore_sqlite_file(root: Path, manifest: Dict[str, Any], target: Path) -> Dict[str, Any]:
+    """Rebuild the snapshot at ``target`` (a new file), checking chunk and file checksums."""
+    with open(target, "wb") as out:
+        digest = unpack_chunks(root / "chunks", manifest["chunks"], out)
+        out.flush()
+        os.fsync(out.fileno())
+    if digest != manifest["sha256"]:
+        raise ValueError("Snapshot checksum mismatch")
+    conn = sqlite3.connect(str(target))
+    try:
+        integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+    if integrity != "ok":
+        raise ValueError(f"Integrity check failed: {integrity}")
+    return {"size": manifest["size"], "sha256": digest, "integrity": integrity}
+
+
+# ---- PostgreSQL --------------------------------------------------------------------
+
+def _pg_args(database_url: str):
+    """libpq connection URI without the password, and the env carrying it."""
+    url = make_url(database_url)
+    env = dict(os.environ)
+    if url.password:
+        env["PGPASSWORD"] = str(url.password)
+    uri = URL.create(
+        "postgresql", username=url.username, host=url.host, port=url.port, database=url.database, query=url.query,
+    ).render_as_string(hide_password=False)
+    return uri, env
+
+
+def _run_tool(args: List[str], env: Dict[str, str]) -> None:
+    tool = args[0]
+    if shutil.which(tool) is None:
+        raise RuntimeError(f"{tool} is not installed")
+    proc = subprocess.run(args, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{tool} failed: {proc.stderr.strip()[-1000:]}")
+
+
+def _backup_postgres(database_url: str, root: Path, backup_id: str) -> Dict[str, Any]:
+    uri, env = _pg_args(database_url)
+    dump = root / "dumps" / f"{backup_id}.dump"
+    dump.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dump.with_suffix(".tmp")
+    started = time.perf_counter()
+    try:
+        _run_tool(["pg_dump", "--format=custom", "--compress=6", "--no-owner", f"--file={tmp}", f"--dbname={uri}"], env)
+        os.replace(tmp, dump)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return {
+        "source": make_url(database_url).render_as_string(hide_password=True),
+        "dump": dump.name,
+        "size": dump.stat().st_size,
+        "stored_bytes": dump.stat().st_size,
+        "sha256": file_sha256(dump),
+        "snapshot_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+# ---- Public API --------------------------------------------------------------------
+
+def create_backup(
+    database_url: Optional[str] = None,
+    directory: Optional[Path] = None,
+    pages_per_step: int = PAGES_PER_STEP,
+    step_pause: float = STEP_PAUSE_SECONDS,
+    chunk_size: int = CHUNK_SIZE,
+) -> Dict[str, Any]:
+    """Back up the database and write its manifest; returns the manifest (without chunks)."""
+    database_url = _database_url(database_url)
+    kind = _engine_kind(database_url)
+    root = directory or backup_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    backup_id = _new_id(root)
+    previous = list_backups(root)
+    started = time.perf_counter()
+    if kind == "sqlite":
+        stats = _backup_sqlite(database_url, root, backup_id, pages_per_step, step_pause, chunk_size)
+    else:
+        stats = _backup_postgres(database_url, root, backup_id)
+    elapsed = time.perf_counter() - started
+    manifest = {
+        "id": backup_id,
+        "engine": kind,
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "parent": previous[0]["id"] if previous and kind == "sqlite" else None,
+        "seconds": round(elapsed, 3),
+        "mb_per_second": round(stats["size"] / 1e6 / elapsed, 1) if elapsed else None,
+        **stats,
+    }
+    _write_manifest(root, manifest)
+    manifest.pop("chunks", None)
+    logger.info(
+        f"Backup {backup_id}: {stats['size'] / 1e6:.1f} MB in {elapsed:.1f}s, "
+        f"{stats['stored_bytes'] / 1e6:.1f} MB stored"
+    )
+    return manifest
+
+
+def verify_backup(backup_id: str, directory: Optional[Path] = None) -> Dict[str, Any]:
+    """Re-check every checksum and that the backup restores to a readable database."""
+    root = directory or backup_dir()
+    manifest = load_manifest(backup_id, root)
+    result: Dict[str, Any] = {"id": backup_id, "engine": manifest["engine"]}
+    try:
+        if manifest["engine"] == "sqlite":
+            with tempfile.TemporaryDirectory(dir=root) as tmp:
+                result.update(_restore_sqlite_file(root, manifest, Path(tmp) / "verify.db"))
+        else:
+            dump = root / "dumps" / manifest["dump"]
+            if not dump.exists():
+                raise ValueError("Dump file is missing")
+            if file_sha256(dump) != manifest["sha256"]:
+                raise ValueError("Dump checksum mismatch")
+            _run_tool(["pg_restore", "--list", str(dump)], dict(os.environ))
+            result["sha256"] = manifest["sha256"]
+    except (ValueError, RuntimeError) as e:
+        result.update(ok=False, error=str(e))
+        return result
+    result["ok"] = True
+    return result
+
+
+def restore_backup(
+    backup_id: str,
+    target: Optional[str] = None,
+    directory: Optional[Path] = None,
+    force: bool = False,
+) -> Dict[str, Any]:
+    """Restore a backup to ``target`` (a SQLite path or a PostgreSQL URL).
+
+    SQLite backups are rebuilt and verified next to the target, then moved
+    into place; the app must not be running against that file. An existing
+    target is only replaced with ``force``. PostgreSQL dumps are restored
+    with ``pg_restore --clean`` into ``target`` (default: DATABASE_URL),
+    which always requires ``force``.
+    """
+    root = directory or backup_dir()
+    manifest = load_manifest(backup_id, root)
+    if manifest["engine"] == "sqlite":
+        destination = Path(target or manifest["source"])
+        if destination.exists() and not force:
+            raise FileExistsError(f"{destination} exists; pass force to replace it")
+        staging = destination.with_name(f".{destination.name}.restore")
+        try:
+            result = _restore_sqlite_file(root, manifest, staging)
+            for suffix in ("-wal", "-shm"):
+                Path(f"{destination}{suffix}").unlink(missing_ok=True)
+            os.replace(staging, destination)
+        finally:
+            staging.unlink(missing_ok=True)
+        result.update(id=backup_id, target=str(destination))
+        return result
+
+    if not force:
+        raise FileExistsError("Restoring PostgreSQL replaces the target database; pass force")
+    dump = root / "dumps" / manifest["dump"]
+    if file_sha256(dump) != manifest["sha256"]:
+        raise ValueError("Dump checksum mismatch")
+    uri, env = _pg_args(_database_url(target))
+    _run_tool(["pg_restore", "--clean", "--if-exists", "--no-owner", f"--dbname={uri}", str(dump)], env)
+    return {"id": backup_id, "target": make_url(uri).render_as_string(hide_password=True), "sha256": manifest["sha256"]}
+
+
+def prune_backups(keep: int = KEEP_BACKUPS, directory: Optional[Path] = None) -> Dict[str, int]:
+    """Drop all but the newest ``keep`` backups and the chunks only they used."""
+    if keep < 1:
+        raise ValueError("keep must be at least 1")
+    root = directory or backup_dir()
+    manifests = sorted((root / "manifests").glob("*.json"), reverse=True)
+    removed = 0
+    for path in manifests[keep:]:
+        manifest = json.loads(path.read_text())
+        if manifest.get("dump"):
+            (root / "dumps" / manifest["dump"]).unlink(missing_ok=True)
+        path.unlink()
+        removed += 1
+
+    referenced = set()
+    for path in manifests[:keep]:
+        referenced.update(json.loads(path.read_text()).get("chunks", ()))
+    freed_chunks = 0
+    # Chunks written in the last hour may belong to a backup whose manifest isn't written yet
+    settled = time.time() - 3600
+    for chunk in (root / "chunks").glob("*/*"):
+        if chunk.name not in referenced and not chunk.name.startswith(".") and chunk.stat().st_mtime < settled:
+            chunk.unlink()
+            freed_chunks += 1
+    return {"removed_backups": removed, "removed_chunks": freed_chunks}
+
+
+def run_db_backup() -> None:
+    """Periodic job entry point: back up, then apply retention."""
+    manifest = create_backup()
+    pruned = prune_backups()
+    if pruned["removed_backups"]:
+        logger.info(
+            f"Backup retention: removed {pruned['removed_backups']} backups, {pruned['removed_chunks']} chunks "
+            f"(kept up to {manifest['id']})"
+        )
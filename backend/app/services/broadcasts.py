@@ -0,0 +1,377 @@
+"""
+Broadcast Service
+Sends one Telegram message to every user of a segment.
+
+A broadcast is a row in ``broadcasts``: a segment name (see SEGMENTS), a
+message template and its progress. The broadcast_dispatch job streams
+recipients in users.id order, CHUNK_SIZE at a time, and sends each chunk
+concurrently through one shared token bucket (TELEGRAM_BROADCAST_RATE
+messages/second, below Telegram's ~30/s per-bot limit) with at most one
+message per chat per second. A 429 pauses the whole bucket for its
+``retry_after`` and the message is retried.
+
+Counters and the cursor are committed after every chunk, so a paused,
+cancelled or interrupted broadcast resumes at the next chunk; a crash
+mid-chunk resends at most that chunk.
+
+Templates use $first_name, $last_name and $name (string.Template),
+HTML-escaped when parse_mode is HTML.
+"""
+import asyncio
+import html
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from string import Template
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import exists, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.models import Broadcast, GroupOrder, GroupOrderStatus, Order, User
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+# One job run stops after this long; the next run continues from the cursor
+DISPATCH_BUDGET_SECONDS = 240
+PER_CHAT_INTERVAL = 1.0
+MAX_RETRIES = 3  # network errors / 5xx, with exponential backoff
+MAX_RATE_LIMIT_RETRIES = 10
+
+SENT, BLOCKED, FAILED = "sent", "blocked", "failed"
+
+# status transitions allowed from the admin API
+TRANSITIONS = {
+    "start": ({"draft", "paused"}, "running"),
+    "pause": ({"running"}, "paused"),
+    "cancel": ({"draft", "running", "paused"}, "cancelled"),
+}
+
+
+# ---- segments -----------------------------------------------------------------
+
+def _open_groups():
+    forming = select(GroupOrder.id).where(GroupOrder.status == GroupOrderStatus.GROUP_FORMING)
+    return or_(
+        User.id.in_(select(GroupOrder.leader_id).where(GroupOrder.status == GroupOrderStatus.GROUP_FORMING)),
+        User.id.in_(select(Order.user_id).where(Order.group_order_id.in_(forming))),
+    )
+
+
+def _never_ordered():
+    return ~exists().where(Order.user_id == User.id)
+
+
+# name -> (description, extra condition on users)
+SEGMENTS: Dict[str, Tuple[str, Optional[Callable[[], Any]]]] = {
+    "telegram_users": ("Everyone who has logged in with Telegram", None),
+    "open_groups": ("Leaders and members of groups still forming", _open_groups),
+    "never_ordered": ("Telegram users without any order", _never_ordered),
+}
+
+
+class UnknownSegment(ValueError):
+    pass
+
+
+def recipients_query(segment: str):
+    if segment not in SEGMENTS:
+        raise UnknownSegment(segment)
+    stmt = select(User.id, User.telegram_id, User.first_name, User.last_name).where(
+        User.telegram_id.isnot(None), User.telegram_id != ""
+    )
+    condition = SEGMENTS[segment][1]
+    if condition is not None:
+        stmt = stmt.where(condition())
+    return stmt
+
+
+def count_recipients(db: Session, segment: str) -> int:
+    return db.execute(select(func.count()).select_from(recipients_query(segment).subquery())).scalar_one()
+
+
+def render(template: str, first_name: Optional[str], last_name: Optional[str], parse_mode: Optional[str]) -> str:
+    values = {
+        "first_name": first_name or "",
+        "last_name": last_name or "",
+        "name": " ".join(p for p in (first_name, last_name) if p),
+    }
+    if (parse_mode or "").upper() == "HTML":
+        values = {k: html.escape(v) for k, v in values.items()}
+    return Template(template).safe_substitute(values)
+
+
+# ---- sending ------------------------------------------------------------------
+
+class TokenBucket:
+    """Async token bucket; pause() holds every sender until a 429's retry_after has passed."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class BroadcastSender:
+    """Concurrent sendMessage calls against one bot, within the bucket's rate."""
+
+    def __init__(
+        self,
+        base_url: str,
+        rate: float,
+        concurrency: int = 16,
+        proxy: Optional[str] = None,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.base_url = base_url
+        # No burst: Telegram counts messages per second, so sends are spaced evenly
+        self.bucket = TokenBucket(rate, burst=1)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.client = client or httpx.AsyncClient(timeout=15, proxies=proxy)
+        self.rate_limited = 0
+        self.last_error: Optional[str] = None
+        self._last_chat_send: Dict[str, float] = {}
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    async def _wait_for_chat(self, chat_id: str) -> None:
+        last = self._last_chat_send.get(chat_id)
+        if last is not None:
+            delay = last + PER_CHAT_INTERVAL - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def send(self, chat_id: str, text: str, parse_mode: Optional[str] = None) -> str:
+        payload = {"chat_id": chat_id, "text": text}
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+        errors = 0
+        rate_limits = 0
+        async with self.semaphore:
+            while True:
+                await self._wait_for_chat(chat_id)
+                await self.bucket.acquire()
+                try:
+                    response = await self.client.post(f"{self.base_url}/sendMessage", json=payload)
+                except httpx.HTTPError as e:
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    response = None
+                finally:
+                    self._last_chat_send[chat_id] = time.monotonic()
+
+                if response is not None and response.status_code == 200:
+                    return SENT
+                if response is not None and response.status_code == 429 and rate_limits < MAX_RATE_LIMIT_RETRIES:
+                    rate_limits += 1
+                    self.rate_limited += 1
+                    retry_after = (_json(response).get("parameters") or {}).get("retry_after") or 1
+                    self.bucket.pause(float(retry_after))
+                    continue
+                if response is not None and response.status_code == 403:
+                    return BLOCKED
+                if response is not None and response.status_code < 500 and response.status_code != 429:
+                    self.last_error = _json(response).get("description") or f"HTTP {response.status_code}"
+                    return FAILED
+                if errors >= MAX_RETRIES:
+                    if response is not None:
+                        self.last_error = f"HTTP {response.status_code}"
+                    return FAILED
+                errors += 1
+                await asyncio.sleep(2 ** errors)
+
+
+def _json(response: httpx.Response) -> Dict[str, Any]:
+    try:
+        body = response.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+# ---- progress -----------------------------------------------------------------
+
+def _load_chunk(broadcast_id: int, chunk_size: int) -> Tuple[Optional[Tuple[str, Optional[str]]], List[Any]]:
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        broadcast = db.get(Broadcast, broadcast_id)
+        if broadcast is None or broadcast.status != "running":
+            return None, []
+        rows = db.execute(
+            recipients_query(broadcast.segment)
+            .where(User.id > broadcast.cursor_user_id)
+            .order_by(User.id)
+            .limit(chunk_size)
+        ).all()
+        return (broadcast.message, broadcast.parse_mode), rows
+    finally:
+        db.close()
+
+
+def _save_progress(
+    broadcast_id: int,
+    cursor: Optional[int],
+    counts: Dict[str, int],
+    rate_limited: int,
+    elapsed: float,
+    last_error: Optional[str],
+) -> None:
+    """Commit one chunk's results; a None cursor marks the broadcast completed."""
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        broadcast = db.get(Broadcast, broadcast_id)
+        if cursor is None:
+            if broadcast.status == "running":
+                broadcast.status = "completed"
+                broadcast.finished_at = datetime.utcnow()
+        else:
+            broadcast.cursor_user_id = cursor
+            broadcast.sent_count += counts.get(SENT, 0)
+            broadcast.blocked_count += counts.get(BLOCKED, 0)
+            broadcast.failed_count += counts.get(FAILED, 0)
+            broadcast.rate_limited_count += rate_limited
+            broadcast.active_seconds += elapsed
+            if last_error:
+                broadcast.last_error = last_error[:1000]
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run_broadcast(
+    broadcast_id: int,
+    sender: BroadcastSender,
+    chunk_size: int = CHUNK_SIZE,
+    deadline: Optional[float] = None,
+) -> bool:
+    """Send chunks until the broadcast is done, paused/cancelled or ``deadline``
+    (time.monotonic()) passes. Returns True when it completed."""
+    while deadline is None or time.monotonic() < deadline:
+        spec, rows = await asyncio.to_thread(_load_chunk, broadcast_id, chunk_size)
+        if spec is None:
+            return False
+        if not rows:
+            await asyncio.to_thread(_save_progress, broadcast_id, None, {}, 0, 0.0, None)
+            logger.info(f"Broadcast {broadcast_id} completed")
+            return True
+
+        message, parse_mode = spec
+        limited_before = sender.rate_limited
+        t0 = time.perf_counter()
+        outcomes = await asyncio.gather(*(
+            sender.send(row.telegram_id, render(message, row.first_name, row.last_name, parse_mode), parse_mode)
+            for row in rows
+        ))
+        elapsed = time.perf_counter() - t0
+        counts = Counter(outcomes)
+        await asyncio.to_thread(
+            _save_progress, broadcast_id, rows[-1].id, counts, sender.rate_limited - limited_before, elapsed,
+            sender.last_error,
+        )
+        logger.info(
+            f"Broadcast {broadcast_id}: {len(rows)} recipients in {elapsed:.1f}s "
+            f"({len(rows) / max(elapsed, 1e-6):.1f} msg/s) sent={counts[SENT]} blocked={counts[BLOCKED]} failed={counts[FAILED]}"
+        )
+    return False
+
+
+def _running_ids() -> List[int]:
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        return list(db.execute(select(Broadcast.id).where(Broadcast.status == "running").order_by(Broadcast.id)).scalars())
+    finally:
+        db.close()
+
+
+async def dispatch_broadcasts(max_seconds: int = DISPATCH_BUDGET_SECONDS) -> None:
+    """Periodic job entry point: work through running broadcasts for up to ``max_seconds``."""
+    from app.config import get_settings
+    from app.services.telegram import telegram_service
+
+    ids = await asyncio.to_thread(_running_ids)
+    if not ids:
+        return
+    if telegram_service.is_test_mode:
+        logger.warning(f"Telegram bot token not configured; {len(ids)} running broadcast(s) stay queued")
+        return
+    sender = BroadcastSender(
+        telegram_service.base_url,
+        rate=float(os.getenv("TELEGRAM_BROADCAST_RATE", "25")),
+        concurrency=int(os.getenv("TELEGRAM_BROADCAST_CONCURRENCY", "16")),
+        proxy=get_settings().TELEGRAM_API_PROXY,
+    )
+    deadline = time.monotonic() + max_seconds
+    try:
+        for broadcast_id in ids:
+            if time.monotonic() >= deadline:
+                break
+            await run_broadcast(broadcast_id, sender, deadline=deadline)
+    finally:
+        await sender.close()
+
+
+# ---- admin helpers ------------------------------------------------------------
+
+def change_status(db: Session, broadcast: Broadcast, action: str) -> None:
+    """Apply an admin action (start/pause/cancel); raises ValueError if not allowed."""
+    if action not in TRANSITIONS:
+        raise ValueError(f"Unknown action: {action}")
+    allowed_from, new_status = TRANSITIONS[action]
+    if broadcast.status not in allowed_from:
+        raise ValueError(f"Cannot {action} a {broadcast.status} broadcast")
+    broadcast.status = new_status
+    if new_status == "running" and broadcast.started_at is None:
+        broadcast.started_at = datetime.utcnow()
+    if new_status == "cancelled":
+        broadcast.finished_at = datetime.utcnow()
+
+
+def serialize_broadcast(broadcast: Broadcast) -> Dict[str, Any]:
+    done = broadcast.sent_count + broadcast.blocked_count + broadcast.failed_count
+    return {
+        "id": broadcast.id,
+        "name": broadcast.name,
+        "segment": broadcast.segment,
+        "message": broadcast.message,
+        "parse_mode": broadcast.parse_mode,
+        "status": broadcast.status,
+        "total_recipients": broadcast.total_recipients,
+        "processed": done,
+        "sent": broadcast.sent_count,
+        "blocked": broadcast.blocked_count,
+        "failed": broadcast.failed_count,
+        "rate_limited": broadcast.rate_limited_count,
+        "messages_per_second": round(done / broadcast.active_seconds, 2) if broadcast.active_seconds else None,
+        "last_error": broadcast.last_error,
+        "created_at": broadcast.created_at.isoformat() if broadcast.created_at else None,
+        "started_at": broadcast.started_at.isoformat() if broadcast.started_at else None,
+        "finished_at": broadcast.finished_at.isoformat() if broadcast.finished_at else None,
+    }
@@ -0,0 +1,449 @@
+"""
+Catalog Import
+Bulk upsert of products, with their options, images and categories, from a
+CSV or JSONL stream.
+
+Rows are keyed by ``sku``: an existing SKU is updated with only the columns
+the row provides, a new one is inserted at the bottom of the curated home
+and landing rails, like a product created in the admin panel.
+``home_position``/``landing_position`` are 1-based places on the rail, applied
+with product_positions.place_product in file order after the chunk is
+written. Category and subcategory slugs resolve through maps loaded once per
+import. Rows are validated one by one and written ``CHUNK_SIZE`` at a time:
+each chunk is one transaction of executemany INSERT/UPDATE statements, and
+a chunk that fails as a whole is reported against all of its rows without
+affecting the chunks before it. Sort scores, facet counts and the suggest
+index are refreshed once at the end.
+
+Row fields: sku, name, description, base_price, market_price, category
+(slug), subcategory (slug), store_id, shipping_cost, friend_1_price ..
+friend_3_price, weight_grams, weight_tolerance_grams, option1_name,
+option2_name, is_active, home_position, landing_position, images (list,
+or "|"-separated in CSV; the first is the main image) and options (list of
+{option1_value, option2_value, stock, price_adjustment}, JSON text in CSV).
+"""
+import csv
+import json
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from sqlalchemy import bindparam, delete, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.models import Category, Product, ProductImage, ProductOption, Store, SubCategory
+from app.services.product_positions import RAILS, append_to_rail, place_product
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 500
+
+_TEXT_FIELDS = {"name": 120, "description": None, "option1_name": 50, "option2_name": 50}
+_FLOAT_FIELDS = ("base_price", "market_price", "shipping_cost", "friend_1_price", "friend_2_price",
+                 "friend_3_price", "rating_seed_sum")
+_INT_FIELDS = ("store_id", "weight_grams", "weight_tolerance_grams", "sales_seed_offset")
+_REQUIRED_FOR_INSERT = ("name", "base_price", "market_price", "category_id")
+# Every inserted row carries the same keys so the INSERT runs as one executemany
+_INSERT_DEFAULTS = {
+    "description": "", "store_id": 1, "subcategory_id": None, "option1_name": None, "option2_name": None,
+    "shipping_cost": 0.0, "is_active": True, "weight_grams": None, "weight_tolerance_grams": None,
+    "friend_1_price": 0.0, "friend_2_price": 0.0, "friend_3_price": 0.0, "sales_seed_offset": 0,
+    "rating_seed_sum": 0.0, "home_position": None, "landing_position": None,
+}
+_TRUE = ("1", "true", "yes", "on")
+_FALSE = ("0", "false", "no", "off")
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    failed: int = 0
+    categories_created: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+    duration: float = 0.0
+    dry_run: bool = False
+    product_ids: List[int] = field(default_factory=list)
+
+    def add_error(self, line: int, sku: Optional[str], message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "sku": sku, "error": message})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.failed,
+            "categories_created": self.categories_created,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+            "duration_seconds": round(self.duration, 2),
+            "dry_run": self.dry_run,
+        }
+
+
+@dataclass
+class _Row:
+    line: int
+    sku: str
+    fields: Dict[str, Any]
+    images: Optional[List[str]] = None
+    options: Optional[List[Dict[str, Any]]] = None
+    category_slug: Optional[str] = None  # new category, created with the chunk
+    category_name: Optional[str] = None
+    places: Dict[str, int] = field(default_factory=dict)  # rail -> 1-based place
+
+
+# ---- reading ------------------------------------------------------------------
+
+def detect_format(filename: Optional[str]) -> str:
+    name = (filename or "").lower()
+    return "jsonl" if name.endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def read_rows(stream: TextIO, fmt: str) -> Iterator[Tuple[int, Any]]:
+    """(line number, raw row) pairs; a raw row that is not an object is yielded as-is."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as e:
+            yield line_no, f"Invalid JSON: {e}"
+
+
+# ---- validation ---------------------------------------------------------------
+
+class _Refs:
+    """Slug -> id maps shared by every chunk of one import."""
+
+    def __init__(self, db: Session):
+        self.load(db)
+
+    def load(self, db: Session) -> None:
+        self.categories = dict(db.execute(select(Category.slug, Category.id)).all())
+        self.subcategories = {
+            slug: (sub_id, category_id)
+            for slug, sub_id, category_id in db.execute(select(SubCategory.slug, SubCategory.id, SubCategory.category_id))
+        }
+        self.stores = set(db.execute(select(Store.id)).scalars())
+
+
+def _blank(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and value.strip() == "")
+
+
+def _number(name: str, value: Any, kind: type) -> Any:
+    try:
+        number = kind(float(value)) if kind is int else float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number")
+    if number < 0:
+        raise ValueError(f"{name} must not be negative")
+    return number
+
+
+def _adjustment(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        raise ValueError("price_adjustment must be a number")
+
+
+def _list_field(name: str, value: Any, csv_split: bool) -> List[Any]:
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str):
+        text = value.strip()
+        if text.startswith("["):
+            try:
+                parsed = json.loads(text)
+            except ValueError:
+                raise ValueError(f"{name} is not valid JSON")
+            if isinstance(parsed, list):
+                return parsed
+        elif csv_split:
+            return [part for part in text.split("|")]
+    raise ValueError(f"{name} must be a list")
+
+
+def _parse_row(line: int, raw: Any, refs: _Refs, create_categories: bool) -> _Row:
+    if not isinstance(raw, dict):
+        raise ValueError(raw if isinstance(raw, str) else "Row must be an object")
+    sku = str(raw.get("sku") or "").strip()
+    if not sku:
+        raise ValueError("sku is required")
+    if len(sku) > 64:
+        raise ValueError("sku is longer than 64 characters")
+
+    fields: Dict[str, Any] = {}
+    for name, max_len in _TEXT_FIELDS.items():
+        if not _blank(raw.get(name)):
+            value = str(raw[name]).strip()
+            if max_len and len(value) > max_len:
+                raise ValueError(f"{name} is longer than {max_len} characters")
+            fields[name] = value
+    for name in _FLOAT_FIELDS:
+        if not _blank(raw.get(name)):
+            fields[name] = _number(name, raw[name], float)
+    for name in _INT_FIELDS:
+        if not _blank(raw.get(name)):
+            fields[name] = _number(name, raw[name], int)
+    places = {rail: _number(column, raw[column], int) for rail, column in RAILS.items() if not _blank(raw.get(column))}
+    if not _blank(raw.get("is_active")):
+        flag = str(raw["is_active"]).strip().lower()
+        if flag not in _TRUE + _FALSE:
+            raise ValueError("is_active must be true or false")
+        fields["is_active"] = flag in _TRUE
+    if "store_id" in fields and fields["store_id"] not in refs.stores:
+        raise ValueError(f"Unknown store_id {fields['store_id']}")
+
+    row = _Row(line, sku, fields, places=places)
+    category_slug = raw.get("category") or raw.get("category_slug")
+    if not _blank(category_slug):
+        category_slug = str(category_slug).strip()
+        if category_slug in refs.categories:
+            fields["category_id"] = refs.categories[category_slug]
+        elif create_categories:
+            row.category_slug = category_slug
+            row.category_name = str(raw.get("category_name") or category_slug).strip()[:50]
+        else:
+            raise ValueError(f"Unknown category '{category_slug}'")
+    subcategory_slug = raw.get("subcategory") or raw.get("subcategory_slug")
+    if not _blank(subcategory_slug):
+        subcategory_slug = str(subcategory_slug).strip()
+        if subcategory_slug not in refs.subcategories:
+            raise ValueError(f"Unknown subcategory '{subcategory_slug}'")
+        sub_id, sub_category_id = refs.subcategories[subcategory_slug]
+        if "category_id" in fields and fields["category_id"] != sub_category_id:
+            raise ValueError(f"Subcategory '{subcategory_slug}' belongs to another category")
+        fields["subcategory_id"] = sub_id
+
+    if not _blank(raw.get("images")):
+        urls = [str(url).strip() for url in _list_field("images", raw["images"], csv_split=True)]
+        urls = list(dict.fromkeys(url for url in urls if url))
+        if any(len(url) > 255 for url in urls):
+            raise ValueError("Image URLs must be at most 255 characters")
+        row.images = urls
+    if not _blank(raw.get("options")):
+        options = []
+        for option in _list_field("options", raw["options"], csv_split=False):
+            if not isinstance(option, dict):
+                raise ValueError("Each option must be an object")
+            options.append({
+                "option1_value": str(option.get("option1_value") or "")[:50] or None,
+                "option2_value": str(option.get("option2_value") or "")[:50] or None,
+                "stock": _number("stock", option.get("stock") or 0, int),
+                "price_adjustment": _adjustment(option.get("price_adjustment")),
+            })
+        row.options = options
+    return row
+
+
+# ---- writing ------------------------------------------------------------------
+
+def _create_categories(db: Session, rows: List[_Row], refs: _Refs) -> int:
+    """Insert the categories first named in this chunk and resolve category_id on its rows."""
+    wanted: Dict[str, str] = {}
+    for row in rows:
+        if row.category_slug is not None and row.category_slug not in refs.categories:
+            wanted.setdefault(row.category_slug, row.category_name or row.category_slug)
+    if wanted:
+        db.execute(Category.__table__.insert(), [{"slug": slug, "name": name} for slug, name in wanted.items()])
+        refs.categories.update(
+            db.execute(select(Category.slug, Category.id).where(Category.slug.in_(list(wanted)))).all()
+        )
+    for row in rows:
+        if row.category_slug is not None:
+            row.fields["category_id"] = refs.categories[row.category_slug]
+    return len(wanted)
+
+
+@dataclass
+class _ChunkOutcome:
+    product_ids: List[int] = field(default_factory=list)
+    inserted: int = 0
+    updated: int = 0
+    categories_created: int = 0
+    rejected: List[Tuple[_Row, str]] = field(default_factory=list)
+
+
+def _write_chunk(db: Session, rows: List[_Row], refs: _Refs, outcome: _ChunkOutcome) -> None:
+    """Upsert one chunk into ``outcome``; the caller commits or rolls back."""
+    table = Product.__table__
+    outcome.categories_created = _create_categories(db, rows, refs)
+    existing = dict(db.execute(select(Product.sku, Product.id).where(Product.sku.in_([r.sku for r in rows]))).all())
+
+    inserts: List[Dict[str, Any]] = []
+    updates: Dict[frozenset, List[Dict[str, Any]]] = defaultdict(list)
+    kept: List[_Row] = []
+    for row in rows:
+        if row.sku in existing:
+            if row.fields:
+                updates[frozenset(row.fields)].append({"b_id": existing[row.sku], **{f"v_{k}": v for k, v in row.fields.items()}})
+            kept.append(row)
+            continue
+        missing = [name for name in _REQUIRED_FOR_INSERT if row.fields.get(name) is None]
+        if missing:
+            outcome.rejected.append((row, f"New product is missing: {', '.join(missing)}"))
+            continue
+        values = {**_INSERT_DEFAULTS, **row.fields, "sku": row.sku}
+        if values["store_id"] not in refs.stores:
+            outcome.rejected.append((row, f"Unknown store_id {values['store_id']}"))
+            continue
+        inserts.append(values)
+        kept.append(row)
+
+    if inserts:
+        db.execute(table.insert(), inserts)
+    for keys, params in updates.items():
+        stmt = table.update().where(table.c.id == bindparam("b_id")).values({k: bindparam(f"v_{k}") for k in keys})
+        db.execute(stmt, params)
+
+    ids = dict(existing)
+    if inserts:
+        ids.update(db.execute(select(Product.sku, Product.id).where(Product.sku.in_([v["sku"] for v in inserts]))).all())
+
+    with_images = [(ids[r.sku], r.images) for r in kept if r.images is not None]
+    if with_images:
+        db.execute(delete(ProductImage).where(ProductImage.product_id.in_([pid for pid, _ in with_images])))
+        image_rows = [
+            {"product_id": pid, "image_url": url, "is_main": i == 0}
+            for pid, urls in with_images for i, url in enumerate(urls)
+        ]
+        if image_rows:
+            db.execute(ProductImage.__table__.insert(), image_rows)
+    with_options = [(ids[r.sku], r.options) for r in kept if r.options is not None]
+    if with_options:
+        db.execute(delete(ProductOption).where(ProductOption.product_id.in_([pid for pid, _ in with_options])))
+        option_rows = [{"product_id": pid, **option} for pid, options in with_options for option in options]
+        if option_rows:
+            db.execute(ProductOption.__table__.insert(), option_rows)
+
+    # New products join the bottom of each rail they have no place on; then the rows' places
+    new_skus = {values["sku"] for values in inserts}
+    for rail in RAILS:
+        append_to_rail(db, rail, [ids[r.sku] for r in kept if r.sku in new_skus and rail not in r.places])
+    for row in kept:
+        for rail, place in row.places.items():
+            place_product(db, rail, ids[row.sku], place)
+
+    outcome.product_ids = [ids[r.sku] for r in kept]
+    outcome.inserted = len(inserts)
+    outcome.updated = len(kept) - len(inserts)
+
+
+def _merge(pending: Dict[str, _Row], row: _Row) -> None:
+    """A SKU repeated within one chunk: later values win."""
+    earlier = pending.get(row.sku)
+    if earlier is None:
+        pending[row.sku] = row
+        return
+    earlier.fields.update(row.fields)
+    earlier.places.update(row.places)
+    earlier.line = row.line
+    if row.images is not None:
+        earlier.images = row.images
+    if row.options is not None:
+        earlier.options = row.options
+    if row.category_slug is not None:
+        earlier.category_slug = row.category_slug
+        earlier.category_name = row.category_name
+
+
+def _flush(db: Session, pending: Dict[str, _Row], refs: _Refs, result: ImportResult, dry_run: bool) -> None:
+    rows = list(pending.values())
+    pending.clear()
+    if not rows:
+        return
+    outcome = _ChunkOutcome()
+    try:
+        _write_chunk(db, rows, refs, outcome)
+        if dry_run:
+            db.rollback()
+            refs.load(db)
+        else:
+            db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        refs.load(db)
+        message = str(getattr(e, "orig", e)).splitlines()[0]
+        rejected = {id(row) for row, _ in outcome.rejected}
+        for row, error in outcome.rejected:
+            result.add_error(row.line, row.sku, error)
+        for row in rows:
+            if id(row) not in rejected:
+                result.add_error(row.line, row.sku, f"Chunk rolled back: {message}")
+        logger.warning(f"Catalog import chunk of {len(rows)} rows failed: {message}")
+        return
+    for row, error in outcome.rejected:
+        result.add_error(row.line, row.sku, error)
+    result.product_ids.extend(outcome.product_ids)
+    result.inserted += outcome.inserted
+    result.updated += outcome.updated
+    result.categories_created += outcome.categories_created
+
+
+def refresh_after_import(db: Session, product_ids: Iterable[int]) -> None:
+    """Recompute sort scores of the touched products and refresh derived indexes."""
+    from app.services.product_browse import invalidate_facets, refresh_product_scores
+    from app.services.suggest_index import suggest_index
+
+    ids = sorted(set(product_ids))
+    for i in range(0, len(ids), CHUNK_SIZE):
+        refresh_product_scores(db, ids[i:i + CHUNK_SIZE])
+    db.commit()
+    invalidate_facets()
+    if suggest_index.built_at:
+        suggest_index.rebuild_in_background()
+
+
+def import_catalog(
+    db: Session,
+    stream: TextIO,
+    fmt: str = "csv",
+    create_categories: bool = False,
+    dry_run: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+) -> ImportResult:
+    """Validate and upsert every row of ``stream``; commits chunk by chunk."""
+    if fmt not in ("csv", "jsonl"):
+        raise ValueError("format must be csv or jsonl")
+    started = time.perf_counter()
+    result = ImportResult(dry_run=dry_run)
+    refs = _Refs(db)
+    pending: Dict[str, _Row] = {}
+    for line, raw in read_rows(stream, fmt):
+        result.rows += 1
+        try:
+            row = _parse_row(line, raw, refs, create_categories)
+        except ValueError as e:
+            sku = raw.get("sku") if isinstance(raw, dict) else None
+            result.add_error(line, sku, str(e))
+            continue
+        _merge(pending, row)
+        if len(pending) >= chunk_size:
+            _flush(db, pending, refs, result, dry_run)
+    _flush(db, pending, refs, result, dry_run)
+
+    if result.product_ids and not dry_run:
+        refresh_after_import(db, result.product_ids)
+    result.duration = time.perf_counter() - started
+    logger.info(
+        f"Catalog import: {result.rows} rows, {result.inserted} inserted, {result.updated} updated, "
+        f"{result.failed} failed in {result.duration:.1f}s"
+    )
+    return result
@@ -0,0 +1,82 @@
+"""
+Favorites Service
+Idempotent add/remove (one INSERT ... ON CONFLICT DO NOTHING / one DELETE)
+and a cached per-user set of favorited product ids that listing endpoints
+merge into product cards as ``is_favorite``.
+
+The id-set cache is per process. Adds/removes that change a row bump the
+``_favorites_version`` row in the same transaction; every worker checks it
+(at most once per second) before serving from the cache and drops the cache
+when it moved, so other workers see a change within about a second.
+"""
+import time
+from typing import Any, Dict, FrozenSet, List, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from app.models import Favorite, User
+from app.services.app_settings import VersionRow
+
+_IDS_TTL_SECONDS = 300
+_IDS_CACHE: dict[int, tuple[float, FrozenSet[int]]] = {}
+_IDS_VERSION = VersionRow("_favorites_version")
+
+
+def _insert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(Favorite)
+
+
+def add_favorite(db: Session, user_id: int, product_id: int) -> bool:
+    """Add a favorite; returns False if it already existed. Does not commit."""
+    stmt = (
+        _insert(db)
+        .values(user_id=user_id, product_id=product_id)
+        .on_conflict_do_nothing(index_elements=["user_id", "product_id"])
+    )
+    added = db.execute(stmt).rowcount > 0
+    if added:
+        _IDS_VERSION.bump(db)
+    invalidate_favorite_ids(user_id)
+    return added
+
+
+def remove_favorite(db: Session, user_id: int, product_id: int) -> bool:
+    """Remove a favorite; returns False if there was none. Does not commit."""
+    stmt = delete(Favorite).where(Favorite.user_id == user_id, Favorite.product_id == product_id)
+    removed = db.execute(stmt).rowcount > 0
+    if removed:
+        _IDS_VERSION.bump(db)
+    invalidate_favorite_ids(user_id)
+    return removed
+
+
+def favorite_ids(db: Session, user_id: int) -> FrozenSet[int]:
+    """Product ids the user has favorited (cached)."""
+    if _IDS_VERSION.changed(db):
+        _IDS_CACHE.clear()
+    now = time.time()
+    cached = _IDS_CACHE.get(user_id)
+    if cached and now - cached[0] < _IDS_TTL_SECONDS:
+        return cached[1]
+    ids = frozenset(db.execute(select(Favorite.product_id).where(Favorite.user_id == user_id)).scalars())
+    if len(_IDS_CACHE) > 10_000:
+        _IDS_CACHE.clear()
+    _IDS_CACHE[user_id] = (now, ids)
+    return ids
+
+
+def invalidate_favorite_ids(user_id: int) -> None:
+    _IDS_CACHE.pop(user_id, None)
+
+
+def mark_favorites(db: Session, user: Optional[User], cards: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copies of ``cards`` with ``is_favorite`` set; unchanged for anonymous users."""
+    if user is None:
+        return cards
+    ids = favorite_ids(db, user.id)
+    return [{**card, "is_favorite": card["id"] in ids} for card in cards]
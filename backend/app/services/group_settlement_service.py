@@ -14,6 +14,8 @@ from app.models import (
     GroupOrderStatus, OrderType
 )
 
+from app.services.pricing import load_products, order_basket_value, secondary_refund, unit_price_for_friends
+
 logger = logging.getLogger(__name__)
 
 # Tehran timezone: UTC+3:30
@@ -103,16 +105,7 @@ class GroupSettlementService:
         Returns:
             Price per unit in tomans
         """
-        solo_price = product.market_price or product.base_price or 0
-        
-        if friends_count >= 3:
-            return product.friend_3_price 
-        elif friends_count == 2:
-            return product.friend_2_price 
-        elif friends_count == 1:
-            return product.friend_1_price 
-        else:
-            return solo_price  # Full price when buying alone
+        return unit_price_for_friends(product, friends_count)
 
     def check_and_mark_settlement_required(self, group_order_id: int) -> Dict[str, Any]:
         """
@@ -167,68 +160,41 @@ class GroupSettlementService:
             }
             
         if not group_order.expected_friends:
-            # Try to infer expected friends from leader order delivery_slot JSON
+            # Try to infer expected friends from the leader order's checkout metadata
             leader_order = self.db.query(Order).filter(
                 Order.group_order_id == group_order_id,
                 Order.user_id == group_order.leader_id,
                 Order.is_settlement_payment == False
             ).order_by(Order.created_at.asc()).first()
 
-            inferred = None
-            if leader_order and leader_order.delivery_slot:
-                try:
-                    import json as _json
-                    info = _json.loads(leader_order.delivery_slot)
-                    if isinstance(info, dict):
-                        inferred = info.get("friends") or info.get("expected_friends") or info.get("max_friends")
-                        if inferred:
-                            inferred = int(inferred)
-                except Exception:
-                    inferred = None
+            inferred = leader_order.expected_friends if leader_order else None
 
             # Heuristic fallback: match leader's paid total to closest tiered total (0..3 friends)
-            # IMPORTANT: Skip heuristic for hybrid/partial payments as it produces incorrect results
             if inferred is None and leader_order:
                 try:
-                    # Check if this is a hybrid/partial payment that should skip heuristic
-                    skip_heuristic = False
-                    if leader_order.delivery_slot:
-                        try:
-                            import json as _json
-                            info = _json.loads(leader_order.delivery_slot)
-                            if isinstance(info, dict):
-                                # If paymentPercentage exists and is not 100%, this is hybrid payment
-                                payment_pct = info.get("paymentPercentage")
-                                if payment_pct is not None and float(payment_pct) < 100:
-                                    skip_heuristic = True
-                                    logger.info(f"Skipping heuristic for group {group_order_id} - hybrid payment detected (paymentPercentage={payment_pct}%)")
-                        except Exception:
-                            pass
-                    
-                    if not skip_heuristic:
-                        items = self.db.query(OrderItem).filter(OrderItem.order_id == leader_order.id).all()
-                        if items:
-                            # Preload products to avoid repeated queries
-                            product_by_id = {}
+                    items = self.db.query(OrderItem).filter(OrderItem.order_id == leader_order.id).all()
+                    if items:
+                        # Preload products to avoid repeated queries
+                        product_by_id = {}
+                        for it in items:
+                            if it.product_id not in product_by_id:
+                                product_by_id[it.product_id] = self.db.query(Product).filter(Product.id == it.product_id).first()
+                        candidates = []  # list of (friends_tier, total_at_tier)
+                        for tier in (0, 1, 2, 3):
+                            total_at_tier = 0.0
                             for it in items:
-                                if it.product_id not in product_by_id:
-                                    product_by_id[it.product_id] = self.db.query(Product).filter(Product.id == it.product_id).first()
-                            candidates = []  # list of (friends_tier, total_at_tier)
-                            for tier in (0, 1, 2, 3):
-                                total_at_tier = 0.0
-                                for it in items:
-                                    prod = product_by_id.get(it.product_id)
-                                    if not prod:
-                                        continue
-                                    unit = self._get_price_for_friends_count(prod, tier)
-                                    total_at_tier += float(unit) * float(getattr(it, 'quantity', 1) or 1)
-                                candidates.append((tier, total_at_tier))
-                            paid_total = float(leader_order.total_amount or 0)
-                            # Choose tier with minimal absolute difference to paid_total
-                            best_tier = min(candidates, key=lambda x: abs(x[1] - paid_total))[0] if candidates else None
-                            if best_tier is not None:
-                                inferred = int(best_tier)
-                                logger.info(f"Heuristic inferred expected_friends={inferred} for group {group_order_id} based on paid amount {paid_total}")
+                                prod = product_by_id.get(it.product_id)
+                                if not prod:
+                                    continue
+                                unit = self._get_price_for_friends_count(prod, tier)
+                                total_at_tier += float(unit) * float(getattr(it, 'quantity', 1) or 1)
+                            candidates.append((tier, total_at_tier))
+                        paid_total = float(leader_order.total_amount or 0)
+                        # Choose tier with minimal absolute difference to paid_total
+                        best_tier = min(candidates, key=lambda x: abs(x[1] - paid_total))[0] if candidates else None
+                        if best_tier is not None:
+                            inferred = int(best_tier)
+                            logger.info(f"Heuristic inferred expected_friends={inferred} for group {group_order_id} based on paid amount {paid_total}")
                 except Exception:
                     inferred = None
 
@@ -870,31 +836,11 @@ class GroupSettlementService:
         - For each member that joins, leader gets: (total_basket_value ÷ 4) refund
         - Maximum 4 members can join (making the product free for leader)
         """
-        from app.models import OrderItem, Product
-        
         if member_count <= 0:
             return 0  # No refund if no members joined
-        
-        # Get total basket value from order items
+
         items = self.db.query(OrderItem).filter(
             OrderItem.order_id == leader_order.id
         ).all()
-        
-        total_basket_value = 0
-        for item in items:
-            product = self.db.query(Product).filter(Product.id == item.product_id).first()
-            if product:
-                # For secondary groups, use the original price (market_price or base_price)
-                unit_price = product.market_price or product.base_price or 0
-                total_basket_value += unit_price * item.quantity
-        
-        if total_basket_value <= 0:
-            return 0
-        
-        # Calculate refund: (total_basket_value ÷ 4) × member_count
-        # But cap at maximum 4 members (so max refund = total_basket_value)
-        discount_per_member = total_basket_value / 4
-        effective_members = min(member_count, 4)  # Cap at 4 members
-        refund_amount = discount_per_member * effective_members
-        
-        return min(refund_amount, total_basket_value)  # Don't refund more than they paid
+        products = load_products(self.db, (item.product_id for item in items))
+        return secondary_refund(order_basket_value(items, products), member_count)
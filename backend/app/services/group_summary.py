@@ -0,0 +1,125 @@
+"""
+Group Summary Service
+Maintains the denormalized per-group counters (kind, participants_count,
+paid_members, product_name) stored on group_orders so list endpoints can
+serve them without loading every order of every group.
+"""
+from typing import Optional
+import json
+import logging
+
+from sqlalchemy import func, case, and_, or_
+from sqlalchemy.orm import Session
+
+from app.models import GroupOrder, Order, OrderItem, Product
+
+logger = logging.getLogger(__name__)
+
+# Legacy status strings that count as paid even without gateway markers
+PAID_STATUSES = ("paid", "completed", "تکمیل شده")
+
+
+def _parse_snapshot(group: GroupOrder) -> dict:
+    try:
+        meta = json.loads(group.basket_snapshot) if getattr(group, "basket_snapshot", None) else {}
+        return meta if isinstance(meta, dict) else {}
+    except Exception:
+        return {}
+
+
+def _resolve_product_name(db: Session, meta: dict) -> Optional[str]:
+    """Name of the first product of the group's source order, if any."""
+    src_oid = meta.get("source_order_id")
+    if src_oid:
+        try:
+            name = (
+                db.query(Product.name)
+                .join(OrderItem, OrderItem.product_id == Product.id)
+                .filter(OrderItem.order_id == int(src_oid))
+                .order_by(OrderItem.id.asc())
+                .limit(1)
+                .scalar()
+            )
+            if name:
+                return name
+        except Exception:
+            pass
+    # Secondary groups carry product names in their snapshot items
+    items = meta.get("items")
+    if isinstance(items, list) and items and isinstance(items[0], dict):
+        return items[0].get("product_name")
+    return None
+
+
+def refresh_group_summary(db: Session, group_id: int) -> Optional[GroupOrder]:
+    """Recompute the summary columns of one group in a single aggregate query.
+
+    Does not commit; callers own the transaction so the summary lands together
+    with the join/payment change that triggered it.
+    """
+    group = db.query(GroupOrder).filter(GroupOrder.id == group_id).first()
+    if not group:
+        return None
+
+    # Paid followers: anyone but the leader with a gateway ref, paid_at or legacy paid status
+    is_paid_follower = and_(
+        or_(Order.user_id.is_(None), Order.user_id != group.leader_id),
+        or_(
+            Order.payment_ref_id.isnot(None),
+            Order.paid_at.isnot(None),
+            func.lower(Order.status).in_(PAID_STATUSES),
+        ),
+    )
+    participants, paid = (
+        db.query(
+            func.count(Order.id),
+            func.coalesce(func.sum(case((is_paid_follower, 1), else_=0)), 0),
+        )
+        .filter(
+            Order.group_order_id == group.id,
+            Order.is_settlement_payment == False,
+        )
+        .one()
+    )
+
+    meta = _parse_snapshot(group)
+    group.kind = str(meta.get("kind") or "primary").lower()
+    group.participants_count = int(participants or 0)
+    group.paid_members = int(paid or 0)
+    if not group.product_name:
+        group.product_name = _resolve_product_name(db, meta)
+    return group
+
+
+def backfill_group_summaries(db: Session, batch_size: int = 200) -> int:
+    """Populate summary columns for groups created before they existed.
+
+    Processes rows whose ``kind`` is still NULL in chunks, committing each
+    chunk so a large history does not hold the write lock for long.
+    """
+    total = 0
+    while True:
+        ids = [
+            row[0]
+            for row in db.query(GroupOrder.id)
+            .filter(GroupOrder.kind.is_(None))
+            .order_by(GroupOrder.id.asc())
+            .limit(batch_size)
+            .all()
+        ]
+        if not ids:
+            break
+        for gid in ids:
+            try:
+                refresh_group_summary(db, gid)
+            except Exception as e:
+                logger.error(f"Failed to backfill summary for group {gid}: {e}")
+                # Mark as processed so a bad row cannot stall the loop
+                db.query(GroupOrder).filter(GroupOrder.id == gid).update(
+                    {GroupOrder.kind: "primary"}, synchronize_session=False
+                )
+        db.commit()
+        total += len(ids)
+    if total:
+        logger.info(f"Backfilled summary columns for {total} groups")
+    return total
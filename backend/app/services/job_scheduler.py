@@ -0,0 +1,377 @@
+"""
+Background Job Scheduler
+
+Runs periodic jobs (group expiry, settlement reconciliation, summary
+rollups) so that exactly one process in the cluster executes each run,
+even with several uvicorn workers or a standalone runner alive at once.
+
+Each job has a row in ``background_jobs`` that doubles as a lease: a
+worker claims a due job with a single conditional UPDATE, heartbeats the
+lease while the job runs, then records duration/lag and the next due time.
+A worker that dies mid-run simply lets its lease expire.
+"""
+
+import asyncio
+import os
+import socket
+import time
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from app.database import SessionLocal
+from app.models import BackgroundJob, GroupOrder, GroupOrderStatus
+
+logger = logging.getLogger(__name__)
+
+JobFunc = Callable[[], Union[None, Awaitable[None]]]
+
+
+def _env_flag(name: str, default: str = "0") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+@dataclass
+class JobSpec:
+    name: str
+    func: JobFunc
+    interval_seconds: int
+    is_async: bool = False
+    enabled: bool = True
+    lease_seconds: int = 300
+
+
+class JobScheduler:
+    def __init__(self, tick_seconds: int = 15):
+        self.tick_seconds = tick_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.jobs: Dict[str, JobSpec] = {}
+        self.running = False
+
+    def register(
+        self,
+        name: str,
+        func: JobFunc,
+        interval_seconds: int,
+        is_async: bool = False,
+        enabled: bool = True,
+        lease_seconds: int = 300,
+    ) -> None:
+        self.jobs[name] = JobSpec(name, func, interval_seconds, is_async, enabled, lease_seconds)
+
+    # ---- lease handling -------------------------------------------------
+
+    def _ensure_row(self, db, name: str) -> None:
+        if db.query(BackgroundJob.name).filter(BackgroundJob.name == name).first():
+            return
+        try:
+            db.add(BackgroundJob(name=name, run_count=0))
+            db.commit()
+        except IntegrityError:
+            # Another worker inserted it first
+            db.rollback()
+
+    def _claim(self, db, job: JobSpec) -> Optional[datetime]:
+        """Claim a due job. Returns the time it was due, or None if not claimed."""
+        self._ensure_row(db, job.name)
+        now = datetime.utcnow()
+        row = db.query(BackgroundJob).filter(BackgroundJob.name == job.name).first()
+        due_at = row.next_run_at if row else None
+        claimed = (
+            db.query(BackgroundJob)
+            .filter(
+                BackgroundJob.name == job.name,
+                or_(BackgroundJob.next_run_at.is_(None), BackgroundJob.next_run_at <= now),
+                or_(BackgroundJob.lease_expires_at.is_(None), BackgroundJob.lease_expires_at < now),
+            )
+            .update(
+                {
+                    BackgroundJob.owner: self.owner,
+                    BackgroundJob.lease_expires_at: now + timedelta(seconds=job.lease_seconds),
+                    BackgroundJob.last_started_at: now,
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        if not claimed:
+            return None
+        return due_at or now
+
+    def _heartbeat(self, job: JobSpec) -> None:
+        db = SessionLocal()
+        try:
+            db.query(BackgroundJob).filter(
+                BackgroundJob.name == job.name,
+                BackgroundJob.owner == self.owner,
+            ).update(
+                {BackgroundJob.lease_expires_at: datetime.utcnow() + timedelta(seconds=job.lease_seconds)},
+                synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    async def _heartbeat_loop(self, job: JobSpec) -> None:
+        while True:
+            await asyncio.sleep(max(1, job.lease_seconds // 3))
+            try:
+                await asyncio.to_thread(self._heartbeat, job)
+            except Exception as e:
+                logger.error(f"Lease heartbeat failed for job {job.name}: {e}")
+
+    def _release(self, job: JobSpec, started: datetime, due_at: datetime, duration_ms: int, error: Optional[str]) -> None:
+        db = SessionLocal()
+        try:
+            row = db.query(BackgroundJob).filter(
+                BackgroundJob.name == job.name,
+                BackgroundJob.owner == self.owner,
+            ).first()
+            if not row:
+                logger.warning(f"Lost lease for job {job.name} before finishing")
+                return
+            row.owner = None
+            row.lease_expires_at = None
+            row.last_finished_at = datetime.utcnow()
+            row.last_duration_ms = duration_ms
+            row.last_lag_ms = max(0, int((started - due_at).total_seconds() * 1000))
+            row.last_error = error[:1000] if error else None
+            row.run_count = (row.run_count or 0) + 1
+            row.next_run_at = started + timedelta(seconds=job.interval_seconds)
+            db.commit()
+        finally:
+            db.close()
+
+    # ---- running --------------------------------------------------------
+
+    async def run_job_if_due(self, name: str) -> bool:
+        """Run one job if it is due and no other process holds its lease."""
+        job = self.jobs[name]
+        db = SessionLocal()
+        try:
+            due_at = await asyncio.to_thread(self._claim, db, job)
+        finally:
+            db.close()
+        if due_at is None:
+            return False
+
+        started = datetime.utcnow()
+        t0 = time.perf_counter()
+        error = None
+        heartbeat = asyncio.create_task(self._heartbeat_loop(job))
+        try:
+            if job.is_async:
+                await job.func()
+            else:
+                await asyncio.to_thread(job.func)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logger.error(f"Background job {name} failed: {error}")
+        finally:
+            heartbeat.cancel()
+        duration_ms = int((time.perf_counter() - t0) * 1000)
+        await asyncio.to_thread(self._release, job, started, due_at, duration_ms, error)
+        logger.info(f"Background job {name} finished in {duration_ms} ms")
+        return True
+
+    async def run_forever(self) -> None:
+        self.running = True
+        enabled = [j.name for j in self.jobs.values() if j.enabled]
+        logger.info(f"Job scheduler started as {self.owner} (jobs: {', '.join(enabled) or 'none'})")
+        while self.running:
+            for name in enabled:
+                if not self.running:
+                    break
+                try:
+                    await self.run_job_if_due(name)
+                except Exception as e:
+                    logger.error(f"Job scheduler error for {name}: {e}")
+            await asyncio.sleep(self.tick_seconds)
+
+    def stop(self) -> None:
+        self.running = False
+        logger.info("Stopping job scheduler")
+
+    def status(self, db) -> List[Dict[str, Any]]:
+        """Registry view: schedule, lease holder, last duration and lag per job."""
+        rows = {r.name: r for r in db.query(BackgroundJob).all()}
+        now = datetime.utcnow()
+        result = []
+        for job in self.jobs.values():
+            row = rows.get(job.name)
+            next_run_at = row.next_run_at if row else None
+            leased = bool(row and row.lease_expires_at and row.lease_expires_at > now)
+            result.append({
+                "name": job.name,
+                "enabled": job.enabled,
+                "interval_seconds": job.interval_seconds,
+                "running": leased,
+                "owner": row.owner if leased else None,
+                "next_run_at": next_run_at.isoformat() if next_run_at else None,
+                "overdue_seconds": max(0, int((now - next_run_at).total_seconds())) if next_run_at else None,
+                "last_started_at": row.last_started_at.isoformat() if row and row.last_started_at else None,
+                "last_finished_at": row.last_finished_at.isoformat() if row and row.last_finished_at else None,
+                "last_duration_ms": row.last_duration_ms if row else None,
+                "last_lag_ms": row.last_lag_ms if row else None,
+                "last_error": row.last_error if row else None,
+                "run_count": (row.run_count or 0) if row else 0,
+            })
+        return result
+
+
+# ---- jobs -----------------------------------------------------------------
+
+async def _run_group_expiry() -> None:
+    from app.services.group_expiry import group_expiry_service
+    await group_expiry_service.check_expired_orders()
+    await group_expiry_service.check_successful_groups()
+
+
+def reconcile_settlements(batch_size: int = 200) -> int:
+    """Re-evaluate settlement/refund flags of every group not yet settled.
+
+    Replaces the old settlement_monitor.py sweep; uses the same rules as the
+    post-payment processor and commits per group.
+    """
+    from app.services.order_post_processor import OrderPostProcessor
+    db = SessionLocal()
+    total = 0
+    last_id = 0
+    try:
+        processor = OrderPostProcessor(db)
+        while True:
+            ids = [
+                gid for (gid,) in db.query(GroupOrder.id)
+                .filter(
+                    GroupOrder.id > last_id,
+                    GroupOrder.status != GroupOrderStatus.GROUP_FAILED,
+                    GroupOrder.settlement_paid_at.is_(None),
+                    GroupOrder.refund_paid_at.is_(None),
+                )
+                .order_by(GroupOrder.id.asc())
+                .limit(batch_size)
+                .all()
+            ]
+            if not ids:
+                break
+            for gid in ids:
+                try:
+                    processor.check_group_settlement(gid)
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"Settlement reconciliation failed for group {gid}: {e}")
+            last_id = ids[-1]
+            total += len(ids)
+    finally:
+        db.close()
+    return total
+
+
+def rollup_group_summaries(batch_size: int = 200) -> int:
+    """Recompute denormalized counters of forming groups to correct any drift."""
+    from app.services.group_summary import refresh_group_summary
+    db = SessionLocal()
+    total = 0
+    last_id = 0
+    try:
+        while True:
+            ids = [
+                gid for (gid,) in db.query(GroupOrder.id)
+                .filter(GroupOrder.id > last_id, GroupOrder.status == GroupOrderStatus.GROUP_FORMING)
+                .order_by(GroupOrder.id.asc())
+                .limit(batch_size)
+                .all()
+            ]
+            if not ids:
+                break
+            for gid in ids:
+                refresh_group_summary(db, gid)
+            db.commit()
+            last_id = ids[-1]
+            total += len(ids)
+    finally:
+        db.close()
+    return total
+
+
+def _rollup_product_scores() -> None:
+    from app.services.product_browse import rollup_product_scores
+    rollup_product_scores()
+
+
+def _build_recommendations() -> None:
+    from app.services.recommendations import run_recommendation_build
+    run_recommendation_build()
+
+
+def _purge_otp() -> None:
+    from app.services.otp_store import run_otp_purge
+    run_otp_purge()
+
+
+async def _dispatch_broadcasts() -> None:
+    from app.services.broadcasts import dispatch_broadcasts
+    await dispatch_broadcasts()
+
+
+async def _dispatch_outbox() -> None:
+    from app.services.notification_outbox import dispatch_outbox
+    await dispatch_outbox()
+
+
+def _archive_orders() -> None:
+    from app.services.order_archive import run_order_archive
+    run_order_archive()
+
+
+def _backup_database() -> None:
+    from app.services.backups import run_db_backup
+    run_db_backup()
+
+
+# Global instance
+job_scheduler = JobScheduler(tick_seconds=int(os.getenv("JOB_SCHEDULER_TICK_SECONDS", "15")))
+job_scheduler.register(
+    "group_expiry", _run_group_expiry, interval_seconds=600, is_async=True,
+    enabled=_env_flag("ENABLE_GROUP_EXPIRY"),
+)
+job_scheduler.register(
+    "settlement_reconcile", reconcile_settlements, interval_seconds=300,
+    enabled=_env_flag("ENABLE_SETTLEMENT_RECONCILE"),
+)
+job_scheduler.register(
+    "group_summary_rollup", rollup_group_summaries, interval_seconds=900,
+    enabled=_env_flag("ENABLE_SUMMARY_ROLLUP", "1"),
+)
+job_scheduler.register(
+    "product_score_rollup", _rollup_product_scores, interval_seconds=600,
+    enabled=_env_flag("ENABLE_PRODUCT_SCORE_ROLLUP", "1"),
+)
+job_scheduler.register(
+    "recommendation_build", _build_recommendations, interval_seconds=6 * 3600,
+    enabled=_env_flag("ENABLE_RECOMMENDATION_BUILD"), lease_seconds=1800,
+)
+job_scheduler.register(
+    "otp_purge", _purge_otp, interval_seconds=3600,
+    enabled=_env_flag("ENABLE_OTP_PURGE", "1"),
+)
+job_scheduler.register(
+    "broadcast_dispatch", _dispatch_broadcasts, interval_seconds=30, is_async=True,
+    enabled=_env_flag("ENABLE_BROADCAST_DISPATCH", "1"),
+)
+job_scheduler.register(
+    "notification_outbox", _dispatch_outbox, interval_seconds=30, is_async=True,
+    enabled=_env_flag("ENABLE_NOTIFICATION_OUTBOX", "1"),
+)
+job_scheduler.register(
+    "order_archive", _archive_orders, interval_seconds=6 * 3600,
+    enabled=_env_flag("ENABLE_ORDER_ARCHIVE"), lease_seconds=900,
+)
+job_scheduler.register(
+    "db_backup", _backup_database, interval_seconds=int(float(os.getenv("BACKUP_INTERVAL_HOURS", "24")) * 3600),
+    enabled=_env_flag("ENABLE_DB_BACKUP"), lease_seconds=3600,
+)
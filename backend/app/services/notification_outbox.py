@@ -0,0 +1,159 @@
+"""
+Notification Outbox
+User notifications that must not be lost or sent for a rolled-back change.
+
+Writers call ``enqueue()`` inside their own transaction, so a notification
+row exists exactly when the change it announces was committed. The
+notification_outbox job sends pending rows oldest first through
+NotificationService (SMS and/or Telegram) and records the outcome; a row
+that keeps failing is given up on after MAX_ATTEMPTS.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models import NotificationOutbox, User
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+DISPATCH_BUDGET_SECONDS = 25
+# Sends in flight at once; each holds a worker thread for its blocking provider calls
+SEND_CONCURRENCY = 4
+
+
+def enqueue(
+    db: Session,
+    user_id: int,
+    event: str,
+    title: str,
+    message: str,
+    payload: Optional[Dict[str, Any]] = None,
+) -> NotificationOutbox:
+    """Add a pending notification to the caller's transaction (not committed here)."""
+    row = NotificationOutbox(
+        user_id=user_id,
+        event=event,
+        title=title,
+        message=message,
+        payload=json.dumps(payload, ensure_ascii=False) if payload is not None else None,
+        status="pending",
+        attempts=0,
+        created_at=datetime.utcnow(),
+    )
+    db.add(row)
+    return row
+
+
+def _load_batch(after_id: int, batch_size: int) -> List[Any]:
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(NotificationOutbox.id, NotificationOutbox.user_id, NotificationOutbox.title, NotificationOutbox.message)
+            .where(NotificationOutbox.status == "pending", NotificationOutbox.id > after_id)
+            .order_by(NotificationOutbox.id)
+            .limit(batch_size)
+        ).all()
+        users = {}
+        if rows:
+            user_ids = {row.user_id for row in rows}
+            users = {u.id: u for u in db.query(User).filter(User.id.in_(user_ids)).all()}
+            for user in users.values():
+                db.expunge(user)
+        return [(row, users.get(row.user_id)) for row in rows]
+    finally:
+        db.close()
+
+
+def _save_outcomes(outcomes: Dict[int, Optional[str]], skipped: List[int]) -> None:
+    """``outcomes`` maps row id -> None (sent) or an error message."""
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        rows = db.query(NotificationOutbox).filter(NotificationOutbox.id.in_(list(outcomes) + skipped)).all()
+        for row in rows:
+            if row.id in skipped:
+                row.status = "skipped"
+                row.last_error = "No notification channel"
+                continue
+            row.attempts = (row.attempts or 0) + 1
+            error = outcomes[row.id]
+            if error is None:
+                row.status = "sent"
+                row.sent_at = now
+            else:
+                row.last_error = error[:1000]
+                if row.attempts >= MAX_ATTEMPTS:
+                    row.status = "failed"
+        db.commit()
+    finally:
+        db.close()
+
+
+def _send_blocking(user: User, title: str, message: str) -> Dict[str, bool]:
+    """send_notification for a worker thread: the SMS/Telegram calls are blocking ``requests`` calls."""
+    from app.services.notification import notification_service
+    return asyncio.run(notification_service.send_notification(user, title, message, include_references=False))
+
+
+async def dispatch_outbox(batch_size: int = BATCH_SIZE, max_seconds: int = DISPATCH_BUDGET_SECONDS) -> int:
+    """Periodic job entry point: send pending notifications. Returns how many were sent.
+
+    Sends run in worker threads, SEND_CONCURRENCY at a time, so slow SMS or
+    Telegram calls never block the event loop. A row is only started before
+    ``max_seconds`` runs out; rows left over stay pending for the next run.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    semaphore = asyncio.Semaphore(SEND_CONCURRENCY)
+    sent = 0
+    after_id = 0
+    while loop.time() < deadline:
+        batch = await asyncio.to_thread(_load_batch, after_id, batch_size)
+        if not batch:
+            break
+        outcomes: Dict[int, Optional[str]] = {}
+        skipped: List[int] = []
+
+        async def send_one(row, user) -> None:
+            async with semaphore:
+                if loop.time() >= deadline:
+                    return
+                try:
+                    result = await asyncio.to_thread(_send_blocking, user, row.title, row.message)
+                    outcomes[row.id] = None if any(result.values()) else "All channels failed"
+                except Exception as e:
+                    outcomes[row.id] = str(e) or e.__class__.__name__
+
+        sends = []
+        for row, user in batch:
+            if user is None:
+                outcomes[row.id] = "User not found"
+            elif not ((user.phone_number and user.is_phone_verified) or user.telegram_id):
+                skipped.append(row.id)
+            else:
+                sends.append(send_one(row, user))
+        await asyncio.gather(*sends)
+        await asyncio.to_thread(_save_outcomes, outcomes, skipped)
+        sent += sum(1 for error in outcomes.values() if error is None)
+        # Rows that failed stay pending for the next run; don't retry them in this one
+        after_id = batch[-1][0].id
+    if sent:
+        logger.info(f"Notification outbox: sent {sent} notifications")
+    return sent
+
+
+def outbox_stats(db: Session) -> Dict[str, int]:
+    """Row count per status."""
+    rows = db.execute(
+        select(NotificationOutbox.status, func.count()).group_by(NotificationOutbox.status)
+    ).all()
+    return {status: count for status, count in rows}
@@ -0,0 +1,369 @@
+"""
+Order Archive
+Moves finished history out of group_orders / orders / order_items.
+
+A group is archived, together with all of its orders and their items, once
+it is finalized or failed, has no unpaid settlement or refund, none of its
+orders is still being fulfilled, and it closed more than
+ORDER_ARCHIVE_AFTER_DAYS ago. Orders without a group are archived on age
+and fulfilment status alone. Each chunk is copied into the *_archive tables
+(models.py) and deleted from the hot tables in one transaction, so a row is
+always in exactly one place.
+
+Nothing reads the archive implicitly; callers opt in (``include_archived``
+on the history and admin lookup endpoints) and get archived rows tagged
+with ``"archived": True``.
+"""
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import DateTime, delete, func, insert, literal, not_, or_, select
+from sqlalchemy.orm import Session
+
+from app.models import (
+    GroupOrder, GroupOrderStatus, Order, OrderItem, Product, TEHRAN_TZ, User,
+    group_orders_archive, order_items_archive, orders_archive,
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", "180"))
+CHUNK_SIZE = 200  # groups (or solo orders) per transaction
+RUN_BUDGET_SECONDS = 60
+
+# Orders in these statuses are still moving and keep their group hot
+OPEN_STATUSES = ("processing", "shipped", "pending_approval", "در حال پردازش", "ارسال شده", "در انتظار تسویه")
+CLOSED_GROUP_STATUSES = (GroupOrderStatus.GROUP_FINALIZED, GroupOrderStatus.GROUP_FAILED)
+
+HOT_TO_ARCHIVE = (
+    (GroupOrder.__table__, group_orders_archive),
+    (Order.__table__, orders_archive),
+    (OrderItem.__table__, order_items_archive),
+)
+
+
+@dataclass
+class ArchiveResult:
+    groups: int = 0
+    orders: int = 0
+    items: int = 0
+    chunks: int = 0
+    dry_run: bool = False
+    complete: bool = True  # False when the time budget ran out first
+    cutoff: Optional[datetime] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "groups": self.groups,
+            "orders": self.orders,
+            "items": self.items,
+            "chunks": self.chunks,
+            "dry_run": self.dry_run,
+            "complete": self.complete,
+            "cutoff": self.cutoff.isoformat() if self.cutoff else None,
+        }
+
+
+def _cutoff(older_than_days: Optional[int]) -> datetime:
+    days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    if days < 1:
+        raise ValueError("older_than_days must be at least 1")
+    # Timestamps are stored as naive Tehran time
+    return datetime.now(TEHRAN_TZ).replace(tzinfo=None) - timedelta(days=days)
+
+
+def _closed_groups(cutoff: datetime, after_id: int, limit: int):
+    open_order = select(Order.id).where(Order.group_order_id == GroupOrder.id, Order.status.in_(OPEN_STATUSES))
+    return (
+        select(GroupOrder.id)
+        .where(
+            GroupOrder.id > after_id,
+            GroupOrder.status.in_(CLOSED_GROUP_STATUSES),
+            func.coalesce(GroupOrder.finalized_at, GroupOrder.expires_at, GroupOrder.created_at) < cutoff,
+            or_(GroupOrder.settlement_required.is_not(True), GroupOrder.settlement_paid_at.isnot(None)),
+            or_(func.coalesce(GroupOrder.refund_due_amount, 0) <= 0, GroupOrder.refund_paid_at.isnot(None)),
+            not_(open_order.exists()),
+        )
+        .order_by(GroupOrder.id)
+        .limit(limit)
+    )
+
+
+def _solo_orders(cutoff: datetime, after_id: int, limit: int):
+    return (
+        select(Order.id)
+        .where(
+            Order.id > after_id,
+            Order.group_order_id.is_(None),
+            Order.created_at < cutoff,
+            Order.status.notin_(OPEN_STATUSES),
+        )
+        .order_by(Order.id)
+        .limit(limit)
+    )
+
+
+def _copy(db: Session, hot, cold, where, now: datetime) -> None:
+    names = [col.name for col in hot.columns]
+    db.execute(
+        insert(cold).from_select(names + ["archived_at"], select(*hot.columns, literal(now, DateTime)).where(where))
+    )
+
+
+def _move(db: Session, group_ids: List[int], order_where, now: datetime) -> tuple:
+    """Copy then delete one chunk; returns (groups, orders, items) moved. Caller commits."""
+    orders, items = Order.__table__, OrderItem.__table__
+    order_ids = select(orders.c.id).where(order_where)
+    item_where = items.c.order_id.in_(order_ids)
+
+    _copy(db, items, order_items_archive, item_where, now)
+    _copy(db, orders, orders_archive, order_where, now)
+    if group_ids:
+        _copy(db, GroupOrder.__table__, group_orders_archive, GroupOrder.__table__.c.id.in_(group_ids), now)
+
+    moved_items = db.execute(delete(items).where(item_where)).rowcount
+    moved_orders = db.execute(delete(orders).where(order_where)).rowcount
+    moved_groups = 0
+    if group_ids:
+        moved_groups = db.execute(delete(GroupOrder.__table__).where(GroupOrder.__table__.c.id.in_(group_ids))).rowcount
+    return moved_groups, moved_orders, moved_items
+
+
+def _count_chunk(db: Session, group_ids: List[int], order_where) -> tuple:
+    order_ids = select(Order.id).where(order_where)
+    orders = db.scalar(select(func.count()).select_from(order_ids.subquery())) or 0
+    items = db.scalar(select(func.count(OrderItem.id)).where(OrderItem.order_id.in_(order_ids))) or 0
+    return len(group_ids), orders, items
+
+
+def archive_orders(
+    db: Session,
+    older_than_days: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+    max_seconds: float = RUN_BUDGET_SECONDS,
+    dry_run: bool = False,
+) -> ArchiveResult:
+    """Move eligible groups, then eligible solo orders, one committed chunk at a time.
+
+    With ``dry_run`` nothing is written and the counts are what would move.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    cutoff = _cutoff(older_than_days)
+    result = ArchiveResult(dry_run=dry_run, cutoff=cutoff)
+    deadline = time.monotonic() + max_seconds
+    now = datetime.utcnow()
+
+    def run_chunk(group_ids: List[int], order_where) -> None:
+        try:
+            if dry_run:
+                counts = _count_chunk(db, group_ids, order_where)
+            else:
+                counts = _move(db, group_ids, order_where, now)
+                db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        result.groups += counts[0]
+        result.orders += counts[1]
+        result.items += counts[2]
+        result.chunks += 1
+
+    after_id = 0
+    while True:
+        if time.monotonic() > deadline:
+            result.complete = False
+            return result
+        group_ids = list(db.scalars(_closed_groups(cutoff, after_id, chunk_size)))
+        if not group_ids:
+            break
+        run_chunk(group_ids, Order.__table__.c.group_order_id.in_(group_ids))
+        after_id = group_ids[-1]
+
+    after_id = 0
+    while True:
+        if time.monotonic() > deadline:
+            result.complete = False
+            return result
+        order_ids = list(db.scalars(_solo_orders(cutoff, after_id, chunk_size)))
+        if not order_ids:
+            break
+        run_chunk([], Order.__table__.c.id.in_(order_ids))
+        after_id = order_ids[-1]
+    return result
+
+
+def run_order_archive() -> None:
+    """Periodic job entry point."""
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        result = archive_orders(db)
+    finally:
+        db.close()
+    if result.orders or result.groups:
+        logger.info(
+            f"Order archive: moved {result.groups} groups, {result.orders} orders, {result.items} items"
+            + ("" if result.complete else " (budget exhausted, continuing next run)")
+        )
+
+
+def archive_stats(db: Session) -> Dict[str, int]:
+    """Row counts of the hot and archive tables."""
+    stats = {}
+    for hot, cold in HOT_TO_ARCHIVE:
+        stats[hot.name] = db.scalar(select(func.count()).select_from(hot)) or 0
+        stats[cold.name] = db.scalar(select(func.count()).select_from(cold)) or 0
+    return stats
+
+
+# ---- Reads ---------------------------------------------------------------------
+
+def _archived_items(db: Session, order_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+    items: Dict[int, List[Dict[str, Any]]] = {order_id: [] for order_id in order_ids}
+    if not order_ids:
+        return items
+    rows = db.execute(
+        select(order_items_archive, Product.name.label("product_name"))
+        .outerjoin(Product, Product.id == order_items_archive.c.product_id)
+        .where(order_items_archive.c.order_id.in_(order_ids))
+        .order_by(order_items_archive.c.id)
+    ).all()
+    for row in rows:
+        items[row.order_id].append({
+            "id": row.id,
+            "product_id": row.product_id,
+            "quantity": row.quantity,
+            "base_price": row.base_price,
+            "total_price": row.base_price * row.quantity,
+            "product_name": row.product_name or "محصول حذف شده",
+        })
+    return items
+
+
+def get_archived_order(db: Session, order_id: int) -> Optional[Dict[str, Any]]:
+    """Archived order row, its items and its group row (or None), or None if not archived."""
+    order = db.execute(select(orders_archive).where(orders_archive.c.id == order_id)).first()
+    if order is None:
+        return None
+    group = None
+    if order.group_order_id is not None:
+        group = db.execute(
+            select(group_orders_archive).where(group_orders_archive.c.id == order.group_order_id)
+        ).first()
+    return {"order": order, "group": group, "items": _archived_items(db, [order.id])[order.id]}
+
+
+def search_archived_orders(
+    db: Session,
+    user_id: Optional[int] = None,
+    phone: Optional[str] = None,
+    group_order_id: Optional[int] = None,
+    limit: int = 100,
+    before_id: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Archived orders matching every given filter, newest id first."""
+    if user_id is None and not phone and group_order_id is None:
+        raise ValueError("Provide user_id, phone or group_order_id")
+    arch = orders_archive.c
+    stmt = (
+        select(orders_archive, User.phone_number, User.first_name, User.last_name)
+        .outerjoin(User, User.id == arch.user_id)
+    )
+    if user_id is not None:
+        stmt = stmt.where(arch.user_id == user_id)
+    if phone:
+        stmt = stmt.where(arch.user_id.in_(select(User.id).where(User.phone_number == phone.strip())))
+    if group_order_id is not None:
+        stmt = stmt.where(arch.group_order_id == group_order_id)
+    if before_id:
+        stmt = stmt.where(arch.id < before_id)
+    rows = db.execute(stmt.order_by(arch.id.desc()).limit(limit)).all()
+    items = _archived_items(db, [row.id for row in rows])
+    return [
+        {
+            "id": row.id,
+            "user_id": row.user_id,
+            "user_name": f"{row.first_name or ''} {row.last_name or ''}".strip() or row.phone_number or "مهمان",
+            "user_phone": row.phone_number or "",
+            "total_amount": row.total_amount,
+            "status": row.status,
+            "order_type": row.order_type.value if row.order_type else None,
+            "group_order_id": row.group_order_id,
+            "is_settlement_payment": bool(row.is_settlement_payment),
+            "created_at": row.created_at,
+            "paid_at": row.paid_at,
+            "delivery_slot": row.delivery_slot,
+            "shipping_address": row.shipping_address,
+            "items": items[row.id],
+            "archived": True,
+            "archived_at": row.archived_at,
+        }
+        for row in rows
+    ]
+
+
+def _group_status(status: Optional[GroupOrderStatus]) -> Optional[str]:
+    if status is None:
+        return None
+    return "success" if status == GroupOrderStatus.GROUP_FINALIZED else "failed"
+
+
+def archived_orders_for_user(db: Session, user_id: int) -> List[Dict[str, Any]]:
+    """A user's archived paid orders, shaped like the entries of /my-groups-and-orders."""
+    arch = orders_archive.c
+    grp = group_orders_archive.c
+    rows = db.execute(
+        select(
+            orders_archive,
+            grp.leader_id, grp.status.label("group_status"), grp.finalized_at.label("group_finalized_at"),
+            grp.settlement_required, grp.settlement_paid_at,
+            grp.allow_consolidation.label("group_allow_consolidation"),
+        )
+        .outerjoin(group_orders_archive, grp.id == arch.group_order_id)
+        .where(
+            arch.user_id == user_id,
+            arch.is_settlement_payment.is_not(True),
+            arch.status != "در انتظار پرداخت",
+            or_(arch.payment_ref_id.isnot(None), arch.paid_at.isnot(None)),
+        )
+        .order_by(arch.id.desc())
+    ).all()
+    item_counts = dict(db.execute(
+        select(order_items_archive.c.order_id, func.count())
+        .where(order_items_archive.c.order_id.in_(
+            select(arch.id).where(arch.user_id == user_id)
+        ))
+        .group_by(order_items_archive.c.order_id)
+    ).all())
+    result = []
+    for row in rows:
+        in_group = row.group_order_id is not None and row.leader_id is not None
+        is_leader = in_group and row.leader_id == row.user_id
+        settled = (not in_group) or (not is_leader) or row.settlement_paid_at is not None or row.settlement_required is not True
+        result.append({
+            "id": row.id,
+            "user_id": row.user_id,
+            "total_amount": row.total_amount,
+            "status": row.status,
+            "created_at": row.created_at,
+            "payment_authority": row.payment_authority,
+            "payment_ref_id": row.payment_ref_id,
+            "shipping_address": row.shipping_address,
+            "delivery_slot": row.delivery_slot,
+            "items_count": item_counts.get(row.id, 0),
+            "is_settlement_payment": bool(row.is_settlement_payment),
+            "group_order_id": row.group_order_id,
+            "group_finalized": in_group and row.group_finalized_at is not None,
+            "is_leader_order": is_leader,
+            "group_status": _group_status(row.group_status) if in_group else None,
+            "settlement_status": "settled" if settled else "pending",
+            "ship_to_leader_address": bool(row.ship_to_leader_address),
+            "allow_consolidation": bool(row.group_allow_consolidation) if in_group else False,
+            "archived": True,
+        })
+    return result
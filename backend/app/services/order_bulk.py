@@ -0,0 +1,210 @@
+"""
+Bulk Order Operations
+Status and delivery-slot changes for many orders in one transaction.
+
+Targets are explicit order ids and/or every non-settlement order of a group.
+Propagation follows the single-order admin endpoints: a status change also
+reaches the consolidated shipment (leader order plus members shipping to
+the leader) and a slot change reaches the whole group. Rows are updated with
+set-based ``UPDATE ... WHERE id IN (...)`` and each affected user gets one
+outbox notification listing their orders, written in the same transaction.
+"""
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.models import GroupOrder, Order
+from app.services.notification_outbox import enqueue
+from app.services.order_metadata import resolve_delivery_slot_id
+
+logger = logging.getLogger(__name__)
+
+MAX_ORDERS = 1000
+ID_CHUNK = 500  # stays under SQLite's bound-parameter limit
+
+STATUS_LABELS = {
+    "pending": "در انتظار",
+    "processing": "در حال پردازش",
+    "shipped": "ارسال شده",
+    "completed": "تحویل داده شده",
+    "cancelled": "لغو شده",
+    "pending_approval": "در انتظار تایید",
+}
+
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+NOT_FOUND = "not_found"
+
+
+@dataclass
+class BulkResult:
+    results: Dict[int, str] = field(default_factory=dict)  # order id -> updated/unchanged/not_found
+    propagated: List[int] = field(default_factory=list)  # ids reached only through group propagation
+    notified_users: int = 0
+
+    def as_dict(self) -> dict:
+        counts: Dict[str, int] = defaultdict(int)
+        for outcome in self.results.values():
+            counts[outcome] += 1
+        propagated = set(self.propagated)
+        return {
+            "results": [
+                {"order_id": order_id, "result": outcome, "propagated": order_id in propagated}
+                for order_id, outcome in self.results.items()
+            ],
+            "counts": dict(counts),
+            "notified_users": self.notified_users,
+        }
+
+
+def _chunks(ids: Sequence[int], size: int = ID_CHUNK) -> Iterable[List[int]]:
+    for i in range(0, len(ids), size):
+        yield list(ids[i:i + size])
+
+
+def _rows(db: Session, where) -> Dict[int, object]:
+    cols = (Order.id, Order.user_id, Order.status, Order.delivery_slot, Order.group_order_id)
+    return {row.id: row for row in db.execute(select(*cols).where(where)).all()}
+
+
+def _check_targets(order_ids: Sequence[int], group_id: Optional[int]) -> List[int]:
+    order_ids = list(dict.fromkeys(order_ids))
+    if not order_ids and group_id is None:
+        raise ValueError("Provide order_ids or group_id")
+    if len(order_ids) > MAX_ORDERS:
+        raise ValueError(f"At most {MAX_ORDERS} orders per request")
+    return order_ids
+
+
+def _load_targets(
+    db: Session, order_ids: Sequence[int], group_id: Optional[int], propagate: str
+) -> Tuple[Dict[int, object], Dict[int, object], List[int]]:
+    """Requested + propagated order rows, and requested ids that do not exist."""
+    requested: Dict[int, object] = {}
+    for chunk in _chunks(list(order_ids)):
+        requested.update(_rows(db, Order.id.in_(chunk)))
+    missing = [order_id for order_id in order_ids if order_id not in requested]
+
+    group_ids = {row.group_order_id for row in requested.values() if row.group_order_id}
+    extra: Dict[int, object] = {}
+    if group_id is not None:
+        if db.get(GroupOrder, group_id) is None:
+            raise LookupError(f"Group {group_id} not found")
+        extra.update(_rows(db, and_(Order.group_order_id == group_id, Order.is_settlement_payment == False)))
+    if group_ids and propagate == "group":
+        for chunk in _chunks(sorted(group_ids)):
+            extra.update(_rows(db, and_(Order.group_order_id.in_(chunk), Order.is_settlement_payment == False)))
+    elif group_ids and propagate == "consolidated":
+        for chunk in _chunks(sorted(group_ids)):
+            extra.update(_rows(db, Order.id.in_(
+                select(Order.id)
+                .join(GroupOrder, GroupOrder.id == Order.group_order_id)
+                .where(
+                    GroupOrder.id.in_(chunk),
+                    GroupOrder.allow_consolidation == True,
+                    Order.is_settlement_payment == False,
+                    or_(Order.user_id == GroupOrder.leader_id, Order.ship_to_leader_address == True),
+                )
+            )))
+    propagated = {order_id: row for order_id, row in extra.items() if order_id not in requested}
+    return requested, propagated, missing
+
+
+def _apply(
+    db: Session,
+    requested: Dict[int, object],
+    propagated: Dict[int, object],
+    missing: List[int],
+    field_name: str,
+    values: dict,
+    notify_event: Optional[str],
+    title: str,
+    message_for: Callable[[List[int]], str],
+) -> BulkResult:
+    """Write ``values`` to targets whose ``field_name`` differs, queue notifications, commit."""
+    result = BulkResult()
+    for order_id in missing:
+        result.results[order_id] = NOT_FOUND
+    targets = {**requested, **propagated}
+    changed = sorted(order_id for order_id, row in targets.items() if getattr(row, field_name) != values[field_name])
+    changed_set = set(changed)
+    for order_id in targets:
+        result.results[order_id] = UPDATED if order_id in changed_set else UNCHANGED
+    result.propagated = sorted(propagated)
+
+    for chunk in _chunks(changed):
+        db.execute(update(Order).where(Order.id.in_(chunk)).values(**values), execution_options={"synchronize_session": False})
+
+    if notify_event:
+        by_user: Dict[int, List[int]] = defaultdict(list)
+        for order_id in changed:
+            user_id = targets[order_id].user_id
+            if user_id:
+                by_user[user_id].append(order_id)
+        for user_id, ids in by_user.items():
+            enqueue(db, user_id, notify_event, title, message_for(ids), {"order_ids": ids})
+        result.notified_users = len(by_user)
+    db.commit()
+    return result
+
+
+def _order_list(ids: List[int]) -> str:
+    return "، ".join(str(order_id) for order_id in ids)
+
+
+def bulk_update_status(
+    db: Session,
+    status: str,
+    order_ids: Sequence[int] = (),
+    group_id: Optional[int] = None,
+    notify: bool = True,
+) -> BulkResult:
+    """Set ``status`` on the targets and their consolidated shipments. Commits."""
+    status = (status or "").strip()
+    if not status or len(status) > 20:
+        raise ValueError("status must be 1-20 characters")
+    order_ids = _check_targets(order_ids, group_id)
+
+    requested, propagated, missing = _load_targets(db, order_ids, group_id, "consolidated")
+    label = STATUS_LABELS.get(status, status)
+    result = _apply(
+        db, requested, propagated, missing,
+        field_name="status",
+        values={"status": status},
+        notify_event="order_status" if notify else None,
+        title="به‌روزرسانی سفارش",
+        message_for=lambda ids: f"وضعیت سفارش {_order_list(ids)} به «{label}» تغییر کرد.",
+    )
+    logger.info(f"Bulk status '{status}': {sum(1 for r in result.results.values() if r == UPDATED)} orders updated")
+    return result
+
+
+def bulk_update_delivery_slot(
+    db: Session,
+    delivery_slot: str,
+    order_ids: Sequence[int] = (),
+    group_id: Optional[int] = None,
+    notify: bool = True,
+) -> BulkResult:
+    """Set the delivery slot on the targets and the rest of their groups. Commits."""
+    delivery_slot = (delivery_slot or "").strip()
+    if not delivery_slot or len(delivery_slot) > 100:
+        raise ValueError("delivery_slot must be 1-100 characters")
+    order_ids = _check_targets(order_ids, group_id)
+
+    requested, propagated, missing = _load_targets(db, order_ids, group_id, "group")
+    slot_id = resolve_delivery_slot_id(db, delivery_slot)
+    result = _apply(
+        db, requested, propagated, missing,
+        field_name="delivery_slot",
+        values={"delivery_slot": delivery_slot, "delivery_slot_id": slot_id},
+        notify_event="delivery_slot" if notify else None,
+        title="زمان ارسال سفارش",
+        message_for=lambda ids: f"زمان ارسال سفارش {_order_list(ids)} به «{delivery_slot}» تغییر کرد.",
+    )
+    logger.info(f"Bulk delivery slot '{delivery_slot}': {sum(1 for r in result.results.values() if r == UPDATED)} orders updated")
+    return result
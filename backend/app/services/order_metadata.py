@@ -0,0 +1,136 @@
+"""
+Order Metadata Helpers
+Typed order metadata (mode, expected_friends, allow_consolidation,
+pending_invite_token, delivery_slot_id) used to live as JSON inside
+Order.delivery_slot and as a PENDING_INVITE marker inside
+Order.shipping_address. These helpers resolve the typed columns and
+backfill them from the legacy encodings.
+"""
+from datetime import date
+from typing import Optional, Tuple
+import json
+import logging
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.models import Order, DeliverySlot
+
+logger = logging.getLogger(__name__)
+
+PENDING_INVITE_PREFIX = "PENDING_INVITE:"
+
+# Legacy delivery_slot JSON used both verbose and compact keys
+_SLOT_KEYS = ("delivery_slot", "ds", "slot", "time_slot", "time")
+
+
+def parse_legacy_delivery_slot(raw: Optional[str]) -> dict:
+    """Split a legacy delivery_slot value into its slot text and group metadata.
+
+    Returns a dict with keys: slot, mode, expected_friends, allow_consolidation.
+    Plain (non-JSON) values are returned as the slot text unchanged.
+    """
+    result = {"slot": raw, "mode": None, "expected_friends": None, "allow_consolidation": None}
+    s = (raw or "").strip()
+    if not s.startswith("{"):
+        return result
+    try:
+        info = json.loads(s)
+    except Exception:
+        return result
+    if not isinstance(info, dict):
+        return result
+
+    result["slot"] = next((str(info[k]) for k in _SLOT_KEYS if info.get(k)), None)
+    result["mode"] = info.get("mode") or info.get("m")
+    for key in ("expected_friends", "ex", "friends", "f", "max_friends", "mx"):
+        if info.get(key) is not None:
+            try:
+                result["expected_friends"] = int(info[key])
+                break
+            except (TypeError, ValueError):
+                continue
+    ac = info.get("allow_consolidation", info.get("ac"))
+    if isinstance(ac, str):
+        ac = ac.strip().lower() in ("1", "true", "yes", "on")
+    result["allow_consolidation"] = bool(ac) if ac is not None else None
+    return result
+
+
+def split_pending_invite(shipping_address: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Split 'PENDING_INVITE:token|address' into (token, address)."""
+    if not shipping_address or not shipping_address.startswith(PENDING_INVITE_PREFIX):
+        return None, shipping_address
+    head, _, tail = shipping_address.partition("|")
+    token = head[len(PENDING_INVITE_PREFIX):] or None
+    return token, tail
+
+
+def resolve_delivery_slot_id(db: Session, slot: Optional[str]) -> Optional[int]:
+    """Map 'YYYY-MM-DD HH:MM-HH:MM' (the checkout format) to a DeliverySlot id."""
+    if not slot:
+        return None
+    try:
+        day_s, _, window = slot.strip().partition(" ")
+        start_s, _, end_s = window.partition("-")
+        day = date.fromisoformat(day_s)
+    except ValueError:
+        return None
+    return (
+        db.query(DeliverySlot.id)
+        .filter(
+            DeliverySlot.delivery_date == day,
+            DeliverySlot.start_time == start_s.strip(),
+            DeliverySlot.end_time == end_s.strip(),
+        )
+        .limit(1)
+        .scalar()
+    )
+
+
+def backfill_order_metadata(db: Session, batch_size: int = 500) -> int:
+    """Move legacy JSON/marker metadata of existing orders into typed columns.
+
+    Only rows still carrying a legacy encoding are touched; each chunk is
+    committed separately so the write lock is released between chunks.
+    """
+    total = 0
+    last_id = 0
+    while True:
+        orders = (
+            db.query(Order)
+            .filter(
+                Order.id > last_id,
+                or_(
+                    Order.delivery_slot.like("{%"),
+                    Order.shipping_address.like(f"{PENDING_INVITE_PREFIX}%"),
+                ),
+            )
+            .order_by(Order.id.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not orders:
+            break
+        for order in orders:
+            meta = parse_legacy_delivery_slot(order.delivery_slot)
+            if order.mode is None:
+                order.mode = meta["mode"]
+            if order.expected_friends is None:
+                order.expected_friends = meta["expected_friends"]
+            if order.allow_consolidation is None:
+                order.allow_consolidation = meta["allow_consolidation"]
+            order.delivery_slot = meta["slot"]
+            if order.delivery_slot_id is None:
+                order.delivery_slot_id = resolve_delivery_slot_id(db, meta["slot"])
+
+            token, address = split_pending_invite(order.shipping_address)
+            if token:
+                order.pending_invite_token = token
+                order.shipping_address = address
+        db.commit()
+        last_id = orders[-1].id
+        total += len(orders)
+    if total:
+        logger.info(f"Backfilled typed metadata for {total} orders")
+    return total
@@ -4,6 +4,7 @@ Runs after every order update to ensure settlement requirements are properly app
 """
 from sqlalchemy.orm import Session
 from app.models import Order, GroupOrder, OrderItem, Product
+from app.services.pricing import load_products, order_basket_value, secondary_refund, unit_price_for_friends
 import json
 import logging
 
@@ -40,41 +41,16 @@ class OrderPostProcessor:
         """
         if member_count <= 0:
             return 0  # No refund if no members joined
-        
-        # Get total basket value from order items
+
         items = self.db.query(OrderItem).filter(
             OrderItem.order_id == leader_order.id
         ).all()
-        
-        total_basket_value = 0
-        for item in items:
-            product = self.db.query(Product).filter(Product.id == item.product_id).first()
-            if product:
-                # For secondary groups, use the original price (market_price or base_price)
-                unit_price = product.market_price or product.base_price or 0
-                total_basket_value += unit_price * item.quantity
-        
-        if total_basket_value <= 0:
-            return 0
-        
-        # Calculate refund: (total_basket_value ÷ 4) × member_count
-        # But cap at maximum 4 members (so max refund = total_basket_value)
-        discount_per_member = total_basket_value / 4
-        effective_members = min(member_count, 4)  # Cap at 4 members
-        refund_amount = discount_per_member * effective_members
-        
-        return min(refund_amount, total_basket_value)  # Don't refund more than they paid
+        products = load_products(self.db, (item.product_id for item in items))
+        return secondary_refund(order_basket_value(items, products), member_count)
     
     def get_price_for_friends_count(self, product, friends_count):
         """Get the price for a specific number of friends"""
-        if friends_count == 0:
-            return product.market_price
-        elif friends_count == 1:
-            return product.friend_1_price or product.market_price
-        elif friends_count == 2:
-            return product.friend_2_price or product.friend_1_price or product.market_price
-        else:  # 3 or more friends
-            return product.friend_3_price or product.friend_2_price or product.friend_1_price or product.market_price
+        return unit_price_for_friends(product, friends_count)
     
     def process_order(self, order_id: int):
         """Process an order after payment verification"""
@@ -204,16 +180,9 @@ class OrderPostProcessor:
         if group.expected_friends:
             return group.expected_friends
         
-        # Try to parse from leader's delivery_slot
-        if leader_order.delivery_slot:
-            try:
-                slot_data = json.loads(leader_order.delivery_slot)
-                if isinstance(slot_data, dict):
-                    expected = slot_data.get('friends') or slot_data.get('expected_friends')
-                    if expected:
-                        return int(expected)
-            except:
-                pass
+        # Fall back to the tier the leader chose at checkout
+        if leader_order.expected_friends:
+            return leader_order.expected_friends
         
         # Default: assume 1 friend tier was selected on cart
         return 1
@@ -0,0 +1,315 @@
+"""
+OTP Store
+Login codes, wrong-attempt counters and send-rate token buckets, kept off
+the primary database.
+
+The backend is chosen by OTP_STORE_URL:
+
+    memory://                  per-process dicts (single worker / tests only)
+    sqlite:///./otp_store.db   local file shared by every worker (default)
+    redis://localhost:6379/0   any Redis-compatible server (needs ``redis``)
+
+Every backend implements the same four operations; the token bucket and
+attempt checks are atomic within the backend so concurrent workers can't
+overspend a phone's sends or guesses.
+"""
+import hmac
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models import PhoneVerification
+
+logger = logging.getLogger(__name__)
+
+# check_code() results
+OTP_OK = "ok"
+OTP_INVALID = "invalid"
+OTP_MISSING = "missing"  # never sent, expired or already used
+OTP_LOCKED = "locked"  # too many wrong attempts; a new code must be requested
+
+
+class OTPStore:
+    def save_code(self, phone: str, code: str, ttl_seconds: int) -> None:
+        """Store ``code`` for ``phone``, replacing any previous code and its attempts."""
+        raise NotImplementedError
+
+    def check_code(self, phone: str, code: str, max_attempts: int) -> str:
+        """Compare ``code``; a correct code is consumed, a wrong one counts an attempt."""
+        raise NotImplementedError
+
+    def take_token(self, key: str, capacity: int, refill_seconds: float) -> float:
+        """Spend one token from the bucket ``key``.
+
+        The bucket holds up to ``capacity`` tokens and regains one every
+        ``refill_seconds``. Returns 0 if a token was spent, otherwise the
+        seconds until one is available.
+        """
+        raise NotImplementedError
+
+    def purge_expired(self) -> int:
+        """Drop expired codes and full buckets; returns entries removed."""
+        return 0
+
+
+def _refill(tokens: float, updated_at: float, now: float, capacity: int, refill_seconds: float) -> float:
+    return min(float(capacity), tokens + (now - updated_at) / refill_seconds)
+
+
+class MemoryOTPStore(OTPStore):
+    SWEEP_SECONDS = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._codes: Dict[str, List] = {}  # phone -> [code, expires_at, attempts]
+        self._buckets: Dict[str, List] = {}  # key -> [tokens, updated_at, capacity, refill_seconds]
+        self._last_sweep = time.time()
+
+    def save_code(self, phone, code, ttl_seconds):
+        now = time.time()
+        with self._lock:
+            self._codes[phone] = [code, now + ttl_seconds, 0]
+            if now - self._last_sweep > self.SWEEP_SECONDS:
+                self._sweep(now)
+
+    def check_code(self, phone, code, max_attempts):
+        with self._lock:
+            entry = self._codes.get(phone)
+            if entry is None or entry[1] <= time.time():
+                self._codes.pop(phone, None)
+                return OTP_MISSING
+            if entry[2] >= max_attempts:
+                return OTP_LOCKED
+            if hmac.compare_digest(entry[0], code):
+                del self._codes[phone]
+                return OTP_OK
+            entry[2] += 1
+            return OTP_INVALID
+
+    def take_token(self, key, capacity, refill_seconds):
+        now = time.time()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = capacity if bucket is None else _refill(bucket[0], bucket[1], now, capacity, refill_seconds)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) * refill_seconds
+            self._buckets[key] = [tokens, now, capacity, refill_seconds]
+            return wait
+
+    def _sweep(self, now: float) -> int:
+        expired = [p for p, e in self._codes.items() if e[1] <= now]
+        full = [k for k, b in self._buckets.items() if _refill(b[0], b[1], now, b[2], b[3]) >= b[2]]
+        for phone in expired:
+            del self._codes[phone]
+        for key in full:
+            del self._buckets[key]
+        self._last_sweep = now
+        return len(expired) + len(full)
+
+    def purge_expired(self):
+        with self._lock:
+            return self._sweep(time.time())
+
+
+class SQLiteOTPStore(OTPStore):
+    """Separate SQLite file (WAL) so every worker on the host shares codes and buckets."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS otp_codes ("
+            "phone TEXT PRIMARY KEY, code TEXT NOT NULL, expires_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._conn()
+        # IMMEDIATE takes the write lock up front so read-modify-write is atomic across workers
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def save_code(self, phone, code, ttl_seconds):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO otp_codes (phone, code, expires_at, attempts) VALUES (?, ?, ?, 0)",
+            (phone, code, time.time() + ttl_seconds),
+        )
+
+    def check_code(self, phone, code, max_attempts):
+        conn = self._transaction()
+        try:
+            row = conn.execute("SELECT code, expires_at, attempts FROM otp_codes WHERE phone = ?", (phone,)).fetchone()
+            if row is None or row[1] <= time.time():
+                conn.execute("DELETE FROM otp_codes WHERE phone = ?", (phone,))
+                result = OTP_MISSING
+            elif row[2] >= max_attempts:
+                result = OTP_LOCKED
+            elif hmac.compare_digest(row[0], code):
+                conn.execute("DELETE FROM otp_codes WHERE phone = ?", (phone,))
+                result = OTP_OK
+            else:
+                conn.execute("UPDATE otp_codes SET attempts = attempts + 1 WHERE phone = ?", (phone,))
+                result = OTP_INVALID
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def take_token(self, key, capacity, refill_seconds):
+        now = time.time()
+        conn = self._transaction()
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            tokens = capacity if row is None else _refill(row[0], row[1], now, capacity, refill_seconds)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) * refill_seconds
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)",
+                (key, tokens, now, now + (capacity - tokens) * refill_seconds),
+            )
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def purge_expired(self):
+        now = time.time()
+        conn = self._conn()
+        removed = conn.execute("DELETE FROM otp_codes WHERE expires_at <= ?", (now,)).rowcount
+        removed += conn.execute("DELETE FROM rate_buckets WHERE full_at <= ?", (now,)).rowcount
+        return removed
+
+
+_REDIS_CHECK = """
+local h = redis.call('HMGET', KEYS[1], 'code', 'attempts')
+if not h[1] then return 'missing' end
+if tonumber(h[2]) >= tonumber(ARGV[2]) then return 'locked' end
+if h[1] == ARGV[1] then redis.call('DEL', KEYS[1]) return 'ok' end
+redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+return 'invalid'
+"""
+
+_REDIS_TAKE = """
+local capacity = tonumber(ARGV[1])
+local refill = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local h = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = capacity
+if h[1] then tokens = math.min(capacity, tonumber(h[1]) + (now - tonumber(h[2])) / refill) end
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) * refill end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) * refill) + 1)
+return tostring(wait)
+"""
+
+
+class RedisOTPStore(OTPStore):
+    """Redis-compatible server; keys expire on their own so purge is a no-op."""
+
+    def __init__(self, url: str, prefix: str = "bahamm:otp:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("OTP_STORE_URL uses redis:// but the 'redis' package is not installed") from e
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self._check = self.client.register_script(_REDIS_CHECK)
+        self._take = self.client.register_script(_REDIS_TAKE)
+
+    def save_code(self, phone, code, ttl_seconds):
+        key = f"{self.prefix}code:{phone}"
+        pipe = self.client.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, mapping={"code": code, "attempts": 0})
+        pipe.expire(key, int(ttl_seconds))
+        pipe.execute()
+
+    def check_code(self, phone, code, max_attempts):
+        return self._check(keys=[f"{self.prefix}code:{phone}"], args=[code, max_attempts])
+
+    def take_token(self, key, capacity, refill_seconds):
+        return float(self._take(keys=[f"{self.prefix}bucket:{key}"], args=[capacity, refill_seconds, time.time()]))
+
+
+def create_otp_store(url: str) -> OTPStore:
+    if url.startswith("memory://"):
+        return MemoryOTPStore()
+    if url.startswith("sqlite:///"):
+        path = url[len("sqlite:///"):]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return SQLiteOTPStore(path)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisOTPStore(url)
+    raise ValueError(f"Unsupported OTP_STORE_URL: {url}")
+
+
+@lru_cache()
+def get_otp_store() -> OTPStore:
+    return create_otp_store(get_settings().OTP_STORE_URL)
+
+
+def purge_phone_verifications(db: Session, retention_days: int = 1, batch_size: int = 5000) -> int:
+    """Delete legacy phone_verifications rows (codes now live in the OTP store).
+
+    Removes used rows and rows expired more than ``retention_days`` ago, in
+    batches so the primary DB isn't locked for long.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    total = 0
+    while True:
+        ids = db.execute(
+            select(PhoneVerification.id)
+            .where(or_(PhoneVerification.is_used == True, PhoneVerification.expires_at < cutoff))
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        db.query(PhoneVerification).filter(PhoneVerification.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        total += len(ids)
+    return total
+
+
+def run_otp_purge() -> None:
+    """Periodic job entry point."""
+    from app.database import SessionLocal
+    removed = get_otp_store().purge_expired()
+    db = SessionLocal()
+    try:
+        rows = purge_phone_verifications(db)
+    finally:
+        db.close()
+    if removed or rows:
+        logger.info(f"OTP purge: {removed} store entries, {rows} phone_verifications rows")
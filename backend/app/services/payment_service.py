@@ -10,6 +10,9 @@ from app.utils.logging import get_logger
 from app.config import get_settings
 from app.services.group_settlement_service import GroupSettlementService
 from app.services.order_post_processor import OrderPostProcessor
+from app.services.group_summary import refresh_group_summary
+from app.services.order_metadata import resolve_delivery_slot_id
+from app.services.pricing import price_group
 from app.services.notification import notification_service
 
 # Tehran timezone: UTC+3:30
@@ -59,6 +62,7 @@ class PaymentService:
         max_friends: Optional[int] = None,
         expected_friends: Optional[int] = None,
         is_invited_checkout: bool = False,
+        invite_code: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         Create an order and initiate payment
@@ -72,6 +76,7 @@ class PaymentService:
             email: User email
             shipping_address: Full shipping address
             delivery_slot: Selected delivery time slot
+            invite_code: Invite token to link this order to a group after payment
         
         Returns:
             Dict with payment URL and order info
@@ -100,50 +105,19 @@ class PaymentService:
                 # Non-fatal; continue as guest
                 pass
 
-            # Create order with simple working approach
-            # Store mode and group target info in delivery_slot as JSON if provided
-            # Compact delivery_slot metadata to stay under DB limits (Postgres enforces varchar length)
-            delivery_info = delivery_slot
-            has_group_metadata = (
-                bool(mode) or
-                friends is not None or
-                max_friends is not None or
-                expected_friends is not None or
-                allow_consolidation is not None
-            )
-            if has_group_metadata:
-                import json
-                compact_payload = {}
-                if delivery_slot:
-                    compact_payload["ds"] = delivery_slot  # delivery_slot
-                if mode:
-                    compact_payload["m"] = mode  # mode
-                if friends is not None:
-                    compact_payload["f"] = friends
-                if max_friends is not None:
-                    compact_payload["mx"] = max_friends
-                if expected_friends is not None:
-                    compact_payload["ex"] = expected_friends
-                if allow_consolidation is not None:
-                    compact_payload["ac"] = bool(allow_consolidation)
-
-                if compact_payload:
-                    delivery_info = json.dumps(compact_payload, ensure_ascii=False)
-                    # Final safeguard: if still too long for legacy varchar(100), trim to essential keys
-                    if isinstance(delivery_info, str) and len(delivery_info) > 95:
-                        minimal_payload = {
-                            k: v for k, v in compact_payload.items()
-                            if k in ("ds", "m", "ac") and v is not None
-                        }
-                        delivery_info = json.dumps(minimal_payload, ensure_ascii=False)
-                
+            # Group metadata goes into typed columns; delivery_slot keeps only the slot text
             order = Order(
                 user_id=resolved_user_id,
                 total_amount=total_amount / 10,  # Convert Rial to Toman for storage
                 status="در انتظار پرداخت",  # Simple status that works
                 order_type=OrderType.ALONE,  # default; may be updated to GROUP when linking
                 shipping_address=shipping_address,
-                delivery_slot=delivery_info,
+                delivery_slot=delivery_slot,
+                delivery_slot_id=resolve_delivery_slot_id(self.db, delivery_slot),
+                mode=mode,
+                expected_friends=next((v for v in (expected_friends, friends, max_friends) if v is not None), None),
+                allow_consolidation=bool(allow_consolidation) if allow_consolidation is not None else None,
+                pending_invite_token=invite_code or None,
                 ship_to_leader_address=ship_to_leader_address or False,
                 is_invited_checkout=is_invited_checkout,
             )
@@ -262,6 +236,8 @@ class PaymentService:
                         if group_id:
                             order.group_order_id = group_id
                             order.order_type = OrderType.GROUP
+                            self.db.flush()
+                            refresh_group_summary(self.db, group_id)
                 
                 # Commit the transaction to ensure data is persisted
                 self.db.commit()
@@ -389,15 +365,13 @@ class PaymentService:
                 notification_group_id = None
                 notification_order = None
 
-                # Handle invited flow markers encoded inside shipping_address (PENDING_INVITE / PENDING_GROUP)
-                logger.info(f"🔍 Checking if order {order.id} is invited: shipping_address={order.shipping_address[:100] if order.shipping_address else None}")
-                if order.shipping_address and order.shipping_address.startswith("PENDING_INVITE:"):
-                    logger.info(f"✅ INVITED USER DETECTED: order {order.id} has PENDING_INVITE prefix")
+                # Handle invited flow: pending_invite_token (or legacy PENDING_GROUP marker in shipping_address)
+                logger.info(f"🔍 Checking if order {order.id} is invited: pending_invite_token={order.pending_invite_token}")
+                if order.pending_invite_token:
+                    logger.info(f"✅ INVITED USER DETECTED: order {order.id} has pending invite token")
                     # Resolve invite to leader order and then to group id
                     try:
-                        parts = order.shipping_address.split("|", 1)
-                        invite_token = parts[0].replace("PENDING_INVITE:", "")
-                        original_address = parts[1] if len(parts) > 1 else ""
+                        invite_token = order.pending_invite_token
                         # Invite token format: GB{order_id}{authority_prefix}
                         raw = invite_token[2:] if invite_token.startswith("GB") else invite_token
                         digits = ''
@@ -429,7 +403,7 @@ class PaymentService:
                         if pending_group_id:
                             order.group_order_id = pending_group_id
                             order.order_type = OrderType.GROUP
-                            order.shipping_address = original_address
+                            order.pending_invite_token = None
                             logger.info(f"✅✅✅ SUCCESSFULLY LINKED invited order {order.id} to group {pending_group_id} via invite token {invite_token}")
                             logger.info(f"   Order type updated to: {order.order_type}")
                             logger.info(f"   Order group_order_id updated to: {order.group_order_id}")
@@ -524,36 +498,16 @@ class PaymentService:
                 # Create GroupOrder for leader if this is a new group buy (not joining existing group)
                 # Only create new group if this order is not already linked to a group
                 if not order.group_order_id:
-                    # Check if the order was created in group mode
-                    order_mode = None
-                    leader_allow_consolidation = None
-                    delivery_info = None
-                    if order.delivery_slot:
-                        try:
-                            import json
-                            delivery_info = json.loads(order.delivery_slot)
-                            if isinstance(delivery_info, dict):
-                                # Support both legacy verbose keys and new compact keys
-                                order_mode = delivery_info.get('mode') or delivery_info.get('m')
-                                if 'allow_consolidation' in delivery_info:
-                                    leader_allow_consolidation = delivery_info.get('allow_consolidation')
-                                elif 'ac' in delivery_info:
-                                    leader_allow_consolidation = delivery_info.get('ac')
-                                logger.info(f"📦 Order {order.id} mode extracted from delivery_slot: {order_mode}")
-                        except Exception as e:
-                            # If not JSON, treat as regular delivery_slot
-                            logger.info(f"📦 Order {order.id} delivery_slot is not JSON: {e}")
-                            pass
+                    # Group mode and leader consolidation toggle were recorded at checkout
+                    order_mode = order.mode
+                    leader_allow_consolidation = order.allow_consolidation
                     
                     logger.info(f"🔍 Order {order.id} GroupOrder creation check: mode={order_mode}, order_type={order.order_type}")
                     
                     # Also check if this is a leader order by checking if it's not an invited user
                     # and has group-related characteristics
-                    is_invited_user = (
-                        hasattr(order, 'shipping_address') and 
-                        order.shipping_address and 
-                        (order.shipping_address.startswith('PENDING_INVITE:') or 
-                         order.shipping_address.startswith('PENDING_GROUP:'))
+                    is_invited_user = bool(order.pending_invite_token) or bool(
+                        order.shipping_address and order.shipping_address.startswith('PENDING_GROUP:')
                     )
                     
                     # ✅ FIX: Don't create new group for invited users or solo purchases
@@ -603,14 +557,6 @@ class PaymentService:
                                     "unit_price": order_item.base_price
                                 })
                             
-                            # Check if this is an invited user (has PENDING_INVITE or PENDING_GROUP in shipping address)
-                            is_invited_user = (
-                                hasattr(order, 'shipping_address') and 
-                                order.shipping_address and 
-                                (order.shipping_address.startswith('PENDING_INVITE:') or 
-                                 order.shipping_address.startswith('PENDING_GROUP:'))
-                            )
-                            
                             # Create snapshot with appropriate kind
                             snapshot_data = {
                                 "items": items,
@@ -627,12 +573,7 @@ class PaymentService:
                             prefix = authority[:8] if authority else ""
                             invite_token = f"GB{order.id}{prefix}"
 
-                            leader_allow_flag = False
-                            if leader_allow_consolidation is not None:
-                                if isinstance(leader_allow_consolidation, str):
-                                    leader_allow_flag = leader_allow_consolidation.strip().lower() in ("1", "true", "yes", "on")
-                                else:
-                                    leader_allow_flag = bool(leader_allow_consolidation)
+                            leader_allow_flag = bool(leader_allow_consolidation)
                             logger.info(f"✅ Creating GroupOrder for leader order {order.id} (allow_consolidation={leader_allow_flag})")
 
                             try:
@@ -773,17 +714,11 @@ class PaymentService:
                             group.expires_at = group.leader_paid_at + timedelta(hours=24)
 
                 # If this is a settlement payment for a group, try to finalize the group
-                # without relying on delivery_slot, while still supporting legacy hint.
+                # without relying on delivery_slot.
                 try:
                     finalize_group_id = None
-                    # Legacy hint path via delivery_slot JSON
-                    if order.delivery_slot:
-                        import json as _json
-                        info = _json.loads(order.delivery_slot)
-                        if isinstance(info, dict) and info.get('mode') == 'group_settlement':
-                            finalize_group_id = info.get('group_id')
-                    # New fallback: any verified settlement payment linked to a group should attempt finalization
-                    if not finalize_group_id and order.is_settlement_payment and order.group_order_id:
+                    # Any verified settlement payment linked to a group should attempt finalization
+                    if order.is_settlement_payment and order.group_order_id:
                         finalize_group_id = order.group_order_id
                     if finalize_group_id:
                         # Fetch group and related orders
@@ -834,6 +769,14 @@ class PaymentService:
                     # Do not fail verification flow on finalize attempt issues
                     pass
                 
+                # Keep the group's denormalized counters in step with this join/payment
+                if order.group_order_id:
+                    try:
+                        self.db.flush()
+                        refresh_group_summary(self.db, order.group_order_id)
+                    except Exception as summary_error:
+                        logger.error(f"Failed to refresh summary for group {order.group_order_id}: {summary_error}")
+
                 # You can add additional logic here like:
                 # - Update product stock
                 # - Send confirmation email/SMS
@@ -1077,7 +1020,7 @@ class PaymentService:
             if new_member and new_member.phone_number:
                 new_member_phone = new_member.phone_number
 
-            leader_price = await self._get_leader_price_from_api(group_id)
+            leader_price = self._get_leader_price(group_id)
             formatted_price = f"{int(leader_price):,}".replace(",", "٬")
 
             message = f"دوستت با شماره {new_member_phone} به عضو گروهت شد! قیمت سبد به {formatted_price} تومان کاهش یافت!"
@@ -1209,44 +1152,15 @@ class PaymentService:
 
         return title, message
     
-    async def _get_leader_price_from_api(self, group_id: int) -> float:
+    def _get_leader_price(self, group_id: int) -> float:
         """
-        Get the current basket price for the leader from the track API.
-        This uses the same calculation logic as the frontend track page.
+        Current basket price for the leader, priced in-process with the same
+        rules as the track page (see app.services.pricing).
         """
         try:
-            import httpx
-            from app.config import get_settings
-            
-            settings = get_settings()
-            
-            # Determine the API base URL
-            # Try to use the frontend public URL, fallback to localhost
-            api_base = settings.get_frontend_public_url() or "http://localhost:3000"
-            
-            # Call the frontend API endpoint that has the correct pricing logic
-            api_url = f"{api_base}/api/groups/{group_id}"
-            
-            logger.info(f"🔍 Fetching leader price from API: {api_url}")
-            
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(api_url)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    # Extract currentTotal from pricing object
-                    pricing = data.get('pricing', {})
-                    current_total = pricing.get('currentTotal', 0)
-                    
-                    logger.info(f"✅ Retrieved leader price from API: {current_total} تومان")
-                    return float(current_total)
-                else:
-                    logger.error(f"❌ API returned status {response.status_code}: {response.text[:200]}")
-                    return 0.0
-                    
+            current_total = price_group(self.db, group_id)["currentTotal"]
+            logger.info(f"Leader price for group {group_id}: {current_total} تومان")
+            return float(current_total)
         except Exception as e:
-            logger.error(f"❌ Error fetching leader price from API for group {group_id}: {str(e)}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.error(f"❌ Error pricing leader basket for group {group_id}: {str(e)}")
             return 0.0 
\ No newline at end of file
@@ -0,0 +1,311 @@
+"""
+Group Pricing
+Single source of truth for group-buy tier pricing. Leader, follower and
+secondary-group prices used by the track API, settlement, post-payment
+processing and notifications are all derived here.
+
+Tier semantics (per unit):
+- 0 friends: solo price (market_price, falling back to base_price)
+- 1/2/3 friends: Product.friend_1/2/3_price
+
+Secondary groups: every paid member refunds a quarter of the basket value
+to the leader, up to four members.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import json
+import logging
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.models import GroupOrder, Order, OrderItem, Product
+
+logger = logging.getLogger(__name__)
+
+# Each secondary member is worth this fraction of the basket
+SECONDARY_MEMBER_SHARE = 4
+MAX_TIER = 3
+
+
+def _num(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def solo_price(product: Any) -> float:
+    """Price when buying alone."""
+    return _num(getattr(product, "market_price", None) or getattr(product, "base_price", None))
+
+
+def unit_price_for_friends(product: Any, friends_count: int) -> float:
+    """Unit price of ``product`` when the leader has ``friends_count`` paid friends.
+
+    A tier that is not configured (NULL) falls back to the nearest lower
+    tier that is, and finally to the solo price. Zero is a real price: the
+    third-friend tier is usually free.
+    """
+    solo = solo_price(product)
+    if friends_count <= 0:
+        return solo
+    tiers = (
+        getattr(product, "friend_1_price", None),
+        getattr(product, "friend_2_price", None),
+        getattr(product, "friend_3_price", None),
+    )
+    for value in reversed(tiers[: min(friends_count, MAX_TIER)]):
+        if value is not None:
+            return float(value)
+    return solo
+
+
+def admin_settlement_unit_price(product: Any, friends_count: int, charge_full_group: bool = True) -> float:
+    """Unit price used by the admin settlement views.
+
+    Unlike ``unit_price_for_friends``, a missing or zero friend_1/friend_2
+    tier falls back to half/a quarter of the solo price. Three or more
+    friends cost friend_3_price (0 when unset), or nothing at all when
+    ``charge_full_group`` is False, as on manual finalization.
+    """
+    solo = solo_price(product)
+    if friends_count >= 3:
+        return _num(getattr(product, "friend_3_price", None)) if charge_full_group else 0.0
+    if friends_count == 2:
+        return _num(getattr(product, "friend_2_price", None) or solo * 0.25)
+    if friends_count == 1:
+        return _num(getattr(product, "friend_1_price", None) or solo * 0.5)
+    return solo
+
+
+def product_tiers(product: Optional[Product], fallback_solo: float = 0.0) -> Dict[str, float]:
+    """Tier prices of a product as shown on the track page."""
+    if product is None:
+        return {"solo_price": fallback_solo, "friend_1_price": 0.0, "friend_2_price": 0.0, "friend_3_price": 0.0}
+    solo = _num(getattr(product, "solo_price", None) or getattr(product, "market_price", None))
+    return {
+        "solo_price": solo if solo > 0 else fallback_solo,
+        "friend_1_price": _num(product.friend_1_price),
+        "friend_2_price": _num(product.friend_2_price),
+        "friend_3_price": _num(product.friend_3_price),
+    }
+
+
+def basket_item_price(item: Dict[str, Any], friends_count: int) -> float:
+    """Track-page unit price of a basket line for ``friends_count`` friends.
+
+    Missing or zero friend_1/friend_2 tiers fall back to 1/2 and 1/3 of the
+    solo price; three or more friends use friend_3_price (the leader total
+    itself is zero then).
+    """
+    solo = item.get("solo_price", item.get("unitPrice", 0))
+    if friends_count <= 0:
+        return solo
+    if friends_count == 1:
+        f1 = item.get("friend_1_price", 0)
+        return f1 if f1 > 0 else solo / 2
+    if friends_count == 2:
+        f2 = item.get("friend_2_price", 0)
+        return f2 if f2 > 0 else solo / 3
+    return item.get("friend_3_price", 0)
+
+
+def basket_from_snapshot(items: Iterable[Dict[str, Any]], products: Dict[int, Product]) -> List[Dict[str, Any]]:
+    """Build track-page basket lines from basket_snapshot items."""
+    basket = []
+    for item in items:
+        unit_price = _num(item.get("unit_price"))
+        qty = int(item.get("quantity", 1) or 1)
+        product_id = item.get("product_id")
+        product = products.get(product_id) if product_id else None
+        tiers = product_tiers(product)
+        if unit_price == 0 and tiers["solo_price"] > 0:
+            unit_price = tiers["solo_price"]
+        basket.append({
+            "productId": str(product_id or ""),
+            "name": item.get("product_name") or (getattr(product, "name", None) if product else None) or f"محصول {product_id}",
+            "qty": qty,
+            "unitPrice": unit_price,
+            "discountedUnitPrice": unit_price,
+            "image": item.get("image"),
+            "solo_price": tiers["solo_price"] if tiers["solo_price"] > 0 else unit_price,
+            "friend_1_price": tiers["friend_1_price"],
+            "friend_2_price": tiers["friend_2_price"],
+            "friend_3_price": tiers["friend_3_price"],
+        })
+    return basket
+
+
+def basket_from_order_items(items: Iterable[OrderItem], products: Dict[int, Product]) -> List[Dict[str, Any]]:
+    """Build track-page basket lines from the leader order's items."""
+    basket = []
+    for item in items:
+        product = products.get(item.product_id)
+        base = _num(getattr(item, "base_price", None))
+        tiers = product_tiers(product, fallback_solo=base)
+        unit_price = tiers["solo_price"] if tiers["solo_price"] > 0 else base
+        basket.append({
+            "productId": str(item.product_id),
+            "name": getattr(product, "name", f"محصول {item.product_id}") if product else f"محصول {item.product_id}",
+            "qty": int(getattr(item, "quantity", 1) or 1),
+            "unitPrice": unit_price,
+            "discountedUnitPrice": unit_price,
+            "image": getattr(product, "image_url", None) if product else None,
+            "solo_price": unit_price,
+            "friend_1_price": tiers["friend_1_price"],
+            "friend_2_price": tiers["friend_2_price"],
+            "friend_3_price": tiers["friend_3_price"],
+        })
+    return basket
+
+
+def basket_tier_totals(basket: Sequence[Dict[str, Any]]) -> Tuple[float, float, float]:
+    """Basket totals at 0, 1 and 2 friends, computed in one pass."""
+    t0 = t1 = t2 = 0.0
+    for item in basket:
+        qty = item.get("qty", 1)
+        t0 += basket_item_price(item, 0) * qty
+        t1 += basket_item_price(item, 1) * qty
+        t2 += basket_item_price(item, 2) * qty
+    return t0, t1, t2
+
+
+def secondary_leader_total(basket_value: float, paid_members: int) -> float:
+    """What a secondary-group leader effectively pays after member refunds."""
+    if paid_members >= SECONDARY_MEMBER_SHARE:
+        return 0
+    quarter = basket_value / SECONDARY_MEMBER_SHARE
+    return max(0, basket_value - min(paid_members, MAX_TIER) * quarter)
+
+
+def secondary_refund(basket_value: float, paid_members: int) -> float:
+    """Refund owed to a secondary-group leader for ``paid_members`` joiners."""
+    if paid_members <= 0 or basket_value <= 0:
+        return 0
+    refund = basket_value / SECONDARY_MEMBER_SHARE * min(paid_members, SECONDARY_MEMBER_SHARE)
+    return min(refund, basket_value)
+
+
+def secondary_tier_prices(base: float) -> Dict[str, float]:
+    """Leader price ladder advertised for a secondary group created from an order."""
+    return {
+        "with1Friend": base,
+        "with2Friends": round(base * 0.667, 2),
+        "with3Friends": round(base * 0.334, 2),
+        "with4Friends": 0.0,
+    }
+
+
+def group_totals(
+    basket: Sequence[Dict[str, Any]],
+    paid_friends: int,
+    is_secondary: bool,
+) -> Dict[str, float]:
+    """Pricing block of the track API: originalTotal, currentTotal, expectedTotal."""
+    original_total = sum(item["solo_price"] * item["qty"] for item in basket)
+    current_total = original_total
+    if is_secondary and original_total > 0:
+        current_total = secondary_leader_total(original_total, paid_friends)
+    elif not is_secondary and basket:
+        if paid_friends >= MAX_TIER:
+            current_total = 0
+        else:
+            current_total = basket_tier_totals(basket)[paid_friends]
+    return {
+        "originalTotal": original_total,
+        "currentTotal": current_total,
+        "expectedTotal": 0 if is_secondary else original_total,
+    }
+
+
+def order_basket_value(items: Iterable[OrderItem], products: Dict[int, Product]) -> float:
+    """Solo value of an order's items (used for secondary refunds)."""
+    total = 0
+    for item in items:
+        product = products.get(item.product_id)
+        if product:
+            total += (product.market_price or product.base_price or 0) * item.quantity
+    return total
+
+
+def load_products(db: Session, product_ids: Iterable[Any]) -> Dict[int, Product]:
+    ids = {int(pid) for pid in product_ids if pid}
+    if not ids:
+        return {}
+    return {p.id: p for p in db.query(Product).filter(Product.id.in_(ids)).all()}
+
+
+def _paid_follower_counts(db: Session, group_ids: Sequence[int]) -> Dict[int, int]:
+    rows = (
+        db.query(Order.group_order_id, func.count(Order.id))
+        .join(GroupOrder, GroupOrder.id == Order.group_order_id)
+        .filter(
+            Order.group_order_id.in_(group_ids),
+            Order.is_settlement_payment == False,
+            or_(Order.user_id.is_(None), Order.user_id != GroupOrder.leader_id),
+            or_(Order.payment_ref_id.isnot(None), Order.paid_at.isnot(None)),
+        )
+        .group_by(Order.group_order_id)
+        .all()
+    )
+    return {gid: int(n) for gid, n in rows}
+
+
+def price_groups(db: Session, group_ids: Iterable[int]) -> Dict[int, Dict[str, float]]:
+    """Track-API pricing for many groups with a constant number of queries.
+
+    Loads groups, paid-follower counts, fallback order items and products in
+    bulk, then prices every basket in memory.
+    """
+    ids = sorted({int(gid) for gid in group_ids})
+    if not ids:
+        return {}
+    groups = db.query(GroupOrder.id, GroupOrder.basket_snapshot).filter(GroupOrder.id.in_(ids)).all()
+    paid = _paid_follower_counts(db, ids)
+
+    snapshots: Dict[int, dict] = {}
+    for gid, raw in groups:
+        try:
+            meta = json.loads(raw) if raw else {}
+        except Exception:
+            meta = {}
+        snapshots[gid] = meta if isinstance(meta, dict) else {}
+
+    # Groups without snapshot items are priced from their first order that has items
+    fallback_ids = [gid for gid, meta in snapshots.items() if not meta.get("items")]
+    order_items: Dict[int, List[OrderItem]] = {}
+    if fallback_ids:
+        first_order: Dict[int, int] = {}
+        rows = (
+            db.query(Order.group_order_id, OrderItem)
+            .join(OrderItem, OrderItem.order_id == Order.id)
+            .filter(
+                Order.group_order_id.in_(fallback_ids),
+                Order.is_settlement_payment == False,
+            )
+            .order_by(Order.id.asc(), OrderItem.id.asc())
+            .all()
+        )
+        for gid, item in rows:
+            if first_order.setdefault(gid, item.order_id) == item.order_id:
+                order_items.setdefault(gid, []).append(item)
+
+    product_ids = [it.get("product_id") for meta in snapshots.values() for it in (meta.get("items") or [])]
+    product_ids += [it.product_id for items in order_items.values() for it in items]
+    products = load_products(db, product_ids)
+
+    result = {}
+    for gid, meta in snapshots.items():
+        if meta.get("items"):
+            basket = basket_from_snapshot(meta["items"], products)
+        else:
+            basket = basket_from_order_items(order_items.get(gid, []), products)
+        result[gid] = group_totals(basket, paid.get(gid, 0), meta.get("kind") == "secondary")
+    return result
+
+
+def price_group(db: Session, group_id: int) -> Dict[str, float]:
+    """Track-API pricing of a single group (zeros when the group is unknown)."""
+    return price_groups(db, [group_id]).get(
+        int(group_id), {"originalTotal": 0, "currentTotal": 0, "expectedTotal": 0}
+    )
@@ -0,0 +1,250 @@
+"""
+Product Browse Service
+Keyset pagination and facet counts for GET /products.
+
+Pages are addressed by an opaque cursor holding the last row's sort key and
+id, so page N costs the same index range scan as page 1. Sales and rating
+sorts read the materialized ``sales_score``/``rating_score`` columns, which
+mirror display_sales/display_rating and are refreshed by a periodic job.
+Facets (category, subcategory, price bucket, in-stock) come from a single
+UNION ALL of grouped selects; each facet ignores its own filter so the UI
+can show counts for the alternatives.
+"""
+import base64
+import json
+import logging
+import time
+from dataclasses import dataclass, astuple
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import String, and_, case, cast, func, literal, null, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.models import Category, OrderItem, Product, Review, SubCategory
+from app.services.product_cards import card_select, in_stock_expr, serialize_card
+
+logger = logging.getLogger(__name__)
+
+# sort name -> (sort key column, descending); id is always the tie-breaker
+SORTS = {
+    "newest": (Product.id, True),
+    "price_asc": (Product.base_price, False),
+    "price_desc": (Product.base_price, True),
+    "sales": (Product.sales_score, True),
+    "rating": (Product.rating_score, True),
+}
+
+# Upper bounds (toman) of the price facet buckets; the last bucket is open-ended
+PRICE_BUCKETS = (50_000, 100_000, 250_000, 500_000, 1_000_000)
+
+_FACET_TTL_SECONDS = 60
+_FACET_CACHE: dict[tuple, tuple[float, dict]] = {}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class ProductFilters:
+    category_id: Optional[int] = None
+    subcategory_id: Optional[int] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    free_shipping: Optional[bool] = None
+    in_stock: Optional[bool] = None
+
+    def conditions(self, exclude: Optional[str] = None) -> list:
+        """WHERE clauses for these filters, skipping the facet named ``exclude``."""
+        conds = []
+        if self.category_id and exclude != "category":
+            conds.append(Product.category_id == self.category_id)
+        if self.subcategory_id and exclude != "subcategory":
+            conds.append(Product.subcategory_id == self.subcategory_id)
+        if exclude != "price":
+            if self.min_price is not None:
+                conds.append(Product.base_price >= self.min_price)
+            if self.max_price is not None:
+                conds.append(Product.base_price <= self.max_price)
+        if self.free_shipping:
+            conds.append(Product.shipping_cost == 0)
+        if self.in_stock is not None and exclude != "in_stock":
+            conds.append(in_stock_expr() if self.in_stock else ~in_stock_expr())
+        return conds
+
+
+# ---- cursors ----------------------------------------------------------------
+
+def encode_cursor(sort: str, value: Any, last_id: int) -> str:
+    raw = json.dumps([sort, value, last_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cur_sort, value, last_id = json.loads(raw)
+        last_id = int(last_id)
+    except Exception:
+        raise InvalidCursor("Malformed cursor")
+    if cur_sort != sort:
+        raise InvalidCursor("Cursor was issued for a different sort order")
+    return value, last_id
+
+
+def _after(key, descending: bool, value: Any, last_id: int):
+    """Rows strictly after (value, last_id) in the given order."""
+    if key is Product.id:
+        return Product.id < last_id if descending else Product.id > last_id
+    if descending:
+        return or_(key < value, and_(key == value, Product.id < last_id))
+    return or_(key > value, and_(key == value, Product.id > last_id))
+
+
+# ---- listing ------------------------------------------------------------------
+
+def browse_products(
+    db: Session,
+    filters: ProductFilters,
+    sort: str = "newest",
+    cursor: Optional[str] = None,
+    limit: int = 20,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One keyset page of product cards and the cursor of the next page."""
+    key, descending = SORTS[sort]
+    stmt = card_select(db).add_columns(key.label("sort_key")).where(*filters.conditions())
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        stmt = stmt.where(_after(key, descending, value, last_id))
+    order = [key.desc(), Product.id.desc()] if descending else [key.asc(), Product.id.asc()]
+    if key is Product.id:
+        order = order[:1]
+    stmt = stmt.order_by(*order)
+
+    rows = db.execute(stmt.limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [serialize_card(row) for row in rows]
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]._mapping
+        next_cursor = encode_cursor(sort, last["sort_key"], last["id"])
+    return items, next_cursor
+
+
+# ---- facets -------------------------------------------------------------------
+
+def _price_bucket_expr():
+    return case(
+        *[(Product.base_price < bound, i) for i, bound in enumerate(PRICE_BUCKETS)],
+        else_=len(PRICE_BUCKETS),
+    )
+
+
+def _facet_branch(name: str, key, label, filters: ProductFilters, join=None):
+    stmt = select(
+        literal(name).label("facet"),
+        key.label("key"),
+        label.label("label"),
+        func.count(Product.id).label("count"),
+    ).select_from(Product)
+    if join is not None:
+        stmt = stmt.outerjoin(join[0], join[1])
+    return stmt.where(*filters.conditions(exclude=name)).group_by(key, label)
+
+
+def facet_counts(db: Session, filters: ProductFilters) -> Dict[str, Any]:
+    """Counts per category, subcategory, price bucket and stock state (one statement)."""
+    cache_key = astuple(filters)
+    now = time.time()
+    cached = _FACET_CACHE.get(cache_key)
+    if cached and now - cached[0] < _FACET_TTL_SECONDS:
+        return cached[1]
+
+    no_label = cast(null(), String)
+    stock_key = case((in_stock_expr(), 1), else_=0)
+    stmt = _facet_branch(
+        "category", Product.category_id, Category.name, filters, (Category, Category.id == Product.category_id)
+    ).union_all(
+        _facet_branch(
+            "subcategory", Product.subcategory_id, SubCategory.name, filters,
+            (SubCategory, SubCategory.id == Product.subcategory_id),
+        ),
+        _facet_branch("price", _price_bucket_expr(), no_label, filters),
+        _facet_branch("in_stock", stock_key, no_label, filters),
+    )
+
+    facets: Dict[str, Any] = {"category": [], "subcategory": [], "price": [], "in_stock": {"true": 0, "false": 0}}
+    for facet, key, label, count in db.execute(stmt):
+        if facet == "price":
+            idx = int(key)
+            facets["price"].append({
+                "min": PRICE_BUCKETS[idx - 1] if idx > 0 else 0,
+                "max": PRICE_BUCKETS[idx] if idx < len(PRICE_BUCKETS) else None,
+                "count": count,
+            })
+        elif facet == "in_stock":
+            facets["in_stock"]["true" if key else "false"] = count
+        elif key is not None:
+            facets[facet].append({"id": key, "name": label, "count": count})
+    facets["price"].sort(key=lambda b: b["min"])
+    for facet in ("category", "subcategory"):
+        facets[facet].sort(key=lambda f: -f["count"])
+
+    if len(_FACET_CACHE) > 256:
+        _FACET_CACHE.clear()
+    _FACET_CACHE[cache_key] = (now, facets)
+    return facets
+
+
+def invalidate_facets() -> None:
+    """Drop cached facet counts (after bulk catalog changes)."""
+    _FACET_CACHE.clear()
+
+
+# ---- sort score maintenance ---------------------------------------------------------
+
+def refresh_product_scores(db: Session, product_ids: Optional[List[int]] = None) -> int:
+    """Recompute sales_score/rating_score with one UPDATE (all products or ``product_ids``).
+
+    Same formulas as the display_sales/display_rating of product cards.
+    Does not commit.
+    """
+    sales_total = (
+        select(func.coalesce(func.sum(OrderItem.quantity), 0))
+        .where(OrderItem.product_id == Product.id)
+        .scalar_subquery()
+    )
+    rating_total = (
+        select(func.coalesce(func.sum(Review.rating), 0))
+        .where(Review.product_id == Product.id)
+        .scalar_subquery()
+    )
+    rating_count = (
+        select(func.count(Review.id))
+        .where(Review.product_id == Product.id)
+        .scalar_subquery()
+    )
+    rating_sum = func.coalesce(Product.rating_seed_sum, 0) + rating_total - func.coalesce(Product.rating_baseline_sum, 0)
+    rating_n = 1 + rating_count - func.coalesce(Product.rating_baseline_count, 0)
+    stmt = update(Product).values(
+        sales_score=func.coalesce(Product.sales_seed_offset, 0) + sales_total - func.coalesce(Product.sales_seed_baseline, 0),
+        rating_score=case((rating_n > 0, func.round(rating_sum * 1.0 / rating_n, 2)), else_=0),
+    )
+    if product_ids is not None:
+        if not product_ids:
+            return 0
+        stmt = stmt.where(Product.id.in_(product_ids))
+    return db.execute(stmt.execution_options(synchronize_session=False)).rowcount or 0
+
+
+def rollup_product_scores() -> int:
+    """Periodic job: refresh every product's sort scores."""
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        n = refresh_product_scores(db)
+        db.commit()
+        return n
+    finally:
+        db.close()
@@ -0,0 +1,166 @@
+"""
+Product Card Read Model
+One query layer and one serializer for every product listing (home,
+/products listings, search, favorites). A page of cards is fetched in a
+single SQL statement: product columns, category/subcategory/store names,
+ordered image URLs and the stock flag come from joins and correlated
+scalar subqueries instead of joinedload collections and lazy loads.
+"""
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, exists, func, literal, select
+from sqlalchemy.orm import Session
+
+from app.models import Category, OrderItem, Product, ProductImage, ProductOption, Review, Store, SubCategory
+
+# Separator for aggregated image URLs (ASCII unit separator never appears in URLs)
+_IMAGE_SEP = "\x1f"
+
+_CARD_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.description,
+    Product.base_price,
+    Product.market_price,
+    Product.friend_1_price,
+    Product.friend_2_price,
+    Product.friend_3_price,
+    Product.shipping_cost,
+    Product.store_id,
+    Product.weight_grams,
+    Product.weight_tolerance_grams,
+)
+
+_STATS_COLUMNS = (
+    Product.sales_seed_offset,
+    Product.sales_seed_baseline,
+    Product.rating_seed_sum,
+    Product.rating_baseline_sum,
+    Product.rating_baseline_count,
+)
+
+
+def _images_column(dialect_name: str):
+    """Image URLs of the product, main image first, as one delimited string."""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import aggregate_order_by
+        return (
+            select(
+                func.string_agg(
+                    ProductImage.image_url,
+                    aggregate_order_by(literal(_IMAGE_SEP), ProductImage.is_main.desc(), ProductImage.id.asc()),
+                )
+            )
+            .where(ProductImage.product_id == Product.id)
+            .correlate(Product)
+            .scalar_subquery()
+        )
+    ordered = (
+        select(ProductImage.image_url.label("url"))
+        .where(ProductImage.product_id == Product.id)
+        .order_by(ProductImage.is_main.desc(), ProductImage.id.asc())
+        .correlate(Product)
+        .subquery()
+    )
+    return select(func.group_concat(ordered.c.url, _IMAGE_SEP)).scalar_subquery()
+
+
+def in_stock_expr():
+    """True when the product has no options or any option has stock."""
+    has_options = exists().where(ProductOption.product_id == Product.id)
+    has_stock = exists().where(ProductOption.product_id == Product.id, ProductOption.stock > 0)
+    return case((~has_options, True), else_=has_stock)
+
+
+def card_select(db: Session, with_stats: bool = False):
+    """SELECT for product cards; callers add filters, ordering and LIMIT.
+
+    ``with_stats`` adds display_sales/display_rating inputs (order-item and
+    review aggregates) as correlated subqueries.
+    """
+    columns = list(_CARD_COLUMNS) + [
+        Category.name.label("category_name"),
+        Category.slug.label("category_slug"),
+        SubCategory.name.label("subcategory_name"),
+        SubCategory.slug.label("subcategory_slug"),
+        Store.name.label("store_name"),
+        _images_column(db.get_bind().dialect.name).label("image_urls"),
+        in_stock_expr().label("in_stock"),
+    ]
+    if with_stats:
+        columns += list(_STATS_COLUMNS) + [
+            select(func.coalesce(func.sum(OrderItem.quantity), 0))
+            .where(OrderItem.product_id == Product.id)
+            .correlate(Product)
+            .scalar_subquery()
+            .label("sales_total"),
+            select(func.coalesce(func.sum(Review.rating), 0))
+            .where(Review.product_id == Product.id)
+            .correlate(Product)
+            .scalar_subquery()
+            .label("rating_total"),
+            select(func.count(Review.id))
+            .where(Review.product_id == Product.id)
+            .correlate(Product)
+            .scalar_subquery()
+            .label("rating_count"),
+        ]
+    return (
+        select(*columns)
+        .select_from(Product)
+        .outerjoin(Category, Category.id == Product.category_id)
+        .outerjoin(SubCategory, SubCategory.id == Product.subcategory_id)
+        .outerjoin(Store, Store.id == Product.store_id)
+    )
+
+
+def serialize_card(row: Any) -> Dict[str, Any]:
+    """Plain-dict product card shared by all listing endpoints."""
+    m = row._mapping
+    base_price = m["base_price"]
+    market_price = m["market_price"]
+    discount_price = market_price if market_price is not None and base_price is not None and market_price < base_price else None
+    images = m["image_urls"].split(_IMAGE_SEP) if m["image_urls"] else []
+    card = {
+        "id": m["id"],
+        "name": m["name"],
+        "description": m["description"],
+        "base_price": base_price,
+        "market_price": market_price,
+        "product_cost": base_price,
+        "solo_price": market_price,
+        "friend_1_price": m["friend_1_price"],
+        "friend_2_price": m["friend_2_price"],
+        "friend_3_price": m["friend_3_price"],
+        "discount_price": discount_price,
+        "discount": round((base_price - discount_price) / base_price * 100) if discount_price and base_price > 0 else None,
+        "shipping_cost": m["shipping_cost"],
+        "free_shipping": m["shipping_cost"] == 0,
+        "category": m["category_name"] or "Unknown",
+        "category_slug": m["category_slug"],
+        "subcategory": m["subcategory_name"],
+        "subcategory_slug": m["subcategory_slug"],
+        "store_id": m["store_id"],
+        "store_name": m["store_name"],
+        "in_stock": bool(m["in_stock"]),
+        "weight_grams": m["weight_grams"],
+        "weight_tolerance_grams": m["weight_tolerance_grams"],
+        "images": images,
+        "image": images[0] if images else None,
+    }
+    if "sales_total" in m:
+        card["display_sales"] = (m["sales_seed_offset"] or 0) + ((m["sales_total"] or 0) - (m["sales_seed_baseline"] or 0))
+        rating_sum = (m["rating_seed_sum"] or 0) + ((m["rating_total"] or 0) - (m["rating_baseline_sum"] or 0))
+        rating_count = 1 + ((m["rating_count"] or 0) - (m["rating_baseline_count"] or 0))
+        card["display_rating"] = round(rating_sum / rating_count, 2) if rating_count > 0 else 0
+    return card
+
+
+def fetch_cards(db: Session, stmt) -> List[Dict[str, Any]]:
+    """Execute a card_select() statement and serialize every row."""
+    return [serialize_card(row) for row in db.execute(stmt)]
+
+
+def fetch_card(db: Session, product_id: int, with_stats: bool = False) -> Optional[Dict[str, Any]]:
+    rows = fetch_cards(db, card_select(db, with_stats).where(Product.id == product_id))
+    return rows[0] if rows else None
@@ -0,0 +1,192 @@
+"""
+Product Positions Service
+Batch reordering of the curated home and landing rails.
+
+A rail is every product with a non-null ``home_position`` (or
+``landing_position``), shown by position then newest first. Ranks are
+spaced GAP apart so moving one product only rewrites that product: it takes
+the midpoint of its new neighbours. When two neighbours have no integer
+between them the whole rail is renumbered, still in the same transaction.
+Only rows whose rank actually changed are written, in one executemany.
+
+Ranks never leave this module: the admin API reads and writes 1-based
+places on the rail (``rail_ordinals``/``place_product``).
+"""
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session
+
+from app.models import Product
+
+logger = logging.getLogger(__name__)
+
+RAILS = {"home": "home_position", "landing": "landing_position"}
+GAP = 1000
+
+
+@dataclass
+class Move:
+    id: int
+    after_id: Optional[int] = None
+    before_id: Optional[int] = None
+    to: Optional[str] = None  # "top" | "bottom"
+    remove: bool = False
+
+
+def _column(rail: str):
+    name = RAILS.get(rail)
+    if name is None:
+        raise ValueError(f"Unknown rail: {rail}")
+    return getattr(Product.__table__.c, name)
+
+
+def rail_positions(db: Session, rail: str) -> Dict[int, int]:
+    """Product id -> rank for the rail, in display order."""
+    col = _column(rail)
+    table = Product.__table__
+    rows = db.execute(
+        select(table.c.id, col).where(col.isnot(None)).order_by(col.asc(), table.c.id.desc())
+    ).all()
+    return {pid: pos for pid, pos in rows}
+
+
+def rail_ordinals(db: Session, rail: str) -> Dict[int, int]:
+    """Product id -> 1-based place on the rail, the number admins see and edit."""
+    return {pid: i for i, pid in enumerate(rail_positions(db, rail), start=1)}
+
+
+def rail_items(db: Session, rail: str) -> List[dict]:
+    col = _column(rail)
+    table = Product.__table__
+    rows = db.execute(
+        select(table.c.id, table.c.name).where(col.isnot(None)).order_by(col.asc(), table.c.id.desc())
+    ).all()
+    return [{"id": pid, "name": name, "position": i} for i, (pid, name) in enumerate(rows, start=1)]
+
+
+def _renumber(order: Sequence[int]) -> Dict[int, int]:
+    return {pid: (i + 1) * GAP for i, pid in enumerate(order)}
+
+
+def _apply_move(order: List[int], ranks: Dict[int, Optional[int]], move: Move) -> bool:
+    """Move one product in ``order``/``ranks``; False when the rail needs renumbering."""
+    if move.id in order:
+        order.remove(move.id)
+    if move.remove:
+        ranks[move.id] = None
+        return True
+
+    if move.after_id is not None:
+        if move.after_id not in order:
+            raise ValueError(f"Product {move.after_id} is not on the rail")
+        idx = order.index(move.after_id) + 1
+    elif move.before_id is not None:
+        if move.before_id not in order:
+            raise ValueError(f"Product {move.before_id} is not on the rail")
+        idx = order.index(move.before_id)
+    elif move.to == "top":
+        idx = 0
+    elif move.to == "bottom":
+        idx = len(order)
+    else:
+        raise ValueError(f"Move for product {move.id} needs after_id, before_id or to")
+
+    order.insert(idx, move.id)
+    prev_rank = ranks[order[idx - 1]] if idx > 0 else 0
+    next_rank = ranks[order[idx + 1]] if idx + 1 < len(order) else prev_rank + 2 * GAP
+    if next_rank - prev_rank < 2:
+        ranks[move.id] = prev_rank
+        return False
+    ranks[move.id] = (prev_rank + next_rank) // 2
+    return True
+
+
+def _reorder(
+    db: Session,
+    rail: str,
+    order: Optional[Iterable[int]] = None,
+    moves: Optional[Iterable[Move]] = None,
+) -> int:
+    col = _column(rail)
+    order = list(dict.fromkeys(order or []))
+    moves = list(moves or [])
+
+    mentioned = set(order)
+    for move in moves:
+        mentioned.add(move.id)
+        mentioned.update(pid for pid in (move.after_id, move.before_id) if pid is not None)
+    if mentioned:
+        known = set(db.execute(select(Product.id).where(Product.id.in_(mentioned))).scalars())
+        unknown = sorted(mentioned - known)
+        if unknown:
+            raise LookupError(f"Unknown product ids: {unknown}")
+
+    current = rail_positions(db, rail)
+    ranks: Dict[int, Optional[int]] = dict(current)
+    sequence = list(current)
+
+    if order:
+        listed = set(order)
+        sequence = order + [pid for pid in sequence if pid not in listed]
+        ranks.update(_renumber(sequence))
+
+    for move in moves:
+        if not _apply_move(sequence, ranks, move):
+            ranks.update(_renumber(sequence))
+
+    changed = [
+        {"b_id": pid, "b_pos": ranks.get(pid)}
+        for pid in set(current) | set(ranks)
+        if ranks.get(pid) != current.get(pid)
+    ]
+    if changed:
+        table = Product.__table__
+        stmt = table.update().where(table.c.id == bindparam("b_id")).values({col.name: bindparam("b_pos")})
+        db.execute(stmt, changed)
+    return len(changed)
+
+
+def reorder_rail(
+    db: Session,
+    rail: str,
+    order: Optional[Iterable[int]] = None,
+    moves: Optional[Iterable[Move]] = None,
+) -> int:
+    """
+    Apply a full ordering and/or sparse moves to a rail. Commits.
+
+    ``order`` puts the listed products first, in that order; the rest of the
+    rail keeps its relative order behind them. ``moves`` are then applied one
+    after another. Returns the number of products whose rank changed.
+    """
+    updated = _reorder(db, rail, order=order, moves=moves)
+    db.commit()
+    logger.info(f"Reordered {rail} rail: {updated} products updated")
+    return updated
+
+
+def append_to_rail(db: Session, rail: str, product_ids: Iterable[int]) -> int:
+    """Put products at the bottom of the rail, in the given order. Does not commit."""
+    moves = [Move(id=pid, to="bottom") for pid in dict.fromkeys(product_ids)]
+    return _reorder(db, rail, moves=moves) if moves else 0
+
+
+def place_product(db: Session, rail: str, product_id: int, ordinal: Optional[int]) -> int:
+    """
+    Put a product at 1-based place ``ordinal`` on the rail; None takes it off.
+
+    Places below 1 mean the top and past the end mean the bottom. Does not
+    commit. Returns the number of products whose rank changed.
+    """
+    if ordinal is None:
+        return _reorder(db, rail, moves=[Move(id=product_id, remove=True)])
+    others = [pid for pid in rail_positions(db, rail) if pid != product_id]
+    idx = max(ordinal, 1) - 1
+    if idx < len(others):
+        move = Move(id=product_id, before_id=others[idx])
+    else:
+        move = Move(id=product_id, to="bottom")
+    return _reorder(db, rail, moves=[move])
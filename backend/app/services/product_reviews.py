@@ -0,0 +1,127 @@
+"""
+Product Reviews Service
+Keyset-paginated review lists (reviewer names joined in the same SELECT)
+and a cached per-product rating summary/histogram for the product page.
+
+The summary cache is per process. Review mutations call reviews_changed()
+inside their transaction; it drops the entry in the handling worker and
+bumps the ``_reviews_version`` row, which every worker checks (at most once
+per second) before serving a cached summary.
+"""
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.models import Review, User
+from app.services.app_settings import VersionRow
+from app.services.product_browse import decode_cursor, encode_cursor, refresh_product_scores
+
+_SUMMARY_TTL_SECONDS = 300
+_SUMMARY_CACHE: dict[int, tuple[float, dict]] = {}
+_SUMMARY_VERSION = VersionRow("_reviews_version")
+
+_CURSOR_SORT = "reviews"
+
+
+def review_page(
+    db: Session,
+    product_id: int,
+    cursor: Optional[str] = None,
+    limit: int = 10,
+    viewer_user_id: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Newest-first approved reviews (plus the viewer's own) in one statement.
+
+    Raises product_browse.InvalidCursor for a malformed cursor.
+    """
+    visible = Review.approved == True
+    if viewer_user_id:
+        visible = or_(visible, Review.user_id == viewer_user_id)
+    stmt = (
+        select(Review, User.first_name, User.last_name)
+        .outerjoin(User, User.id == Review.user_id)
+        .where(Review.product_id == product_id, visible)
+    )
+    if cursor:
+        value, last_id = decode_cursor(cursor, _CURSOR_SORT)
+        created_at = datetime.fromisoformat(value)
+        stmt = stmt.where(or_(
+            Review.created_at < created_at,
+            and_(Review.created_at == created_at, Review.id < last_id),
+        ))
+    rows = db.execute(stmt.order_by(Review.created_at.desc(), Review.id.desc()).limit(limit + 1)).all()
+
+    items = [
+        {
+            "id": review.id,
+            "rating": review.rating,
+            "comment": review.comment,
+            "display_name": review.display_name,
+            "product_id": review.product_id,
+            "user_id": review.user_id,
+            "created_at": review.created_at,
+            "approved": review.approved,
+            "first_name": first_name,
+            "last_name": last_name,
+        }
+        for review, first_name, last_name in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit and items and items[-1]["created_at"]:
+        next_cursor = encode_cursor(_CURSOR_SORT, items[-1]["created_at"].isoformat(), items[-1]["id"])
+    return items, next_cursor
+
+
+def review_summary(db: Session, product_id: int) -> Dict[str, Any]:
+    """Count, average and 1-5 star histogram of approved reviews (cached)."""
+    if _SUMMARY_VERSION.changed(db):
+        _SUMMARY_CACHE.clear()
+    now = time.time()
+    cached = _SUMMARY_CACHE.get(product_id)
+    if cached and now - cached[0] < _SUMMARY_TTL_SECONDS:
+        return cached[1]
+
+    rows = db.execute(
+        select(Review.rating, func.count(Review.id))
+        .where(Review.product_id == product_id, Review.approved == True)
+        .group_by(Review.rating)
+    ).all()
+    histogram = {str(star): 0 for star in range(1, 6)}
+    total = 0
+    rating_sum = 0
+    for rating, count in rows:
+        if rating is None:
+            continue
+        histogram[str(rating)] = histogram.get(str(rating), 0) + count
+        total += count
+        rating_sum += rating * count
+    summary = {
+        "count": total,
+        "average": round(rating_sum / total, 2) if total else 0,
+        "histogram": histogram,
+    }
+
+    if len(_SUMMARY_CACHE) > 10_000:
+        _SUMMARY_CACHE.clear()
+    _SUMMARY_CACHE[product_id] = (now, summary)
+    return summary
+
+
+def invalidate_review_summary(product_id: int) -> None:
+    _SUMMARY_CACHE.pop(product_id, None)
+
+
+def reviews_changed(db: Session, product_id: int) -> None:
+    """Call before committing a review create/approve/reject/edit/delete.
+
+    Refreshes the product's rating sort score, bumps the summary version for
+    other workers and drops the cached summary here. Does not commit.
+    """
+    # The score UPDATE doesn't autoflush; it must see the pending review change
+    db.flush()
+    refresh_product_scores(db, [product_id])
+    _SUMMARY_VERSION.bump(db)
+    invalidate_review_summary(product_id)
@@ -0,0 +1,238 @@
+"""
+Recommendation Service
+Item-to-item co-purchase recommendations.
+
+An offline job (recommendation_build) turns paid orders into baskets (each
+order, plus the union of every group's orders at a lower weight), counts
+co-occurrences, scores pairs by cosine similarity
+
+    sim(a, b) = co(a, b) / sqrt(n(a) * n(b))
+
+and stores the top-K neighbours of every product in ``product_neighbors``.
+The build is CPU-bound, so the job is off by default
+(ENABLE_RECOMMENDATION_BUILD=1 turns it on); scripts/build_recommendations.py
+runs it in its own process, e.g. from cron.
+Serving is a lookup: the neighbour lists of a few seed products (the
+viewed product, the user's recent purchases and favorites) are merged, so
+a request costs O(seeds * K) regardless of catalog or order volume.
+
+Pure Python (dicts and heaps); the pair counts are sparse, so no
+matrix library is needed.
+"""
+import heapq
+import logging
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import delete, func, insert, or_, select
+from sqlalchemy.orm import Session
+
+from app.models import Order, OrderItem, Product, ProductNeighbor, User
+from app.services.group_summary import PAID_STATUSES
+
+logger = logging.getLogger(__name__)
+
+TOP_K = 20
+# Baskets larger than this are truncated before pair counting (pairs grow quadratically)
+MAX_BASKET_ITEMS = 50
+# A group's combined basket counts less than an individual order
+GROUP_BASKET_WEIGHT = 0.5
+
+# Seed weights for personalized lists
+SEED_WEIGHT_VIEWED = 2.0
+SEED_WEIGHT_PURCHASED = 1.0
+SEED_WEIGHT_FAVORITE = 0.5
+RECENT_ITEMS_LIMIT = 20
+
+Neighbors = Dict[int, List[Tuple[int, float]]]
+
+
+# ---- building -----------------------------------------------------------------
+
+def build_neighbors(
+    baskets: Iterable[Tuple[Sequence[int], float]],
+    k: int = TOP_K,
+    max_basket: int = MAX_BASKET_ITEMS,
+) -> Neighbors:
+    """Top-``k`` cosine neighbours per product from weighted baskets.
+
+    ``baskets`` yields (product ids, weight). Returns
+    {product_id: [(neighbor_id, score), ...]} sorted by descending score.
+    """
+    item_weight: Dict[int, float] = defaultdict(float)
+    # Upper-triangular co-occurrence counts: co[a][b] with a < b
+    co: Dict[int, Dict[int, float]] = defaultdict(dict)
+    for items, weight in baskets:
+        items = sorted(set(items))[:max_basket]
+        for a in items:
+            item_weight[a] += weight
+        for idx, a in enumerate(items[:-1]):
+            row = co[a]
+            for b in items[idx + 1:]:
+                row[b] = row.get(b, 0.0) + weight
+
+    heaps: Dict[int, list] = defaultdict(list)
+
+    def push(item: int, neighbor: int, score: float) -> None:
+        heap = heaps[item]
+        if len(heap) < k:
+            heapq.heappush(heap, (score, neighbor))
+        elif score > heap[0][0]:
+            heapq.heapreplace(heap, (score, neighbor))
+
+    for a, row in co.items():
+        na = item_weight[a]
+        for b, count in row.items():
+            score = count / math.sqrt(na * item_weight[b])
+            push(a, b, score)
+            push(b, a, score)
+
+    return {
+        item: [(neighbor, score) for score, neighbor in sorted(heap, reverse=True)]
+        for item, heap in heaps.items()
+    }
+
+
+def score_candidates(
+    seeds: Dict[int, float],
+    neighbors: Neighbors,
+    exclude: Set[int],
+    limit: int,
+) -> List[int]:
+    """Merge the neighbour lists of weighted seeds into one ranked list."""
+    scores: Dict[int, float] = defaultdict(float)
+    for seed, weight in seeds.items():
+        for neighbor, score in neighbors.get(seed, ()):
+            if neighbor not in exclude:
+                scores[neighbor] += weight * score
+    return [pid for pid, _ in heapq.nlargest(limit, scores.items(), key=lambda kv: (kv[1], -kv[0]))]
+
+
+def _is_paid():
+    return or_(
+        Order.paid_at.isnot(None),
+        Order.payment_ref_id.isnot(None),
+        func.lower(Order.status).in_(PAID_STATUSES),
+    )
+
+
+def order_baskets(db: Session, batch_size: int = 5000) -> Iterator[Tuple[List[int], float]]:
+    """Stream paid-order baskets, then one combined basket per group."""
+    stmt = (
+        select(OrderItem.order_id, Order.group_order_id, OrderItem.product_id)
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(_is_paid(), or_(Order.is_settlement_payment.is_(None), Order.is_settlement_payment == False))
+        .order_by(OrderItem.order_id)
+        .execution_options(yield_per=batch_size)
+    )
+    groups: Dict[int, Set[int]] = defaultdict(set)
+    group_orders: Dict[int, Set[int]] = defaultdict(set)
+    current_order, current_items = None, []
+    for order_id, group_id, product_id in db.execute(stmt):
+        if order_id != current_order:
+            if current_items:
+                yield current_items, 1.0
+            current_order, current_items = order_id, []
+        current_items.append(product_id)
+        if group_id:
+            groups[group_id].add(product_id)
+            group_orders[group_id].add(order_id)
+    if current_items:
+        yield current_items, 1.0
+    for group_id, items in groups.items():
+        # Single-order groups add nothing beyond the order itself
+        if len(group_orders[group_id]) > 1:
+            yield list(items), GROUP_BASKET_WEIGHT
+
+
+def rebuild_neighbors(db: Session, k: int = TOP_K, batch_size: int = 5000) -> int:
+    """Recompute and replace the product_neighbors table; returns rows written.
+
+    Rows are replaced a chunk of products at a time (about ``batch_size`` rows
+    per transaction), so writers are never locked out for the whole rewrite.
+    Each product's list is swapped in one transaction.
+    """
+    neighbors = build_neighbors(order_baskets(db), k=k)
+    stale = set(db.execute(select(ProductNeighbor.product_id).distinct()).scalars()) - set(neighbors)
+    stale = sorted(stale)
+    per_chunk = max(1, batch_size // max(1, k))
+    for start in range(0, len(stale), per_chunk):
+        db.execute(delete(ProductNeighbor).where(ProductNeighbor.product_id.in_(stale[start:start + per_chunk])))
+        db.commit()
+
+    written = 0
+    product_ids = sorted(neighbors)
+    for start in range(0, len(product_ids), per_chunk):
+        chunk = product_ids[start:start + per_chunk]
+        rows = [
+            {"product_id": pid, "rank": rank, "neighbor_id": nid, "score": score}
+            for pid in chunk
+            for rank, (nid, score) in enumerate(neighbors[pid])
+        ]
+        db.execute(delete(ProductNeighbor).where(ProductNeighbor.product_id.in_(chunk)))
+        db.execute(insert(ProductNeighbor), rows)
+        db.commit()
+        written += len(rows)
+    logger.info(f"Rebuilt co-purchase neighbours for {len(neighbors)} products ({written} rows)")
+    return written
+
+
+def run_recommendation_build() -> None:
+    """Periodic job entry point."""
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        rebuild_neighbors(db)
+    finally:
+        db.close()
+
+
+# ---- serving ------------------------------------------------------------------
+
+def _user_seeds(db: Session, user: User) -> Dict[int, float]:
+    from app.services.favorites import favorite_ids
+    seeds: Dict[int, float] = {}
+    recent = db.execute(
+        select(OrderItem.product_id)
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(Order.user_id == user.id, _is_paid())
+        .order_by(OrderItem.id.desc())
+        .limit(RECENT_ITEMS_LIMIT)
+    ).scalars()
+    for pid in recent:
+        seeds[pid] = seeds.get(pid, 0.0) + SEED_WEIGHT_PURCHASED
+    for pid in favorite_ids(db, user.id):
+        seeds[pid] = seeds.get(pid, 0.0) + SEED_WEIGHT_FAVORITE
+    return seeds
+
+
+def recommend_product_ids(
+    db: Session,
+    user: Optional[User] = None,
+    product_id: Optional[int] = None,
+    limit: int = 10,
+) -> List[int]:
+    """Ranked product ids for a user and/or a viewed product, topped up with best sellers."""
+    seeds = _user_seeds(db, user) if user is not None else {}
+    if product_id:
+        seeds[product_id] = seeds.get(product_id, 0.0) + SEED_WEIGHT_VIEWED
+
+    neighbors: Neighbors = defaultdict(list)
+    if seeds:
+        rows = db.execute(
+            select(ProductNeighbor.product_id, ProductNeighbor.neighbor_id, ProductNeighbor.score)
+            .where(ProductNeighbor.product_id.in_(list(seeds)))
+        )
+        for pid, nid, score in rows:
+            neighbors[pid].append((nid, score))
+
+    exclude = set(seeds)
+    ranked = score_candidates(seeds, neighbors, exclude, limit)
+    if len(ranked) < limit:
+        taken = exclude | set(ranked)
+        stmt = select(Product.id).order_by(Product.sales_score.desc(), Product.id.desc()).limit(limit - len(ranked))
+        if taken:
+            stmt = stmt.where(Product.id.notin_(taken))
+        ranked.extend(db.execute(stmt).scalars())
+    return ranked
@@ -0,0 +1,268 @@
+"""
+Search Analytics Service
+Captures what users search for without a database write per request.
+
+Each process keeps a space-saving heavy-hitter counter (bounded memory,
+exact for frequent terms) of normalized search terms and how often they
+returned nothing. A per-process loop flushes the counter every
+SEARCH_STATS_FLUSH_SECONDS into ``search_term_stats`` (one row per term per
+day, upserted), from which the admin trending / zero-result reports and
+the optional trending merge of /popular-searches are computed.
+"""
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from app.models import SearchTermStat, TEHRAN_TZ
+
+logger = logging.getLogger(__name__)
+
+MAX_TERM_LENGTH = 120
+# Laplace smoothing for the trending ratio so brand-new terms don't divide by zero
+TREND_SMOOTHING = 1.0
+
+_WHITESPACE = re.compile(r"\s+")
+# Arabic letter forms typed by some keyboards -> Persian
+_CHAR_MAP = str.maketrans({"ي": "ی", "ك": "ک", "‌": " "})
+
+
+def normalize_term(query: str) -> str:
+    term = _WHITESPACE.sub(" ", (query or "").translate(_CHAR_MAP)).strip().lower()
+    return term[:MAX_TERM_LENGTH]
+
+
+class SpaceSavingCounter:
+    """Space-saving top-k counter (Metwally et al.).
+
+    Holds at most ``capacity`` terms. When full, a new term replaces the
+    least-counted one and inherits its count as ``error``, so
+    ``count - error`` is a guaranteed lower bound of the true count.
+
+    Terms are also grouped by count (the paper's stream-summary): counts
+    only ever grow by one, so the minimum is tracked directly and every
+    ``add`` is O(1), eviction included.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        # term -> [count, error, zero_result_count, last_result_count]
+        self.entries: Dict[str, List[int]] = {}
+        # count -> terms with that count, oldest first
+        self._buckets: Dict[int, Dict[str, None]] = {}
+        self._min = 0
+        self.total = 0
+
+    def _bump(self, term: str, count: int) -> None:
+        """Move ``term`` from the ``count - 1`` bucket (none when new) to ``count``."""
+        self._buckets.setdefault(count, {})[term] = None
+        if count == 1:
+            self._min = 1
+            return
+        bucket = self._buckets[count - 1]
+        del bucket[term]
+        if not bucket:
+            del self._buckets[count - 1]
+            if self._min == count - 1:
+                self._min = count
+
+    def add(self, term: str, result_count: int) -> None:
+        self.total += 1
+        zero = 1 if result_count == 0 else 0
+        entry = self.entries.get(term)
+        if entry is not None:
+            entry[0] += 1
+            entry[2] += zero
+            entry[3] = result_count
+            self._bump(term, entry[0])
+            return
+        if len(self.entries) < self.capacity:
+            self.entries[term] = [1, 0, zero, result_count]
+            self._bump(term, 1)
+            return
+        floor = self._min
+        victim = next(iter(self._buckets[floor]))
+        del self._buckets[floor][victim]
+        if not self._buckets[floor]:
+            del self._buckets[floor]
+        del self.entries[victim]
+        self.entries[term] = [floor + 1, floor, zero, result_count]
+        self._min = floor if floor in self._buckets else floor + 1
+        self._buckets.setdefault(floor + 1, {})[term] = None
+
+    def guaranteed(self) -> List[Tuple[str, int, int, int]]:
+        """(term, guaranteed count, zero-result count, last result count) per tracked term."""
+        return [
+            (term, count - error, min(zero, count - error), last)
+            for term, (count, error, zero, last) in self.entries.items()
+        ]
+
+
+class SearchTermRecorder:
+    def __init__(self, capacity: int = 2000, flush_seconds: int = 60):
+        self.capacity = capacity
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._counter = SpaceSavingCounter(capacity)
+        self.running = False
+
+    def record(self, query: str, result_count: int) -> None:
+        term = normalize_term(query)
+        if not term:
+            return
+        with self._lock:
+            self._counter.add(term, result_count)
+
+    def drain(self) -> SpaceSavingCounter:
+        with self._lock:
+            counter, self._counter = self._counter, SpaceSavingCounter(self.capacity)
+        return counter
+
+    def flush(self) -> int:
+        """Upsert the drained counts into search_term_stats; returns terms written."""
+        counter = self.drain()
+        rows = [r for r in counter.guaranteed() if r[1] > 0]
+        if not rows:
+            return 0
+        from app.database import SessionLocal
+        db = SessionLocal()
+        try:
+            _upsert_stats(db, rows)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to flush {len(rows)} search terms: {e}")
+            return 0
+        finally:
+            db.close()
+        return len(rows)
+
+    async def run_flusher(self) -> None:
+        self.running = True
+        while self.running:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"Search term flush failed: {e}")
+
+    def stop(self) -> None:
+        self.running = False
+        self.flush()
+
+
+def _upsert_stats(db: Session, rows: List[Tuple[str, int, int, int]]) -> None:
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    now = datetime.now(TEHRAN_TZ)
+    stmt = insert(SearchTermStat)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["term", "day"],
+        set_={
+            "search_count": SearchTermStat.search_count + stmt.excluded.search_count,
+            "zero_result_count": SearchTermStat.zero_result_count + stmt.excluded.zero_result_count,
+            "last_result_count": stmt.excluded.last_result_count,
+            "last_seen_at": stmt.excluded.last_seen_at,
+        },
+    )
+    db.execute(stmt, [
+        {
+            "term": term,
+            "day": now.date(),
+            "search_count": count,
+            "zero_result_count": zero,
+            "last_result_count": last,
+            "last_seen_at": now,
+        }
+        for term, count, zero, last in rows
+    ])
+
+
+# ---- reports ------------------------------------------------------------------
+
+def trending_terms(db: Session, days: int = 1, baseline_days: int = 7, limit: int = 20) -> List[Dict[str, Any]]:
+    """Terms searched more in the last ``days`` than their baseline daily rate.
+
+    trend = recent per-day count / (baseline per-day count + smoothing)
+    """
+    today = datetime.now(TEHRAN_TZ).date()
+    recent_start = today - timedelta(days=days - 1)
+    baseline_start = recent_start - timedelta(days=baseline_days)
+    recent = func.sum(case((SearchTermStat.day >= recent_start, SearchTermStat.search_count), else_=0))
+    baseline = func.sum(case((SearchTermStat.day < recent_start, SearchTermStat.search_count), else_=0))
+    rows = db.execute(
+        select(SearchTermStat.term, recent.label("recent"), baseline.label("baseline"))
+        .where(SearchTermStat.day >= baseline_start)
+        .group_by(SearchTermStat.term)
+        .having(recent > 0)
+    ).all()
+    result = []
+    for term, recent_count, baseline_count in rows:
+        recent_rate = recent_count / days
+        baseline_rate = baseline_count / baseline_days
+        result.append({
+            "term": term,
+            "recent_count": recent_count,
+            "baseline_count": baseline_count,
+            "trend": round(recent_rate / (baseline_rate + TREND_SMOOTHING), 3),
+        })
+    result.sort(key=lambda r: (-r["trend"], -r["recent_count"], r["term"]))
+    return result[:limit]
+
+
+def zero_result_terms(db: Session, days: int = 7, limit: int = 50) -> List[Dict[str, Any]]:
+    """Most frequent searches that returned nothing in the last ``days``."""
+    since = datetime.now(TEHRAN_TZ).date() - timedelta(days=days - 1)
+    zero = func.sum(SearchTermStat.zero_result_count)
+    rows = db.execute(
+        select(
+            SearchTermStat.term,
+            zero.label("zero_results"),
+            func.sum(SearchTermStat.search_count).label("searches"),
+            func.max(SearchTermStat.last_seen_at).label("last_seen_at"),
+        )
+        .where(SearchTermStat.day >= since)
+        .group_by(SearchTermStat.term)
+        .having(zero > 0)
+        .order_by(zero.desc(), SearchTermStat.term)
+        .limit(limit)
+    ).all()
+    return [
+        {
+            "term": term,
+            "zero_results": zero_results,
+            "searches": searches,
+            "last_seen_at": last_seen_at.isoformat() if last_seen_at else None,
+        }
+        for term, zero_results, searches, last_seen_at in rows
+    ]
+
+
+_TRENDING_CACHE: dict[int, tuple[float, list]] = {}
+
+
+def cached_trending_terms(db: Session, limit: int) -> List[Dict[str, Any]]:
+    """trending_terms() for public endpoints, cached for 5 minutes."""
+    now = time.time()
+    cached = _TRENDING_CACHE.get(limit)
+    if cached and now - cached[0] < 300:
+        return cached[1]
+    terms = trending_terms(db, limit=limit)
+    _TRENDING_CACHE[limit] = (now, terms)
+    return terms
+
+
+# Global instance
+search_term_recorder = SearchTermRecorder(
+    capacity=int(os.getenv("SEARCH_TERMS_CAPACITY", "2000")),
+    flush_seconds=int(os.getenv("SEARCH_STATS_FLUSH_SECONDS", "60")),
+)
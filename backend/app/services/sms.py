@@ -1,6 +1,11 @@
-from typing import Optional, Dict
-import requests
+import asyncio
 import json
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Iterable, List, Tuple
+
+import httpx
+import requests
 from app.config import get_settings
 from app.utils.logging import get_logger
 
@@ -12,19 +17,98 @@ settings = get_settings()
 # Dictionary to store verification codes for testing
 test_verification_codes: Dict[str, str] = {}
 
+# Bulk sending: recipients per provider call and concurrent calls (distinct bodies / chunks)
+BULK_MAX_RECIPIENTS = 100
+BULK_CONCURRENCY = 4
+
+
+def normalize_phone(phone_number: str) -> Optional[str]:
+    """+98912... / 98912... -> 0912...; None if the result isn't an Iranian mobile number"""
+    formatted = (phone_number or "").strip()
+    if formatted.startswith('+98'):
+        formatted = '0' + formatted[3:]
+    elif formatted.startswith('98'):
+        formatted = '0' + formatted[2:]
+    elif formatted.startswith('+'):
+        formatted = formatted[1:]
+    return formatted if formatted.startswith('09') else None
+
+
+@dataclass
+class BulkSMSResult:
+    """Per-recipient outcome of send_bulk: phone -> sent | failed | invalid"""
+    statuses: Dict[str, str] = field(default_factory=dict)
+    provider_ids: Dict[str, int] = field(default_factory=dict)
+    requests: int = 0
+    duration_seconds: float = 0.0
+
+    def count(self, status: str) -> int:
+        return sum(1 for s in self.statuses.values() if s == status)
+
+    def as_dict(self) -> Dict:
+        return {
+            "recipients": len(self.statuses),
+            "sent": self.count("sent"),
+            "failed": self.count("failed"),
+            "invalid": self.count("invalid"),
+            "requests": self.requests,
+            "duration_seconds": round(self.duration_seconds, 3),
+            "recipients_per_second": round(len(self.statuses) / self.duration_seconds, 1) if self.duration_seconds else None,
+            "statuses": self.statuses,
+        }
+
+
+class SMSMetrics:
+    """Process-wide counters for bulk sends (exposed at /admin/sms/metrics)"""
+
+    def __init__(self):
+        self.batches = 0
+        self.requests = 0
+        self.recipients = 0
+        self.sent = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.last_batch: Optional[Dict] = None
+
+    def record(self, result: BulkSMSResult) -> None:
+        self.batches += 1
+        self.requests += result.requests
+        self.recipients += len(result.statuses)
+        self.sent += result.count("sent")
+        self.failed += result.count("failed")
+        self.busy_seconds += result.duration_seconds
+        summary = result.as_dict()
+        summary.pop("statuses")
+        self.last_batch = summary
+
+    def snapshot(self) -> Dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "recipients": self.recipients,
+            "sent": self.sent,
+            "failed": self.failed,
+            "recipients_per_request": round(self.recipients / self.requests, 1) if self.requests else None,
+            "recipients_per_second": round(self.recipients / self.busy_seconds, 1) if self.busy_seconds else None,
+            "last_batch": self.last_batch,
+        }
+
 class SMSService:
     def __init__(self):
         self.provider = settings.SMS_PROVIDER.lower()
         logger.info(f"Initializing SMS service with provider: {self.provider}")
         self.is_test_mode = True  # Default to test until provider is confirmed
         self.force_test_mode = getattr(settings, "SMS_FORCE_TEST_MODE", False)
+        self.api_base_url = settings.MELIPAYAMAK_API_BASE_URL.rstrip('/')
+        self.soap_base_url = settings.MELIPAYAMAK_SOAP_BASE_URL.rstrip('/')
+        self.metrics = SMSMetrics()
         
         try:
             # Check if we're using custom API key from settings
             if hasattr(settings, 'MELIPAYAMAK_API_KEY') and settings.MELIPAYAMAK_API_KEY and settings.MELIPAYAMAK_API_KEY != "":
                 # Extract API key ID for URL construction
                 api_key = settings.MELIPAYAMAK_API_KEY
-                self.melipayamak_api_url = f'https://console.melipayamak.com/api/send/otp/{api_key}'
+                self.melipayamak_api_url = f'{self.api_base_url}/api/send/otp/{api_key}'
                 self.is_test_mode = False
                 # Never log secrets (API key)
                 logger.info("Melipayamak API key is configured")
@@ -33,7 +117,7 @@ class SMSService:
                 self.is_test_mode = True
         
             if self.provider == "melipayamak" and not self.is_test_mode:
-                logger.info("Melipayamak SMS service initialized with API URL: https://console.melipayamak.com/api/send/otp/<redacted>")
+                logger.info(f"Melipayamak SMS service initialized with API URL: {self.api_base_url}/api/send/otp/<redacted>")
             else:
                 logger.info("SMS service initialized in TEST MODE")
             if self.force_test_mode:
@@ -172,7 +256,7 @@ class SMSService:
             # Skip credit check - let's try sending SMS directly
             logger.info(f"Attempting SMS send via SOAP API (skipping credit check)")
             
-            url = "https://api.payamak-panel.com/post/Send.asmx/SendSimpleSMS"
+            url = f"{self.soap_base_url}/post/Send.asmx/SendSimpleSMS"
             
             data = {
                 "username": settings.MELIPAYAMAK_API_KEY,
@@ -228,7 +312,7 @@ class SMSService:
 
             # Extract API key for SMS API
             api_key = settings.MELIPAYAMAK_API_KEY
-            sms_url = f'https://console.melipayamak.com/api/send/simple/{api_key}'
+            sms_url = f'{self.api_base_url}/api/send/simple/{api_key}'
 
             # If this is for verification, format the message accordingly
             if is_verification:
@@ -353,11 +437,109 @@ class SMSService:
             logger.error(f"Failed to send SMS to {phone_number}: {str(e)}", exc_info=True)
             return False
 
+    async def send_bulk(self, messages: Iterable[Tuple[str, str]]) -> BulkSMSResult:
+        """
+        Send many (phone_number, message) pairs.
+
+        Recipients sharing a body go out together through Melipayamak's
+        multi-recipient endpoint (send/advanced), BULK_MAX_RECIPIENTS per
+        call; distinct bodies and chunks run concurrently, at most
+        BULK_CONCURRENCY calls at a time. A chunk the provider rejects or
+        never received falls back to send_sms per recipient; a chunk whose
+        outcome is unknown (e.g. a read timeout) is marked failed rather
+        than resent, so nobody gets the message twice.
+        """
+        t0 = time.perf_counter()
+        result = BulkSMSResult()
+        by_body: Dict[str, Dict[str, None]] = {}  # body -> recipients, ordered and de-duplicated
+        for phone_number, message in messages:
+            formatted = normalize_phone(phone_number)
+            if not formatted:
+                result.statuses[phone_number] = "invalid"
+                continue
+            by_body.setdefault(message, {})[formatted] = None
+        chunks = [
+            (message, list(recipients)[i:i + BULK_MAX_RECIPIENTS])
+            for message, recipients in by_body.items()
+            for i in range(0, len(recipients), BULK_MAX_RECIPIENTS)
+        ]
+
+        if self.is_test_mode or self.force_test_mode:
+            for message, recipients in chunks:
+                logger.info(f"[TEST MODE] Bulk SMS to {len(recipients)} recipients: {message}")
+                result.statuses.update({phone: "sent" for phone in recipients})
+        elif chunks:
+            semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+            async with httpx.AsyncClient(timeout=20) as client:
+                await asyncio.gather(*(
+                    self._send_bulk_chunk(client, semaphore, message, recipients, result)
+                    for message, recipients in chunks
+                ))
+
+        result.duration_seconds = time.perf_counter() - t0
+        self.metrics.record(result)
+        logger.info(
+            f"Bulk SMS: {len(result.statuses)} recipients, {len(by_body)} distinct bodies, {result.requests} requests "
+            f"in {result.duration_seconds:.2f}s (sent={result.count('sent')}, failed={result.count('failed')}, "
+            f"invalid={result.count('invalid')})"
+        )
+        return result
+
+    async def _send_bulk_chunk(
+        self,
+        client: httpx.AsyncClient,
+        semaphore: asyncio.Semaphore,
+        message: str,
+        recipients: List[str],
+        result: BulkSMSResult,
+    ) -> None:
+        url = f"{self.api_base_url}/api/send/advanced/{settings.MELIPAYAMAK_API_KEY}"
+        data = {"from": settings.MELIPAYAMAK_SENDER, "to": recipients, "text": message}
+        async with semaphore:
+            result.requests += 1
+            try:
+                response = await client.post(url, json=data)
+                body = response.json() if response.status_code == 200 else {}
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                # Never reached the provider: safe to send one by one
+                logger.warning(f"Bulk SMS request for {len(recipients)} recipients failed: {e}")
+                response, body = None, {}
+            except (httpx.HTTPError, ValueError) as e:
+                # The provider may have accepted the batch; resending could deliver twice
+                logger.error(f"Bulk SMS outcome unknown for {len(recipients)} recipients ({e!r}); marking them failed")
+                result.statuses.update({phone: "failed" for phone in recipients})
+                return
+
+            rec_ids = body.get("recIds") if isinstance(body, dict) else None
+            if isinstance(rec_ids, list) and len(rec_ids) == len(recipients):
+                for phone, rec_id in zip(recipients, rec_ids):
+                    # Message ids are large; small numbers are provider error codes
+                    ok = isinstance(rec_id, int) and rec_id > 1000
+                    result.statuses[phone] = "sent" if ok else "failed"
+                    if ok:
+                        result.provider_ids[phone] = rec_id
+                return
+
+        status_code = response.status_code if response is not None else None
+        logger.warning(f"Bulk SMS endpoint unusable (HTTP {status_code}, {body}); sending {len(recipients)} individually")
+
+        async def send_one(phone: str) -> None:
+            async with semaphore:
+                result.requests += 1
+                sent = await asyncio.to_thread(self._send_sms_blocking, phone, message)
+                result.statuses[phone] = "sent" if sent else "failed"
+
+        await asyncio.gather(*(send_one(phone) for phone in recipients))
+
+    def _send_sms_blocking(self, phone_number: str, message: str) -> bool:
+        """send_sms for a worker thread: its provider calls are blocking ``requests`` calls."""
+        return asyncio.run(self.send_sms(phone_number, message))
+
     async def _send_general_via_soap(self, phone_number: str, message: str) -> bool:
         """Send general SMS via legacy SOAP API as a fallback."""
         try:
             logger.info(f"Trying SOAP fallback for {phone_number}")
-            url = "https://api.payamak-panel.com/post/Send.asmx/SendSimpleSMS"
+            url = f"{self.soap_base_url}/post/Send.asmx/SendSimpleSMS"
 
             data = {
                 "username": settings.MELIPAYAMAK_API_KEY,
@@ -423,6 +605,10 @@ class SMSService:
         logger.debug(f"Retrieved test code for {phone_number}: {code}")
         return code
     
+    def take_sent_code(self, phone_number: str) -> Optional[str]:
+        """Pop the code recorded by the last send (the provider's own OTP or the test/fallback code)"""
+        return test_verification_codes.pop(phone_number, None)
+
     @staticmethod
     def get_test_code_static(phone_number: str) -> Optional[str]:
         """Static method to get the test verification code for a phone number"""
@@ -0,0 +1,326 @@
+"""
+Suggest Index
+In-memory typeahead over product, category and subcategory names and
+curated popular searches, served by /search/suggest without touching the
+database.
+
+Every name is normalized (see search_analytics.normalize_term) and indexed
+under each word start, so "گوشی سامسونگ" matches both "گو" and "سام".
+Keys live in one sorted list; a prefix is a bisect range, its matches are
+ranked by weight (sales) and the top results per prefix are cached.
+Prefixes matching more than SCAN_LIMIT keys are precomputed at build time,
+so a cache miss normally scans at most SCAN_LIMIT keys.
+
+The index is built in a background thread at startup (suggestions are
+empty until it is ready). Admin edits update single entries in place
+(refresh_product/category/...), patching the cached top lists of the
+entry's prefixes rather than dropping them; each process also rebuilds in the
+background once its index is older than SUGGEST_INDEX_MAX_AGE_SECONDS,
+which picks up edits made in other workers and sales changes.
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from app.models import Category, PopularSearch, Product, SubCategory
+from app.services.search_analytics import normalize_term
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = 20
+MAX_TOKENS_PER_NAME = 6
+SCAN_LIMIT = 1000
+_KEY_END = "\U0010ffff"
+
+Ref = Tuple[str, int]  # (kind, id)
+
+
+class SuggestIndex:
+    def __init__(self, max_age_seconds: int = 600):
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.RLock()
+        self._keys: List[Tuple[str, str, int]] = []  # sorted (key, kind, id)
+        self._entries: Dict[Ref, Dict[str, Any]] = {}
+        self._cache: Dict[str, List[Ref]] = {}
+        self._wide: Set[str] = set()  # precomputed prefixes, kept when the cache is trimmed
+        self._short: Set[str] = set()  # cached lists that edits left shorter than their range allows
+        self.built_at = 0.0
+        self._rebuilding = False
+
+    # ---- building -------------------------------------------------------
+
+    @staticmethod
+    def _keys_for(text: str) -> List[str]:
+        norm = normalize_term(text)
+        words = norm.split(" ")
+        return [" ".join(words[i:]) for i in range(min(len(words), MAX_TOKENS_PER_NAME)) if words[i]]
+
+    @staticmethod
+    def _make_entry(kind: str, ref_id: int, text: str, weight: float, slug: Optional[str] = None) -> Dict[str, Any]:
+        return {"type": kind, "id": ref_id, "text": text, "slug": slug, "weight": weight or 0}
+
+    def load(self, entries: List[Dict[str, Any]]) -> None:
+        """Replace the whole index with ``entries`` (see _make_entry)."""
+        keyed = {}
+        keys = []
+        for entry in entries:
+            ref = (entry["type"], entry["id"])
+            entry["keys"] = self._keys_for(entry["text"])
+            keyed[ref] = entry
+            keys.extend((k, ref[0], ref[1]) for k in entry["keys"])
+        keys.sort()
+        cache = self._precompute(keys, keyed)
+        with self._lock:
+            self._keys, self._entries, self._cache = keys, keyed, cache
+            self._wide, self._short = set(cache), set()
+            self.built_at = time.time()
+
+    @staticmethod
+    def _precompute(keys: List[Tuple[str, str, int]], entries: Dict[Ref, Dict[str, Any]]) -> Dict[str, List[Ref]]:
+        """Top results for every prefix whose key range exceeds SCAN_LIMIT.
+
+        Bottom-up: a wide range merges the top lists of its one-letter-longer
+        children, so every key is scanned once.
+        """
+        cache: Dict[str, List[Ref]] = {}
+
+        def top_of(prefix: str, lo: int, hi: int) -> List[Ref]:
+            if hi - lo <= SCAN_LIMIT:
+                return _top({(kind, ref_id) for _, kind, ref_id in keys[lo:hi]}, entries)
+            depth = len(prefix)
+            # Keys equal to the prefix sort first; children follow by next character
+            i = bisect_left(keys, (prefix + "\x00",), lo, hi)
+            refs = {(kind, ref_id) for _, kind, ref_id in keys[lo:i]}
+            while i < hi:
+                child = keys[i][0][:depth + 1]
+                j = bisect_left(keys, (child + _KEY_END,), i, hi)
+                refs.update(top_of(child, i, j))
+                i = j
+            result = _top(refs, entries)
+            if prefix:
+                cache[prefix] = result
+            return result
+
+        top_of("", 0, len(keys))
+        return cache
+
+    def build(self, db: Session) -> int:
+        entries = load_entries(db)
+        self.load(entries)
+        logger.info(f"Suggest index built with {len(entries)} entries")
+        return len(entries)
+
+    def rebuild_in_background(self) -> None:
+        """Rebuild from the database in a thread; the current index keeps serving."""
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def run():
+            from app.database import SessionLocal
+            db = SessionLocal()
+            try:
+                self.build(db)
+            except Exception as e:
+                logger.error(f"Suggest index rebuild failed: {e}")
+            finally:
+                db.close()
+                self._rebuilding = False
+
+        threading.Thread(target=run, name="suggest-index-rebuild", daemon=True).start()
+
+    # ---- incremental updates -----------------------------------------------
+
+    def _range_size(self, prefix: str) -> int:
+        return bisect_left(self._keys, (prefix + _KEY_END,)) - bisect_left(self._keys, (prefix,))
+
+    def _patch_cached(self, ref: Ref, old_keys: List[str], new_keys: List[str]) -> None:
+        """Update the cached top lists of every prefix of ``ref``'s old and new keys in place.
+
+        A cached list is always the exact top len(list) of its prefix. Taking
+        ``ref`` out can leave it one short of what the range holds; such
+        prefixes go to ``_short`` and are rescanned only when a lookup wants
+        more results than they still have.
+        """
+        new_prefixes = {key[:n] for key in new_keys for n in range(1, len(key) + 1)}
+        old_prefixes = {key[:n] for key in old_keys for n in range(1, len(key) + 1)}
+        rank = _rank(self._entries, ref) if new_keys else None
+        for prefix in new_prefixes | old_prefixes:
+            refs = self._cache.get(prefix)
+            if refs is None:
+                continue
+            # The list held the whole range, so anything added belongs in it
+            whole = prefix not in self._short and len(refs) < MAX_RESULTS
+            if ref in refs:
+                refs.remove(ref)
+            if prefix in new_prefixes and (whole or (refs and rank > _rank(self._entries, refs[-1]))):
+                i = 0
+                while i < len(refs) and _rank(self._entries, refs[i]) > rank:
+                    i += 1
+                refs.insert(i, ref)
+                del refs[MAX_RESULTS:]
+            if len(refs) < min(MAX_RESULTS, self._range_size(prefix)):
+                self._short.add(prefix)
+            else:
+                self._short.discard(prefix)
+
+    def _remove(self, ref: Ref) -> List[str]:
+        """Take ``ref``'s keys out of the index; returns them."""
+        old = self._entries.pop(ref, None)
+        if not old:
+            return []
+        for key in old["keys"]:
+            i = bisect_left(self._keys, (key, ref[0], ref[1]))
+            if i < len(self._keys) and self._keys[i] == (key, ref[0], ref[1]):
+                del self._keys[i]
+        return old["keys"]
+
+    def put(self, entry: Dict[str, Any]) -> None:
+        ref = (entry["type"], entry["id"])
+        entry["keys"] = self._keys_for(entry["text"])
+        with self._lock:
+            old_keys = self._remove(ref)
+            self._entries[ref] = entry
+            for key in entry["keys"]:
+                insort(self._keys, (key, ref[0], ref[1]))
+            self._patch_cached(ref, old_keys, entry["keys"])
+
+    def remove(self, kind: str, ref_id: int) -> None:
+        with self._lock:
+            self._patch_cached((kind, ref_id), self._remove((kind, ref_id)), [])
+
+    def refresh_product(self, db: Session, product_id: int) -> None:
+        """Re-read one product after an admin create/update/delete."""
+        if not self.built_at:
+            return
+        row = db.execute(
+            select(Product.id, Product.name, Product.sales_score, Product.is_active).where(Product.id == product_id)
+        ).first()
+        if row is None or row.is_active is False:
+            self.remove("product", product_id)
+        else:
+            self.put(self._make_entry("product", row.id, row.name, row.sales_score))
+
+    def refresh_category(self, db: Session, category_id: int) -> None:
+        if not self.built_at:
+            return
+        row = db.execute(
+            select(Category.id, Category.name, Category.slug, func.coalesce(func.sum(Product.sales_score), 0))
+            .outerjoin(Product, Product.category_id == Category.id)
+            .where(Category.id == category_id)
+            .group_by(Category.id, Category.name, Category.slug)
+        ).first()
+        if row is None:
+            self.remove("category", category_id)
+        else:
+            self.put(self._make_entry("category", row[0], row[1], row[3], row[2]))
+
+    def refresh_subcategory(self, db: Session, subcategory_id: int) -> None:
+        if not self.built_at:
+            return
+        row = db.execute(
+            select(SubCategory.id, SubCategory.name, SubCategory.slug, func.coalesce(func.sum(Product.sales_score), 0))
+            .outerjoin(Product, Product.subcategory_id == SubCategory.id)
+            .where(SubCategory.id == subcategory_id)
+            .group_by(SubCategory.id, SubCategory.name, SubCategory.slug)
+        ).first()
+        if row is None:
+            self.remove("subcategory", subcategory_id)
+        else:
+            self.put(self._make_entry("subcategory", row[0], row[1], row[3], row[2]))
+
+    def refresh_terms(self, db: Session) -> None:
+        """Reload curated popular searches after they change."""
+        if not self.built_at:
+            return
+        with self._lock:
+            top = max((e["weight"] for e in self._entries.values() if e["type"] != "term"), default=0)
+            for ref in [r for r in self._entries if r[0] == "term"]:
+                self._patch_cached(ref, self._remove(ref), [])
+        for entry in _term_entries(db, top):
+            self.put(entry)
+
+    # ---- lookup ---------------------------------------------------------------
+
+    def suggest(self, db: Session, query: str, limit: int = 8) -> List[Dict[str, Any]]:
+        prefix = normalize_term(query)
+        if not prefix:
+            return []
+        if not self.built_at:
+            # Still warming up (started from the app lifespan); never build on the request path
+            self.rebuild_in_background()
+            return []
+        if time.time() - self.built_at > self.max_age_seconds:
+            self.rebuild_in_background()
+
+        with self._lock:
+            refs = self._cache.get(prefix)
+            if refs is None or (prefix in self._short and len(refs) < limit):
+                lo = bisect_left(self._keys, (prefix,))
+                hi = bisect_left(self._keys, (prefix + _KEY_END,))
+                # Ranges wider than SCAN_LIMIT are precomputed, so this rarely scans more
+                refs = _top({(kind, ref_id) for _, kind, ref_id in self._keys[lo:hi]}, self._entries)
+                if len(self._cache) > 50_000:
+                    self._cache = {p: self._cache[p] for p in self._wide if p in self._cache}
+                    self._short &= set(self._cache)
+                self._cache[prefix] = refs
+                self._short.discard(prefix)
+            entries = [self._entries[ref] for ref in refs[:limit] if ref in self._entries]
+        return [{k: e[k] for k in ("type", "id", "text", "slug")} for e in entries]
+
+
+def _rank(entries: Dict[Ref, Dict[str, Any]], ref: Ref) -> Tuple[float, int, int]:
+    entry = entries[ref]
+    return entry["weight"], -len(entry["text"]), -ref[1]
+
+
+def _top(refs, entries: Dict[Ref, Dict[str, Any]]) -> List[Ref]:
+    return heapq.nlargest(MAX_RESULTS, refs, key=lambda r: _rank(entries, r))
+
+
+def _term_entries(db: Session, top_weight: float) -> List[Dict[str, Any]]:
+    # Curated terms rank just above the best-selling match, in their curated order
+    rows = db.execute(
+        select(PopularSearch.id, PopularSearch.search_term, PopularSearch.sort_order)
+        .where(PopularSearch.is_active == True)
+    ).all()
+    return [
+        SuggestIndex._make_entry("term", pid, term, top_weight + max(0, 1000 - (sort_order or 0)))
+        for pid, term, sort_order in rows
+        if term and term.strip()
+    ]
+
+
+def load_entries(db: Session) -> List[Dict[str, Any]]:
+    """All index entries: four queries regardless of catalog size."""
+    make = SuggestIndex._make_entry
+    entries = [
+        make("product", pid, name, sales)
+        for pid, name, sales in db.execute(
+            select(Product.id, Product.name, Product.sales_score)
+            .where(or_(Product.is_active.is_(None), Product.is_active == True))
+        )
+        if name
+    ]
+    for model, kind, fk in ((Category, "category", Product.category_id), (SubCategory, "subcategory", Product.subcategory_id)):
+        rows = db.execute(
+            select(model.id, model.name, model.slug, func.coalesce(func.sum(Product.sales_score), 0))
+            .outerjoin(Product, fk == model.id)
+            .group_by(model.id, model.name, model.slug)
+        )
+        entries.extend(make(kind, rid, name, weight, slug) for rid, name, slug, weight in rows if name)
+    top = max((e["weight"] for e in entries), default=0)
+    entries.extend(_term_entries(db, top))
+    return entries
+
+
+# Global instance
+suggest_index = SuggestIndex(max_age_seconds=int(os.getenv("SUGGEST_INDEX_MAX_AGE_SECONDS", "600")))
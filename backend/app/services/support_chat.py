@@ -0,0 +1,456 @@
+"""
+Support Chat Service
+Conversation summaries, persisted read receipts and push events for the
+user <-> admin support chat.
+
+support_conversations holds one row per user: the last message, unread
+counts for each side and each side's read high-water mark. Messages are
+written through add_message() and receipts through mark_seen_*(), so the
+summary stays in step with support_messages and receipts are the same in
+every worker and survive restarts.
+
+SupportEventHub pushes new messages and receipt changes to SSE clients.
+While anyone is listening, each worker re-reads the conversations touched
+since its last poll (one indexed query per interval), so messages written
+by another worker reach this worker's clients too; writes in this worker
+wake the poller immediately.
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.models import SupportConversation, SupportMessage, User
+from app.utils.admin import ADMIN_PHONE_NUMBER
+
+logger = logging.getLogger(__name__)
+
+SUPPORT_EVENTS_POLL_SECONDS = float(os.getenv("SUPPORT_EVENTS_POLL_SECONDS", "1.0"))
+SUPPORT_EVENTS_HEARTBEAT_SECONDS = 15
+# Conversations updated this long before the previous poll are re-read (clock skew between workers)
+_POLL_OVERLAP = timedelta(seconds=2)
+_QUEUE_SIZE = 200
+_REPLAY_LIMIT = 500
+
+
+def get_admin_user(db: Session) -> Optional[User]:
+    return db.query(User).filter(User.phone_number == ADMIN_PHONE_NUMBER).first()
+
+
+def _insert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(SupportConversation)
+
+
+def _thread_filter(admin_id: int, user_id: int):
+    return (
+        ((SupportMessage.sender_id == user_id) & (SupportMessage.receiver_id == admin_id))
+        | ((SupportMessage.sender_id == admin_id) & (SupportMessage.receiver_id == user_id))
+    )
+
+
+def message_dict(row: SupportMessage, user_id: int, conversation: Optional[SupportConversation]) -> Dict:
+    """SupportMessage schema fields; ``seen`` comes from the other side's high-water mark."""
+    sender = "user" if row.sender_id == user_id else "admin"
+    if conversation is None:
+        seen = False
+    elif sender == "user":
+        seen = row.id <= (conversation.admin_seen_id or 0)
+    else:
+        seen = row.id <= (conversation.user_seen_id or 0)
+    return {
+        "id": row.id,
+        "sender": sender,
+        "message": row.message,
+        "timestamp": row.timestamp,
+        "delivered": True,
+        "seen": seen,
+    }
+
+
+def conversation_dict(conversation: SupportConversation, user: Optional[User] = None) -> Dict:
+    data = {
+        "user_id": conversation.user_id,
+        "last_message_id": conversation.last_message_id,
+        "last_message": conversation.last_message,
+        "last_sender": conversation.last_sender,
+        "last_timestamp": conversation.last_message_at,
+        "unread_by_admin": conversation.unread_by_admin or 0,
+        "unread_by_user": conversation.unread_by_user or 0,
+        "admin_seen_id": conversation.admin_seen_id or 0,
+        "user_seen_id": conversation.user_seen_id or 0,
+    }
+    if user is not None:
+        data["name"] = f"{user.first_name or ''} {user.last_name or ''}".strip()
+        data["phone"] = user.phone_number
+    else:
+        data["name"] = "کاربر"
+        data["phone"] = None
+    return data
+
+
+def get_conversation(db: Session, user_id: int) -> Optional[SupportConversation]:
+    return db.query(SupportConversation).filter(SupportConversation.user_id == user_id).first()
+
+
+def add_message(db: Session, admin_id: int, user_id: int, sender: str, text: str) -> SupportMessage:
+    """Insert a message (sender is "user" or "admin") and update the conversation summary. Commits."""
+    from_admin = sender == "admin"
+    now = datetime.utcnow()
+    row = SupportMessage(
+        sender_id=admin_id if from_admin else user_id,
+        receiver_id=user_id if from_admin else admin_id,
+        message=text,
+        timestamp=now,
+    )
+    db.add(row)
+    db.flush()
+    unread_col = "unread_by_user" if from_admin else "unread_by_admin"
+    stmt = _insert(db).values(
+        user_id=user_id,
+        last_message_id=row.id,
+        last_message=text,
+        last_sender=sender,
+        last_message_at=now,
+        unread_by_admin=0 if from_admin else 1,
+        unread_by_user=1 if from_admin else 0,
+        admin_seen_id=0,
+        user_seen_id=0,
+        updated_at=now,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            "last_message_id": stmt.excluded.last_message_id,
+            "last_message": stmt.excluded.last_message,
+            "last_sender": stmt.excluded.last_sender,
+            "last_message_at": stmt.excluded.last_message_at,
+            unread_col: getattr(SupportConversation, unread_col) + 1,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    db.execute(stmt)
+    db.commit()
+    support_events.wake()
+    return row
+
+
+def _advance_mark(db: Session, admin_id: int, user_id: int, side: str, up_to_id: int) -> bool:
+    """Move one side's read mark forward to ``up_to_id`` and recount its unread messages, in one UPDATE."""
+    if side == "admin":
+        mark, unread = SupportConversation.admin_seen_id, SupportConversation.unread_by_admin
+        sender_id, receiver_id = user_id, admin_id
+    else:
+        mark, unread = SupportConversation.user_seen_id, SupportConversation.unread_by_user
+        sender_id, receiver_id = admin_id, user_id
+    new_mark = case((mark < up_to_id, up_to_id), else_=mark)
+    remaining = (
+        select(func.count(SupportMessage.id))
+        .where(
+            SupportMessage.sender_id == sender_id,
+            SupportMessage.receiver_id == receiver_id,
+            SupportMessage.id > up_to_id,
+        )
+        .scalar_subquery()
+    )
+    result = db.execute(
+        update(SupportConversation)
+        .where(SupportConversation.user_id == user_id, mark < up_to_id)
+        .values({mark: new_mark, unread: remaining, SupportConversation.updated_at: datetime.utcnow()})
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+
+def mark_seen_by_admin(db: Session, admin_id: int, user_id: int) -> bool:
+    """Admin opened the thread: everything the user sent so far is seen. Commits."""
+    latest = db.query(func.max(SupportMessage.id)).filter(
+        SupportMessage.sender_id == user_id, SupportMessage.receiver_id == admin_id
+    ).scalar()
+    changed = bool(latest) and _advance_mark(db, admin_id, user_id, "admin", latest)
+    db.commit()
+    if changed:
+        support_events.wake()
+    return changed
+
+
+def mark_seen_by_user(db: Session, admin_id: int, message_ids: List[int]) -> int:
+    """The user saw these admin messages; each affected thread's mark moves to the highest one. Commits."""
+    if not message_ids:
+        return 0
+    rows = (
+        db.query(SupportMessage.receiver_id, func.max(SupportMessage.id))
+        .filter(SupportMessage.id.in_(message_ids), SupportMessage.sender_id == admin_id)
+        .group_by(SupportMessage.receiver_id)
+        .all()
+    )
+    changed = sum(1 for user_id, up_to_id in rows if _advance_mark(db, admin_id, user_id, "user", up_to_id))
+    db.commit()
+    if changed:
+        support_events.wake()
+    return changed
+
+
+def thread_page(
+    db: Session, admin_id: int, user_id: int, before_id: Optional[int] = None, limit: Optional[int] = 50
+) -> Tuple[List[Dict], Optional[int]]:
+    """Newest ``limit`` messages (all when None) older than ``before_id``, oldest first, and the cursor for the previous page."""
+    query = db.query(SupportMessage).filter(_thread_filter(admin_id, user_id))
+    if before_id:
+        query = query.filter(SupportMessage.id < before_id)
+    query = query.order_by(SupportMessage.id.desc())
+    rows = (query.limit(limit + 1) if limit is not None else query).all()
+    has_more = limit is not None and len(rows) > limit
+    rows = rows[:limit][::-1]
+    conversation = get_conversation(db, user_id)
+    items = [message_dict(r, user_id, conversation) for r in rows]
+    return items, (rows[0].id if has_more and rows else None)
+
+
+def list_conversations(db: Session, limit: Optional[int] = 100, unread_only: bool = False) -> List[Dict]:
+    """Inbox: conversations with the latest activity first (all when ``limit`` is None)."""
+    query = db.query(SupportConversation, User).outerjoin(User, User.id == SupportConversation.user_id)
+    if unread_only:
+        query = query.filter(SupportConversation.unread_by_admin > 0)
+    rows = (
+        query.order_by(SupportConversation.last_message_at.desc(), SupportConversation.id.desc())
+        .limit(limit)
+        .all()
+    )
+    return [conversation_dict(conversation, user) for conversation, user in rows]
+
+
+def backfill_support_conversations(db: Session, batch_size: int = 500) -> int:
+    """Build support_conversations from support_messages when the table is still empty.
+
+    Receipts used to live in process memory, so existing history is treated
+    as read on both sides.
+    """
+    if db.query(SupportConversation.id).first() is not None:
+        return 0
+    admin = get_admin_user(db)
+    if not admin:
+        return 0
+    other = case((SupportMessage.sender_id == admin.id, SupportMessage.receiver_id), else_=SupportMessage.sender_id)
+    last_ids = [
+        row[0]
+        for row in db.query(func.max(SupportMessage.id))
+        .filter(or_(SupportMessage.sender_id == admin.id, SupportMessage.receiver_id == admin.id))
+        .group_by(other)
+        .all()
+    ]
+    now = datetime.utcnow()
+    for i in range(0, len(last_ids), batch_size):
+        rows = db.query(SupportMessage).filter(SupportMessage.id.in_(last_ids[i:i + batch_size])).all()
+        for r in rows:
+            from_admin = r.sender_id == admin.id
+            db.add(SupportConversation(
+                user_id=r.receiver_id if from_admin else r.sender_id,
+                last_message_id=r.id,
+                last_message=r.message,
+                last_sender="admin" if from_admin else "user",
+                last_message_at=r.timestamp,
+                unread_by_admin=0,
+                unread_by_user=0,
+                admin_seen_id=r.id,
+                user_seen_id=r.id,
+                updated_at=now,
+            ))
+        db.commit()
+    if last_ids:
+        logger.info(f"Backfilled {len(last_ids)} support conversations")
+    return len(last_ids)
+
+
+class SupportEventHub:
+    """Per-process fan-out of support chat events to SSE subscribers.
+
+    Events are dicts: {"type": "message", "user_id", "id", "message"} and
+    {"type": "conversation", "user_id", "conversation"} (last message,
+    unread counts, read marks). A subscriber registered with a user_id only
+    receives that user's events; None receives everything (admin inbox).
+    """
+
+    def __init__(self, poll_seconds: float = SUPPORT_EVENTS_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._subscribers: Dict[asyncio.Queue, Optional[int]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._since: Optional[datetime] = None
+        self._last_message_id = 0
+        self._signatures: Dict[int, tuple] = {}
+
+    def subscribe(self, user_id: Optional[int] = None) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=_QUEUE_SIZE)
+        self._subscribers[queue] = user_id
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._since = None
+            self._signatures.clear()
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.pop(queue, None)
+
+    def wake(self) -> None:
+        """Poll now instead of at the next interval; safe to call from worker threads."""
+        loop, event = self._loop, self._wake
+        if loop is None or event is None or not self._subscribers:
+            return
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            pass  # loop already closed
+
+    async def _run(self) -> None:
+        while self._subscribers:
+            self._wake.clear()
+            try:
+                events = await asyncio.to_thread(self._poll)
+            except Exception as e:
+                logger.error(f"Support event poll failed: {e}")
+                events = []
+            for event in events:
+                self._publish(event)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def _poll(self) -> List[Dict]:
+        from app.database import SessionLocal
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            if self._since is None:
+                self._last_message_id = db.query(func.max(SupportMessage.id)).scalar() or 0
+                self._since = now
+                return []
+            conversations = (
+                db.query(SupportConversation)
+                .filter(SupportConversation.updated_at >= self._since - _POLL_OVERLAP)
+                .all()
+            )
+            self._since = now
+            by_user = {c.user_id: c for c in conversations}
+            events: List[Dict] = []
+
+            newest = max((c.last_message_id or 0 for c in conversations), default=0)
+            if newest > self._last_message_id:
+                rows = (
+                    db.query(SupportMessage)
+                    .filter(SupportMessage.id > self._last_message_id, SupportMessage.id <= newest)
+                    .order_by(SupportMessage.id.asc())
+                    .all()
+                )
+                for r in rows:
+                    user_id = r.sender_id if r.sender_id in by_user else r.receiver_id
+                    events.append({
+                        "type": "message",
+                        "user_id": user_id,
+                        "id": r.id,
+                        "message": message_dict(r, user_id, by_user.get(user_id)),
+                    })
+                self._last_message_id = newest
+
+            for c in conversations:
+                signature = (c.last_message_id, c.unread_by_admin, c.unread_by_user, c.admin_seen_id, c.user_seen_id)
+                if self._signatures.get(c.user_id) != signature:
+                    self._signatures[c.user_id] = signature
+                    events.append({"type": "conversation", "user_id": c.user_id, "conversation": conversation_dict(c)})
+            if len(self._signatures) > 10_000:
+                self._signatures.clear()
+            return events
+        finally:
+            db.close()
+
+    def _publish(self, event: Dict) -> None:
+        for queue, user_id in list(self._subscribers.items()):
+            if user_id is not None and event["user_id"] != user_id:
+                continue
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow client: end its stream; EventSource reconnects with Last-Event-ID and replays
+                self._subscribers.pop(queue, None)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+
+support_events = SupportEventHub()
+
+
+def _replay(admin_id: int, user_id: Optional[int], after_id: int) -> List[Dict]:
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        query = db.query(SupportMessage).filter(SupportMessage.id > after_id)
+        if user_id is not None:
+            query = query.filter(_thread_filter(admin_id, user_id))
+        else:
+            query = query.filter(or_(SupportMessage.sender_id == admin_id, SupportMessage.receiver_id == admin_id))
+        rows = query.order_by(SupportMessage.id.asc()).limit(_REPLAY_LIMIT).all()
+        events = []
+        for r in rows:
+            uid = r.receiver_id if r.sender_id == admin_id else r.sender_id
+            events.append({
+                "type": "message",
+                "user_id": uid,
+                "id": r.id,
+                "message": message_dict(r, uid, get_conversation(db, uid)),
+            })
+        return events
+    finally:
+        db.close()
+
+
+def _format_sse(event: Dict) -> str:
+    lines = []
+    if event["type"] == "message":
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append("data: " + json.dumps(event, ensure_ascii=False, default=str))
+    return "\n".join(lines) + "\n\n"
+
+
+async def event_stream(request, admin_id: int, user_id: Optional[int] = None,
+                       after_id: Optional[int] = None) -> AsyncIterator[str]:
+    """SSE body for one client; ``after_id`` (Last-Event-ID) replays messages missed while disconnected."""
+    queue = support_events.subscribe(user_id)
+    sent_up_to = 0
+    try:
+        # The ready event tells the client the stream is live so it can stop polling
+        yield "retry: 3000\nevent: ready\ndata: {}\n\n"
+        if after_id:
+            for event in await asyncio.to_thread(_replay, admin_id, user_id, after_id):
+                sent_up_to = event["id"]
+                yield _format_sse(event)
+        while True:
+            if await request.is_disconnected():
+                break
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=SUPPORT_EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                break
+            if event["type"] == "message":
+                if event["id"] <= sent_up_to:
+                    continue
+                sent_up_to = event["id"]
+            yield _format_sse(event)
+    finally:
+        support_events.unsubscribe(queue)
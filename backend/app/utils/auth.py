@@ -1,12 +1,13 @@
 import random
 import string
-from datetime import datetime, timedelta
 from typing import Optional
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 
-from app.models import User, PhoneVerification, UserType
+from app.config import get_settings
+from app.models import User, UserType
 from app.schemas import PhoneVerificationRequest, VerifyCodeRequest
+from app.services.otp_store import OTP_LOCKED, OTP_OK, get_otp_store
 from app.services.sms import sms_service
 from app.utils.logging import get_logger
 
@@ -26,37 +27,39 @@ def generate_verification_code() -> str:
     """Generate a 5-digit verification code"""
     return ''.join(random.choices(string.digits, k=5))
 
-def create_verification_code(db: Session, user: User) -> str:
-    """Create a new verification code for a user"""
-    logger.info(f"Creating verification code for user ID: {user.id}, phone: {user.phone_number}")
-    
-    # Invalidate any existing codes
-    db.query(PhoneVerification).filter(
-        PhoneVerification.user_id == user.id,
-        PhoneVerification.is_used == False
-    ).update({"is_used": True})
-    
-    # Generate new code
+def create_verification_code(phone_number: str) -> str:
+    """Create a new verification code for a phone number, replacing any previous one"""
+    settings = get_settings()
     code = generate_verification_code()
-    expires_at = datetime.utcnow() + timedelta(minutes=15)
-    
-    verification = PhoneVerification(
-        user_id=user.id,
-        verification_code=code,
-        expires_at=expires_at
-    )
-    
-    db.add(verification)
-    db.commit()
-    
-    logger.info(f"Verification code created for user ID: {user.id}, expires at: {expires_at}")
+    get_otp_store().save_code(phone_number, code, settings.OTP_TTL_SECONDS)
+    logger.info(f"Verification code created for phone: {phone_number}, expires in {settings.OTP_TTL_SECONDS}s")
     return code
 
-async def send_verification_code(db: Session, phone_number: str, user_type: str) -> dict:
+def check_send_rate(phone_number: str, client_ip: Optional[str]) -> None:
+    """Token-bucket limits per IP and per phone number, checked before any SMS is sent"""
+    settings = get_settings()
+    store = get_otp_store()
+    limits = [(f"phone:{phone_number}", settings.OTP_PHONE_BURST, settings.OTP_PHONE_REFILL_SECONDS)]
+    if client_ip:
+        limits.insert(0, (f"ip:{client_ip}", settings.OTP_IP_BURST, settings.OTP_IP_REFILL_SECONDS))
+    for key, burst, refill_seconds in limits:
+        wait = store.take_token(key, burst, refill_seconds)
+        if wait > 0:
+            retry_after = int(wait) + 1
+            logger.warning(f"Verification send rate limited for {key}, retry after {retry_after}s")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"درخواست‌های زیاد. لطفاً {retry_after} ثانیه دیگر دوباره تلاش کنید",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+async def send_verification_code(db: Session, phone_number: str, user_type: str, client_ip: Optional[str] = None) -> dict:
     """Send verification code to phone number"""
     logger.info(f"Request to send verification code to phone number: {phone_number}, user type: {user_type}")
     
     try:
+        check_send_rate(phone_number, client_ip)
+
         # Check if user exists
         user = db.query(User).filter(User.phone_number == phone_number).first()
         
@@ -87,12 +90,15 @@ async def send_verification_code(db: Session, phone_number: str, user_type: str)
             logger.info(f"Found existing user with ID: {user.id} for phone number: {phone_number}")
         
         # Generate and send verification code
-        code = create_verification_code(db, user)
-        logger.info(f"Verification code: {code}")
+        code = create_verification_code(phone_number)
         logger.info(f"Attempting to send verification code to {phone_number}")
         
         sms_result = await sms_service.send_verification_code(phone_number, code)
         logger.debug(f"SMS service returned: {sms_result}")
+        # Melipayamak's OTP API sends its own code; that is the one the user will type
+        sent_code = sms_service.take_sent_code(phone_number)
+        if sent_code and sent_code != code:
+            get_otp_store().save_code(phone_number, sent_code, get_settings().OTP_TTL_SECONDS)
         
         if isinstance(sms_result, tuple):
             success, fallback_code = sms_result
@@ -114,7 +120,7 @@ async def send_verification_code(db: Session, phone_number: str, user_type: str)
         
         response_data = {
             "message": "کد تایید با موفقیت ارسال شد",
-            "expires_in": 15  # minutes
+            "expires_in": get_settings().OTP_TTL_SECONDS // 60  # minutes
         }
         
         # If we have a fallback code, it means SMS failed and we're in fallback mode
@@ -150,55 +156,23 @@ def verify_code(db: Session, phone_number: str, code: str) -> User:
     
     logger.debug(f"Found user ID: {user.id} for verification")
     
-    # First, try to verify against our database
-    verification = db.query(PhoneVerification).filter(
-        PhoneVerification.user_id == user.id,
-        PhoneVerification.verification_code == code,
-        PhoneVerification.is_used == False,
-        PhoneVerification.expires_at > datetime.utcnow()
-    ).first()
-    
-    # If not found in database, check if it's a Melipayamak code stored in memory
-    if not verification:
-        from app.services.sms import sms_service
-        test_code = sms_service.get_test_code(phone_number)
-        if test_code and test_code == code:
-            logger.info(f"Code verified against Melipayamak stored code for {phone_number}")
-            # Find any recent verification record for this user to mark as used
-            recent_verification = db.query(PhoneVerification).filter(
-                PhoneVerification.user_id == user.id,
-                PhoneVerification.is_used == False,
-                PhoneVerification.expires_at > datetime.utcnow()
-            ).first()
-            
-            if recent_verification:
-                recent_verification.is_used = True
-            else:
-                # Create a verification record for tracking
-                verification = PhoneVerification(
-                    user_id=user.id,
-                    verification_code=code,
-                    expires_at=datetime.utcnow() + timedelta(minutes=15),
-                    is_used=True
-                )
-                db.add(verification)
-            
-            user.is_phone_verified = True
-            db.commit()
-            logger.info(f"Phone verification successful for user ID: {user.id} using Melipayamak code")
-            return user
-    
-    if not verification:
-        logger.warning(f"Invalid or expired verification code for user ID: {user.id}")
+    result = get_otp_store().check_code(phone_number, code, get_settings().OTP_MAX_ATTEMPTS)
+    if result == OTP_LOCKED:
+        logger.warning(f"Too many wrong verification attempts for user ID: {user.id}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many wrong attempts. Please request a new verification code"
+        )
+    if result != OTP_OK:
+        logger.warning(f"Invalid or expired verification code for user ID: {user.id} ({result})")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid or expired verification code"
         )
     
-    # Mark code as used and verify user
-    verification.is_used = True
-    user.is_phone_verified = True
-    db.commit()
+    if not user.is_phone_verified:
+        user.is_phone_verified = True
+        db.commit()
     
     logger.info(f"Phone verification successful for user ID: {user.id}")
-    return user 
\ No newline at end of file
+    return user
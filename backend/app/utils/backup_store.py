@@ -0,0 +1,100 @@
+"""
+Content-addressed chunk store for database snapshots (see services/backups.py).
+
+A file is split into fixed-size chunks; each chunk is stored once,
+zlib-compressed, under the SHA-256 of its plain bytes, so snapshots that
+share most of their pages share most of their chunks. Standard library
+only: ``pack_file`` runs in a separate process started with the spawn
+method, which imports nothing but this module.
+"""
+import hashlib
+import os
+import time
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Iterable, List
+
+DEFAULT_CHUNK_SIZE = 256 * 1024  # 64 pages of 4 KiB: small enough that scattered updates leave most chunks intact
+COMPRESS_LEVEL = 1  # ~3x faster than 6 and within a few percent of its ratio on database pages
+
+
+def chunk_path(store: Path, digest: str) -> Path:
+    return store / digest[:2] / digest
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def pack_file(path: str, store: str, chunk_size: int = DEFAULT_CHUNK_SIZE, level: int = COMPRESS_LEVEL) -> dict:
+    """Store the chunks of ``path`` that the store lacks; returns the chunk list and stats."""
+    store_dir = Path(store)
+    started = time.perf_counter()
+    whole = hashlib.sha256()
+    chunks: List[str] = []
+    size = new_chunks = stored_bytes = 0
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            whole.update(data)
+            size += len(data)
+            digest = hashlib.sha256(data).hexdigest()
+            chunks.append(digest)
+            target = chunk_path(store_dir, digest)
+            try:
+                # Reused chunk: refresh its mtime so prune's settle window covers it
+                # until the manifest that references it is written
+                os.utime(target)
+                continue
+            except FileNotFoundError:
+                pass
+            packed = zlib.compress(data, level)
+            _write_atomic(target, packed)
+            new_chunks += 1
+            stored_bytes += len(packed)
+    return {
+        "size": size,
+        "sha256": whole.hexdigest(),
+        "chunk_size": chunk_size,
+        "chunks": chunks,
+        "new_chunks": new_chunks,
+        "stored_bytes": stored_bytes,
+        "pack_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def unpack_chunks(store: Path, chunks: Iterable[str], out: BinaryIO) -> str:
+    """Write the chunks to ``out`` in order, checking each one; returns the SHA-256 of the output.
+
+    Raises ValueError naming the first missing or corrupt chunk.
+    """
+    whole = hashlib.sha256()
+    for index, digest in enumerate(chunks):
+        source = chunk_path(store, digest)
+        try:
+            data = zlib.decompress(source.read_bytes())
+        except FileNotFoundError:
+            raise ValueError(f"Chunk {index} ({digest[:12]}) is missing")
+        except zlib.error:
+            raise ValueError(f"Chunk {index} ({digest[:12]}) is corrupt")
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Chunk {index} ({digest[:12]}) fails its checksum")
+        whole.update(data)
+        out.write(data)
+    return whole.hexdigest()
+
+
+def file_sha256(path: Path, block_size: int = DEFAULT_CHUNK_SIZE) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
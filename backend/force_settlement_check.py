@@ -7,6 +7,7 @@ import sys
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.models import GroupOrder, Order, OrderItem, Product, OrderState
+from app.services.pricing import unit_price_for_friends
 from datetime import datetime
 
 # Database connection
@@ -16,14 +17,7 @@ session = Session()
 
 def get_price_for_friends_count(product, friends_count):
     """Get the price for a specific number of friends"""
-    if friends_count == 0:
-        return product.market_price
-    elif friends_count == 1:
-        return product.friend_1_price or product.market_price
-    elif friends_count == 2:
-        return product.friend_2_price or product.friend_1_price or product.market_price
-    else:  # 3 or more friends
-        return product.friend_3_price or product.friend_2_price or product.friend_1_price or product.market_price
+    return unit_price_for_friends(product, friends_count)
 
 def force_check_all_groups():
     """Check all groups and update settlement requirements"""
@@ -2,7 +2,6 @@ import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
-from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
@@ -11,7 +10,12 @@ from app import models
 from app.routes import init_routes
 from app.utils.logging import get_logger
 from app.services.group_expiry import group_expiry_service
-from app.middleware.request_tracking import RequestTrackingMiddleware
+from app.services.job_scheduler import job_scheduler
+from app.services.search_analytics import search_term_recorder
+from app.services.suggest_index import suggest_index
+from app.services.ai_chatbot import ai_reply_worker
+from app.middleware.request_tracking import RequestTrackingMiddleware, get_request_stats
+from app.middleware.compression import StreamAwareGZipMiddleware
 from sqlalchemy import text
 from sqlalchemy.orm import joinedload
 
@@ -63,24 +67,158 @@ try:
         conn.execute(text("CREATE INDEX IF NOT EXISTS idx_product_images_product ON product_images(product_id)"))
         conn.execute(text("CREATE INDEX IF NOT EXISTS idx_product_options_product ON product_options(product_id)"))
         conn.execute(text("CREATE INDEX IF NOT EXISTS idx_products_name ON products(name)"))
+        # Correlated aggregates of the product-card query (services/product_cards.py)
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items(product_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_reviews_product ON reviews(product_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_reviews_product_created ON reviews(product_id, created_at, id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_favorites_user ON favorites(user_id)"))
 except Exception as _e:
     logger.error(f"Failed to ensure products.is_active column: {_e}")
 
+# One favorites row per (user, product) so adds can be ON CONFLICT DO NOTHING upserts;
+# drop duplicates left by the old select-then-insert path first
+try:
+    with engine.begin() as conn:
+        unique_indexes = [row[1] for row in conn.execute(text("PRAGMA index_list(favorites)")) if row[2]]
+        unique_cols = [
+            sorted(r[2] for r in conn.execute(text(f'PRAGMA index_info("{name}")')))
+            for name in unique_indexes
+        ]
+        if ["product_id", "user_id"] not in unique_cols:
+            conn.execute(text(
+                "DELETE FROM favorites WHERE id NOT IN "
+                "(SELECT MIN(id) FROM favorites GROUP BY user_id, product_id)"
+            ))
+            conn.execute(text("CREATE UNIQUE INDEX uq_favorites_user_product ON favorites(user_id, product_id)"))
+            logger.info("Added unique index on favorites(user_id, product_id)")
+except Exception as _e:
+    logger.error(f"Failed to ensure favorites unique index: {_e}")
+
+# Ensure product sort-score columns (keyset sorts of GET /products), then fill new ones
+try:
+    with engine.begin() as conn:
+        res = conn.execute(text("PRAGMA table_info(products)"))
+        product_cols = [row[1] for row in res]
+        added_scores = False
+        for col, ddl in (
+            ("sales_score", "INTEGER NOT NULL DEFAULT 0"),
+            ("rating_score", "FLOAT NOT NULL DEFAULT 0"),
+        ):
+            if col not in product_cols:
+                conn.execute(text(f"ALTER TABLE products ADD COLUMN {col} {ddl}"))
+                logger.info(f"Added products.{col} column")
+                added_scores = True
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_products_price_id ON products(base_price, id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_products_sales_id ON products(sales_score, id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_products_rating_id ON products(rating_score, id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_products_subcategory ON products(subcategory_id)"))
+        if "sku" not in product_cols:
+            conn.execute(text("ALTER TABLE products ADD COLUMN sku VARCHAR(64)"))
+            logger.info("Added products.sku column")
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_products_sku ON products(sku)"))
+    if added_scores:
+        from app.services.product_browse import rollup_product_scores
+        logger.info(f"Backfilled sort scores for {rollup_product_scores()} products")
+except Exception as _e:
+    logger.error(f"Failed to ensure products sort-score columns: {_e}")
+
+# Ensure group_orders summary columns exist, then backfill rows created before them
+try:
+    with engine.begin() as conn:
+        res = conn.execute(text("PRAGMA table_info(group_orders)"))
+        group_cols = [row[1] for row in res]
+        for col, ddl in (
+            ("kind", "VARCHAR(20)"),
+            ("participants_count", "INTEGER DEFAULT 0"),
+            ("paid_members", "INTEGER DEFAULT 0"),
+            ("product_name", "VARCHAR(120)"),
+        ):
+            if col not in group_cols:
+                conn.execute(text(f"ALTER TABLE group_orders ADD COLUMN {col} {ddl}"))
+                logger.info(f"Added group_orders.{col} column")
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_group_orders_kind_id ON group_orders(kind, id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_group_orders_status_id ON group_orders(status, id)"))
+    from app.database import SessionLocal
+    from app.services.group_summary import backfill_group_summaries
+    _db = SessionLocal()
+    try:
+        backfill_group_summaries(_db)
+    finally:
+        _db.close()
+except Exception as _e:
+    logger.error(f"Failed to ensure group_orders summary columns: {_e}")
+
+# Ensure typed checkout metadata columns on orders, then backfill legacy JSON/markers
+try:
+    with engine.begin() as conn:
+        res = conn.execute(text("PRAGMA table_info(orders)"))
+        order_cols = [row[1] for row in res]
+        for col, ddl in (
+            ("mode", "VARCHAR(20)"),
+            ("expected_friends", "INTEGER"),
+            ("allow_consolidation", "BOOLEAN"),
+            ("pending_invite_token", "VARCHAR(50)"),
+            ("delivery_slot_id", "INTEGER REFERENCES delivery_slots(id) ON DELETE SET NULL"),
+        ):
+            if col not in order_cols:
+                conn.execute(text(f"ALTER TABLE orders ADD COLUMN {col} {ddl}"))
+                logger.info(f"Added orders.{col} column")
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_mode ON orders(mode)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_pending_invite_token ON orders(pending_invite_token)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_delivery_slot_id ON orders(delivery_slot_id)"))
+        # Parent lookups of the order archive move (services/order_archive.py)
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_orders_group_order_id ON orders(group_order_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id)"))
+    from app.database import SessionLocal
+    from app.services.order_metadata import backfill_order_metadata
+    _db = SessionLocal()
+    try:
+        backfill_order_metadata(_db)
+    finally:
+        _db.close()
+except Exception as _e:
+    logger.error(f"Failed to ensure orders metadata columns: {_e}")
+
+# Support chat: thread index and conversation summaries for messages sent before the table existed
+try:
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_support_messages_pair ON support_messages(sender_id, receiver_id, id)"))
+    from app.database import SessionLocal
+    from app.services.support_chat import backfill_support_conversations
+    _db = SessionLocal()
+    try:
+        backfill_support_conversations(_db)
+    finally:
+        _db.close()
+except Exception as _e:
+    logger.error(f"Failed to ensure support conversations: {_e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up application...")
     
-    # Start the group expiry service
-    asyncio.create_task(group_expiry_service.run_periodic_check(interval_minutes=10))
-    logger.info("Group expiry service started")
+    # Start periodic jobs (group expiry, settlement reconciliation, rollups).
+    # Every worker runs the scheduler loop; per-job leases in background_jobs
+    # ensure only one process executes each run.
+    asyncio.create_task(job_scheduler.run_forever())
+    logger.info("Job scheduler started")
+    # Per-process: each worker flushes its own search-term counter
+    asyncio.create_task(search_term_recorder.run_flusher())
+    # Per-process: typeahead index for /search/suggest, built off the request path
+    suggest_index.rebuild_in_background()
+    # Per-process: AI support replies run on this loop with bounded concurrency
+    ai_reply_worker.start()
     
     yield
     
     # Shutdown
     logger.info("Shutting down application...")
+    job_scheduler.stop()
+    search_term_recorder.stop()
+    ai_reply_worker.stop()
     group_expiry_service.stop()
-    logger.info("Group expiry service stopped")
+    logger.info("Job scheduler stopped")
 
 # Create main app
 app = FastAPI(
@@ -153,8 +291,9 @@ app.add_middleware(
 )
 
 # Enable gzip compression on both apps for faster responses over the wire
-app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=5)
-api_app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=5)
+# (SSE streams are skipped: gzip would buffer them and no event would arrive)
+app.add_middleware(StreamAwareGZipMiddleware, minimum_size=500, compresslevel=5)
+api_app.add_middleware(StreamAwareGZipMiddleware, minimum_size=500, compresslevel=5)
 
 # Add request tracking middleware to monitor slow requests and prevent 524 timeouts
 # This MUST be added after CORS and GZip but before routes
@@ -177,4 +316,9 @@ async def api_root():
 
 @api_app.get("/health")
 async def api_health():
-    return {"status": "healthy", "service": "Bahamm API"}
\ No newline at end of file
+    return {"status": "healthy", "service": "Bahamm API"}
+
+@api_app.get("/health/requests")
+async def api_request_stats():
+    """Per-worker in-flight counts and admission metrics per priority lane."""
+    return get_request_stats()
@@ -0,0 +1,13 @@
+-- Lease + run stats for periodic background jobs (see app/services/job_scheduler.py)
+CREATE TABLE IF NOT EXISTS background_jobs (
+    name VARCHAR(64) PRIMARY KEY,
+    owner VARCHAR(120),
+    lease_expires_at DATETIME,
+    next_run_at DATETIME,
+    last_started_at DATETIME,
+    last_finished_at DATETIME,
+    last_duration_ms INTEGER,
+    last_lag_ms INTEGER,
+    last_error TEXT,
+    run_count INTEGER DEFAULT 0
+);
@@ -0,0 +1,24 @@
+-- Migration: Telegram broadcasts to user segments
+-- Progress (cursor_user_id and counters) is written by app.services.broadcasts after every chunk.
+
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id INTEGER PRIMARY KEY,
+    name VARCHAR(120) NOT NULL,
+    segment VARCHAR(50) NOT NULL,
+    message TEXT NOT NULL,
+    parse_mode VARCHAR(16) DEFAULT 'HTML',
+    status VARCHAR(20) NOT NULL DEFAULT 'draft',
+    cursor_user_id INTEGER NOT NULL DEFAULT 0,
+    total_recipients INTEGER,
+    sent_count INTEGER NOT NULL DEFAULT 0,
+    blocked_count INTEGER NOT NULL DEFAULT 0,
+    failed_count INTEGER NOT NULL DEFAULT 0,
+    rate_limited_count INTEGER NOT NULL DEFAULT 0,
+    active_seconds FLOAT NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at DATETIME,
+    started_at DATETIME,
+    finished_at DATETIME
+);
+CREATE INDEX IF NOT EXISTS ix_broadcasts_id ON broadcasts(id);
+CREATE INDEX IF NOT EXISTS ix_broadcasts_status ON broadcasts(status);
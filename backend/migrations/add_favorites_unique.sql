@@ -0,0 +1,5 @@
+-- Migration: One favorite row per (user, product)
+-- Lets /favorites/add use INSERT ... ON CONFLICT DO NOTHING.
+
+DELETE FROM favorites WHERE id NOT IN (SELECT MIN(id) FROM favorites GROUP BY user_id, product_id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_favorites_user_product ON favorites(user_id, product_id);
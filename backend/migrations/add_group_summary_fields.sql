@@ -0,0 +1,12 @@
+-- Migration: Add denormalized group summary fields
+-- Lets GET /group-orders/public-list page through groups without loading their orders.
+-- Existing rows are backfilled on startup (app.services.group_summary.backfill_group_summaries).
+
+ALTER TABLE group_orders ADD COLUMN kind VARCHAR(20) DEFAULT NULL;
+ALTER TABLE group_orders ADD COLUMN participants_count INTEGER DEFAULT 0;
+ALTER TABLE group_orders ADD COLUMN paid_members INTEGER DEFAULT 0;
+ALTER TABLE group_orders ADD COLUMN product_name VARCHAR(120) DEFAULT NULL;
+
+-- Keyset pagination / filters for the public list
+CREATE INDEX IF NOT EXISTS idx_group_orders_kind_id ON group_orders(kind, id);
+CREATE INDEX IF NOT EXISTS idx_group_orders_status_id ON group_orders(status, id);
@@ -0,0 +1,19 @@
+-- Migration: transactional outbox for user notifications
+-- Rows are written by app.services.order_bulk and sent by the notification_outbox job.
+
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    event VARCHAR(40) NOT NULL,
+    title VARCHAR(200) NOT NULL,
+    message TEXT NOT NULL,
+    payload TEXT,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at DATETIME,
+    sent_at DATETIME
+);
+CREATE INDEX IF NOT EXISTS ix_notification_outbox_id ON notification_outbox(id);
+CREATE INDEX IF NOT EXISTS ix_notification_outbox_user_id ON notification_outbox(user_id);
+CREATE INDEX IF NOT EXISTS ix_notification_outbox_status ON notification_outbox(status);
@@ -0,0 +1,71 @@
+-- Migration: cold storage for finalized groups and old orders
+-- Same columns as group_orders / orders / order_items without foreign keys,
+-- plus archived_at. Rows are moved here by app.services.order_archive.
+
+CREATE TABLE IF NOT EXISTS group_orders_archive (
+    id INTEGER PRIMARY KEY,
+    leader_id INTEGER NOT NULL,
+    invite_token VARCHAR(50) NOT NULL,
+    status VARCHAR(15) NOT NULL,
+    created_at DATETIME,
+    leader_paid_at DATETIME,
+    expires_at DATETIME,
+    finalized_at DATETIME,
+    basket_snapshot TEXT,
+    expected_friends INTEGER,
+    settlement_required BOOLEAN,
+    settlement_amount INTEGER,
+    settlement_paid_at DATETIME,
+    refund_due_amount INTEGER,
+    refund_card_number VARCHAR(32),
+    refund_requested_at DATETIME,
+    refund_paid_at DATETIME,
+    allow_consolidation BOOLEAN,
+    leader_address_id INTEGER,
+    kind VARCHAR(20),
+    participants_count INTEGER,
+    paid_members INTEGER,
+    product_name VARCHAR(120),
+    archived_at DATETIME
+);
+CREATE INDEX IF NOT EXISTS ix_group_orders_archive_leader_id ON group_orders_archive(leader_id);
+CREATE INDEX IF NOT EXISTS ix_group_orders_archive_created_at ON group_orders_archive(created_at);
+
+CREATE TABLE IF NOT EXISTS orders_archive (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER,
+    total_amount FLOAT NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    state VARCHAR(13),
+    created_at DATETIME,
+    expires_at DATETIME,
+    order_type VARCHAR(5) NOT NULL,
+    group_order_id INTEGER,
+    payment_authority VARCHAR(100),
+    payment_ref_id VARCHAR(100),
+    paid_at DATETIME,
+    ship_to_leader_address BOOLEAN,
+    is_invited_checkout BOOLEAN,
+    is_settlement_payment BOOLEAN,
+    shipping_address TEXT,
+    delivery_slot VARCHAR(100),
+    delivery_slot_id INTEGER,
+    mode VARCHAR(20),
+    expected_friends INTEGER,
+    allow_consolidation BOOLEAN,
+    pending_invite_token VARCHAR(50),
+    archived_at DATETIME
+);
+CREATE INDEX IF NOT EXISTS ix_orders_archive_user_id ON orders_archive(user_id);
+CREATE INDEX IF NOT EXISTS ix_orders_archive_group_order_id ON orders_archive(group_order_id);
+CREATE INDEX IF NOT EXISTS ix_orders_archive_created_at ON orders_archive(created_at);
+
+CREATE TABLE IF NOT EXISTS order_items_archive (
+    id INTEGER PRIMARY KEY,
+    order_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    base_price FLOAT NOT NULL,
+    archived_at DATETIME
+);
+CREATE INDEX IF NOT EXISTS ix_order_items_archive_order_id ON order_items_archive(order_id);
@@ -0,0 +1,14 @@
+-- Migration: Typed checkout metadata on orders
+-- Replaces the JSON packed into orders.delivery_slot and the PENDING_INVITE marker
+-- inside orders.shipping_address. Existing rows are backfilled on startup
+-- (app.services.order_metadata.backfill_order_metadata).
+
+ALTER TABLE orders ADD COLUMN mode VARCHAR(20) DEFAULT NULL;
+ALTER TABLE orders ADD COLUMN expected_friends INTEGER DEFAULT NULL;
+ALTER TABLE orders ADD COLUMN allow_consolidation BOOLEAN DEFAULT NULL;
+ALTER TABLE orders ADD COLUMN pending_invite_token VARCHAR(50) DEFAULT NULL;
+ALTER TABLE orders ADD COLUMN delivery_slot_id INTEGER DEFAULT NULL REFERENCES delivery_slots(id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS ix_orders_mode ON orders(mode);
+CREATE INDEX IF NOT EXISTS ix_orders_pending_invite_token ON orders(pending_invite_token);
+CREATE INDEX IF NOT EXISTS ix_orders_delivery_slot_id ON orders(delivery_slot_id);
@@ -0,0 +1,10 @@
+-- Migration: Precomputed co-purchase neighbours for /recommendations
+-- Filled by the recommendation_build job (app.services.recommendations.rebuild_neighbors).
+
+CREATE TABLE IF NOT EXISTS product_neighbors (
+    product_id INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    neighbor_id INTEGER NOT NULL,
+    score FLOAT NOT NULL,
+    PRIMARY KEY (product_id, rank)
+);
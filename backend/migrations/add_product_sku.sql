@@ -0,0 +1,5 @@
+-- Migration: supplier SKU on products, the upsert key of the bulk catalog import
+-- (app.services.catalog_import). NULLs are allowed and do not collide.
+
+ALTER TABLE products ADD COLUMN sku VARCHAR(64);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_products_sku ON products(sku);
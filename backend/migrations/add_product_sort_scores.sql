@@ -0,0 +1,13 @@
+-- Migration: Add materialized sort keys for keyset pagination of /products
+-- sales_score / rating_score mirror the displayed sales and rating.
+-- Existing rows are backfilled on startup and refreshed by the product_score_rollup job
+-- (app.services.product_browse.refresh_product_scores).
+
+ALTER TABLE products ADD COLUMN sales_score INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE products ADD COLUMN rating_score FLOAT NOT NULL DEFAULT 0;
+
+-- Keyset pagination: (sort key, id)
+CREATE INDEX IF NOT EXISTS idx_products_price_id ON products(base_price, id);
+CREATE INDEX IF NOT EXISTS idx_products_sales_id ON products(sales_score, id);
+CREATE INDEX IF NOT EXISTS idx_products_rating_id ON products(rating_score, id);
+CREATE INDEX IF NOT EXISTS idx_products_subcategory ON products(subcategory_id);
@@ -0,0 +1,14 @@
+-- Migration: Aggregated search-term analytics
+-- Rows are upserted by app.services.search_analytics (one row per term per day).
+
+CREATE TABLE IF NOT EXISTS search_term_stats (
+    id INTEGER PRIMARY KEY,
+    term VARCHAR(120) NOT NULL,
+    day DATE NOT NULL,
+    search_count INTEGER NOT NULL DEFAULT 0,
+    zero_result_count INTEGER NOT NULL DEFAULT 0,
+    last_result_count INTEGER,
+    last_seen_at DATETIME,
+    CONSTRAINT uq_search_term_stats_term_day UNIQUE (term, day)
+);
+CREATE INDEX IF NOT EXISTS ix_search_term_stats_day ON search_term_stats(day);
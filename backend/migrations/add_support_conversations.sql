@@ -0,0 +1,23 @@
+-- Migration: support chat inbox summaries and persisted read receipts
+-- Rows are maintained by app.services.support_chat; on startup main.py backfills
+-- the table from support_messages when it is empty.
+
+CREATE TABLE IF NOT EXISTS support_conversations (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL UNIQUE REFERENCES users(id),
+    last_message_id INTEGER,
+    last_message TEXT,
+    last_sender VARCHAR(10),
+    last_message_at DATETIME,
+    unread_by_admin INTEGER NOT NULL DEFAULT 0,
+    unread_by_user INTEGER NOT NULL DEFAULT 0,
+    admin_seen_id INTEGER NOT NULL DEFAULT 0,
+    user_seen_id INTEGER NOT NULL DEFAULT 0,
+    updated_at DATETIME
+);
+CREATE INDEX IF NOT EXISTS ix_support_conversations_id ON support_conversations(id);
+CREATE INDEX IF NOT EXISTS ix_support_conversations_last_message_at ON support_conversations(last_message_at);
+CREATE INDEX IF NOT EXISTS ix_support_conversations_updated_at ON support_conversations(updated_at);
+
+-- Keyset pages of one thread (sender, receiver, id)
+CREATE INDEX IF NOT EXISTS idx_support_messages_pair ON support_messages(sender_id, receiver_id, id);
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+AI reply worker against a local fake OpenAI-compatible server.
+
+The fake server answers /v1/chat/completions after --latency-ms and tracks
+how many requests it is handling at once. Users send bursts of support
+messages: most are specific questions (order numbers, so they go to the
+model), some are greetings (canned reply) and some repeat the same short
+FAQ (model once, then the answer cache). Checks that every user gets
+exactly one reply per burst and that the model never sees more than
+--concurrency requests at a time; reports event-loop lag while the worker
+is busy.
+
+Usage:
+    python scripts/bench_ai_replies.py [--users 60] [--burst 3] [--concurrency 4]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+class FakeLLM:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.calls = 0
+
+    def serve(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                with api.lock:
+                    api.active += 1
+                    api.calls += 1
+                    api.max_active = max(api.max_active, api.active)
+                time.sleep(api.latency)
+                with api.lock:
+                    api.active -= 1
+                last = payload["messages"][-1]["content"]
+                body = json.dumps({
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                    "model": payload.get("model"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": f"پاسخ به: {last[:40]}"}}],
+                    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=60)
+    parser.add_argument("--burst", type=int, default=3, help="messages per user, sent 100 ms apart")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--coalesce", type=float, default=1.0)
+    args = parser.parse_args()
+
+    llm = FakeLLM(args.latency_ms / 1000)
+    server = llm.serve()
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_ai.db")
+    Path(db_path).touch()
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ["AI_SUPPORT_ENABLED"] = "1"
+
+    import logging
+    logging.disable(logging.WARNING)
+    from sqlalchemy import func
+    from app import models
+    from app.database import SessionLocal, engine
+    from app.models import SupportMessage, User, UserType
+    from app.services.ai_chatbot import AIReplyWorker
+    from app.services.support_chat import add_message
+    from app.utils.admin import ADMIN_PHONE_NUMBER
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    admin = User(phone_number=ADMIN_PHONE_NUMBER, user_type=UserType.CUSTOMER)
+    users = [User(phone_number=f"0912{i:07d}", user_type=UserType.CUSTOMER) for i in range(args.users)]
+    db.add_all([admin, *users])
+    db.commit()
+    admin_id, user_ids = admin.id, [u.id for u in users]
+
+    def text_for(n, k):
+        if n % 6 == 0:
+            return "سلام"  # canned
+        if n % 6 == 1:
+            return "ساعت کاری پشتیبانی چیه؟"  # same FAQ for many users: model once, then cache
+        return f"سفارش {1000 + n} من کی می‌رسه؟ ({k})"
+
+    async def run():
+        worker = AIReplyWorker(queue_size=args.users * 2, concurrency=args.concurrency,
+                               coalesce_seconds=args.coalesce)
+        worker.start()
+        lag = []
+
+        async def probe():
+            while True:
+                t = time.perf_counter()
+                await asyncio.sleep(0.05)
+                lag.append(time.perf_counter() - t - 0.05)
+
+        probe_task = asyncio.create_task(probe())
+
+        async def user_burst(n, uid):
+            for k in range(args.burst):
+                text = text_for(n, k)
+                await asyncio.to_thread(add_message, SessionLocal(), admin_id, uid, "user", text)
+                worker.submit(uid, text)
+                await asyncio.sleep(0.1)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(user_burst(n, uid) for n, uid in enumerate(user_ids)))
+        while worker._pending or worker._inflight or not worker._queue.empty():
+            await asyncio.sleep(0.05)
+        wall = time.perf_counter() - t0
+        probe_task.cancel()
+        worker.stop()
+        return worker.snapshot(), wall, lag
+
+    snapshot, wall, lag = asyncio.run(run())
+    server.shutdown()
+
+    db = SessionLocal()
+    replies = dict(
+        db.query(SupportMessage.receiver_id, func.count(SupportMessage.id))
+        .filter(SupportMessage.sender_id == admin_id)
+        .group_by(SupportMessage.receiver_id)
+        .all()
+    )
+    per_user = [replies.get(uid, 0) for uid in user_ids]
+    lag.sort()
+    print(f"users={args.users} messages={args.users * args.burst} wall={wall:.2f}s")
+    print(f"worker: {snapshot}")
+    print(f"fake LLM: calls={llm.calls} max concurrent={llm.max_active}")
+    print(f"replies per user: min={min(per_user)} max={max(per_user)}")
+    print(f"event loop lag: p50={lag[len(lag) // 2] * 1000:.1f}ms max={lag[-1] * 1000:.1f}ms")
+    ok = min(per_user) == max(per_user) == 1 and llm.max_active <= args.concurrency
+    print("OK" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Hot-query latency before and after order archival.
+
+Builds a throwaway SQLite database with --orders orders (half in two-member
+groups, half solo, one item each) of which --recent-pct were created in the
+last month and the rest spread over the two years before, times a handful
+of queries the hot paths run, archives everything older than
+ORDER_ARCHIVE_AFTER_DAYS with app.services.order_archive and times the same
+queries again.
+
+Usage:
+    python scripts/bench_archive.py [--orders 1000000] [--users 50000] [--recent-pct 5]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+sys.path.append(str(BACKEND))
+
+BATCH = 20000
+
+
+def build(orders: int, users: int, recent_pct: float) -> None:
+    from sqlalchemy import text
+    from app.database import engine
+    from app.models import Base, Category, GroupOrder, Order, OrderItem, Product, Store, User
+
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        # Indexes main.py adds at startup
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_orders_group_order_id ON orders(group_order_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id)"))
+    rng = random.Random(7)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": i, "phone_number": f"0912{i:07d}", "user_type": "CUSTOMER", "coins": 0,
+             "is_phone_verified": True, "created_at": now - timedelta(days=800)}
+            for i in range(1, users + 1)
+        ])
+        conn.execute(Store.__table__.insert(), [{"id": 1, "name": "s", "merchant_id": 1}])
+        conn.execute(Category.__table__.insert(), [{"id": 1, "name": "c", "slug": "c"}])
+        conn.execute(Product.__table__.insert(), [
+            {"id": i, "name": f"p{i}", "store_id": 1, "category_id": 1, "base_price": 1000, "market_price": 1200}
+            for i in range(1, 201)
+        ])
+
+    def when(i: int) -> datetime:
+        if rng.random() * 100 < recent_pct:
+            return now - timedelta(minutes=rng.randint(1, 30 * 24 * 60))
+        return now - timedelta(days=rng.randint(200, 900), minutes=rng.randint(0, 1440))
+
+    groups, rows, items = [], [], []
+
+    def flush(conn) -> None:
+        for table, batch in ((GroupOrder.__table__, groups), (Order.__table__, rows), (OrderItem.__table__, items)):
+            if batch:
+                conn.execute(table.insert(), batch)
+                batch.clear()
+
+    with engine.begin() as conn:
+        order_id = group_id = 0
+        while order_id < orders:
+            created = when(order_id)
+            recent = created > now - timedelta(days=31)
+            if order_id % 4 < 2:
+                # group: leader + one member
+                group_id += 1
+                leader = rng.randint(1, users)
+                forming = recent and rng.random() < 0.3
+                groups.append({
+                    "id": group_id, "leader_id": leader, "invite_token": f"g{group_id}",
+                    "status": "GROUP_FORMING" if forming else "GROUP_FINALIZED", "created_at": created,
+                    "leader_paid_at": created, "expires_at": created + timedelta(days=1),
+                    "finalized_at": None if forming else created + timedelta(hours=5),
+                    "settlement_required": False, "settlement_amount": 0, "refund_due_amount": 0,
+                    "allow_consolidation": False, "kind": "primary", "participants_count": 2, "paid_members": 1,
+                })
+                members = [(leader, group_id), (rng.randint(1, users), group_id)]
+            else:
+                members = [(rng.randint(1, users), None)]
+            for user_id, gid in members:
+                order_id += 1
+                rows.append({
+                    "id": order_id, "user_id": user_id, "total_amount": rng.randint(50, 5000) * 1000,
+                    "status": "completed" if not recent else "در انتظار", "order_type": "GROUP" if gid else "ALONE",
+                    "group_order_id": gid, "is_settlement_payment": False, "created_at": created,
+                    "paid_at": created, "payment_ref_id": f"r{order_id}", "ship_to_leader_address": False,
+                })
+                items.append({"id": order_id, "order_id": order_id, "product_id": rng.randint(1, 200),
+                              "quantity": rng.randint(1, 3), "base_price": 1000})
+            if len(rows) >= BATCH:
+                flush(conn)
+        flush(conn)
+
+
+def queries(users: int):
+    from sqlalchemy import func, or_, select
+    from app.models import GroupOrder, GroupOrderStatus, Order
+
+    rng = random.Random(11)
+    month_ago = datetime.now() - timedelta(days=30)
+    return {
+        # /my-groups-and-orders: one user's paid orders
+        "user history": lambda: select(Order.id).where(
+            Order.user_id == rng.randint(1, users), Order.is_settlement_payment == False,
+            or_(Order.payment_ref_id.isnot(None), Order.paid_at.isnot(None)),
+        ),
+        # group_expiry scan
+        "expiry scan": lambda: select(GroupOrder.id).where(
+            GroupOrder.status == GroupOrderStatus.GROUP_FORMING, GroupOrder.expires_at < datetime.now(),
+        ),
+        # admin order list: newest page of paid orders
+        "admin newest 50": lambda: select(Order.id).where(
+            Order.is_settlement_payment == False, Order.payment_ref_id.isnot(None),
+        ).order_by(Order.created_at.desc()).limit(50),
+        "orders last 30d": lambda: select(func.count()).select_from(Order).where(Order.created_at >= month_ago),
+    }
+
+
+def time_queries(users: int, repeat: int) -> dict:
+    from app.database import SessionLocal
+
+    results = {}
+    db = SessionLocal()
+    try:
+        for name, make in queries(users).items():
+            db.execute(make()).all()  # warm the page cache
+            samples = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                db.execute(make()).all()
+                samples.append((time.perf_counter() - t0) * 1000)
+            results[name] = statistics.median(samples)
+    finally:
+        db.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--recent-pct", type=float, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "archive.db")
+        # app.database falls back to the project DB when the file does not exist yet
+        Path(db_path).touch()
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+        t0 = time.perf_counter()
+        build(args.orders, args.users, args.recent_pct)
+        print(f"built {args.orders} orders / {args.users} users in {time.perf_counter() - t0:.1f}s")
+
+        before = time_queries(args.users, args.repeat)
+
+        from app.database import SessionLocal
+        from app.services.order_archive import archive_orders, archive_stats
+        db = SessionLocal()
+        try:
+            t0 = time.perf_counter()
+            result = archive_orders(db, max_seconds=3600)
+            elapsed = time.perf_counter() - t0
+            stats = archive_stats(db)
+        finally:
+            db.close()
+        print(f"archived {result.groups} groups / {result.orders} orders / {result.items} items "
+              f"in {result.chunks} chunks, {elapsed:.1f}s ({result.orders / max(elapsed, 1e-9):.0f} orders/s)")
+        print(f"hot orders left: {stats['orders']}, archived: {stats['orders_archive']}")
+
+        after = time_queries(args.users, args.repeat)
+        print(f"{'query':18s} {'before ms':>10s} {'after ms':>10s} {'speedup':>8s}")
+        for name in before:
+            print(f"{name:18s} {before[name]:10.2f} {after[name]:10.2f} {before[name] / max(after[name], 1e-6):7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
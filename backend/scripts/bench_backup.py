@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Online backup throughput and writer stalls.
+
+Builds a throwaway WAL-mode SQLite database of about --mb megabytes, keeps a
+writer thread committing small inserts the way the app does, and reports
+the writer's commit latency (p99 and max) alone and while
+app.services.backups takes a full backup. It then updates --churn-pct of
+the rows, takes a second, incremental backup and reports how much of it had to be
+stored, and finally times verify.
+
+Usage:
+    python scripts/bench_backup.py [--mb 500] [--pages-per-step 256] [--step-pause-ms 5] [--churn-pct 0.1]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+sys.path.append(str(BACKEND))
+
+ROW_BYTES = 240
+
+
+def build(path: str, mb: int) -> int:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE rows (id INTEGER PRIMARY KEY, payload TEXT NOT NULL, n INTEGER NOT NULL)")
+    rng = random.Random(3)
+    total = mb * 1024 * 1024 // (ROW_BYTES + 20)
+    batch = 50000
+    for start in range(0, total, batch):
+        conn.executemany(
+            "INSERT INTO rows (payload, n) VALUES (?, ?)",
+            [(os.urandom(ROW_BYTES // 2).hex(), rng.randint(0, 1 << 30)) for _ in range(min(batch, total - start))],
+        )
+        conn.commit()
+    conn.close()
+    return total
+
+
+class Writer(threading.Thread):
+    """Commits one small insert every ~2 ms, recording (finished_at, latency)."""
+
+    def __init__(self, path: str):
+        super().__init__(daemon=True)
+        self.path = path
+        self.samples = []
+        self.stop = threading.Event()
+
+    def run(self) -> None:
+        conn = sqlite3.connect(self.path, timeout=60)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        while not self.stop.is_set():
+            t0 = time.perf_counter()
+            conn.execute("INSERT INTO rows (payload, n) VALUES ('w', 0)")
+            conn.commit()
+            t1 = time.perf_counter()
+            self.samples.append((t1, t1 - t0))
+            time.sleep(0.002)
+        conn.close()
+
+    def window(self, start: float, end: float):
+        return [lat * 1000 for t, lat in self.samples if start <= t <= end]
+
+
+def describe(latencies) -> str:
+    if not latencies:
+        return "no commits"
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return (f"{len(ordered)} commits, median {statistics.median(ordered):.2f} ms, "
+            f"p99 {p99:.2f} ms, max {ordered[-1]:.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=int, default=500)
+    parser.add_argument("--pages-per-step", type=int, default=256)
+    parser.add_argument("--step-pause-ms", type=float, default=5)
+    parser.add_argument("--chunk-kb", type=int, help="chunk size (default: BACKUP_CHUNK_KB)")
+    parser.add_argument("--churn-pct", type=float, default=0.1)
+    args = parser.parse_args()
+
+    from app.services.backups import CHUNK_SIZE, create_backup, verify_backup
+    chunk_size = args.chunk_kb * 1024 if args.chunk_kb else CHUNK_SIZE
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "live.db")
+        store = Path(tmp) / "backups"
+        t0 = time.perf_counter()
+        rows = build(db_path, args.mb)
+        print(f"built {os.path.getsize(db_path) / 1e6:.0f} MB ({rows} rows) in {time.perf_counter() - t0:.1f}s")
+
+        writer = Writer(db_path)
+        writer.start()
+        time.sleep(0.5)
+        base_start = time.perf_counter()
+        time.sleep(3)
+        print(f"writer alone:       {describe(writer.window(base_start, time.perf_counter()))}")
+
+        def backup(label: str) -> dict:
+            start = time.perf_counter()
+            manifest = create_backup(
+                f"sqlite:///{db_path}", store, pages_per_step=args.pages_per_step,
+                step_pause=args.step_pause_ms / 1000, chunk_size=chunk_size,
+            )
+            snap_end = start + manifest["snapshot_seconds"]
+            print(f"{label}: {manifest['size'] / 1e6:.0f} MB, snapshot {manifest['snapshot_seconds']:.1f}s "
+                  f"({manifest['size'] / 1e6 / manifest['snapshot_seconds']:.0f} MB/s, {manifest['steps']} steps, "
+                  f"longest step {manifest['max_step_ms']:.1f} ms), pack {manifest['pack_seconds']:.1f}s, "
+                  f"total {manifest['seconds']:.1f}s ({manifest['mb_per_second']} MB/s); "
+                  f"stored {manifest['stored_bytes'] / 1e6:.1f} MB in {manifest['new_chunks']} new chunks")
+            print(f"  writer during snapshot: {describe(writer.window(start, snap_end))}")
+            print(f"  writer during pack:     {describe(writer.window(snap_end, time.perf_counter()))}")
+            return manifest
+
+        backup("full backup")
+
+        conn = sqlite3.connect(db_path, timeout=60)
+        rng = random.Random(5)
+        changed = int(rows * args.churn_pct / 100)
+        conn.executemany("UPDATE rows SET n = n + 1 WHERE id = ?", [(rng.randint(1, rows),) for _ in range(changed)])
+        conn.commit()
+        conn.close()
+        print(f"updated {changed} random rows")
+        second = backup("incremental backup")
+
+        writer.stop.set()
+        writer.join()
+
+        t0 = time.perf_counter()
+        result = verify_backup(second["id"], store)
+        print(f"verify: ok={result['ok']} in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
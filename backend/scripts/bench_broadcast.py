@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Broadcast engine against a local fake Telegram Bot API.
+
+Starts an HTTP server that behaves like sendMessage: it answers 429 with
+retry_after when the bot exceeds --server-limit messages in any one-second
+window, 403 for a share of "blocked" chats, and records every delivered
+message. A throwaway SQLite database gets --users Telegram users and one
+running broadcast, which is sent in two runs (the first stopped by a
+deadline) to exercise resume. Reports throughput and checks that every
+recipient got exactly one message.
+
+Usage:
+    python scripts/bench_broadcast.py [--users 2000] [--rate 25] [--server-limit 30]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+class FakeBotAPI:
+    def __init__(self, limit_per_second: int, blocked_share: float, seed: int = 5):
+        self.limit = limit_per_second
+        self.blocked_share = blocked_share
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window = deque()
+        self.delivered = Counter()
+        self.rejected_429 = 0
+        self.blocked = set()
+
+    def handle(self, payload):
+        now = time.monotonic()
+        with self.lock:
+            while self.window and now - self.window[0] >= 1.0:
+                self.window.popleft()
+            if len(self.window) >= self.limit:
+                self.rejected_429 += 1
+                return 429, {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                             "parameters": {"retry_after": 1}}
+            self.window.append(now)
+            chat = str(payload.get("chat_id"))
+            if chat in self.blocked or self.rnd.random() < self.blocked_share:
+                self.blocked.add(chat)
+                return 403, {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}
+            self.delivered[chat] += 1
+        return 200, {"ok": True, "result": {"message_id": 1, "chat": {"id": chat}, "text": payload.get("text")}}
+
+    def serve(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                status, body = api.handle(payload)
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=25, help="client send rate (messages/second)")
+    parser.add_argument("--server-limit", type=int, default=30, help="fake API messages/second before 429")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--chunk-size", type=int, default=200)
+    parser.add_argument("--blocked", type=float, default=0.05, help="share of chats that blocked the bot")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_broadcast.db")
+    Path(db_path).touch()
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from sqlalchemy import insert
+    from app import models
+    from app.database import SessionLocal, engine
+    from app.models import Broadcast, User
+    from app.services.broadcasts import BroadcastSender, run_broadcast, serialize_broadcast
+
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": i, "phone_number": f"0912{i:07d}", "user_type": "CUSTOMER", "coins": 0,
+             "telegram_id": str(100000 + i) if i % 10 else None, "first_name": f"کاربر {i}"}
+            for i in range(1, args.users + 1)
+        ])
+    db = SessionLocal()
+    broadcast = Broadcast(name="bench", segment="telegram_users", message="سلام $first_name!", status="running",
+                          cursor_user_id=0, total_recipients=sum(1 for i in range(1, args.users + 1) if i % 10))
+    db.add(broadcast)
+    db.commit()
+    broadcast_id = broadcast.id
+
+    api = FakeBotAPI(args.server_limit, args.blocked)
+    server = api.serve()
+    base_url = f"http://127.0.0.1:{server.server_port}/botTEST"
+
+    async def run(deadline_seconds):
+        sender = BroadcastSender(base_url, rate=args.rate, concurrency=args.concurrency)
+        try:
+            deadline = time.monotonic() + deadline_seconds if deadline_seconds else None
+            return await run_broadcast(broadcast_id, sender, chunk_size=args.chunk_size, deadline=deadline)
+        finally:
+            await sender.close()
+
+    t0 = time.perf_counter()
+    first = asyncio.run(run(deadline_seconds=3))
+    db.expire_all()
+    cursor = db.get(Broadcast, broadcast_id).cursor_user_id
+    print(f"run 1 stopped by deadline: completed={first} cursor_user_id={cursor}")
+    second = asyncio.run(run(deadline_seconds=None))
+    wall = time.perf_counter() - t0
+    server.shutdown()
+
+    db.expire_all()
+    result = serialize_broadcast(db.get(Broadcast, broadcast_id))
+    duplicates = sum(1 for n in api.delivered.values() if n > 1)
+    print(f"run 2 completed={second} status={result['status']}")
+    print(f"recipients={result['total_recipients']} sent={result['sent']} blocked={result['blocked']} "
+          f"failed={result['failed']} retried_429={result['rate_limited']}")
+    print(f"fake API: delivered={sum(api.delivered.values())} unique_chats={len(api.delivered)} "
+          f"duplicates={duplicates} 429s={api.rejected_429}")
+    print(f"throughput: {result['messages_per_second']} msg/s while dispatching, {result['processed'] / wall:.1f} msg/s wall")
+    ok = (result["status"] == "completed" and duplicates == 0
+          and result["processed"] == result["total_recipients"] and result["sent"] == len(api.delivered))
+    print("OK" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
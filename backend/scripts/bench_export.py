@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Peak memory of the streaming admin exports.
+
+Builds a throwaway SQLite database with --orders orders (spread over
+--users users), then exports it in a fresh child process per format and
+reports output size, wall time, the child's peak RSS and its peak anonymous
+RSS (heap only; SQLite's mmap of the database file counts towards RSS but
+is page cache, not memory the export holds on to). With
+--materialize the same query is also run with .all() the way the JSON list
+endpoints load rows, for comparison.
+
+Usage:
+    python scripts/bench_export.py [--orders 1000000] [--users 50000] [--materialize]
+"""
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+sys.path.append(str(BACKEND))
+
+
+def build(db_path: str, orders: int, users: int) -> None:
+    # app.database falls back to the project DB when the file does not exist yet
+    Path(db_path).touch()
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    from app.database import engine
+    from app.models import Base, Order, User
+
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(7)
+    start = datetime(2025, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": i, "phone_number": f"0912{i:07d}", "first_name": f"کاربر {i}", "user_type": "CUSTOMER",
+             "coins": 0, "is_phone_verified": True, "created_at": start}
+            for i in range(1, users + 1)
+        ])
+    batch = []
+    statuses = ["pending", "processing", "shipped", "completed", "cancelled"]
+    with engine.begin() as conn:
+        for i in range(1, orders + 1):
+            batch.append({
+                "id": i, "user_id": rng.randint(1, users), "total_amount": rng.randint(50, 5000) * 1000,
+                "status": rng.choice(statuses), "order_type": "ALONE", "is_settlement_payment": False,
+                "created_at": start + timedelta(minutes=i), "delivery_slot": "2025-01-02 10:00-12:00",
+                "shipping_address": f"تهران، خیابان {i % 300}، پلاک {i % 90}",
+            })
+            if len(batch) == 20000:
+                conn.execute(Order.__table__.insert(), batch)
+                batch.clear()
+        if batch:
+            conn.execute(Order.__table__.insert(), batch)
+
+
+def anon_rss_mb() -> float:
+    """RssAnon from /proc (Linux); 0 where unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def child(db_path: str, mode: str) -> None:
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    from app.services.exports import build_query, export_stream
+
+    spec, stmt = build_query("orders")
+    t0 = time.perf_counter()
+    size = rows = 0
+    if mode == "materialize":
+        from app.database import SessionLocal
+        db = SessionLocal()
+        result = db.execute(stmt).all()
+        rows = len(result)
+        peak_anon = anon_rss_mb()
+    else:
+        peak_anon = 0.0
+        for i, chunk in enumerate(export_stream("orders", mode, stmt, spec)):
+            size += len(chunk)
+            if i % 20 == 0:
+                peak_anon = max(peak_anon, anon_rss_mb())
+        rows = -1
+    elapsed = time.perf_counter() - t0
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{mode:12s} {elapsed:7.1f}s  {size / 1e6:8.1f} MB out  peak RSS {peak_mb:7.1f} MB"
+          f"  peak anon {peak_anon:7.1f} MB"
+          + (f"  ({rows} rows)" if rows >= 0 else ""))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--materialize", action="store_true")
+    parser.add_argument("--child", nargs=2, metavar=("DB", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "export.db")
+        t0 = time.perf_counter()
+        build(db_path, args.orders, args.users)
+        print(f"built {args.orders} orders / {args.users} users in {time.perf_counter() - t0:.1f}s")
+        modes = ["csv", "xlsx"] + (["materialize"] if args.materialize else [])
+        for mode in modes:
+            subprocess.run([sys.executable, __file__, "--child", db_path, mode], check=True, cwd=BACKEND)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark: legacy ORM listing vs. the product-card read model.
+
+Builds a throwaway SQLite database, then fetches 50-card pages both ways
+and reports SQL statements, rows fetched from the driver and latency.
+
+Usage:
+    python scripts/bench_product_cards.py [--products 5000] [--pages 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--images", type=int, default=4, help="images per product")
+    parser.add_argument("--options", type=int, default=3, help="options per product")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_cards.db")
+    Path(db_path).touch()
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from sqlalchemy import event, func, insert, text
+    from sqlalchemy.orm import joinedload
+    from app.database import engine, SessionLocal
+    from app import models
+    from app.models import Category, OrderItem, Product, ProductImage, ProductOption, Review, Store, SubCategory, User
+    from app.services.product_cards import card_select, fetch_cards
+
+    models.Base.metadata.create_all(bind=engine)
+    rnd = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "phone_number": "09120000000", "user_type": "MERCHANT", "coins": 0, "is_phone_verified": True}])
+        conn.execute(insert(Store), [{"id": 1, "name": "store", "merchant_id": 1}])
+        conn.execute(insert(Category), [{"id": i, "name": f"cat{i}", "slug": f"cat{i}"} for i in range(1, 11)])
+        conn.execute(insert(SubCategory), [{"id": i, "name": f"sub{i}", "slug": f"sub{i}", "category_id": (i % 10) + 1} for i in range(1, 31)])
+        conn.execute(insert(Product), [
+            {"id": i, "name": f"محصول {i}", "description": "توضیحات " * 20, "base_price": 10000 + i,
+             "market_price": 9000 + i, "store_id": 1, "category_id": (i % 10) + 1, "subcategory_id": (i % 30) + 1,
+             "shipping_cost": rnd.choice([0, 5000]), "friend_1_price": 5000, "friend_2_price": 3000, "friend_3_price": 0}
+            for i in range(1, args.products + 1)
+        ])
+        conn.execute(insert(ProductImage), [
+            {"product_id": i, "image_url": f"/static/p{i}_{k}.jpg", "is_main": k == 1}
+            for i in range(1, args.products + 1) for k in range(args.images)
+        ])
+        conn.execute(insert(ProductOption), [
+            {"product_id": i, "option1_value": str(k), "stock": rnd.choice([0, 5])}
+            for i in range(1, args.products + 1) for k in range(args.options)
+        ])
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_product_images_product ON product_images(product_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_product_options_product ON product_options(product_id)"))
+
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    def rows_fetched(captured):
+        raw = engine.raw_connection()
+        try:
+            cur = raw.cursor()
+            return sum(len(cur.execute(sql, params).fetchall()) for sql, params in captured)
+        finally:
+            raw.close()
+
+    def legacy_page(db, offset):
+        products = (
+            db.query(Product)
+            .options(joinedload(Product.category), joinedload(Product.subcategory), joinedload(Product.images))
+            .order_by(Product.id.asc())
+            .offset(offset)
+            .limit(args.page_size)
+            .all()
+        )
+        ids = [p.id for p in products]
+        sales = dict(db.query(OrderItem.product_id, func.sum(OrderItem.quantity)).filter(OrderItem.product_id.in_(ids)).group_by(OrderItem.product_id).all())
+        ratings = {pid: (s, c) for pid, s, c in db.query(Review.product_id, func.sum(Review.rating), func.count(Review.id)).filter(Review.product_id.in_(ids)).group_by(Review.product_id).all()}
+        return [
+            {
+                "id": p.id,
+                "category": p.category.name if p.category else "Unknown",
+                "subcategory": p.subcategory.name if p.subcategory else None,
+                "images": [img.image_url for img in sorted(p.images, key=lambda x: (0 if x.is_main else 1, x.id))],
+                "in_stock": any(o.stock > 0 for o in p.options) if p.options else True,
+                "sales": sales.get(p.id, 0),
+                "ratings": ratings.get(p.id, (0, 0)),
+            }
+            for p in products
+        ]
+
+    def card_page(db, offset):
+        return fetch_cards(db, card_select(db, with_stats=True).order_by(Product.id.asc()).offset(offset).limit(args.page_size))
+
+    max_offset = max(0, args.products - args.page_size)
+    offsets = [rnd.randint(0, max_offset) for _ in range(args.pages)]
+    print(f"products={args.products} images/product={args.images} options/product={args.options} page_size={args.page_size}")
+    for label, fn in (("legacy ORM", legacy_page), ("card read model", card_page)):
+        latencies, stmt_counts, row_counts = [], [], []
+        for offset in offsets:
+            db = SessionLocal()
+            statements.clear()
+            t0 = time.perf_counter()
+            cards = fn(db, offset)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            db.close()
+            captured = list(statements)
+            stmt_counts.append(len(captured))
+            row_counts.append(rows_fetched(captured))
+            assert len(cards) == args.page_size
+        print(
+            f"{label:<16} statements/page={statistics.mean(stmt_counts):6.1f} rows/page={statistics.mean(row_counts):7.1f} "
+            f"p50={statistics.median(latencies):7.2f}ms max={max(latencies):7.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark: co-purchase neighbour build time and serving cost.
+
+Generates synthetic orders (default 100k products x 1M order lines), times
+build_neighbors(), then times merging top-K lists for personalized
+requests with 20 seeds.
+
+Usage:
+    python scripts/bench_recommendations.py [--products 100000] [--lines 1000000]
+"""
+import argparse
+import random
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from app.services.recommendations import build_neighbors, score_candidates  # noqa: E402
+from eval_recommendations import synthetic_orders  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("-k", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    orders = synthetic_orders(args.products, args.lines, args.users)
+    baskets = [(o, 1.0) for user_orders in orders.values() for o in user_orders]
+    gen_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    neighbors = build_neighbors(baskets, k=args.k)
+    build_s = time.perf_counter() - t0
+    rows = sum(len(v) for v in neighbors.values())
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    rnd = random.Random(1)
+    product_ids = list(neighbors)
+    latencies = []
+    for _ in range(args.requests):
+        seeds = {pid: 1.0 for pid in rnd.sample(product_ids, min(20, len(product_ids)))}
+        t1 = time.perf_counter()
+        score_candidates(seeds, neighbors, set(seeds), 10)
+        latencies.append((time.perf_counter() - t1) * 1000)
+
+    print(f"products={args.products} order_lines={args.lines} baskets={len(baskets)} (generated in {gen_s:.1f}s)")
+    print(f"build: {build_s:.1f}s, {len(neighbors)} products with neighbours, {rows} top-{args.k} rows, peak RSS {peak_mb:.0f} MB")
+    print(f"serve (20 seeds): p50={statistics.median(latencies):.3f}ms max={max(latencies):.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
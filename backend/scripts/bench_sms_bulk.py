@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Bulk SMS against a local stub of the Melipayamak REST API.
+
+The stub answers send/simple (one recipient), send/advanced (many
+recipients) and the legacy SOAP SendSimpleSMS fallback with a fixed
+per-request latency plus a small per-recipient cost, and rejects numbers
+ending in --reject-suffix with an error code the way the provider does, so
+no request leaves the machine. The same recipient list (split over --bodies
+distinct messages) is sent once with send_sms per recipient and once with
+send_bulk; reports requests, wall time and recipients/second, and checks
+that every recipient got exactly one message and the statuses match.
+
+Usage:
+    python scripts/bench_sms_bulk.py [--recipients 500] [--bodies 3] [--latency-ms 80]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+class StubMelipayamak:
+    def __init__(self, latency: float, per_recipient: float, reject_suffix: str):
+        self.latency = latency
+        self.per_recipient = per_recipient
+        self.reject_suffix = reject_suffix
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.delivered = Counter()
+        self.next_id = 10_000_000
+
+    def handle_soap(self, form):
+        phone = form.get("to", [""])[0]
+        time.sleep(self.latency + self.per_recipient)
+        with self.lock:
+            self.requests["soap"] += 1
+            rejected = bool(self.reject_suffix) and phone.endswith(self.reject_suffix)
+            if not rejected:
+                self.delivered[(phone, form.get("text", [""])[0])] += 1
+        # SendSimpleSMS answers 0 for success, a non-zero code otherwise
+        return f"<ArrayOfString><string>{11 if rejected else 0}</string></ArrayOfString>"
+
+    def handle(self, path, payload):
+        kind = path.rstrip("/").split("/")[-2]
+        recipients = payload.get("to")
+        recipients = recipients if isinstance(recipients, list) else [recipients]
+        time.sleep(self.latency + self.per_recipient * len(recipients))
+        rec_ids = []
+        with self.lock:
+            self.requests[kind] += 1
+            for phone in recipients:
+                if self.reject_suffix and str(phone).endswith(self.reject_suffix):
+                    rec_ids.append(11)  # provider error code: invalid recipient
+                    continue
+                self.next_id += 1
+                self.delivered[(phone, payload.get("text"))] += 1
+                rec_ids.append(self.next_id)
+        if kind == "advanced":
+            return {"recIds": rec_ids, "status": "ارسال موفق بود"}
+        ok = rec_ids[0] > 1000
+        return {"recId": rec_ids[0], "status": "ارسال موفق بود" if ok else "شماره نامعتبر"}
+
+    def serve(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length)
+                if "Send.asmx" in self.path:
+                    data, content_type = api.handle_soap(parse_qs(raw.decode())).encode(), "text/xml"
+                else:
+                    data, content_type = json.dumps(api.handle(self.path, json.loads(raw or b"{}"))).encode(), "application/json"
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, default=500)
+    parser.add_argument("--bodies", type=int, default=3, help="distinct message texts")
+    parser.add_argument("--latency-ms", type=float, default=80, help="stub latency per request")
+    parser.add_argument("--per-recipient-ms", type=float, default=0.5, help="stub cost per recipient")
+    parser.add_argument("--reject-suffix", default="77", help="numbers ending with this are rejected")
+    parser.add_argument("--sequential-limit", type=int, default=100,
+                        help="recipients sent one by one for the baseline (it is slow)")
+    args = parser.parse_args()
+
+    stub = StubMelipayamak(args.latency_ms / 1000, args.per_recipient_ms / 1000, args.reject_suffix)
+    server = stub.serve()
+    os.environ["MELIPAYAMAK_API_KEY"] = "bench"
+    os.environ["MELIPAYAMAK_API_BASE_URL"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ["MELIPAYAMAK_SOAP_BASE_URL"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ["SMS_FORCE_TEST_MODE"] = "false"
+
+    import logging
+    logging.disable(logging.INFO)
+    from app.services.sms import SMSService
+
+    service = SMSService()
+    messages = [
+        (f"+98912{i:07d}", f"پیام آزمایشی شماره {i % args.bodies}") for i in range(args.recipients)
+    ]
+
+    baseline = messages[:args.sequential_limit]
+    t0 = time.perf_counter()
+    for phone, body in baseline:
+        asyncio.run(service.send_sms(phone, body))
+    seq_s = time.perf_counter() - t0
+    print(f"sequential send_sms: {len(baseline)} recipients, "
+          f"{stub.requests['simple'] + stub.requests['soap']} requests ({stub.requests['soap']} SOAP fallbacks), "
+          f"{seq_s:.2f}s, {len(baseline) / seq_s:.1f} recipients/s")
+
+    stub.delivered.clear()
+    result = asyncio.run(service.send_bulk(messages))
+    summary = result.as_dict()
+    server.shutdown()
+
+    print(f"send_bulk: {summary['recipients']} recipients, {stub.requests['advanced']} requests, "
+          f"{summary['duration_seconds']:.2f}s, {summary['recipients_per_second']} recipients/s "
+          f"(sent={summary['sent']} failed={summary['failed']} invalid={summary['invalid']})")
+    print(f"metrics: {service.metrics.snapshot()}")
+
+    expected_failed = sum(1 for phone, _ in messages if phone.endswith(args.reject_suffix)) if args.reject_suffix else 0
+    duplicates = sum(1 for n in stub.delivered.values() if n > 1)
+    ok = (duplicates == 0 and summary["failed"] == expected_failed
+          and summary["sent"] == len(stub.delivered) == args.recipients - expected_failed)
+    print("OK" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
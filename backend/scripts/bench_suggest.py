@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /search/suggest index build time and lookup latency.
+
+Loads synthetic Persian product names (default 100k) into a SuggestIndex
+and times lookups for random 1-6 letter prefixes of real name words, first
+cold (only the wide prefixes precomputed at build time are cached, every
+other lookup is a bisect range scan) and then warm.
+
+Usage:
+    python scripts/bench_suggest.py [--products 100000] [--requests 20000]
+"""
+import argparse
+import random
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.services.suggest_index import SuggestIndex  # noqa: E402
+
+BRANDS = ["سامسونگ", "شیائومی", "اپل", "ال جی", "بوش", "پارس خزر", "فیلیپس", "سونی", "هواوی", "نوکیا"]
+NOUNS = ["گوشی", "تلویزیون", "یخچال", "شامپو", "برنج", "روغن", "کفش", "کیف", "لپ تاپ", "هدفون",
+         "چای", "قهوه", "پنیر", "ماست", "دستمال", "صابون", "عطر", "ساعت", "کتاب", "مداد"]
+ADJECTIVES = ["ایرانی", "خارجی", "بزرگ", "کوچک", "مشکی", "سفید", "ارگانیک", "ویژه", "اقتصادی", "لوکس"]
+
+
+def synthetic_entries(n_products: int, seed: int = 3):
+    rnd = random.Random(seed)
+    entries = []
+    for pid in range(1, n_products + 1):
+        name = f"{rnd.choice(NOUNS)} {rnd.choice(BRANDS)} {rnd.choice(ADJECTIVES)} مدل {rnd.randrange(1, 5000)}"
+        entries.append(SuggestIndex._make_entry("product", pid, name, rnd.paretovariate(1.2)))
+    for cid, noun in enumerate(NOUNS, 1):
+        entries.append(SuggestIndex._make_entry("category", cid, noun, 1000.0, f"cat-{cid}"))
+    return entries
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return (
+        statistics.median(latencies),
+        latencies[int(len(latencies) * 0.99) - 1],
+        latencies[-1],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=20_000)
+    args = parser.parse_args()
+
+    entries = synthetic_entries(args.products)
+    words = sorted({w for e in entries for w in e["text"].split()})
+
+    index = SuggestIndex()
+    t0 = time.perf_counter()
+    index.load(entries)
+    build_s = time.perf_counter() - t0
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    precomputed = dict(index._cache)
+
+    rnd = random.Random(1)
+    prefixes = []
+    for _ in range(args.requests):
+        word = rnd.choice(words)
+        prefixes.append(word[:rnd.randint(1, min(6, len(word)))])
+
+    for label, cold in (("cold", True), ("warm", False)):
+        latencies = []
+        for prefix in prefixes:
+            if cold and prefix not in precomputed:
+                index._cache.pop(prefix, None)
+            t1 = time.perf_counter()
+            index.suggest(None, prefix, 8)
+            latencies.append((time.perf_counter() - t1) * 1000)
+        p50, p99, worst = percentiles(latencies)
+        print(f"{label}: p50={p50:.3f}ms p99={p99:.3f}ms max={worst:.3f}ms")
+
+    print(f"entries={len(entries)} keys={len(index._keys)} build={build_s:.2f}s "
+          f"precomputed prefixes={len(precomputed)} peak RSS {peak_mb:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Rebuild the co-purchase recommendation table (product_neighbors).
+
+Same build as the recommendation_build job (app.services.recommendations),
+run in its own process so the pure-Python pair counting never competes
+with API requests. Schedule it from cron instead of setting
+ENABLE_RECOMMENDATION_BUILD=1 on the API workers. Uses the database
+configured for the backend (DATABASE_URL / .env).
+
+Usage:
+    python scripts/build_recommendations.py
+    python scripts/build_recommendations.py --top-k 30
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.database import SessionLocal  # noqa: E402
+from app.services.recommendations import TOP_K, rebuild_neighbors  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top-k", type=int, default=TOP_K, help=f"neighbours kept per product (default {TOP_K})")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        rows = rebuild_neighbors(db, k=args.top_k)
+    finally:
+        db.close()
+    print(f"wrote {rows} neighbour rows in {time.perf_counter() - started:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
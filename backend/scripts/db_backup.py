@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Back up, verify and restore the backend database.
+
+Same subsystem as the db_backup job (app.services.backups): SQLite is
+copied with the online backup API into the incremental chunk store,
+PostgreSQL goes through pg_dump/pg_restore. Uses the database configured
+for the backend (DATABASE_URL / .env) and BACKUP_DIR.
+
+Usage:
+    python scripts/db_backup.py backup
+    python scripts/db_backup.py list
+    python scripts/db_backup.py verify <id>
+    python scripts/db_backup.py restore <id> [--target PATH_OR_URL] [--force]
+    python scripts/db_backup.py prune [--keep 14]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.services.backups import (
+    KEEP_BACKUPS, create_backup, list_backups, prune_backups, restore_backup, verify_backup,
+)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dir", type=Path, help="backup directory (default: BACKUP_DIR)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("backup")
+    sub.add_parser("list")
+    verify = sub.add_parser("verify")
+    verify.add_argument("id")
+    restore = sub.add_parser("restore")
+    restore.add_argument("id")
+    restore.add_argument("--target", help="SQLite file or PostgreSQL URL (default: the backed-up database)")
+    restore.add_argument("--force", action="store_true", help="replace an existing target")
+    prune = sub.add_parser("prune")
+    prune.add_argument("--keep", type=int, default=KEEP_BACKUPS)
+    args = parser.parse_args()
+
+    try:
+        if args.command == "backup":
+            result = create_backup(directory=args.dir)
+        elif args.command == "list":
+            result = list_backups(args.dir)
+        elif args.command == "verify":
+            result = verify_backup(args.id, args.dir)
+        elif args.command == "restore":
+            result = restore_backup(args.id, args.target, args.dir, force=args.force)
+        else:
+            result = prune_backups(args.keep, args.dir)
+    except (ValueError, LookupError, FileExistsError, RuntimeError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if isinstance(result, dict) and result.get("ok") is False:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
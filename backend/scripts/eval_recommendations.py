@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation of co-purchase recommendations.
+
+Leave-last-out: for every user with at least two orders, the latest order
+is held out, neighbours are built from all other orders, and the user's
+earlier purchases seed a top-K list exactly as /recommendations does.
+Reports HitRate@K, Recall@K and catalog coverage against a best-seller
+baseline.
+
+Usage:
+    python scripts/eval_recommendations.py                  # orders in DATABASE_URL
+    python scripts/eval_recommendations.py --synthetic      # generated shopping data
+"""
+import argparse
+import random
+import sys
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.services.recommendations import (  # noqa: E402
+    RECENT_ITEMS_LIMIT,
+    SEED_WEIGHT_PURCHASED,
+    build_neighbors,
+    score_candidates,
+)
+
+# user_id -> list of orders (oldest first), each a list of product ids
+UserOrders = Dict[int, List[List[int]]]
+
+
+def synthetic_orders(
+    n_products: int,
+    n_lines: int,
+    n_users: int,
+    cluster_size: int = 50,
+    seed: int = 7,
+) -> UserOrders:
+    """Clustered shopping data: users buy mostly from two favourite clusters."""
+    rnd = random.Random(seed)
+    n_clusters = max(1, n_products // cluster_size)
+    prefs = {u: rnd.sample(range(n_clusters), min(2, n_clusters)) for u in range(n_users)}
+    orders: UserOrders = defaultdict(list)
+    lines = 0
+    while lines < n_lines:
+        user = rnd.randrange(n_users)
+        size = min(1 + int(rnd.expovariate(1 / 2.0)), 12)
+        items = []
+        for _ in range(size):
+            if rnd.random() < 0.8:
+                cluster = rnd.choice(prefs[user])
+                # Skewed popularity inside a cluster
+                offset = min(int(rnd.paretovariate(1.2)) - 1, cluster_size - 1)
+                items.append(cluster * cluster_size + offset)
+            else:
+                items.append(rnd.randrange(n_products))
+        orders[user].append(items)
+        lines += size
+    return orders
+
+
+def db_orders() -> UserOrders:
+    from sqlalchemy import select
+    from app.database import SessionLocal
+    from app.models import Order, OrderItem
+    from app.services.recommendations import _is_paid
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(Order.user_id, Order.id, OrderItem.product_id)
+            .join(OrderItem, OrderItem.order_id == Order.id)
+            .where(Order.user_id.isnot(None), _is_paid())
+            .order_by(Order.user_id, Order.id)
+        )
+        by_order: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for user_id, order_id, product_id in rows:
+            by_order[(user_id, order_id)].append(product_id)
+    finally:
+        db.close()
+    orders: UserOrders = defaultdict(list)
+    for (user_id, _), items in sorted(by_order.items()):
+        orders[user_id].append(items)
+    return orders
+
+
+def evaluate(orders: UserOrders, k: int) -> None:
+    train_baskets = []
+    tests = []
+    for user, user_orders in orders.items():
+        if len(user_orders) >= 2:
+            train_baskets.extend((o, 1.0) for o in user_orders[:-1])
+            history = [pid for o in user_orders[:-1] for pid in o]
+            tests.append((history, set(user_orders[-1])))
+        else:
+            train_baskets.extend((o, 1.0) for o in user_orders)
+    if not tests:
+        print("No users with two or more orders; nothing to evaluate.")
+        return
+
+    neighbors = build_neighbors(train_baskets)
+    popularity = Counter(pid for basket, _ in train_baskets for pid in basket)
+    best_sellers = [pid for pid, _ in popularity.most_common(k + RECENT_ITEMS_LIMIT)]
+
+    results = {"co-purchase": [0, 0.0, set()], "best-sellers": [0, 0.0, set()]}
+    for history, held_out in tests:
+        seeds: Dict[int, float] = {}
+        for pid in history[-RECENT_ITEMS_LIMIT:]:
+            seeds[pid] = seeds.get(pid, 0.0) + SEED_WEIGHT_PURCHASED
+        exclude = set(seeds)
+        fallback = [pid for pid in best_sellers if pid not in exclude]
+        recs = score_candidates(seeds, neighbors, exclude, k)
+        recs += [pid for pid in fallback if pid not in recs][: k - len(recs)]
+        for name, ranked in (("co-purchase", recs), ("best-sellers", fallback[:k])):
+            hits = len(held_out & set(ranked))
+            results[name][0] += 1 if hits else 0
+            results[name][1] += hits / len(held_out)
+            results[name][2].update(ranked)
+
+    catalog = len(popularity)
+    print(f"users evaluated={len(tests)} train baskets={len(train_baskets)} products seen={catalog} K={k}")
+    for name, (hit_users, recall_sum, shown) in results.items():
+        print(
+            f"{name:<13} HitRate@{k}={hit_users / len(tests):.3f} Recall@{k}={recall_sum / len(tests):.3f} "
+            f"coverage={len(shown) / max(1, catalog):.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--lines", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    orders = synthetic_orders(args.products, args.lines, args.users) if args.synthetic else db_orders()
+    evaluate(orders, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,657 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic dataset at production scale.
+
+Fills an empty database with users (phone, Telegram and mixed accounts),
+addresses, categories, stores, products with images and options, delivery
+slots, primary and secondary group buys in every status (forming, some
+already past their expiry, finalized with settlements and refunds,
+failed), their orders and items, solo orders, reviews and support threads.
+
+The same --seed and --anchor always produce the same rows: every table draws
+from its own random stream and ids are assigned explicitly. Timestamps run
+up to --anchor (default: the current hour), so forming groups and recent
+orders line up with "now" for the expiry sweep and admin lists. Rows are
+written with multi-row executemany inserts in batches, so --scale 50
+(about 10M rows) loads in minutes on SQLite or PostgreSQL. The schema and
+startup indexes come from importing main against --database-url; product
+sort scores are refreshed and ANALYZE is run at the end.
+
+Refuses to touch a database that already has users.
+
+Usage:
+    python scripts/generate_dataset.py --database-url sqlite:////tmp/bench.db [--seed 1] [--scale 1]
+        [--anchor 2025-06-01T12:00] [--users N] [--products N] [--groups N] [--solo-orders N]
+        [--reviews N] [--support-threads N] [--days 365]
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from array import array
+from dataclasses import dataclass, fields
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BACKEND = Path(__file__).resolve().parents[1]
+sys.path.append(str(BACKEND))
+
+BATCH = 10000
+TEHRAN_OFFSET = timedelta(hours=3, minutes=30)
+
+FIRST_NAMES = [
+    "علی", "محمد", "حسین", "رضا", "مهدی", "امیر", "سعید", "حمید", "مجید", "پویا", "آرش", "بهنام",
+    "فاطمه", "زهرا", "مریم", "سارا", "نرگس", "الهام", "مینا", "نازنین", "شیما", "لیلا", "پریسا", "هانیه",
+]
+LAST_NAMES = [
+    "محمدی", "حسینی", "احمدی", "رضایی", "کریمی", "موسوی", "جعفری", "صادقی", "رحیمی", "کاظمی",
+    "قاسمی", "نوری", "هاشمی", "عباسی", "اکبری", "زمانی", "شریفی", "یوسفی", "طاهری", "فرهادی",
+]
+CITIES = ["تهران", "مشهد", "اصفهان", "شیراز", "تبریز", "کرج", "قم", "اهواز", "رشت", "کرمان"]
+STREETS = ["ولیعصر", "آزادی", "انقلاب", "امام رضا", "شریعتی", "بهار", "فردوسی", "سعدی", "حافظ", "جمهوری"]
+PHONE_PREFIXES = ["0912", "0935", "0919", "0936", "0901", "0937", "0913", "0938", "0915", "0990", "0921"]
+
+CATEGORIES = {
+    "میوه و سبزی": ("fruits-vegetables", ["میوه", "سبزی", "صیفی‌جات"]),
+    "لبنیات": ("dairy", ["شیر", "ماست", "پنیر", "کره"]),
+    "خواربار": ("groceries", ["برنج", "حبوبات", "روغن", "قند و شکر"]),
+    "نوشیدنی": ("beverages", ["آبمیوه", "نوشابه", "چای و قهوه"]),
+    "تنقلات": ("snacks", ["چیپس", "شکلات", "آجیل", "بیسکویت"]),
+    "پروتئینی": ("protein", ["مرغ", "گوشت", "ماهی", "تخم‌مرغ"]),
+    "بهداشتی": ("hygiene", ["شامپو", "صابون", "دستمال کاغذی"]),
+    "شوینده": ("cleaning", ["مایع ظرفشویی", "پودر لباسشویی", "سفیدکننده"]),
+    "لوازم خانه": ("home", ["آشپزخانه", "نظافت", "نگهداری"]),
+    "کودک": ("baby", ["پوشک", "غذای کودک", "بهداشت کودک"]),
+}
+PRODUCT_WORDS = ["ممتاز", "اعلا", "خانواده", "اقتصادی", "ارگانیک", "تازه", "ویژه", "درجه یک", "بسته‌ای", "فله"]
+BRANDS = ["گلستان", "میهن", "کاله", "دامداران", "پگاه", "سحر", "مهرام", "چی‌توز", "تک ماکارون", "اویلا"]
+REVIEW_COMMENTS = [
+    "کیفیت عالی بود", "به موقع رسید", "قیمتش نسبت به بازار خیلی خوب بود", "بسته‌بندی مناسب بود",
+    "تازه بود", "با دوستام خریدیم و راضی بودیم", "معمولی بود", "انتظار بیشتری داشتم", None, None,
+]
+SUPPORT_USER_LINES = [
+    "سلام، سفارشم کی می‌رسه؟", "کد تخفیف کار نمی‌کنه", "دوستم عضو گروه شد ولی نشون نمیده",
+    "می‌خوام آدرس رو عوض کنم", "مبلغ تسویه رو چطور پرداخت کنم؟", "ممنون، رسید",
+]
+SUPPORT_ADMIN_LINES = [
+    "سلام، وقت بخیر. بررسی می‌کنیم", "سفارش شما فردا ارسال میشه", "آدرس به‌روزرسانی شد",
+    "لینک پرداخت تسویه در صفحه گروه‌ها هست", "مشکل برطرف شد",
+]
+SLOTS = [("10:00", "12:00"), ("14:00", "16:00"), ("18:00", "20:00")]
+
+# users.id 1 is the admin, then merchants, then customers
+ADMIN_ID = 1
+
+
+@dataclass
+class Counts:
+    users: int = 20000
+    merchants: int = 20
+    products: int = 2000
+    groups: int = 10000
+    solo_orders: int = 20000
+    reviews: int = 20000
+    support_threads: int = 1000
+
+    def scaled(self, scale: float) -> "Counts":
+        return Counts(**{f.name: max(1, int(getattr(self, f.name) * scale)) for f in fields(self)})
+
+
+class Loader:
+    """Buffers rows per table and writes them in foreign-key order, one transaction per flush.
+
+    Callers ``tick()`` between complete units (a user with their address, a group with its
+    orders), so a flush never writes a row before the row it references.
+    """
+
+    def __init__(self, engine, tables):
+        self.engine = engine
+        self.tables = tables  # in dependency order
+        self.buffers: Dict[str, List[dict]] = {t.name: [] for t in tables}
+        self.totals: Dict[str, int] = {t.name: 0 for t in tables}
+        self.pending = 0
+
+    def add(self, table, row: dict) -> None:
+        self.buffers[table.name].append(row)
+        self.pending += 1
+
+    def tick(self) -> None:
+        if self.pending >= BATCH:
+            self.flush()
+
+    def flush(self) -> None:
+        with self.engine.begin() as conn:
+            for table in self.tables:
+                rows = self.buffers[table.name]
+                if rows:
+                    # executemany needs one key set; optional columns left out of a row are NULL
+                    keys = set().union(*rows)
+                    for row in rows:
+                        if len(row) < len(keys):
+                            row.update((key, None) for key in keys - row.keys())
+                    conn.execute(table.insert(), rows)
+                    self.totals[table.name] += len(rows)
+                    rows.clear()
+        self.pending = 0
+
+
+class Generator:
+    def __init__(self, engine, seed: int, anchor: datetime, days: int, counts: Counts):
+        from app.models import (
+            Category, DeliverySlot, GroupOrder, Order, OrderItem, Product, ProductImage, ProductOption, Review,
+            Store, SubCategory, SupportConversation, SupportMessage, User, UserAddress,
+        )
+        self.seed = seed
+        self.anchor = anchor
+        self.start = anchor - timedelta(days=days)
+        self.span = (anchor - self.start).total_seconds()
+        self.counts = counts
+        self.t = {
+            "users": User.__table__, "addresses": UserAddress.__table__, "categories": Category.__table__,
+            "subcategories": SubCategory.__table__, "stores": Store.__table__, "products": Product.__table__,
+            "images": ProductImage.__table__, "options": ProductOption.__table__,
+            "slots": DeliverySlot.__table__, "groups": GroupOrder.__table__, "orders": Order.__table__,
+            "items": OrderItem.__table__, "reviews": Review.__table__,
+            "messages": SupportMessage.__table__, "conversations": SupportConversation.__table__,
+        }
+        self.loader = Loader(engine, list(self.t.values()))
+        self.first_customer = ADMIN_ID + counts.merchants + 1
+        self.address_of = array("l", [0]) * (counts.users + 1)
+        self.subcategories: List[tuple] = []  # (id, category_id, name)
+        self.prices: List[tuple] = []  # per product index: (base, friend_1, friend_2, friend_3)
+        self.product_names: List[str] = []
+        self.product_cum_weights: List[float] = []
+        self.order_id = 0
+        self.item_id = 0
+
+    def rng(self, stream: str) -> random.Random:
+        return random.Random(f"{self.seed}:{stream}")
+
+    # ---- time helpers -----------------------------------------------------------------
+
+    def _at(self, fraction: float) -> datetime:
+        """Point on the history timeline; activity grows towards the anchor."""
+        return min(self.start + timedelta(seconds=self.span * fraction ** 0.7), self.anchor)
+
+    def _users_before(self, when: datetime) -> int:
+        """Highest customer id whose account existed at ``when`` (inverse of the users timeline)."""
+        fraction = max(0.0, min(1.0, (when - self.start).total_seconds() / self.span))
+        customers = self.counts.users - self.first_customer + 1
+        return self.first_customer + min(int(customers * fraction ** (1 / 0.7)), customers - 1)
+
+    def _customer(self, rng: random.Random, when: datetime) -> int:
+        return rng.randint(self.first_customer, max(self.first_customer, self._users_before(when)))
+
+    # ---- catalog and users ----------------------------------------------------------
+
+    def users(self) -> None:
+        from app.models import UserType
+        from app.utils.admin import ADMIN_PHONE_NUMBER
+
+        rng = self.rng("users")
+        add = self.loader.add
+        add(self.t["users"], {
+            "id": ADMIN_ID, "first_name": "مدیر", "last_name": "سامانه", "phone_number": ADMIN_PHONE_NUMBER,
+            "user_type": UserType.MERCHANT, "coins": 0, "is_phone_verified": True, "created_at": self.start,
+        })
+        for uid in range(ADMIN_ID + 1, self.first_customer):
+            add(self.t["users"], {
+                "id": uid, "first_name": rng.choice(FIRST_NAMES), "last_name": rng.choice(LAST_NAMES),
+                "phone_number": f"0912{uid:07d}", "user_type": UserType.MERCHANT, "coins": 0,
+                "is_phone_verified": True, "created_at": self.start,
+            })
+        customers = self.counts.users - self.first_customer + 1
+        address_id = 0
+        for n, uid in enumerate(range(self.first_customer, self.counts.users + 1)):
+            self.loader.tick()
+            created = self._at(n / customers)
+            kind = rng.random()
+            # 55% phone only, 20% Telegram only, 25% both
+            has_phone = kind < 0.55 or kind >= 0.75
+            has_telegram = kind >= 0.55
+            named = rng.random() < (0.9 if has_telegram else 0.75)
+            add(self.t["users"], {
+                "id": uid,
+                "first_name": rng.choice(FIRST_NAMES) if named else None,
+                "last_name": rng.choice(LAST_NAMES) if named and rng.random() < 0.8 else None,
+                "phone_number": f"{rng.choice(PHONE_PREFIXES)}{uid:07d}" if has_phone else None,
+                "user_type": UserType.CUSTOMER,
+                "coins": rng.choice((0, 0, 0, 10, 20, 50, 100)),
+                "created_at": created,
+                "is_phone_verified": has_phone and rng.random() < 0.92,
+                "telegram_id": str(100_000_000 + uid * 7) if has_telegram else None,
+                "telegram_username": f"user_{uid}" if has_telegram and rng.random() < 0.7 else None,
+                "telegram_photo_url": f"https://t.me/i/userpic/320/{uid}.jpg" if has_telegram and rng.random() < 0.5 else None,
+                "telegram_language_code": ("fa" if rng.random() < 0.85 else "en") if has_telegram else None,
+            })
+            if rng.random() < 0.7:
+                address_id += 1
+                self.address_of[uid] = address_id
+                full, postal = self._address(uid)
+                add(self.t["addresses"], {
+                    "id": address_id, "user_id": uid, "title": rng.choice(("خانه", "محل کار", None)),
+                    "full_address": full, "postal_code": postal,
+                    "receiver_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                    "phone_number": f"{rng.choice(PHONE_PREFIXES)}{uid:07d}",
+                    "latitude": round(35.6 + rng.uniform(-0.2, 0.2), 6),
+                    "longitude": round(51.4 + rng.uniform(-0.3, 0.3), 6),
+                    "is_default": True, "created_at": created,
+                })
+
+    def _address(self, uid: int) -> tuple:
+        """Address text for a user, derived from the id alone (orders repeat it without a lookup)."""
+        h = (uid * 2654435761 + self.seed * 40503) % 4294967291
+        full = (f"{CITIES[h % 10]}، خیابان {STREETS[h // 10 % 10]}، کوچه {h // 100 % 40 + 1}، "
+                f"پلاک {h // 4000 % 200 + 1} - واحد {h // 800000 % 20 + 1}")
+        return full, f"{1000000000 + h % 9000000000}"
+
+    def catalog(self) -> None:
+        rng = self.rng("catalog")
+        add = self.loader.add
+        sub_id = 0
+        for cat_id, (name, (slug, subs)) in enumerate(CATEGORIES.items(), start=1):
+            add(self.t["categories"], {"id": cat_id, "name": name, "slug": slug,
+                                       "image_url": f"/static/images/categories/{slug}.png"})
+            for sub in subs:
+                sub_id += 1
+                self.subcategories.append((sub_id, cat_id, sub))
+                add(self.t["subcategories"], {"id": sub_id, "name": sub, "slug": f"{slug}-{sub_id}",
+                                              "category_id": cat_id})
+        for store_id, merchant in enumerate(range(ADMIN_ID + 1, self.first_customer), start=1):
+            add(self.t["stores"], {"id": store_id, "name": f"فروشگاه {rng.choice(BRANDS)} {store_id}",
+                                   "description": "فروشگاه نمونه", "merchant_id": merchant})
+        stores = self.counts.merchants
+        option_id = image_id = 0
+        for pid in range(1, self.counts.products + 1):
+            self.loader.tick()
+            sub_id, cat_id, sub_name = rng.choice(self.subcategories)
+            grams = rng.choice((250, 500, 900, 1000, 2000))
+            name = f"{sub_name} {rng.choice(BRANDS)} {rng.choice(PRODUCT_WORDS)} {grams} گرمی"[:120]
+            base = rng.randint(20, 2000) * 1000
+            friends = tuple(round(base * factor / 1000) * 1000 for factor in (0.92, 0.85, 0.78))
+            self.prices.append((base,) + friends)
+            self.product_names.append(name)
+            has_options = rng.random() < 0.35
+            add(self.t["products"], {
+                "id": pid, "sku": f"SKU-{pid:07d}", "name": name, "description": f"{name}؛ محصول نمونه",
+                "base_price": base, "market_price": round(base * rng.uniform(1.1, 1.6) / 1000) * 1000,
+                "store_id": rng.randint(1, stores), "category_id": cat_id, "subcategory_id": sub_id,
+                "option1_name": "وزن" if has_options else None, "option2_name": None,
+                "shipping_cost": 0, "is_active": rng.random() < 0.95,
+                "weight_grams": grams, "weight_tolerance_grams": 20,
+                "sales_seed_offset": rng.randint(0, 300), "sales_seed_baseline": 0,
+                "rating_seed_sum": 0, "rating_baseline_sum": 0, "rating_baseline_count": 0,
+                "sales_score": 0, "rating_score": 0,
+                "home_position": pid * 1000 if pid <= 40 else None,
+                "landing_position": pid * 1000 if pid <= 20 else None,
+                "friend_1_price": friends[0], "friend_2_price": friends[1], "friend_3_price": friends[2],
+            })
+            for n in range(rng.choice((1, 1, 2, 3, 4))):
+                image_id += 1
+                add(self.t["images"], {"id": image_id, "product_id": pid, "is_main": n == 0,
+                                       "image_url": f"/static/images/products/{pid}_{n + 1}.jpg"})
+            if has_options:
+                for value in rng.sample(("250 گرم", "500 گرم", "1 کیلو", "2 کیلو", "5 کیلو"), rng.randint(2, 4)):
+                    option_id += 1
+                    add(self.t["options"], {"id": option_id, "product_id": pid, "option1_value": value,
+                                            "stock": rng.randint(0, 500), "price_adjustment": rng.choice((0, 0, 5000, 10000))})
+        # Zipf-like popularity over a shuffled product order
+        ranks = list(range(1, self.counts.products + 1))
+        rng.shuffle(ranks)
+        total = 0.0
+        for rank in ranks:
+            total += 1 / rank ** 0.9
+            self.product_cum_weights.append(total)
+
+    def delivery_slots(self) -> None:
+        first = self.start.date()
+        for day in range((self.anchor.date() - first).days + 15):
+            self.loader.tick()
+            for n, (start, end) in enumerate(SLOTS):
+                self.loader.add(self.t["slots"], {
+                    "id": day * len(SLOTS) + n + 1, "delivery_date": first + timedelta(days=day),
+                    "start_time": start, "end_time": end, "is_active": True, "is_day_off": False,
+                    "created_at": self.start, "updated_at": self.start,
+                })
+
+    def _slot(self, rng: random.Random, paid: datetime) -> tuple:
+        day = (paid.date() - self.start.date()).days + rng.randint(1, 3)
+        n = rng.randrange(len(SLOTS))
+        start, end = SLOTS[n]
+        text = f"{(self.start.date() + timedelta(days=day)).isoformat()} {start}-{end}"
+        return text, day * len(SLOTS) + n + 1
+
+    # ---- orders ---------------------------------------------------------------------
+
+    def _basket(self, rng: random.Random) -> List[tuple]:
+        """[(product_index, quantity)] with popular products more likely."""
+        picks = rng.choices(range(self.counts.products), cum_weights=self.product_cum_weights, k=rng.choice((1, 1, 1, 2, 2, 3, 4)))
+        return [(p, rng.choice((1, 1, 1, 2, 3))) for p in dict.fromkeys(picks)]
+
+    def _order(self, rng: random.Random, user_id: int, created: datetime, basket, tier: int, **extra) -> int:
+        self.order_id += 1
+        total = 0.0
+        for product, qty in basket:
+            price = self.prices[product][tier]
+            self.item_id += 1
+            self.loader.add(self.t["items"], {"id": self.item_id, "order_id": self.order_id,
+                                              "product_id": product + 1, "quantity": qty, "base_price": price})
+            total += price * qty
+        paid = extra.pop("paid_at", created)
+        row = {
+            "id": self.order_id, "user_id": user_id, "total_amount": total, "created_at": created,
+            "is_settlement_payment": False, "ship_to_leader_address": False, "is_invited_checkout": False,
+            "paid_at": paid,
+            "payment_authority": f"A{self.order_id:035d}" if paid else None,
+            "payment_ref_id": str(10_000_000 + self.order_id) if paid else None,
+        }
+        if paid:
+            slot, slot_id = self._slot(rng, paid)
+            row.update(delivery_slot=slot, delivery_slot_id=slot_id)
+        if self.address_of[user_id]:
+            row["shipping_address"] = self._address(user_id)[0]
+        row.update(extra)
+        self.loader.add(self.t["orders"], row)
+        return self.order_id
+
+    def _fulfilment_status(self, rng: random.Random, since: datetime) -> str:
+        age = (self.anchor - since).total_seconds() / 86400
+        if rng.random() < 0.03:
+            return "cancelled"
+        if age < 1:
+            return "در انتظار"
+        if age < 3:
+            return "processing"
+        if age < 7:
+            return rng.choice(("processing", "shipped"))
+        return "completed"
+
+    def orders(self) -> None:
+        from app.models import OrderState, OrderType
+
+        rng = self.rng("orders")
+        counts = self.counts
+        events = counts.groups + counts.solo_orders
+        group_share = counts.groups / events
+        groups_left = counts.groups
+        group_id = 0
+        primary_groups: List[int] = []
+        for n in range(events):
+            self.loader.tick()
+            # leaves room for the leader's payment before the anchor
+            created = max(self.start, self._at((n + 1) / events) - timedelta(seconds=rng.randint(600, 1200)))
+            is_group = groups_left > 0 and (rng.random() < group_share or events - n <= groups_left)
+            if not is_group:
+                user = self._customer(rng, created)
+                if rng.random() < 0.06:
+                    # abandoned checkout
+                    self._order(rng, user, created, self._basket(rng), 0, status="در انتظار پرداخت",
+                                order_type=OrderType.ALONE, mode="solo", paid_at=None)
+                else:
+                    self._order(rng, user, created, self._basket(rng), 0, status=self._fulfilment_status(rng, created),
+                                order_type=OrderType.ALONE, state=OrderState.ALONE_PAID,
+                                mode=rng.choice(("solo", "alone")))
+                continue
+            groups_left -= 1
+            group_id += 1
+            self._group(rng, group_id, created, primary_groups)
+            # secondary groups point back at a recent primary one
+            if len(primary_groups) > 5000:
+                del primary_groups[:2500]
+
+    def _group(self, rng: random.Random, group_id: int, created: datetime, primary_groups: List[int]) -> None:
+        from app.models import GroupOrderStatus, OrderState, OrderType
+
+        age_hours = (self.anchor - created).total_seconds() / 3600
+        roll = rng.random()
+        if age_hours < 24:
+            status = GroupOrderStatus.GROUP_FORMING if roll < 0.8 else GroupOrderStatus.GROUP_FINALIZED
+        elif age_hours < 30:
+            # Forming groups past their 24h window are what the expiry sweep picks up
+            status = (GroupOrderStatus.GROUP_FORMING if roll < 0.4
+                      else GroupOrderStatus.GROUP_FINALIZED if roll < 0.8 else GroupOrderStatus.GROUP_FAILED)
+        else:
+            status = GroupOrderStatus.GROUP_FINALIZED if roll < 0.72 else GroupOrderStatus.GROUP_FAILED
+        secondary = bool(primary_groups) and rng.random() < 0.15
+        leader = self._customer(rng, created)
+        expected = rng.choice((1, 1, 2, 2, 3))
+        if status == GroupOrderStatus.GROUP_FINALIZED:
+            joined = max(1, min(3, expected + rng.choice((-1, 0, 0, 0, 1))))
+        elif status == GroupOrderStatus.GROUP_FAILED:
+            joined = 0
+        else:
+            joined = rng.randint(0, max(0, expected - 1))
+        consolidate = rng.random() < 0.4 and self.address_of[leader] != 0
+        paid_at = created + timedelta(minutes=rng.randint(1, 15))
+        expires = paid_at + timedelta(hours=24)
+        join_times = sorted(paid_at + timedelta(minutes=rng.randint(5, 24 * 60 - 5)) for _ in range(joined))
+        join_times = [t for t in join_times if t <= self.anchor]
+        finalized = None
+        if status == GroupOrderStatus.GROUP_FINALIZED:
+            finalized = min(join_times[-1] if join_times else expires, self.anchor)
+
+        basket = self._basket(rng)
+        leader_state = {GroupOrderStatus.GROUP_FORMING: OrderState.GROUP_PENDING,
+                        GroupOrderStatus.GROUP_FINALIZED: OrderState.GROUP_SUCCESS,
+                        GroupOrderStatus.GROUP_FAILED: OrderState.GROUP_EXPIRED}[status]
+        settlement_required = status == GroupOrderStatus.GROUP_FINALIZED and len(join_times) < expected
+        settled_at = finalized + timedelta(hours=rng.randint(1, 48)) if settlement_required else None
+        settlement_paid = settlement_required and rng.random() < 0.75 and settled_at <= self.anchor
+        if status == GroupOrderStatus.GROUP_FINALIZED:
+            leader_status = "در انتظار تسویه" if settlement_required and not settlement_paid else self._fulfilment_status(rng, finalized)
+        elif status == GroupOrderStatus.GROUP_FAILED:
+            leader_status = "cancelled" if rng.random() < 0.3 else self._fulfilment_status(rng, expires)
+        else:
+            leader_status = "در انتظار"
+
+        group = {
+            "id": group_id, "leader_id": leader, "invite_token": f"GB{group_id:x}{rng.getrandbits(24):06x}",
+            "status": status, "created_at": created, "leader_paid_at": paid_at, "expires_at": expires,
+            "finalized_at": finalized, "expected_friends": expected,
+            "settlement_required": settlement_required, "settlement_amount": 0, "refund_due_amount": 0,
+            "allow_consolidation": consolidate,
+            "leader_address_id": self.address_of[leader] if consolidate else None,
+            "kind": "secondary" if secondary else "primary",
+            "participants_count": 1 + len(join_times), "paid_members": len(join_times),
+            "product_name": self.product_names[basket[0][0]],
+        }
+        leader_order = self._order(
+            rng, leader, created, basket, expected, status=leader_status, state=leader_state,
+            order_type=OrderType.GROUP, group_order_id=group_id, mode="group", paid_at=paid_at,
+            expected_friends=expected, allow_consolidation=consolidate,
+            expires_at=expires if status == GroupOrderStatus.GROUP_FORMING else None,
+        )
+        if secondary:
+            group["basket_snapshot"] = json.dumps({
+                "kind": "secondary", "source_group_id": rng.choice(primary_groups),
+                "items": [{"product_id": p + 1, "product_name": self.product_names[p], "quantity": q,
+                           "unit_price": self.prices[p][expected]} for p, q in basket],
+            }, ensure_ascii=False)
+        else:
+            group["basket_snapshot"] = json.dumps({"kind": "primary", "source_order_id": leader_order})
+            primary_groups.append(group_id)
+
+        leader_address = self._address(leader)[0] if consolidate else None
+        for joined_at in join_times:
+            member = self._customer(rng, joined_at - timedelta(minutes=2))
+            to_leader = consolidate and rng.random() < 0.5
+            self._order(
+                rng, member, joined_at - timedelta(minutes=2), self._basket(rng), min(3, len(join_times)),
+                status=self._fulfilment_status(rng, finalized or joined_at), state=OrderState.GROUP_SUCCESS
+                if status == GroupOrderStatus.GROUP_FINALIZED else OrderState.GROUP_PENDING,
+                order_type=OrderType.GROUP, group_order_id=group_id, mode="group", paid_at=joined_at,
+                is_invited_checkout=True, ship_to_leader_address=to_leader,
+                **({"shipping_address": leader_address} if to_leader else {}),
+            )
+
+        if settlement_required:
+            leader_total = sum(self.prices[p][expected] * q for p, q in basket)
+            actual = sum(self.prices[p][len(join_times)] * q for p, q in basket)
+            amount = int(max(actual - leader_total, 1000))
+            group["settlement_amount"] = amount
+            if settlement_paid:
+                group["settlement_paid_at"] = settled_at
+                self.order_id += 1
+                self.loader.add(self.t["orders"], {
+                    "id": self.order_id, "user_id": leader, "total_amount": amount, "status": "completed",
+                    "created_at": settled_at, "paid_at": settled_at, "order_type": OrderType.GROUP,
+                    "group_order_id": group_id, "is_settlement_payment": True, "mode": "group",
+                    "payment_authority": f"S{self.order_id:035d}", "payment_ref_id": str(10_000_000 + self.order_id),
+                    "ship_to_leader_address": False, "is_invited_checkout": False,
+                })
+        elif status == GroupOrderStatus.GROUP_FINALIZED and len(join_times) > expected:
+            leader_total = sum(self.prices[p][expected] * q for p, q in basket)
+            actual = sum(self.prices[p][len(join_times)] * q for p, q in basket)
+            group["refund_due_amount"] = int(max(leader_total - actual, 1000))
+            group["refund_card_number"] = f"6037{rng.randint(0, 10 ** 12 - 1):012d}"
+            group["refund_requested_at"] = min(finalized + timedelta(hours=1), self.anchor)
+            refunded_at = finalized + timedelta(hours=rng.randint(2, 72))
+            if rng.random() < 0.6 and refunded_at <= self.anchor:
+                group["refund_paid_at"] = refunded_at
+        self.loader.add(self.t["groups"], group)
+
+    # ---- reviews and support ----------------------------------------------------------
+
+    def reviews(self) -> None:
+        rng = self.rng("reviews")
+        for rid in range(1, self.counts.reviews + 1):
+            self.loader.tick()
+            created = self._at(rng.random())
+            self.loader.add(self.t["reviews"], {
+                "id": rid, "user_id": self._customer(rng, created),
+                "product_id": rng.choices(range(1, self.counts.products + 1), cum_weights=self.product_cum_weights)[0],
+                "rating": rng.choices((1, 2, 3, 4, 5), weights=(3, 4, 10, 30, 53))[0],
+                "comment": rng.choice(REVIEW_COMMENTS),
+                "display_name": rng.choice(FIRST_NAMES) if rng.random() < 0.3 else None,
+                "created_at": created, "approved": rng.random() < 0.85,
+            })
+
+    def support(self) -> None:
+        rng = self.rng("support")
+        customers = range(self.first_customer, self.counts.users + 1)
+        threads = rng.sample(customers, min(self.counts.support_threads, len(customers)))
+        message_id = 0
+        for conv_id, user in enumerate(sorted(threads), start=1):
+            self.loader.tick()
+            # support timestamps are naive UTC
+            at = self._at(rng.uniform(0.5, 1.0)) - TEHRAN_OFFSET
+            end = self.anchor - TEHRAN_OFFSET
+            from_user = True
+            last = {}
+            last_from = {"user": 0, "admin": 0}  # newest message id per sender
+            seen = {"user": 0, "admin": 0}  # newest message of the other side each one has seen
+            unread = {"user": 0, "admin": 0}
+            for _ in range(rng.randint(1, 12)):
+                if last and at > end:
+                    break
+                message_id += 1
+                sender, reader = ("user", "admin") if from_user else ("admin", "user")
+                text = rng.choice(SUPPORT_USER_LINES if from_user else SUPPORT_ADMIN_LINES)
+                self.loader.add(self.t["messages"], {
+                    "id": message_id, "sender_id": user if from_user else ADMIN_ID,
+                    "receiver_id": ADMIN_ID if from_user else user, "message": text, "timestamp": at,
+                })
+                # Replying means having read everything the other side sent
+                seen[sender] = last_from[reader]
+                unread[sender] = 0
+                unread[reader] += 1
+                last_from[sender] = message_id
+                last = {"id": message_id, "text": text, "from_user": from_user, "at": at}
+                at += timedelta(minutes=rng.randint(1, 600))
+                from_user = not from_user if rng.random() < 0.8 else from_user
+            if last["at"] < end - timedelta(days=3):
+                # Only the last few days of the inbox are still unanswered
+                seen = {"user": last_from["admin"], "admin": last_from["user"]}
+                unread = {"user": 0, "admin": 0}
+            self.loader.add(self.t["conversations"], {
+                "id": conv_id, "user_id": user, "last_message_id": last["id"], "last_message": last["text"],
+                "last_sender": "user" if last["from_user"] else "admin", "last_message_at": last["at"],
+                "unread_by_admin": unread["admin"], "unread_by_user": unread["user"],
+                "admin_seen_id": seen["admin"], "user_seen_id": seen["user"], "updated_at": last["at"],
+            })
+
+    def run(self) -> Dict[str, int]:
+        for step in (self.users, self.catalog, self.delivery_slots, self.orders, self.reviews, self.support):
+            started = time.perf_counter()
+            step()
+            self.loader.flush()
+            print(f"  {step.__name__:15s} {time.perf_counter() - started:7.1f}s", flush=True)
+        return self.loader.totals
+
+
+def _finish(engine, tables) -> None:
+    from sqlalchemy import text
+    from app.database import SessionLocal
+    from app.services.product_browse import refresh_product_scores
+
+    db = SessionLocal()
+    try:
+        refresh_product_scores(db)
+        db.commit()
+    finally:
+        db.close()
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            # Ids were inserted explicitly; move the sequences past them
+            for table in tables:
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT MAX(id) FROM {table}), 1))"
+                ))
+        conn.execute(text("ANALYZE"))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", required=True, help="target database (must have no users yet)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies every default count")
+    parser.add_argument("--anchor", help="end of the timeline, ISO Tehran time (default: current hour)")
+    parser.add_argument("--days", type=int, default=365, help="length of the history")
+    for f in fields(Counts):
+        parser.add_argument(f"--{f.name.replace('_', '-')}", type=int, dest=f.name)
+    args = parser.parse_args()
+
+    counts = Counts().scaled(args.scale)
+    for f in fields(Counts):
+        if getattr(args, f.name) is not None:
+            setattr(counts, f.name, getattr(args, f.name))
+    if counts.users <= counts.merchants + 1:
+        parser.error("--users must exceed --merchants + 1")
+    anchor = (datetime.fromisoformat(args.anchor) if args.anchor
+              else (datetime.utcnow() + TEHRAN_OFFSET).replace(minute=0, second=0, microsecond=0))
+
+    url = args.database_url
+    if url.startswith("sqlite:///"):
+        # app.database falls back to the project DB when the file does not exist yet
+        Path(url[len("sqlite:///"):]).touch()
+    os.environ["DATABASE_URL"] = url
+    import main as app_main  # noqa: F401  creates the schema and startup indexes
+    from sqlalchemy import func, select
+    from app.database import engine
+    from app.models import User
+
+    with engine.connect() as conn:
+        if conn.scalar(select(func.count()).select_from(User)):
+            print("error: target database already has users", file=sys.stderr)
+            return 1
+
+    print(f"seed {args.seed}, anchor {anchor.isoformat()}, {args.days} days: "
+          + ", ".join(f"{f.name}={getattr(counts, f.name)}" for f in fields(Counts)), flush=True)
+    started = time.perf_counter()
+    generator = Generator(engine, args.seed, anchor, args.days, counts)
+    totals = generator.run()
+    _finish(engine, [generator.t[key].name for key in generator.t])
+    elapsed = time.perf_counter() - started
+    rows = sum(totals.values())
+    for table, n in totals.items():
+        print(f"  {table:22s} {n:>10}")
+    print(f"{rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Import a supplier catalog (CSV or JSONL) into the products table.
+
+Same importer as POST /admin/products/import: rows are upserted by sku in
+chunked transactions and per-row errors are printed at the end. Uses the
+database configured for the backend (DATABASE_URL / .env).
+
+Usage:
+    python scripts/import_products.py catalog.csv [--format csv|jsonl] [--create-categories] [--dry-run]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.database import SessionLocal
+from app.services.catalog_import import CHUNK_SIZE, detect_format, import_catalog
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=("csv", "jsonl"))
+    parser.add_argument("--create-categories", action="store_true", help="create categories for unknown slugs")
+    parser.add_argument("--dry-run", action="store_true", help="validate and roll back every chunk")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        with open(args.path, encoding="utf-8-sig", newline="") as stream:
+            result = import_catalog(
+                db, stream, args.format or detect_format(args.path),
+                create_categories=args.create_categories, dry_run=args.dry_run, chunk_size=args.chunk_size,
+            )
+    finally:
+        db.close()
+
+    summary = result.as_dict()
+    errors = summary.pop("errors")
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    for error in errors:
+        print(f"line {error['line']} [{error['sku'] or '-'}]: {error['error']}")
+    return 1 if result.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
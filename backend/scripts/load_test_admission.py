@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Load test for admission control in RequestTrackingMiddleware.
+
+Saturates /api/admin/orders with many concurrent pollers while issuing a
+steady stream of /api/payment/callback requests, then reports latency
+percentiles and shed counts per endpoint.
+
+Usage:
+    python scripts/load_test_admission.py                 # in-process simulation
+    python scripts/load_test_admission.py --url http://127.0.0.1:8001
+
+The in-process mode mounts a stand-in app behind the real middleware whose
+handlers block a threadpool worker (like the synchronous DB layer does), so
+it runs without a database or payment gateway.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+def build_simulated_app(admin_ms: int, callback_ms: int):
+    from fastapi import FastAPI
+    from app.middleware.request_tracking import RequestTrackingMiddleware
+
+    root = FastAPI()
+    api = FastAPI()
+
+    @api.get("/admin/orders")
+    def admin_orders():
+        time.sleep(admin_ms / 1000)
+        return {"orders": []}
+
+    @api.get("/payment/callback")
+    def payment_callback():
+        time.sleep(callback_ms / 1000)
+        return {"ok": True}
+
+    @api.get("/health/requests")
+    def request_stats():
+        from app.middleware.request_tracking import get_request_stats
+        return get_request_stats()
+
+    api.add_middleware(RequestTrackingMiddleware)
+    root.mount("/api", api)
+    root.add_middleware(RequestTrackingMiddleware)
+    return root
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+async def hammer(client, path, stop_at, results):
+    while time.perf_counter() < stop_at:
+        t0 = time.perf_counter()
+        try:
+            r = await client.get(path)
+            results.append(((time.perf_counter() - t0) * 1000, r.status_code))
+            if r.status_code == 503:
+                await asyncio.sleep(0.05)
+        except Exception:
+            results.append(((time.perf_counter() - t0) * 1000, 0))
+
+
+async def steady(client, path, rate, stop_at, results):
+    interval = 1.0 / rate
+    tasks = []
+
+    async def one():
+        t0 = time.perf_counter()
+        try:
+            r = await client.get(path)
+            results.append(((time.perf_counter() - t0) * 1000, r.status_code))
+        except Exception:
+            results.append(((time.perf_counter() - t0) * 1000, 0))
+
+    while time.perf_counter() < stop_at:
+        tasks.append(asyncio.create_task(one()))
+        await asyncio.sleep(interval)
+    await asyncio.gather(*tasks)
+
+
+def report(name, results):
+    ok = [ms for ms, code in results if code == 200]
+    shed = sum(1 for _, code in results if code == 503)
+    other = len(results) - len(ok) - shed
+    print(
+        f"{name:<22} n={len(results):<6} ok={len(ok):<6} shed={shed:<6} err={other:<4} "
+        f"p50={percentile(ok, 50):7.1f}ms p99={percentile(ok, 99):7.1f}ms max={max(ok) if ok else 0:7.1f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running backend (default: in-process simulation)")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--admin-concurrency", type=int, default=64)
+    parser.add_argument("--callback-rate", type=float, default=20.0, help="callbacks per second")
+    parser.add_argument("--admin-ms", type=int, default=200, help="simulated admin handler time")
+    parser.add_argument("--callback-ms", type=int, default=20, help="simulated callback handler time")
+    parser.add_argument("--callback-path", default="/api/payment/callback?Authority=LOADTEST&Status=NOK")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60, limits=limits, follow_redirects=False)
+    else:
+        app = build_simulated_app(args.admin_ms, args.callback_ms)
+        client = httpx.AsyncClient(app=app, base_url="http://loadtest", timeout=60, limits=limits)
+
+    admin_results, callback_results = [], []
+    stop_at = time.perf_counter() + args.duration
+    async with client:
+        await asyncio.gather(
+            *[hammer(client, "/api/admin/orders", stop_at, admin_results) for _ in range(args.admin_concurrency)],
+            steady(client, args.callback_path, args.callback_rate, stop_at, callback_results),
+        )
+        # Redirects from the real callback count as success
+        callback_results = [(ms, 200 if code in (302, 307) else code) for ms, code in callback_results]
+        print(f"duration={args.duration}s admin_concurrency={args.admin_concurrency} callback_rate={args.callback_rate}/s")
+        report("/api/admin/orders", admin_results)
+        report("/api/payment/callback", callback_results)
+        try:
+            stats = (await client.get("/api/health/requests")).json()
+            for lane, m in stats.get("admission", {}).get("lanes", {}).items():
+                print(f"  lane {lane:<10} admitted={m['admitted']} queued={m['queued']} shed={m['shed']} "
+                      f"wait_avg={m['wait_ms_avg']}ms wait_max={m['wait_ms_max']:.1f}ms")
+        except Exception:
+            pass
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
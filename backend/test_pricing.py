@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Golden checks for app.services.pricing.
+Track-page basket, secondary-group and admin settlement values were captured
+from the per-module code this module replaced (groups track API, /pricing/tiers,
+admin finalize and settlements views). unit_price_for_friends is the unified
+rule the settlement service and post-processor moved to; its cases pin the
+NULL-falls-back / zero-is-a-price behaviour.
+Run: python test_pricing.py  (or pytest test_pricing.py)
+"""
+from types import SimpleNamespace
+
+from app.services.pricing import (
+    admin_settlement_unit_price,
+    basket_from_snapshot,
+    basket_item_price,
+    group_totals,
+    secondary_refund,
+    secondary_tier_prices,
+    unit_price_for_friends,
+)
+
+FULL = SimpleNamespace(market_price=12000, base_price=10000, friend_1_price=6000, friend_2_price=4000, friend_3_price=0)
+PARTIAL = SimpleNamespace(market_price=9000, base_price=9000, friend_1_price=4500, friend_2_price=None, friend_3_price=None)
+NO_MARKET = SimpleNamespace(market_price=0, base_price=8000, friend_1_price=None, friend_2_price=None, friend_3_price=None)
+ZERO = SimpleNamespace(market_price=8000, base_price=8000, friend_1_price=0, friend_2_price=0, friend_3_price=0)
+PAID_F3 = SimpleNamespace(market_price=12000, base_price=10000, friend_1_price=6000, friend_2_price=4000, friend_3_price=1500)
+
+
+def test_unit_price_for_friends():
+    assert [unit_price_for_friends(FULL, n) for n in range(5)] == [12000, 6000, 4000, 0, 0]
+    assert [unit_price_for_friends(PARTIAL, n) for n in range(4)] == [9000, 4500, 4500, 4500]
+    assert [unit_price_for_friends(NO_MARKET, n) for n in range(4)] == [8000, 8000, 8000, 8000]
+    assert [unit_price_for_friends(ZERO, n) for n in range(4)] == [8000, 0, 0, 0]
+    assert [unit_price_for_friends(PAID_F3, n) for n in range(5)] == [12000, 6000, 4000, 1500, 1500]
+
+
+def test_admin_settlements_view_price():
+    price = admin_settlement_unit_price
+    assert [price(FULL, n) for n in range(5)] == [12000, 6000, 4000, 0, 0]
+    assert [price(PAID_F3, n) for n in range(5)] == [12000, 6000, 4000, 1500, 1500]
+    assert [price(PARTIAL, n) for n in range(4)] == [9000, 4500, 2250, 0]
+    assert [price(NO_MARKET, n) for n in range(4)] == [8000, 4000, 2000, 0]
+    assert [price(ZERO, n) for n in range(4)] == [8000, 4000, 2000, 0]
+
+
+def test_admin_finalize_price():
+    def price(product, n):
+        return admin_settlement_unit_price(product, n, charge_full_group=False)
+    assert [price(PAID_F3, n) for n in range(5)] == [12000, 6000, 4000, 0, 0]
+    assert [price(PARTIAL, n) for n in range(4)] == [9000, 4500, 2250, 0]
+    assert [price(ZERO, n) for n in range(4)] == [8000, 4000, 2000, 0]
+    assert [price(None, n) for n in range(4)] == [0, 0, 0, 0]
+
+
+def test_basket_item_price():
+    item = {"solo_price": 9000, "friend_1_price": 0, "friend_2_price": 0, "friend_3_price": 0}
+    assert [basket_item_price(item, n) for n in range(5)] == [9000, 4500, 3000, 0, 0]
+    item = {"solo_price": 9000, "friend_1_price": 5000, "friend_2_price": 4000, "friend_3_price": 2500}
+    assert [basket_item_price(item, n) for n in range(5)] == [9000, 5000, 4000, 2500, 2500]
+
+
+def test_primary_group_totals():
+    products = {1: SimpleNamespace(name="سیب", market_price=12000, friend_1_price=6000, friend_2_price=4000, friend_3_price=0),
+                2: SimpleNamespace(name="هلو", market_price=9000, friend_1_price=0, friend_2_price=0, friend_3_price=0)}
+    basket = basket_from_snapshot(
+        [{"product_id": 1, "quantity": 2, "unit_price": 0}, {"product_id": 2, "quantity": 1, "unit_price": 0}],
+        products,
+    )
+    expected = {
+        0: 33000,
+        1: 2 * 6000 + 9000 / 2,
+        2: 2 * 4000 + 9000 / 3,
+        3: 0,
+    }
+    for friends, current in expected.items():
+        assert group_totals(basket, friends, False) == {
+            "originalTotal": 33000, "currentTotal": current, "expectedTotal": 33000,
+        }
+
+
+def test_secondary_group_totals():
+    basket = basket_from_snapshot([{"product_id": 9, "quantity": 2, "unit_price": 3000.0}], {})
+    currents = [group_totals(basket, n, True)["currentTotal"] for n in range(6)]
+    assert currents == [6000.0, 4500.0, 3000.0, 1500.0, 0, 0]
+    assert group_totals(basket, 1, True)["expectedTotal"] == 0
+
+
+def test_secondary_refund():
+    assert [secondary_refund(8000, n) for n in range(6)] == [0, 2000.0, 4000.0, 6000.0, 8000.0, 8000.0]
+    assert secondary_refund(0, 3) == 0
+
+
+def test_secondary_tier_prices():
+    assert secondary_tier_prices(10000.0) == {
+        "with1Friend": 10000.0, "with2Friends": 6670.0, "with3Friends": 3340.0, "with4Friends": 0.0,
+    }
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
@@ -5,7 +5,7 @@
    "use client";
 
    import React from "react";
-   import { useEffect, useState, useCallback } from "react";
+   import { useEffect, useState, useCallback, useRef } from "react";
    import { toTehranTime, toTehranDate, toTehranDateTime } from "@/utils/dateUtils";
    import {
     FaTachometerAlt,
@@ -25,6 +25,7 @@ import { toFa } from "@/utils/toFa";
 import SettlementsContent from "@/components/SettlementsContent";
 import Image from "next/image";
 import { API_BASE_URL } from "@/utils/api";
+import { subscribeAdminSupportEvents, supportEventsSupported } from "@/utils/supportEvents";
 import { syncTokenFromURL } from "@/utils/crossDomainAuth";
 
    /* --------------------------------------------------------------------------
@@ -409,7 +410,34 @@ import { syncTokenFromURL } from "@/utils/crossDomainAuth";
        };
      }, []);
 
-     // Load messages for selected conversation with polling
+     // Live updates for every thread: keep the list fresh and append to the open one
+     const selectedRef = useRef<number | null>(null);
+     useEffect(() => { selectedRef.current = selectedUserId; }, [selectedUserId]);
+     // Polling stays on until the stream has delivered its first event
+     const [streamLive, setStreamLive] = useState(false);
+
+     useEffect(() => {
+       if (!supportEventsSupported()) return;
+       return subscribeAdminSupportEvents(ADMIN_API_BASE_URL, {
+         onMessage: ({ user_id, message }) => {
+           if (user_id !== selectedRef.current) return;
+           setMessages((prev) => (prev.some((m) => m.id === message.id) ? prev : [...prev, message]));
+           if (message.sender === 'user') {
+             fetchJSON(`${ADMIN_API_BASE_URL}/chat/admin/conversations/${user_id}/seen`, { method: 'POST' }).catch(() => {});
+           }
+         },
+         onConversation: ({ user_id, conversation }) => {
+           setConversations((prev) => {
+             const existing = prev.find((c) => c.user_id === user_id);
+             const rest = prev.filter((c) => c.user_id !== user_id);
+             return [{ ...existing, ...conversation }, ...rest];
+           });
+         },
+         onLive: setStreamLive,
+       });
+     }, []);
+
+     // Load messages for selected conversation (polling only while the event stream is not live)
      useEffect(() => {
        if (!selectedUserId) return;
        let alive = true;
@@ -427,14 +455,14 @@ import { syncTokenFromURL } from "@/utils/crossDomainAuth";
          }
        };
        load();
-       const id = setInterval(load, 2000);
+       const id = streamLive ? null : setInterval(load, 2000);
        setPolling(id);
        return () => {
          alive = false;
          if (id) clearInterval(id);
          setPolling(null);
        };
-     }, [selectedUserId]);
+     }, [selectedUserId, streamLive]);
 
      const handleSelect = (c: any) => {
        setSelectedUserId(c.user_id);
@@ -8,6 +8,7 @@ import { apiClient } from '@/utils/apiClient';
 import { toTehranTime } from '@/utils/dateUtils';
 import { PageErrorBoundary } from '@/components/common/PageErrorBoundary';
 import { safeStorage } from '@/utils/safeStorage';
+import { subscribeUserSupportEvents, supportEventsSupported } from '@/utils/supportEvents';
 import { IoArrowBack, IoSend, IoCheckmark, IoCheckmarkDone } from "react-icons/io5";
 import { FaHeadset } from "react-icons/fa";
 
@@ -60,11 +61,51 @@ function ChatPageContent() {
       }
     };
 
+    const startPolling = () => {
+      if (!intervalRef.current) intervalRef.current = setInterval(fetchMessages, 2000);
+    };
+    const stopPolling = () => {
+      if (intervalRef.current) clearInterval(intervalRef.current);
+      intervalRef.current = null;
+    };
+
     fetchMessages();
-    intervalRef.current = setInterval(fetchMessages, 2000);
+    // Poll until the event stream proves it delivers, and again whenever it drops
+    startPolling();
+    let unsubscribe: (() => void) | null = null;
+    if (supportEventsSupported()) {
+      unsubscribe = subscribeUserSupportEvents({
+        onMessage: ({ message }) => {
+          if (!isMounted) return;
+          setMessages((prev) => (prev.some((m) => m.id === message.id) ? prev : [...prev, message]));
+          if (message.sender === 'admin') {
+            apiClient.post('/chat/admin/messages/seen', [message.id]).catch(() => {});
+            safeStorage.setItem('chat_last_seen_admin_id', String(message.id));
+          }
+        },
+        onConversation: ({ conversation }) => {
+          // Admin read receipts: tick our own messages up to admin_seen_id
+          const seenUpTo = Number(conversation.admin_seen_id || 0);
+          if (!isMounted || !seenUpTo) return;
+          setMessages((prev) => prev.map((m) => (
+            m.sender === 'user' && m.id <= seenUpTo && !m.seen ? { ...m, seen: true } : m
+          )));
+        },
+        onLive: (live) => {
+          if (!isMounted) return;
+          if (live) {
+            stopPolling();
+            fetchMessages(); // catch up on anything sent before the stream was live
+          } else {
+            startPolling();
+          }
+        },
+      });
+    }
     return () => {
       isMounted = false;
-      if (intervalRef.current) clearInterval(intervalRef.current);
+      if (unsubscribe) unsubscribe();
+      stopPolling();
     };
   }, [isAuthenticated]);
 
@@ -9,6 +9,7 @@ import { useAuth } from '@/contexts/AuthContext';
 import { apiClient } from '@/utils/apiClient';
 import { useCart } from '@/contexts/CartContext';
 import { safeStorage } from '@/utils/safeStorage';
+import { subscribeUserSupportEvents, supportEventsSupported } from '@/utils/supportEvents';
 
 export default function BottomNavigation() {
     const pathname = usePathname();
@@ -195,17 +196,22 @@ export default function BottomNavigation() {
         }
     }, []);
 
+    // True while the support event stream is delivering; until then the chat badge is polled
+    const chatStreamLiveRef = useRef(false);
+
     // Poll with guards and avoid stacking timers across route changes
     useEffect(() => {
         const tick = () => {
             if (typeof document !== 'undefined' && document.hidden) return;
             if (isInteractingRef.current) return;
             scheduleIdle(() => { void computeGroupsOrdersCount(); });
-            scheduleIdle(() => { void computeChatUnread(); });
+            // With a live support event stream the chat badge is pushed; only re-read it otherwise
+            if (!chatStreamLiveRef.current) scheduleIdle(() => { void computeChatUnread(); });
         };
 
         // initial compute (idle)
         tick();
+        scheduleIdle(() => { void computeChatUnread(); });
 
         // single interval, slower to reduce load
         if (pollRef.current) clearInterval(pollRef.current);
@@ -225,6 +231,29 @@ export default function BottomNavigation() {
         };
     }, [computeGroupsOrdersCount, computeChatUnread, scheduleIdle]);
 
+    // Push new admin replies into the chat badge instead of polling for them
+    const pathnameRef = useRef(pathname);
+    useEffect(() => { pathnameRef.current = pathname; }, [pathname]);
+
+    useEffect(() => {
+        if (!isClient || !supportEventsSupported()) return;
+        if (!isAuthenticated && !safeStorage.getItem('auth_token')) return;
+        return subscribeUserSupportEvents({
+            onMessage: ({ message }) => {
+                if (message.sender !== 'admin' || pathnameRef.current === '/chat') return;
+                const lastSeenId = Number(safeStorage.getItem('chat_last_seen_admin_id') || 0);
+                if (lastSeenId && message.id > lastSeenId) {
+                    setChatUnreadCount((count) => count + 1);
+                }
+            },
+            onLive: (live) => {
+                chatStreamLiveRef.current = live;
+                // Re-read once so nothing sent before the stream went live is missed
+                if (live) scheduleIdle(() => { void computeChatUnread(); });
+            },
+        });
+    }, [isAuthenticated, isClient, computeChatUnread, scheduleIdle]);
+
     // Avoid heavy recompute on every route change; only clear badges on target tabs below
     // If immediate refresh is needed in future, consider a short debounced trigger.
 
@@ -0,0 +1,98 @@
+/**
+ * Support chat live updates over Server-Sent Events.
+ *
+ * The backend pushes `message` and `conversation` events on
+ * /chat/admin/messages/events (one user's thread, token in the query string
+ * because EventSource cannot send headers) and /chat/admin/conversations/events
+ * (every thread, for the admin panel). EventSource reconnects on its own and
+ * sends Last-Event-ID, so missed messages are replayed by the server.
+ *
+ * An open connection is not proof that events get through (a compressing or
+ * buffering proxy can hold them back), so callers keep polling until
+ * `onLive(true)` reports the first event, and resume on `onLive(false)`.
+ */
+import { getApiUrl } from './api';
+import { safeStorage } from './safeStorage';
+
+export type SupportMessageEvent = {
+  type: 'message';
+  user_id: number;
+  id: number;
+  message: {
+    id: number;
+    sender: 'user' | 'admin';
+    message: string;
+    timestamp: string;
+    delivered?: boolean;
+    seen?: boolean;
+  };
+};
+
+export type SupportConversationEvent = {
+  type: 'conversation';
+  user_id: number;
+  conversation: {
+    user_id: number;
+    name?: string;
+    phone?: string | null;
+    last_message_id?: number | null;
+    last_message?: string | null;
+    last_sender?: 'user' | 'admin' | null;
+    last_timestamp?: string | null;
+    unread_by_admin?: number;
+    unread_by_user?: number;
+    admin_seen_id?: number;
+    user_seen_id?: number;
+  };
+};
+
+type Handlers = {
+  onMessage?: (event: SupportMessageEvent) => void;
+  onConversation?: (event: SupportConversationEvent) => void;
+  /** true once an event has arrived on the stream, false when it drops. */
+  onLive?: (live: boolean) => void;
+};
+
+export const supportEventsSupported = (): boolean =>
+  typeof window !== 'undefined' && typeof window.EventSource !== 'undefined';
+
+function listen(url: string, handlers: Handlers): () => void {
+  const source = new EventSource(url);
+  let live = false;
+  const setLive = (value: boolean) => {
+    if (live === value) return;
+    live = value;
+    if (handlers.onLive) handlers.onLive(value);
+  };
+  const parse = (raw: MessageEvent) => {
+    setLive(true);
+    try { return JSON.parse(raw.data); } catch { return null; }
+  };
+  // The server sends `ready` as soon as the stream starts
+  source.addEventListener('ready', () => setLive(true));
+  source.addEventListener('error', () => setLive(false));
+  source.addEventListener('message', (raw) => {
+    const data = parse(raw as MessageEvent);
+    if (data && handlers.onMessage) handlers.onMessage(data);
+  });
+  source.addEventListener('conversation', (raw) => {
+    const data = parse(raw as MessageEvent);
+    if (data && handlers.onConversation) handlers.onConversation(data);
+  });
+  return () => source.close();
+}
+
+/** Subscribe to the signed-in user's support thread. Returns an unsubscribe function. */
+export function subscribeUserSupportEvents(handlers: Handlers, afterId?: number): () => void {
+  const params = new URLSearchParams();
+  const token = safeStorage.getItem('auth_token');
+  if (token) params.set('token', token);
+  if (afterId) params.set('after_id', String(afterId));
+  return listen(`${getApiUrl()}/chat/admin/messages/events?${params.toString()}`, handlers);
+}
+
+/** Subscribe to every support thread (admin panel). Returns an unsubscribe function. */
+export function subscribeAdminSupportEvents(baseUrl: string, handlers: Handlers, afterId?: number): () => void {
+  const query = afterId ? `?after_id=${afterId}` : '';
+  return listen(`${baseUrl}/chat/admin/conversations/events${query}`, handlers);
+}